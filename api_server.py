@@ -152,6 +152,9 @@ BOT_USERNAME = os.getenv('BOT_USERNAME', 'SocrateAIBot')
 # Storage path
 STORAGE_PATH = os.getenv('STORAGE_PATH', './storage')
 
+# Batch retrieval: maximum queries per /api/query/batch request
+MAX_BATCH_QUERIES = int(os.getenv('MAX_BATCH_QUERIES', '20'))
+
 
 # ============================================================================
 # AUTHENTICATION HELPERS
@@ -833,6 +836,10 @@ def delete_document_endpoint(document_id: str):
     if not success:
         return jsonify({'error': 'Document not found'}), 404
 
+    # Other workers drop it on their next library sync
+    from core.library_index import remove_from_library_index
+    remove_from_library_index(user_id, document_id)
+
     logger.info(f"Document deleted: {document_id} by user {user_id}")
 
     return jsonify({'success': True})
@@ -1049,6 +1056,7 @@ def custom_query():
     try:
         # Get metadata source from document (prefer R2, fallback to local path)
         metadata_r2_key = doc.doc_metadata.get('metadata_r2_key') if doc.doc_metadata else None
+        faiss_r2_key = doc.doc_metadata.get('faiss_r2_key') if doc.doc_metadata else None
         metadata_file = doc.doc_metadata.get('metadata_file') if doc.doc_metadata else None
 
         if not metadata_r2_key and not metadata_file:
@@ -1065,6 +1073,7 @@ def custom_query():
             query=query,
             metadata_file=metadata_file,
             metadata_r2_key=metadata_r2_key,
+            faiss_r2_key=faiss_r2_key,
             top_k=top_k,
             user_tier=user_tier,
             query_type=command_type,
@@ -1111,6 +1120,207 @@ def custom_query():
         }), 500
 
 
+@app.route('/api/query/batch', methods=['POST'])
+@require_auth
+def batch_query():
+    """
+    Batch retrieval endpoint: candidate chunks for several queries on one document
+    (single pass: one embedding call, one matrix product, shared keyword postings).
+    No reranking and no LLM call.
+    Body: {
+        "document_id": "...",
+        "queries": ["...", "..."],
+        "command_type": "query|quiz|summary|outline|mindmap|analyze",
+        "top_k": 10  (optional, default: dynamic retrieval size)
+    }
+    """
+    user_id = get_current_user_id()
+    data = request.json or {}
+
+    document_id = data.get('document_id')
+    queries = data.get('queries')
+    command_type = data.get('command_type', 'query')
+
+    if not document_id or not isinstance(queries, list) or not queries:
+        return jsonify({'error': 'document_id and queries (non-empty list) required'}), 400
+
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({'error': f'Too many queries (max {MAX_BATCH_QUERIES})'}), 400
+
+    if not all(isinstance(query, str) and query.strip() for query in queries):
+        return jsonify({'error': 'queries must be non-empty strings'}), 400
+
+    try:
+        top_k = validate_integer_param(data.get('top_k'), 'top_k', min_val=1, max_val=200) if data.get('top_k') is not None else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    doc = get_document_by_id(document_id, user_id)
+    if not doc:
+        return jsonify({'error': 'Document not found'}), 404
+
+    if doc.status != 'ready':
+        return jsonify({'error': f'Document not ready (status: {doc.status})'}), 400
+
+    metadata_r2_key = doc.doc_metadata.get('metadata_r2_key') if doc.doc_metadata else None
+    metadata_file = doc.doc_metadata.get('metadata_file') if doc.doc_metadata else None
+
+    if not metadata_r2_key and not metadata_file:
+        logger.error(f"No metadata source in document {document_id}")
+        return jsonify({
+            'error': 'Document metadata not found',
+            'help': 'Document may need to be reprocessed'
+        }), 500
+
+    user = get_user_by_id(user_id)
+    user_tier = user.subscription_tier if user else 'free'
+
+    try:
+        from core.query_engine import query_engine
+
+        logger.info(f"[BATCH] {len(queries)} queries for document {document_id}")
+        result = query_engine.retrieve_batch(
+            queries=queries,
+            metadata_file=metadata_file,
+            metadata_r2_key=metadata_r2_key,
+            top_k=top_k,
+            user_tier=user_tier,
+            query_type=command_type
+        )
+
+        return jsonify({
+            'success': result['success'],
+            'results': [
+                {
+                    'query': item['query'],
+                    'chunks': [
+                        {
+                            'chunk_index': chunk.get('metadata', {}).get('index', chunk.get('chunk_row')),
+                            'page': chunk.get('metadata', {}).get('page', '?'),
+                            'section': chunk.get('metadata', {}).get('section', '?'),
+                            'text': chunk.get('text', ''),
+                            'similarity_score': chunk.get('similarity_score', 0),
+                            'semantic_score': chunk.get('semantic_score'),
+                            'keyword_score': chunk.get('keyword_score')
+                        }
+                        for chunk in item['chunks']
+                    ]
+                }
+                for item in result.get('results', [])
+            ],
+            'metadata': result.get('metadata', {})
+        }), 200 if result['success'] else 500
+
+    except Exception as e:
+        logger.error(f"Error processing batch query: {e}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/documents/<document_id>/occurrences', methods=['GET'])
+@require_auth
+def document_occurrences(document_id: str):
+    """
+    All occurrences of a term or phrase in a document (positional index, no LLM)
+    Exact total, per-page counts and paginated snippets.
+    Query: ?q=<term or phrase>&offset=0&limit=50
+    """
+    from core.positional_index import DEFAULT_OCCURRENCE_LIMIT, MAX_OCCURRENCE_LIMIT
+
+    user_id = get_current_user_id()
+
+    term = (request.args.get('q') or '').strip()
+    if not term:
+        return jsonify({'error': 'q (term or phrase) required'}), 400
+
+    offset = validate_integer_param(request.args.get('offset'), 'offset', min_val=0, default=0)
+    limit = validate_integer_param(
+        request.args.get('limit'), 'limit', min_val=1, max_val=MAX_OCCURRENCE_LIMIT, default=DEFAULT_OCCURRENCE_LIMIT
+    )
+
+    doc = get_document_by_id(document_id, user_id)
+    if not doc:
+        return jsonify({'error': 'Document not found'}), 404
+
+    if doc.status != 'ready':
+        return jsonify({'error': f'Document not ready (status: {doc.status})'}), 400
+
+    metadata_r2_key = doc.doc_metadata.get('metadata_r2_key') if doc.doc_metadata else None
+    metadata_file = doc.doc_metadata.get('metadata_file') if doc.doc_metadata else None
+
+    if not metadata_r2_key and not metadata_file:
+        logger.error(f"No metadata source in document {document_id}")
+        return jsonify({
+            'error': 'Document metadata not found',
+            'help': 'Document may need to be reprocessed'
+        }), 500
+
+    try:
+        from core.query_engine import query_engine
+
+        result = query_engine.find_occurrences(
+            term,
+            metadata_file=metadata_file,
+            metadata_r2_key=metadata_r2_key,
+            offset=offset,
+            limit=limit
+        )
+
+        return jsonify(result), 200 if result['success'] else 500
+
+    except Exception as e:
+        logger.error(f"Error searching occurrences: {e}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/library/search', methods=['POST'])
+@require_auth
+def library_search():
+    """
+    Search across all of the user's ready documents
+    Body: {
+        "query": "...",
+        "top_k": 10
+    }
+    """
+    user_id = get_current_user_id()
+    data = request.json or {}
+
+    query = data.get('query')
+    if not isinstance(query, str) or not query.strip():
+        return jsonify({'error': 'query required'}), 400
+
+    top_k = validate_integer_param(data.get('top_k'), 'top_k', min_val=1, max_val=50, default=10)
+
+    try:
+        from core.library_index import get_library_index, library_entries_from_documents
+        from core.query_engine import query_engine
+
+        # Incremental sync with the database (only new / reprocessed / deleted documents change)
+        library = get_library_index(user_id)
+        library.sync(library_entries_from_documents(get_user_documents(user_id, status='ready')))
+
+        result = query_engine.search_library(query, library, top_k=top_k)
+
+        return jsonify({
+            'success': result['success'],
+            'results': result['results'],
+            'metadata': result.get('metadata', {})
+        })
+
+    except Exception as e:
+        logger.error(f"Error in library search: {e}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @app.route('/api/documents/<document_id>/chat', methods=['POST'])
 @require_auth
 def document_chat(document_id):
@@ -1237,6 +1447,7 @@ def document_chat(document_id):
     try:
         # Get metadata source from document
         metadata_r2_key = doc.doc_metadata.get('metadata_r2_key') if doc.doc_metadata else None
+        faiss_r2_key = doc.doc_metadata.get('faiss_r2_key') if doc.doc_metadata else None
         metadata_file = doc.doc_metadata.get('metadata_file') if doc.doc_metadata else None
 
         if not metadata_r2_key and not metadata_file:
@@ -1268,6 +1479,7 @@ Rispondi alla nuova domanda tenendo conto del contesto della conversazione."""
             query=retrieval_query,  # Clean query for retrieval
             metadata_file=metadata_file,
             metadata_r2_key=metadata_r2_key,
+            faiss_r2_key=faiss_r2_key,
             top_k=top_k,
             user_tier=user_tier,
             query_type='chat',
@@ -1518,12 +1730,14 @@ def generate_outline_tool(document_id):
         # Query document using RAG
         metadata_file = document.file_path
         metadata_r2_key = document.doc_metadata.get('metadata_r2_key') if document.doc_metadata else None
+        faiss_r2_key = document.doc_metadata.get('faiss_r2_key') if document.doc_metadata else None
         user_tier = 'premium'
 
         result = query_document(
             query=outline_prompt,
             metadata_file=metadata_file,
             metadata_r2_key=metadata_r2_key,
+            faiss_r2_key=faiss_r2_key,
             top_k=50,  # Premium: maximum context for detailed outlines
             user_tier=user_tier,
             query_type='outline',
@@ -1597,12 +1811,14 @@ def generate_quiz_tool(document_id):
         # Query document using RAG
         metadata_file = document.file_path
         metadata_r2_key = document.doc_metadata.get('metadata_r2_key') if document.doc_metadata else None
+        faiss_r2_key = document.doc_metadata.get('faiss_r2_key') if document.doc_metadata else None
         user_tier = 'premium'
 
         result = query_document(
             query=quiz_prompt,
             metadata_file=metadata_file,
             metadata_r2_key=metadata_r2_key,
+            faiss_r2_key=faiss_r2_key,
             top_k=30,  # Premium: rich context for diverse questions
             user_tier=user_tier,
             query_type='quiz',
@@ -1675,12 +1891,14 @@ def generate_summary_tool(document_id):
         # Query document using RAG
         metadata_file = document.file_path
         metadata_r2_key = document.doc_metadata.get('metadata_r2_key') if document.doc_metadata else None
+        faiss_r2_key = document.doc_metadata.get('faiss_r2_key') if document.doc_metadata else None
         user_tier = 'premium'
 
         result = query_document(
             query=summary_prompt,
             metadata_file=metadata_file,
             metadata_r2_key=metadata_r2_key,
+            faiss_r2_key=faiss_r2_key,
             top_k=25,  # Premium: comprehensive context for complete summaries
             user_tier=user_tier,
             query_type='summary',
@@ -1748,12 +1966,14 @@ def generate_analysis_tool(document_id):
         # Query document using RAG
         metadata_file = document.file_path
         metadata_r2_key = document.doc_metadata.get('metadata_r2_key') if document.doc_metadata else None
+        faiss_r2_key = document.doc_metadata.get('faiss_r2_key') if document.doc_metadata else None
         user_tier = 'premium'
 
         result = query_document(
             query=analysis_prompt,
             metadata_file=metadata_file,
             metadata_r2_key=metadata_r2_key,
+            faiss_r2_key=faiss_r2_key,
             top_k=40,  # Premium: deep context for thorough analysis
             user_tier=user_tier,
             query_type='analyze',
@@ -1852,6 +2072,10 @@ def cleanup_orphaned_r2():
                     if embeddings_r2_key and embeddings_r2_key != 'inline' and '/' in embeddings_r2_key:
                         valid_keys.add(embeddings_r2_key)
 
+                    for artifact_r2_key in doc.doc_metadata.get('artifact_r2_keys') or []:
+                        if artifact_r2_key and '/' in artifact_r2_key:
+                            valid_keys.add(artifact_r2_key)
+
             logger.info(f"Found {len(valid_keys)} valid R2 keys in database")
         finally:
             db.close()
@@ -2116,12 +2340,31 @@ def check_r2_storage():
 
 @app.route('/api/health')
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint (includes per-worker cache statistics)"""
+    from core.document_cache import get_document_cache
+    from core.disk_cache import get_disk_cache
+    from core.library_index import get_library_stats
+    from core.model_preload import get_model_readiness
+    from core.embedding_models import get_encoder_registry
+    from core.cache_manager import get_cache_manager
+
+    disk_cache = get_disk_cache()
+    models = get_model_readiness()
+
+    # Model readiness is informational: workers warm up in post_fork, before serving
     return jsonify({
         'status': 'healthy',
         'service': 'Socrate AI Multi-tenant API',
-        'version': '1.0.0'
-    })
+        'version': '1.0.0',
+        'models': models,
+        'caches': {
+            'document_cache': get_document_cache().get_stats(),
+            'disk_cache': disk_cache.get_stats() if disk_cache else None,
+            'library': get_library_stats(),
+            'embedding_models': get_encoder_registry().get_stats(),
+            'rerank_scores': get_cache_manager().get_rerank_stats()
+        }
+    }), 200
 
 
 # ============================================================================
@@ -2138,11 +2381,13 @@ def initialize():
         logger.error(f"Database initialization failed: {e}")
         logger.warning("Application will continue but database operations may fail")
 
-    # ONNX preload disabled: causes worker timeout during export
-    # Model will be loaded on first query and cached permanently
-    # TODO: Pre-build ONNX cache during Docker build phase
-    if os.getenv('RAILWAY_ENVIRONMENT'):
-        logger.info("[ONNX] Preload disabled - model will load on first query")
+    # PERFORMANCE: PRELOAD_MODELS=true loads models here, in the gunicorn master before
+    # fork (gunicorn.conf.py), so ONNX exports never run inside a worker's request timeout
+    from core.model_preload import PRELOAD_MODELS, preload_models
+    if PRELOAD_MODELS:
+        preload_models()
+    else:
+        logger.info("[PRELOAD] Disabled - models will load on first query")
 
 # Initialize at module load time (for gunicorn workers)
 try:
@@ -2159,6 +2404,10 @@ if __name__ == '__main__':
     logger.info(f"   Bot Username: {BOT_USERNAME}")
     logger.info(f"   Storage Path: {STORAGE_PATH}")
 
+    # Not forked by gunicorn: create sessions and warm up in this process
+    from core.model_preload import init_worker_models
+    init_worker_models()
+
     # Run server
     app.run(
         host='0.0.0.0',
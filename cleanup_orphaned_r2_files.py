@@ -66,6 +66,11 @@ def get_valid_r2_keys_from_db() -> Set[str]:
                 if embeddings_r2_key and embeddings_r2_key != 'inline' and '/' in embeddings_r2_key:
                     valid_keys.add(embeddings_r2_key)
 
+                # 5. Binary artifact files (manifest, indexes, ...)
+                for artifact_r2_key in doc.doc_metadata.get('artifact_r2_keys') or []:
+                    if artifact_r2_key and '/' in artifact_r2_key:
+                        valid_keys.add(artifact_r2_key)
+
         logger.info(f"Found {len(valid_keys)} valid R2 keys in database")
         return valid_keys
 
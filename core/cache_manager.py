@@ -6,12 +6,56 @@ Provides embedding and result caching to reduce latency and costs
 import logging
 import hashlib
 import json
+import random
 import numpy as np
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List, NamedTuple
 import os
 
 logger = logging.getLogger(__name__)
 
+# Semantic result cache: reuse an answer when a previous query on the same
+# document (same query type and parameters) is a near-duplicate
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'true').lower() == 'true'
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.95'))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '64'))
+
+# False-hit sampling: fraction of semantic hits recomputed and compared with the
+# cached answer (a hit is false when the two source sets overlap less than this)
+SEMANTIC_CACHE_AUDIT_RATE = float(os.getenv('SEMANTIC_CACHE_AUDIT_RATE', '0.05'))
+SEMANTIC_CACHE_MIN_SOURCE_OVERLAP = 0.5
+SEMANTIC_CACHE_MAX_SAMPLES = 20
+
+# Results whose stored near-duplicate expired are skipped: check a few best matches
+SEMANTIC_CACHE_MAX_PROBES = 3
+
+# Rerank score cache: cross-encoder score per (normalized query, document version,
+# scoring model, chunk row), so hot chunks are not re-scored on every chat turn
+RERANK_CACHE_ENABLED = os.getenv('RERANK_CACHE_ENABLED', 'true').lower() == 'true'
+RERANK_CACHE_TTL_SECONDS = int(os.getenv('RERANK_CACHE_TTL_SECONDS', '86400'))
+
+
+class SemanticMatch(NamedTuple):
+    """Cached result of a near-duplicate query"""
+    result: Dict[str, Any]
+    cached_query: str
+    similarity: float
+    audit: bool  # True: recompute the answer and report it via record_semantic_audit
+
+
+def make_result_scope(query_type: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Stable scope string for result cache keys (query type + generation parameters)
+
+    Args:
+        query_type: Type of query (query, quiz, summary, outline, mindmap, analyze)
+        params: Parameters that change the answer (tier, temperature, command params, ...)
+
+    Returns:
+        Scope string (query type + parameter hash)
+    """
+    params_json = json.dumps(params or {}, sort_keys=True, ensure_ascii=False, default=str)
+    return f"{query_type}:{hashlib.md5(params_json.encode('utf-8')).hexdigest()[:12]}"
+
 # Try to import redis
 try:
     import redis
@@ -28,6 +72,9 @@ class CacheManager:
     Features:
     - Embedding cache: Store query embeddings (768-dim vectors)
     - Result cache: Store full query results (answer + sources)
+    - Semantic result cache: Reuse results of near-duplicate queries
+      (cosine similarity of query embeddings, per document and scope)
+    - Rerank score cache: Cross-encoder scores per (query, document version, chunk)
     - Automatic TTL (time-to-live)
     - Fallback to no-cache if Redis unavailable
     """
@@ -77,25 +124,34 @@ class CacheManager:
         """Normalize query for consistent cache keys"""
         return query.lower().strip()
 
-    def _make_cache_key(self, prefix: str, query: str, doc_id: Optional[str] = None) -> str:
+    def _make_cache_key(
+        self,
+        prefix: str,
+        query: str,
+        doc_id: Optional[str] = None,
+        scope: Optional[str] = None
+    ) -> str:
         """
-        Generate cache key from query (and optionally doc_id)
+        Generate cache key from query (and optionally doc_id and scope)
 
         Args:
             prefix: Cache key prefix (e.g., 'emb', 'result')
             query: User query
             doc_id: Optional document ID
+            scope: Optional result scope (see make_result_scope)
 
         Returns:
             Cache key string
         """
         normalized = self._normalize_query(query)
 
-        # Include doc_id in hash if provided
+        # Include doc_id (and scope) in hash if provided
         if doc_id:
             to_hash = f"{normalized}:{doc_id}"
         else:
             to_hash = normalized
+        if scope:
+            to_hash = f"{to_hash}:{scope}"
 
         # MD5 hash for compact key
         hash_hex = hashlib.md5(to_hash.encode('utf-8')).hexdigest()
@@ -106,12 +162,13 @@ class CacheManager:
     # EMBEDDING CACHE
     # ========================================================================
 
-    def get_embedding(self, query: str) -> Optional[np.ndarray]:
+    def get_embedding(self, query: str, model: Optional[str] = None) -> Optional[np.ndarray]:
         """
         Get cached query embedding
 
         Args:
             query: User query
+            model: Embedding model id (embeddings of different models never mix)
 
         Returns:
             Embedding array (768-dim) or None if cache miss
@@ -120,7 +177,7 @@ class CacheManager:
             return None
 
         try:
-            cache_key = self._make_cache_key('emb', query)
+            cache_key = self._make_cache_key('emb', query, scope=model)
             cached = self.redis_client.get(cache_key)
 
             if cached:
@@ -136,13 +193,14 @@ class CacheManager:
             logger.warning(f"[CACHE ERROR] Failed to get embedding: {e}")
             return None
 
-    def set_embedding(self, query: str, embedding: np.ndarray) -> bool:
+    def set_embedding(self, query: str, embedding: np.ndarray, model: Optional[str] = None) -> bool:
         """
         Cache query embedding
 
         Args:
             query: User query
             embedding: Embedding array (768-dim)
+            model: Embedding model id (embeddings of different models never mix)
 
         Returns:
             True if cached successfully, False otherwise
@@ -151,7 +209,7 @@ class CacheManager:
             return False
 
         try:
-            cache_key = self._make_cache_key('emb', query)
+            cache_key = self._make_cache_key('emb', query, scope=model)
 
             # Serialize numpy array to bytes
             embedding_bytes = embedding.astype(np.float32).tobytes()
@@ -170,13 +228,14 @@ class CacheManager:
     # RESULT CACHE
     # ========================================================================
 
-    def get_result(self, query: str, doc_id: str) -> Optional[Dict[str, Any]]:
+    def get_result(self, query: str, doc_id: str, scope: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Get cached query result
 
         Args:
             query: User query
             doc_id: Document ID
+            scope: Result scope (query type + parameters, see make_result_scope)
 
         Returns:
             Cached result dict or None if cache miss
@@ -185,7 +244,7 @@ class CacheManager:
             return None
 
         try:
-            cache_key = self._make_cache_key('result', query, doc_id)
+            cache_key = self._make_cache_key('result', query, doc_id, scope)
             cached = self.redis_client.get(cache_key)
 
             if cached:
@@ -201,7 +260,14 @@ class CacheManager:
             logger.warning(f"[CACHE ERROR] Failed to get result: {e}")
             return None
 
-    def set_result(self, query: str, doc_id: str, result: Dict[str, Any]) -> bool:
+    def set_result(
+        self,
+        query: str,
+        doc_id: str,
+        result: Dict[str, Any],
+        scope: Optional[str] = None,
+        query_embedding: Optional[np.ndarray] = None
+    ) -> bool:
         """
         Cache query result
 
@@ -209,6 +275,8 @@ class CacheManager:
             query: User query
             doc_id: Document ID
             result: Result dictionary (answer, sources, metadata)
+            scope: Result scope (query type + parameters, see make_result_scope)
+            query_embedding: Query embedding, registers the query for semantic lookups
 
         Returns:
             True if cached successfully, False otherwise
@@ -217,7 +285,7 @@ class CacheManager:
             return False
 
         try:
-            cache_key = self._make_cache_key('result', query, doc_id)
+            cache_key = self._make_cache_key('result', query, doc_id, scope)
 
             # Serialize to JSON
             result_json = json.dumps(result, ensure_ascii=False)
@@ -226,6 +294,9 @@ class CacheManager:
             result_ttl = min(self.ttl, 1800)  # Max 30 minutes for results
             self.redis_client.setex(cache_key, result_ttl, result_json.encode('utf-8'))
 
+            if query_embedding is not None and SEMANTIC_CACHE_ENABLED:
+                self._add_semantic_entry(query, doc_id, scope, query_embedding, result_ttl)
+
             logger.info(f"[CACHE SET] Result for query on doc {doc_id}: {query[:50]}...")
             return True
 
@@ -233,6 +304,324 @@ class CacheManager:
             logger.warning(f"[CACHE ERROR] Failed to set result: {e}")
             return False
 
+    # ========================================================================
+    # SEMANTIC RESULT CACHE
+    # ========================================================================
+
+    def _semantic_set_key(self, doc_id: str, scope: Optional[str]) -> str:
+        """Key of the vector set of recent queries for one document and scope"""
+        to_hash = f"{doc_id}:{scope}" if scope else doc_id
+        return f"semq:{hashlib.md5(to_hash.encode('utf-8')).hexdigest()}"
+
+    @staticmethod
+    def _normalize_embedding(embedding: np.ndarray) -> Optional[np.ndarray]:
+        """Unit-length float32 copy of a query embedding (None if degenerate)"""
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        return vector / norm
+
+    def _add_semantic_entry(
+        self,
+        query: str,
+        doc_id: str,
+        scope: Optional[str],
+        query_embedding: np.ndarray,
+        ttl: int
+    ) -> None:
+        """
+        Register a cached query in the document vector set (newest first, bounded)
+
+        Entry layout: 2-byte query length + normalized query (UTF-8) + float16 unit vector
+        """
+        vector = self._normalize_embedding(query_embedding)
+        if vector is None:
+            return
+
+        query_bytes = self._normalize_query(query).encode('utf-8')[:65535]
+        entry = len(query_bytes).to_bytes(2, 'big') + query_bytes + vector.astype(np.float16).tobytes()
+
+        set_key = self._semantic_set_key(doc_id, scope)
+        pipe = self.redis_client.pipeline()
+        pipe.lpush(set_key, entry)
+        pipe.ltrim(set_key, 0, SEMANTIC_CACHE_MAX_ENTRIES - 1)
+        pipe.expire(set_key, ttl)
+        pipe.execute()
+
+    @staticmethod
+    def _unpack_semantic_entries(entries: List[bytes], dim: int):
+        """Split vector set entries into (queries, float32 matrix), skipping other dimensions"""
+        queries = []
+        vectors = []
+        for entry in entries:
+            length = int.from_bytes(entry[:2], 'big')
+            vector_bytes = entry[2 + length:]
+            if len(vector_bytes) != dim * 2:
+                continue  # Stored by a different embedding model
+            queries.append(entry[2:2 + length].decode('utf-8'))
+            vectors.append(np.frombuffer(vector_bytes, dtype=np.float16))
+
+        if not vectors:
+            return queries, np.empty((0, dim), dtype=np.float32)
+        return queries, np.vstack(vectors).astype(np.float32)
+
+    def get_similar_result(
+        self,
+        query: str,
+        query_embedding: np.ndarray,
+        doc_id: str,
+        scope: Optional[str] = None
+    ) -> Optional[SemanticMatch]:
+        """
+        Get the cached result of a near-duplicate query on the same document and scope
+
+        Args:
+            query: User query
+            query_embedding: Embedding of the query
+            doc_id: Document ID
+            scope: Result scope (query type + parameters, see make_result_scope)
+
+        Returns:
+            SemanticMatch (result, matched query, similarity, audit flag) or None
+        """
+        if not self.enabled or not SEMANTIC_CACHE_ENABLED:
+            return None
+
+        try:
+            vector = self._normalize_embedding(query_embedding)
+            if vector is None:
+                return None
+
+            entries = self.redis_client.lrange(self._semantic_set_key(doc_id, scope), 0, -1)
+            cached_queries, matrix = self._unpack_semantic_entries(entries, len(vector))
+
+            if cached_queries:
+                similarities = matrix @ vector
+                for i in np.argsort(-similarities)[:SEMANTIC_CACHE_MAX_PROBES]:
+                    similarity = float(similarities[i])
+                    if similarity < SEMANTIC_CACHE_THRESHOLD:
+                        break
+
+                    cached = self.redis_client.get(
+                        self._make_cache_key('result', cached_queries[i], doc_id, scope)
+                    )
+                    if not cached:
+                        continue  # Result expired before its vector set entry
+
+                    self.redis_client.incr('semstats:hits')
+                    audit = random.random() < SEMANTIC_CACHE_AUDIT_RATE
+                    logger.info(
+                        f"[CACHE SEMANTIC HIT] sim={similarity:.3f} doc {doc_id}: "
+                        f"'{query[:50]}' ~ '{cached_queries[i][:50]}'" + (" (audit)" if audit else "")
+                    )
+                    return SemanticMatch(
+                        result=json.loads(cached.decode('utf-8')),
+                        cached_query=cached_queries[i],
+                        similarity=similarity,
+                        audit=audit
+                    )
+
+            self.redis_client.incr('semstats:misses')
+            logger.debug(f"[CACHE SEMANTIC MISS] doc {doc_id}: {query[:50]}...")
+            return None
+
+        except Exception as e:
+            logger.warning(f"[CACHE ERROR] Failed to get similar result: {e}")
+            return None
+
+    def record_semantic_audit(self, query: str, match: SemanticMatch, result: Dict[str, Any]) -> bool:
+        """
+        Compare a recomputed result with the semantic hit it replaced (false-hit sampling)
+
+        Args:
+            query: User query
+            match: Audited semantic match (get_similar_result with audit=True)
+            result: Freshly computed result for the query
+
+        Returns:
+            True if the semantic hit was a false hit (sources overlap too little)
+        """
+        if not self.enabled:
+            return False
+
+        cached_sources = {source.get('chunk_index') for source in match.result.get('sources', [])}
+        fresh_sources = {source.get('chunk_index') for source in result.get('sources', [])}
+        union = cached_sources | fresh_sources
+        overlap = len(cached_sources & fresh_sources) / len(union) if union else 1.0
+        false_hit = overlap < SEMANTIC_CACHE_MIN_SOURCE_OVERLAP
+
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.incr('semstats:audits')
+            if false_hit:
+                sample = {
+                    'query': query[:200],
+                    'cached_query': match.cached_query[:200],
+                    'similarity': round(match.similarity, 4),
+                    'source_overlap': round(overlap, 3)
+                }
+                pipe.incr('semstats:false_hits')
+                pipe.lpush('semstats:samples', json.dumps(sample, ensure_ascii=False).encode('utf-8'))
+                pipe.ltrim('semstats:samples', 0, SEMANTIC_CACHE_MAX_SAMPLES - 1)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[CACHE ERROR] Failed to record semantic audit: {e}")
+
+        logger.info(
+            f"[CACHE SEMANTIC AUDIT] sim={match.similarity:.3f} source overlap={overlap:.2f} "
+            f"-> {'FALSE HIT' if false_hit else 'ok'}"
+        )
+        return false_hit
+
+    def _semantic_stats(self) -> Dict[str, Any]:
+        """Semantic cache counters (shared by all workers through Redis)"""
+        counters = self.redis_client.mget(
+            'semstats:hits', 'semstats:misses', 'semstats:audits', 'semstats:false_hits'
+        )
+        hits, misses, audits, false_hits = (int(value or 0) for value in counters)
+        samples = self.redis_client.lrange('semstats:samples', 0, -1)
+
+        return {
+            'enabled': SEMANTIC_CACHE_ENABLED,
+            'threshold': SEMANTIC_CACHE_THRESHOLD,
+            'vector_sets': len(self.redis_client.keys('semq:*')),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'audit_rate': SEMANTIC_CACHE_AUDIT_RATE,
+            'audits': audits,
+            'false_hits': false_hits,
+            'false_hit_rate': false_hits / audits if audits else 0.0,
+            'false_hit_samples': [json.loads(sample.decode('utf-8')) for sample in samples]
+        }
+
+    # ========================================================================
+    # RERANK SCORE CACHE
+    # ========================================================================
+
+    def _rerank_key_prefix(self, query: str, document_key: str, model: str) -> str:
+        """
+        Key prefix of the rerank scores of one query on one document version
+
+        The query is normalized beyond _normalize_query (inner whitespace, trailing
+        punctuation): "Chi è l'autore?" and "chi è  l'autore" share scores.
+        """
+        normalized = ' '.join(self._normalize_query(query).split()).rstrip('?!.;:')
+        to_hash = f"{normalized}:{document_key}:{model}"
+        return f"rrk:{hashlib.md5(to_hash.encode('utf-8')).hexdigest()}:"
+
+    def get_rerank_scores(
+        self,
+        query: str,
+        document_key: str,
+        model: str,
+        rows: List[int]
+    ) -> List[Optional[float]]:
+        """
+        Get cached rerank scores (one MGET for all candidates)
+
+        Args:
+            query: User query
+            document_key: Document version key (DocumentArtifact.cache_key)
+            model: Scoring backend and model (scores of different models never mix)
+            rows: Chunk rows of the candidates
+
+        Returns:
+            Score per row, None where not cached
+        """
+        if not self.enabled or not rows:
+            return [None] * len(rows)
+
+        try:
+            prefix = self._rerank_key_prefix(query, document_key, model)
+            values = self.redis_client.mget([f"{prefix}{row}" for row in rows])
+            return [float(np.frombuffer(value, dtype=np.float32)[0]) if value else None for value in values]
+
+        except Exception as e:
+            logger.warning(f"[CACHE ERROR] Failed to get rerank scores: {e}")
+            return [None] * len(rows)
+
+    def set_rerank_scores(
+        self,
+        query: str,
+        document_key: str,
+        model: str,
+        scores: Dict[int, float]
+    ) -> bool:
+        """
+        Cache rerank scores (one pipelined round trip: MSET cannot set a TTL)
+
+        Args:
+            query: User query
+            document_key: Document version key (DocumentArtifact.cache_key)
+            model: Scoring backend and model
+            scores: Score per chunk row
+
+        Returns:
+            True if cached successfully, False otherwise
+        """
+        if not self.enabled or not scores:
+            return False
+
+        try:
+            prefix = self._rerank_key_prefix(query, document_key, model)
+            pipe = self.redis_client.pipeline(transaction=False)
+            for row, score in scores.items():
+                pipe.setex(f"{prefix}{row}", RERANK_CACHE_TTL_SECONDS, np.float32(score).tobytes())
+            pipe.execute()
+            return True
+
+        except Exception as e:
+            logger.warning(f"[CACHE ERROR] Failed to set rerank scores: {e}")
+            return False
+
+    def record_rerank_lookup(self, backend: str, hits: int, misses: int) -> None:
+        """Count cached / scored candidates of one rerank call (per backend)"""
+        if not self.enabled:
+            return
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.incrby(f"rrstats:{backend}:hits", hits)
+            pipe.incrby(f"rrstats:{backend}:misses", misses)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[CACHE ERROR] Failed to record rerank lookup: {e}")
+
+    def get_rerank_stats(self) -> Dict[str, Any]:
+        """
+        Rerank score cache hit ratio per backend (shared by all workers through Redis)
+
+        Returns:
+            Dict with enabled flag, TTL and per-backend hits, misses and hit rate
+        """
+        if not self.enabled:
+            return {'enabled': False}
+
+        try:
+            keys = sorted(key.decode('utf-8') for key in self.redis_client.keys('rrstats:*'))
+            values = self.redis_client.mget(keys) if keys else []
+            counters = {key: int(value or 0) for key, value in zip(keys, values)}
+
+            backends = {}
+            for key, value in counters.items():
+                _, backend, counter = key.split(':')
+                backends.setdefault(backend, {'hits': 0, 'misses': 0})[counter] = value
+            for stats in backends.values():
+                total = stats['hits'] + stats['misses']
+                stats['hit_rate'] = stats['hits'] / total if total else 0.0
+
+            return {
+                'enabled': RERANK_CACHE_ENABLED,
+                'ttl_seconds': RERANK_CACHE_TTL_SECONDS,
+                'backends': backends
+            }
+
+        except Exception as e:
+            logger.warning(f"[CACHE ERROR] Failed to get rerank stats: {e}")
+            return {'enabled': RERANK_CACHE_ENABLED, 'error': str(e)}
+
     # ========================================================================
     # CACHE MANAGEMENT
     # ========================================================================
@@ -242,7 +631,7 @@ class CacheManager:
         Clear cache entries
 
         Args:
-            pattern: Optional pattern to match keys (e.g., 'emb:*', 'result:*')
+            pattern: Optional pattern to match keys (e.g., 'emb:*', 'result:*', 'semq:*', 'rrk:*')
                     If None, clears all cache
 
         Returns:
@@ -257,7 +646,10 @@ class CacheManager:
                 keys = self.redis_client.keys(pattern)
             else:
                 # Clear all (use with caution!)
-                keys = self.redis_client.keys('emb:*') + self.redis_client.keys('result:*')
+                keys = (
+                    self.redis_client.keys('emb:*') + self.redis_client.keys('result:*')
+                    + self.redis_client.keys('semq:*') + self.redis_client.keys('rrk:*')
+                )
 
             if keys:
                 deleted = self.redis_client.delete(*keys)
@@ -295,7 +687,9 @@ class CacheManager:
                 'total_keys': emb_keys + result_keys,
                 'keyspace_hits': info.get('keyspace_hits', 0),
                 'keyspace_misses': info.get('keyspace_misses', 0),
-                'hit_rate': self._calculate_hit_rate(info)
+                'hit_rate': self._calculate_hit_rate(info),
+                'semantic': self._semantic_stats(),
+                'rerank': self.get_rerank_stats()
             }
 
         except Exception as e:
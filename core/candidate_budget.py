@@ -0,0 +1,145 @@
+"""
+Candidate Budget Planner
+How many retrieval candidates to send to the reranking stage
+
+Retrieval used to forward a percentage of the whole document (20-90% of all
+chunks) to reranking: 1,000 candidates for a 5,000-chunk document, of which
+Modal silently kept the first 100 and the diversity filter compared all pairs.
+
+The planner bounds the candidate count by:
+- Coverage: the historical percentage of the document (upper bound only)
+- Tier / query type cap: absolute maximum per subscription tier
+- Latency target: per-tier rerank budget (ms) / estimated cost per candidate
+  of the active backend (Modal GPU cross-encoder or local diversity filter)
+- Backend limit: Modal accepts at most MAX_CHUNKS_PER_REQUEST chunks
+
+After retrieval, score-gap early termination drops the tail of candidates
+once hybrid scores fall off a cliff (never below the final top-k).
+
+Every decision is logged with a [BUDGET] prefix for tuning.
+"""
+
+import os
+import logging
+from typing import List, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+# Estimated rerank cost per candidate (ms) and fixed overhead per request (ms)
+MODAL_RERANK_MS_PER_CHUNK = float(os.getenv('MODAL_RERANK_MS_PER_CHUNK', '4'))
+MODAL_RERANK_OVERHEAD_MS = float(os.getenv('MODAL_RERANK_OVERHEAD_MS', '150'))
+LOCAL_RERANK_MS_PER_CHUNK = float(os.getenv('LOCAL_RERANK_MS_PER_CHUNK', '1'))
+
+# Score-gap early termination: cut where consecutive scores drop by more than
+# this fraction of the (best - worst) score range
+CANDIDATE_SCORE_GAP = float(os.getenv('CANDIDATE_SCORE_GAP', '0.25'))
+
+# Local diversity filter compares candidates pairwise: keep it bounded too
+LOCAL_RERANK_MAX_CANDIDATES = 300
+
+# Rerank latency target (ms) and absolute candidate cap per tier
+TIER_BUDGETS = {
+    'free': {'latency_ms': 400, 'max_candidates': 60},
+    'pro': {'latency_ms': 600, 'max_candidates': 100},
+    'enterprise': {'latency_ms': 900, 'max_candidates': 150}
+}
+
+# Document-wide tools need broader coverage than a single question
+QUERY_TYPE_FACTORS = {
+    'query': 1.0,
+    'quiz': 1.0,
+    'summary': 1.5,
+    'outline': 1.5,
+    'mindmap': 1.5,
+    'analyze': 1.5
+}
+
+
+class CandidateBudget(NamedTuple):
+    """Planned candidate count for one query"""
+    max_candidates: int
+    min_candidates: int
+    limited_by: str
+
+
+def plan_candidate_budget(
+    total_chunks: int,
+    coverage_top_k: int,
+    final_top_k: int,
+    user_tier: str = 'free',
+    query_type: str = 'query',
+    use_modal: bool = False
+) -> CandidateBudget:
+    """
+    Plan how many candidates retrieval should pass to reranking
+
+    Args:
+        total_chunks: Number of chunks in the document
+        coverage_top_k: Percentage-of-document retrieval size (upper bound)
+        final_top_k: Chunks the reranker returns (lower bound for candidates)
+        user_tier: User subscription tier
+        query_type: Type of query (query, quiz, summary, outline, mindmap, analyze)
+        use_modal: True if the Modal GPU reranker is the active backend
+
+    Returns:
+        CandidateBudget (max/min candidates and the binding constraint)
+    """
+    from core.modal_rerank_client import MAX_CHUNKS_PER_REQUEST
+
+    tier_budget = TIER_BUDGETS.get(user_tier, TIER_BUDGETS['free'])
+    factor = QUERY_TYPE_FACTORS.get(query_type, 1.0)
+
+    if use_modal:
+        latency_cap = (tier_budget['latency_ms'] * factor - MODAL_RERANK_OVERHEAD_MS) / MODAL_RERANK_MS_PER_CHUNK
+        backend_cap = MAX_CHUNKS_PER_REQUEST
+    else:
+        latency_cap = tier_budget['latency_ms'] * factor / LOCAL_RERANK_MS_PER_CHUNK
+        backend_cap = LOCAL_RERANK_MAX_CANDIDATES
+
+    limits = {
+        'coverage': coverage_top_k,
+        'tier': int(tier_budget['max_candidates'] * factor),
+        'latency': int(latency_cap),
+        'backend': backend_cap
+    }
+    limited_by = min(limits, key=limits.get)
+    min_candidates = min(final_top_k, total_chunks)
+    if min_candidates > limits[limited_by]:
+        # Never fewer candidates than the reranker has to return
+        limited_by = 'final_top_k'
+    max_candidates = min(max(min(limits.values()), min_candidates), total_chunks)
+
+    logger.info(
+        f"[BUDGET] tier={user_tier} type={query_type} chunks={total_chunks} "
+        f"backend={'modal' if use_modal else 'local'} -> {max_candidates} candidates "
+        f"(min {min_candidates}, limited by {limited_by}: "
+        + ', '.join(f"{name}={value}" for name, value in limits.items()) + ")"
+    )
+
+    return CandidateBudget(max_candidates=max_candidates, min_candidates=min_candidates, limited_by=limited_by)
+
+
+def score_gap_cutoff(scores: List[float], min_keep: int, max_gap: float = CANDIDATE_SCORE_GAP) -> int:
+    """
+    Number of candidates to keep: stop at the first large score drop
+
+    Args:
+        scores: Hybrid scores, best first
+        min_keep: Never keep fewer than this many candidates
+        max_gap: Largest allowed drop between consecutive scores, as a
+                 fraction of the (best - worst) score range
+
+    Returns:
+        Number of leading candidates to keep
+    """
+    if len(scores) <= min_keep:
+        return len(scores)
+
+    score_range = scores[0] - scores[-1]
+    if score_range <= 0:
+        return len(scores)
+
+    for i in range(max(min_keep, 1), len(scores)):
+        if scores[i - 1] - scores[i] > max_gap * score_range:
+            return i
+    return len(scores)
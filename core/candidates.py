@@ -0,0 +1,85 @@
+"""
+Compact Retrieval Candidates
+Chunk row + scores + reference to the shared chunk list (no per-candidate copies)
+
+find_relevant_chunks used to return a dict copy of every candidate chunk, which
+then flowed through Modal reranking, the local diversity reranker and context
+building. CandidateChunk keeps only the row, the score fields and a reference
+to the document's chunk list (shared through the document cache):
+
+- Reads of chunk fields ('text', 'metadata', ...) resolve lazily to the
+  shared chunk, so text is only touched where it is actually needed
+  (Modal request body, context building, source previews)
+- Writes (e.g. 'rerank_score' set by a reranker) go to a small per-candidate
+  overlay: the shared chunk is never mutated
+- Inline 'embedding' lists of legacy chunks are never exposed: rerankers read
+  candidate rows from the document embedding matrix via 'chunk_row'
+
+CandidateChunk is a MutableMapping, so existing dict-style consumers keep
+working; use to_dict() where a real dict is required (JSON serialization).
+"""
+
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List
+
+# Chunk fields never exposed through a candidate (large, available elsewhere)
+HIDDEN_FIELDS = frozenset({'embedding'})
+
+
+class CandidateChunk(MutableMapping):
+    """
+    Read-only view of a shared chunk plus per-candidate score fields
+    """
+
+    __slots__ = ('row', '_chunks', '_fields')
+
+    def __init__(self, chunks: List[Dict[str, Any]], row: int, **fields):
+        """
+        Initialize candidate
+
+        Args:
+            chunks: Document chunk list (shared, never modified)
+            row: Row of the chunk in the document (and in its embedding matrix)
+            **fields: Candidate fields (similarity_score, semantic_score, ...)
+        """
+        self.row = row
+        self._chunks = chunks
+        self._fields = {'chunk_row': row}
+        self._fields.update(fields)
+
+    def _chunk(self) -> Dict[str, Any]:
+        return self._chunks[self.row]
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._fields:
+            return self._fields[key]
+        if key in HIDDEN_FIELDS:
+            raise KeyError(key)
+        return self._chunk()[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._fields[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        # Only candidate fields can be removed, the shared chunk is read-only
+        del self._fields[key]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._fields
+        for key in self._chunk():
+            if key not in self._fields and key not in HIDDEN_FIELDS:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"CandidateChunk(row={self.row}, fields={self._fields})"
+
+    def copy(self) -> 'CandidateChunk':
+        """Independent candidate (own score fields) over the same shared chunk"""
+        return CandidateChunk(self._chunks, self.row, **self._fields)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Materialize as a plain dict (chunk fields + candidate fields, no embedding)"""
+        return dict(self.items())
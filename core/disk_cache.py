@@ -0,0 +1,458 @@
+"""
+Local Disk Cache for R2 Downloads
+Size-bounded on-disk tier in front of core.s3_storage (opt-in)
+
+Every R2 download used to be a full get_object. With R2_DISK_CACHE_DIR set,
+downloads are stored on local disk and revalidated with If-None-Match, so a
+restarted worker (or the Celery worker on the same box) is warm immediately.
+
+Layout (one pair of files per R2 key, name = sha1 of the key):
+    <dir>/<sha1>.bin   - Object body
+    <dir>/<sha1>.meta  - JSON sidecar: key, etag, size, last access, hits, last check
+
+Features:
+- Byte budget with LRU or LFU eviction (R2_DISK_CACHE_POLICY)
+- Atomic writes (temp file + os.replace): readers never see partial files,
+  safe with several processes sharing the directory
+- Conditional GET revalidation, stale copy served if R2 is unreachable
+- Hit/miss/revalidation/eviction counters via get_stats()
+
+PERFORMANCE: Sizes and access statistics are kept in memory with running byte /
+entry totals, so hits, evict() and get_stats() never list the directory. The
+directory is rescanned (other processes share it) only when the totals exceed
+the budget. Access times are persisted to .meta at most every
+R2_DISK_CACHE_TOUCH_SECONDS per object instead of on every hit.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment (disabled unless R2_DISK_CACHE_DIR is set)
+R2_DISK_CACHE_DIR = os.getenv('R2_DISK_CACHE_DIR')
+R2_DISK_CACHE_MAX_MB = int(os.getenv('R2_DISK_CACHE_MAX_MB', '2048'))
+R2_DISK_CACHE_POLICY = os.getenv('R2_DISK_CACHE_POLICY', 'lru').lower()
+R2_DISK_CACHE_REVALIDATE_SECONDS = float(os.getenv('R2_DISK_CACHE_REVALIDATE_SECONDS', '30'))
+# Persist access time / hit count to .meta at most this often per object (hits in between are counted in memory)
+R2_DISK_CACHE_TOUCH_SECONDS = float(os.getenv('R2_DISK_CACHE_TOUCH_SECONDS', '60'))
+
+EVICTION_POLICIES = ('lru', 'lfu')
+
+
+class DiskCache:
+    """
+    Size-bounded local disk cache of R2 objects keyed by R2 key
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int,
+        policy: str = 'lru',
+        revalidate_seconds: float = R2_DISK_CACHE_REVALIDATE_SECONDS,
+        touch_seconds: float = R2_DISK_CACHE_TOUCH_SECONDS
+    ):
+        """
+        Initialize disk cache
+
+        Args:
+            cache_dir: Local directory for cached objects (created if missing)
+            max_bytes: Total byte budget for cached object bodies
+            policy: Eviction policy, 'lru' (least recently used) or 'lfu' (least frequently used)
+            revalidate_seconds: Serve without contacting R2 if checked more recently than this
+            touch_seconds: Minimum interval between .meta writes for accesses to one object
+        """
+        if policy not in EVICTION_POLICIES:
+            logger.warning(f"[DISK-CACHE] Unknown eviction policy '{policy}', using 'lru'")
+            policy = 'lru'
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.revalidate_seconds = revalidate_seconds
+        self.touch_seconds = touch_seconds
+        self._lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # In-memory view of the directory: base path -> key, size, last access, hits
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._total_bytes = 0
+
+        # Counters (per process)
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0  # 304 Not Modified responses
+        self.stale_hits = 0     # Served stale copy because R2 was unreachable
+        self.evictions = 0
+        self.bytes_downloaded = 0
+        self.bytes_served = 0
+
+        self._rescan()
+
+    # ------------------------------------------------------------------
+    # File layout helpers
+    # ------------------------------------------------------------------
+
+    def _base_path(self, file_key: str) -> str:
+        digest = hashlib.sha1(file_key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest)
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        """Write file atomically (temp file in the same dir + os.replace)"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _read_meta(self, meta_path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta_path: str, meta: Dict[str, Any]) -> None:
+        try:
+            self._write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+        except OSError as e:
+            logger.warning(f"[DISK-CACHE] Failed to update metadata {meta_path}: {e}")
+
+    def _track(self, base: str, meta: Dict[str, Any]) -> Dict[str, Any]:
+        """In-memory entry of a cached object (caller holds the lock), added to the totals if new"""
+        entry = self._entries.get(base)
+        if entry is None:
+            entry = {
+                'key': meta.get('key'),
+                'size': meta.get('size', 0),
+                'last_access': meta.get('last_access', 0),
+                'hits': meta.get('hits', 0)
+            }
+            self._entries[base] = entry
+            self._total_bytes += entry['size']
+        return entry
+
+    def _untrack(self, base: str) -> None:
+        """Drop a cached object from the in-memory totals"""
+        with self._lock:
+            entry = self._entries.pop(base, None)
+            if entry is not None:
+                self._total_bytes -= entry['size']
+
+    def _touch(self, base: str, meta: Dict[str, Any], checked: bool = False) -> None:
+        """
+        Record an access (recency + frequency for the eviction policy)
+
+        Counted in memory on every access; written to .meta only after a
+        revalidation or when the persisted access time is older than touch_seconds.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._track(base, meta)
+            entry['last_access'] = now
+            entry['hits'] += 1
+            hits = entry['hits']
+
+        if checked or now - meta.get('last_access', 0) >= self.touch_seconds:
+            meta['last_access'] = now
+            meta['hits'] = max(meta.get('hits', 0) + 1, hits)
+            if checked:
+                meta['checked_at'] = now
+            self._write_meta(base + '.meta', meta)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def fetch(self, file_key: str) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Make sure an R2 object is on local disk (downloading or revalidating if needed)
+
+        Args:
+            file_key: R2 key of the object
+
+        Returns:
+            (local file path, etag) or None if the object is unavailable
+        """
+        from core.s3_storage import get_file_if_modified_uncached
+
+        base = self._base_path(file_key)
+        data_path = base + '.bin'
+        meta_path = base + '.meta'
+
+        meta = self._read_meta(meta_path) if os.path.exists(data_path) else None
+
+        # Fresh enough: skip R2 entirely
+        if meta and time.time() - meta.get('checked_at', 0) < self.revalidate_seconds:
+            self._touch(base, meta)
+            with self._lock:
+                self.hits += 1
+            logger.info(f"[DISK-CACHE HIT] {file_key}")
+            return data_path, meta.get('etag')
+
+        response = get_file_if_modified_uncached(file_key, etag=meta.get('etag') if meta else None)
+
+        if response is None:
+            if meta:
+                # R2 unreachable: stale data is better than no data
+                self._touch(base, meta)
+                with self._lock:
+                    self.stale_hits += 1
+                logger.warning(f"[DISK-CACHE STALE] R2 revalidation failed, serving local copy: {file_key}")
+                return data_path, meta.get('etag')
+            with self._lock:
+                self.misses += 1
+            return None
+
+        if response['not_modified'] and meta:
+            self._touch(base, meta, checked=True)
+            with self._lock:
+                self.hits += 1
+                self.revalidations += 1
+            logger.info(f"[DISK-CACHE HIT] {file_key} (revalidated, 304 Not Modified)")
+            return data_path, meta.get('etag')
+
+        # Miss (or changed on R2): store body first, then its metadata
+        data = response['data']
+        with self._lock:
+            self.misses += 1
+            self.bytes_downloaded += len(data)
+
+        if len(data) > self.max_bytes:
+            logger.warning(f"[DISK-CACHE] Object too large to cache: {file_key} ({len(data) / 1024 / 1024:.1f}MB)")
+            return None
+
+        now = time.time()
+        meta = {
+            'key': file_key,
+            'etag': response.get('etag'),
+            'size': len(data),
+            'created_at': now,
+            'last_access': now,
+            'checked_at': now,
+            'hits': 1
+        }
+        self._untrack(base)
+        try:
+            self._write_atomic(data_path, data)
+            self._write_meta(meta_path, meta)
+        except OSError as e:
+            logger.warning(f"[DISK-CACHE] Failed to write {file_key}: {e}")
+            return None
+
+        with self._lock:
+            self._track(base, meta)
+
+        logger.info(f"[DISK-CACHE MISS] {file_key} ({len(data) / 1024:.0f}KB stored)")
+        self.evict(keep=base)
+        return data_path, response.get('etag')
+
+    def get(self, file_key: str) -> Optional[bytes]:
+        """
+        Get R2 object body through the disk cache
+
+        Args:
+            file_key: R2 key of the object
+
+        Returns:
+            bytes: Object content, or None if unavailable
+        """
+        result = self.get_with_etag(file_key)
+        return result[0] if result else None
+
+    def get_with_etag(self, file_key: str) -> Optional[Tuple[bytes, Optional[str]]]:
+        """
+        Get R2 object body and its ETag through the disk cache
+
+        Args:
+            file_key: R2 key of the object
+
+        Returns:
+            (bytes, etag) or None if unavailable
+        """
+        fetched = self.fetch(file_key)
+        if fetched is None:
+            return None
+
+        data_path, etag = fetched
+        try:
+            with open(data_path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            # Evicted by another process between fetch and read
+            logger.warning(f"[DISK-CACHE] Cached file vanished, downloading directly: {file_key} ({e})")
+            return None
+
+        with self._lock:
+            self.bytes_served += len(data)
+        return data, etag
+
+    def invalidate(self, file_key: str) -> None:
+        """Remove an object from the disk cache (e.g. after delete or overwrite)"""
+        base = self._base_path(file_key)
+        self._untrack(base)
+        for path in (base + '.bin', base + '.meta'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"[DISK-CACHE] Failed to remove {path}: {e}")
+
+    def _scan(self) -> List[Dict[str, Any]]:
+        """List cached objects with their metadata (shared across processes)"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.meta'):
+                continue
+            meta_path = os.path.join(self.cache_dir, name)
+            meta = self._read_meta(meta_path)
+            if not meta:
+                continue
+            meta['_base'] = meta_path[:-len('.meta')]
+            entries.append(meta)
+        return entries
+
+    def _rescan(self) -> None:
+        """Rebuild the in-memory entries and totals from the directory (keeps this process's access counts)"""
+        entries = {}
+        for meta in self._scan():
+            base = meta.pop('_base')
+            entries[base] = {
+                'key': meta.get('key'),
+                'size': meta.get('size', 0),
+                'last_access': meta.get('last_access', 0),
+                'hits': meta.get('hits', 0)
+            }
+
+        with self._lock:
+            for base, entry in entries.items():
+                known = self._entries.get(base)
+                if known is not None and known['size'] == entry['size']:
+                    entry['last_access'] = max(entry['last_access'], known['last_access'])
+                    entry['hits'] = max(entry['hits'], known['hits'])
+            self._entries = entries
+            self._total_bytes = sum(entry['size'] for entry in entries.values())
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        Evict objects until the cache fits its byte budget
+
+        Cheap when under budget (running totals); otherwise the directory is
+        rescanned first, since other processes may have added or evicted objects.
+
+        Args:
+            keep: Base path never evicted (the object just stored: under LFU it
+                  has the fewest hits, and fetch() is about to return its path)
+
+        Returns:
+            Number of objects evicted
+        """
+        with self._lock:
+            if self._total_bytes <= self.max_bytes:
+                return 0
+
+        self._rescan()
+
+        with self._lock:
+            total_bytes = self._total_bytes
+            if total_bytes <= self.max_bytes:
+                return 0
+            candidates = [(base, entry) for base, entry in self._entries.items() if base != keep]
+
+        if self.policy == 'lfu':
+            # Least frequently used first, ties broken by recency
+            candidates.sort(key=lambda item: (item[1]['hits'], item[1]['last_access']))
+        else:
+            candidates.sort(key=lambda item: item[1]['last_access'])
+
+        evicted = 0
+        for base, entry in candidates:
+            if total_bytes <= self.max_bytes:
+                break
+            # Remove body first: a .meta without .bin is ignored by fetch()
+            for suffix in ('.bin', '.meta'):
+                try:
+                    os.remove(base + suffix)
+                except FileNotFoundError:
+                    pass
+            self._untrack(base)
+            total_bytes -= entry['size']
+            evicted += 1
+            logger.info(f"[DISK-CACHE] Evicted {entry['key']} ({entry['size'] / 1024:.0f}KB, {self.policy})")
+
+        with self._lock:
+            self.evictions += evicted
+        return evicted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dict with disk usage (as seen by this process, resynced on eviction)
+            and hit/miss counters (counters are per process)
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'dir': self.cache_dir,
+                'policy': self.policy,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'stale_hits': self.stale_hits,
+                'evictions': self.evictions,
+                'bytes_downloaded': self.bytes_downloaded,
+                'bytes_served': self.bytes_served,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+# Singleton instance
+_disk_cache_instance: Optional[DiskCache] = None
+_disk_cache_initialized = False
+
+
+def get_disk_cache() -> Optional[DiskCache]:
+    """
+    Get singleton disk cache instance
+
+    Returns:
+        DiskCache instance, or None if R2_DISK_CACHE_DIR is not configured
+    """
+    global _disk_cache_instance, _disk_cache_initialized
+
+    if not _disk_cache_initialized:
+        _disk_cache_initialized = True
+        if R2_DISK_CACHE_DIR:
+            try:
+                _disk_cache_instance = DiskCache(
+                    cache_dir=R2_DISK_CACHE_DIR,
+                    max_bytes=R2_DISK_CACHE_MAX_MB * 1024 * 1024,
+                    policy=R2_DISK_CACHE_POLICY
+                )
+                logger.info(
+                    f"[DISK-CACHE] Enabled at {R2_DISK_CACHE_DIR} "
+                    f"(budget: {R2_DISK_CACHE_MAX_MB}MB, policy: {_disk_cache_instance.policy})"
+                )
+            except OSError as e:
+                logger.warning(f"[DISK-CACHE] Cannot use {R2_DISK_CACHE_DIR}: {e}, disk cache disabled")
+                _disk_cache_instance = None
+
+    return _disk_cache_instance
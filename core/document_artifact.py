@@ -0,0 +1,768 @@
+"""
+Document Artifact Format
+Versioned on-disk / R2 layout for processed documents
+
+Layout (all files side by side under users/<user_id>/documents/<document_id>/):
+    metadata.json   - Compact chunk text + chunk metadata (NO inline embeddings)
+    embeddings.npy  - float32 matrix (chunks x dim), L2-normalized rows
+    index.faiss     - Per-document HNSW index (large documents only, optional)
+    keyword_index.npz - Inverted index (postings, tf, doc lengths) for keyword scoring
+    atsw_stats.npz  - ATSW term statistics (sorted vocabulary, IDF, diversity, entropy)
+    structure.json  - Structural index (page / article / heading -> chunk rows)
+    positions.npz   - Positional full-text index (exact occurrences of terms / phrases)
+    manifest.json   - Format version, embedding model id/dim, file list
+
+metadata.json keeps its historical name and structure so every existing consumer
+(query engine, mindmap/outline tools, cleanup scripts) keeps working. It gains an
+'artifact' pointer to the manifest. Legacy metadata.json files with inline
+'embedding' lists per chunk remain readable.
+
+Compared to inline JSON float lists, the binary matrix is ~4-5x smaller and is
+loaded with a single np.load instead of a per-query list-to-array conversion.
+"""
+
+import io
+import os
+import json
+import logging
+import posixpath
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FORMAT_VERSION = 1
+
+METADATA_FILENAME = 'metadata.json'
+EMBEDDINGS_FILENAME = 'embeddings.npy'
+MANIFEST_FILENAME = 'manifest.json'
+ANN_INDEX_FILENAME = 'index.faiss'
+KEYWORD_INDEX_FILENAME = 'keyword_index.npz'
+ATSW_STATS_FILENAME = 'atsw_stats.npz'
+STRUCTURE_FILENAME = 'structure.json'
+POSITIONAL_INDEX_FILENAME = 'positions.npz'
+
+# Use the ANN index instead of brute-force scoring from this document size on
+# (defaults to ANN_HNSW_THRESHOLD: indexes are only built, and worth loading, from there)
+ANN_QUERY_MIN_CHUNKS = int(os.getenv('ANN_QUERY_MIN_CHUNKS', os.getenv('ANN_HNSW_THRESHOLD', '5000')))
+
+
+def get_document_r2_prefix(user_id: str, document_id: str) -> str:
+    """
+    Get R2 prefix (directory) for all artifact files of a document
+
+    Args:
+        user_id: User UUID
+        document_id: Document UUID
+
+    Returns:
+        str: R2 prefix, e.g., 'users/abc-123/documents/xyz-789'
+    """
+    return f"users/{user_id}/documents/{document_id}"
+
+
+def normalize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Convert embeddings to contiguous float32 with L2-normalized rows
+
+    With normalized rows, cosine similarity is a single matrix-vector product.
+    """
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def embeddings_to_bytes(embeddings: np.ndarray) -> bytes:
+    """Serialize embedding matrix to .npy bytes (float32)"""
+    buffer = io.BytesIO()
+    np.save(buffer, np.ascontiguousarray(embeddings, dtype=np.float32), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def embeddings_from_bytes(data: bytes) -> np.ndarray:
+    """Deserialize .npy bytes to embedding matrix"""
+    return np.load(io.BytesIO(data), allow_pickle=False)
+
+
+def strip_inline_embeddings(metadata: Dict[str, Any]) -> Optional[np.ndarray]:
+    """
+    Remove inline 'embedding' lists from chunks (modifies metadata in-place)
+
+    Args:
+        metadata: Metadata dict with 'chunks'
+
+    Returns:
+        float32 matrix of the removed embeddings, or None if not all chunks had one
+    """
+    chunks = metadata.get('chunks', [])
+    has_inline = bool(chunks) and all('embedding' in chunk for chunk in chunks)
+
+    embeddings = None
+    if has_inline:
+        embeddings = np.asarray([chunk['embedding'] for chunk in chunks], dtype=np.float32)
+
+    for chunk in chunks:
+        chunk.pop('embedding', None)
+
+    return embeddings
+
+
+def build_manifest(
+    metadata: Dict[str, Any],
+    embeddings: Optional[np.ndarray],
+    embedding_model: Optional[str],
+    ann_info: Optional[Dict[str, Any]] = None,
+    has_keyword_index: bool = False,
+    has_atsw_stats: bool = False,
+    has_structure: bool = False,
+    has_positional_index: bool = False
+) -> Dict[str, Any]:
+    """
+    Build artifact manifest
+
+    Args:
+        metadata: Metadata dict (without inline embeddings)
+        embeddings: Embedding matrix or None
+        embedding_model: Model used to compute embeddings
+        ann_info: ANN index description (type, parameters) or None
+        has_keyword_index: True if keyword_index.npz was uploaded
+        has_atsw_stats: True if atsw_stats.npz was uploaded
+        has_structure: True if structure.json was uploaded
+        has_positional_index: True if positions.npz was uploaded
+
+    Returns:
+        Manifest dict
+    """
+    files = {'chunks': METADATA_FILENAME}
+    embedding_info = None
+
+    if ann_info:
+        files['ann_index'] = ANN_INDEX_FILENAME
+
+    if has_keyword_index:
+        files['keyword_index'] = KEYWORD_INDEX_FILENAME
+
+    if has_atsw_stats:
+        files['atsw_stats'] = ATSW_STATS_FILENAME
+
+    if has_structure:
+        files['structure'] = STRUCTURE_FILENAME
+
+    if has_positional_index:
+        files['positional_index'] = POSITIONAL_INDEX_FILENAME
+
+    if embeddings is not None:
+        from core.embedding_models import canonical_model_id
+
+        files['embeddings'] = EMBEDDINGS_FILENAME
+        embedding_info = {
+            'model': canonical_model_id(embedding_model),
+            'dim': int(embeddings.shape[1]),
+            'dtype': 'float32',
+            'normalized': True
+        }
+
+    return {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'created_at': datetime.utcnow().isoformat(),
+        'chunks_count': len(metadata.get('chunks', [])),
+        'files': files,
+        'embedding': embedding_info,
+        'ann_index': ann_info
+    }
+
+
+def upload_document_artifact(
+    metadata: Dict[str, Any],
+    embeddings: Optional[np.ndarray],
+    r2_prefix: str,
+    embedding_model: Optional[str] = None,
+    build_ann: bool = True
+) -> Optional[Dict[str, Any]]:
+    """
+    Upload document artifact (embeddings.npy + index.faiss + keyword_index.npz +
+    atsw_stats.npz + structure.json + positions.npz + manifest.json + metadata.json) to R2
+
+    metadata.json is uploaded LAST so readers never see an artifact pointer
+    before the files it points to exist.
+
+    Args:
+        metadata: Metadata dict (inline embeddings are stripped in-place)
+        embeddings: Embedding matrix (chunks x dim) or None
+        r2_prefix: R2 prefix, see get_document_r2_prefix()
+        embedding_model: Model used to compute embeddings
+        build_ann: Build and upload the per-document ANN index (requires FAISS)
+
+    Returns:
+        dict with 'metadata_r2_key', 'embeddings_r2_key', 'faiss_r2_key', 'manifest_r2_key'
+        and 'artifact_r2_keys' (all uploaded keys), or None if metadata upload failed
+    """
+    from core.s3_storage import upload_file
+
+    # Legacy callers may still pass metadata with inline embeddings
+    inline_embeddings = strip_inline_embeddings(metadata)
+    if embeddings is None:
+        embeddings = inline_embeddings
+
+    metadata_r2_key = f"{r2_prefix}/{METADATA_FILENAME}"
+    embeddings_r2_key = None
+    faiss_r2_key = None
+    keyword_index_r2_key = None
+    atsw_stats_r2_key = None
+    structure_r2_key = None
+    positional_index_r2_key = None
+    manifest_r2_key = None
+    ann_info = None
+
+    if embeddings is not None and len(embeddings) != len(metadata.get('chunks', [])):
+        logger.warning(
+            f"[ARTIFACT] Embedding count mismatch ({len(embeddings)} vs "
+            f"{len(metadata.get('chunks', []))} chunks), uploading without embeddings"
+        )
+        embeddings = None
+
+    if embeddings is not None:
+        embeddings = normalize_embeddings(embeddings)
+        embeddings_bytes = embeddings_to_bytes(embeddings)
+
+        if upload_file(embeddings_bytes, f"{r2_prefix}/{EMBEDDINGS_FILENAME}", 'application/octet-stream'):
+            embeddings_r2_key = f"{r2_prefix}/{EMBEDDINGS_FILENAME}"
+            logger.info(f"[ARTIFACT] Uploaded embeddings {embeddings.shape} ({len(embeddings_bytes) / 1024:.0f}KB)")
+        else:
+            logger.warning("[ARTIFACT] Failed to upload embeddings, continuing without them")
+            embeddings = None
+
+    if embeddings is not None and build_ann:
+        from core.embedding_generator import build_ann_index, ann_index_to_bytes
+
+        ann_index, ann_info = build_ann_index(embeddings)
+        if ann_index is not None:
+            ann_bytes = ann_index_to_bytes(ann_index)
+            if upload_file(ann_bytes, f"{r2_prefix}/{ANN_INDEX_FILENAME}", 'application/octet-stream'):
+                faiss_r2_key = f"{r2_prefix}/{ANN_INDEX_FILENAME}"
+                logger.info(f"[ARTIFACT] Uploaded {ann_info['type']} ANN index ({len(ann_bytes) / 1024:.0f}KB)")
+            else:
+                logger.warning("[ARTIFACT] Failed to upload ANN index, queries will use brute-force scoring")
+                ann_info = None
+
+    # Keyword inverted index (independent of embeddings)
+    try:
+        from core.keyword_index import build_keyword_index
+
+        keyword_index_bytes = build_keyword_index(metadata.get('chunks', [])).to_bytes()
+        if upload_file(keyword_index_bytes, f"{r2_prefix}/{KEYWORD_INDEX_FILENAME}", 'application/octet-stream'):
+            keyword_index_r2_key = f"{r2_prefix}/{KEYWORD_INDEX_FILENAME}"
+            logger.info(f"[ARTIFACT] Uploaded keyword index ({len(keyword_index_bytes) / 1024:.0f}KB)")
+        else:
+            logger.warning("[ARTIFACT] Failed to upload keyword index, it will be built at query time")
+    except Exception as e:
+        logger.warning(f"[ARTIFACT] Failed to build keyword index: {e}")
+
+    # ATSW term statistics (computed once here instead of on the first query)
+    try:
+        from core.term_specificity_analyzer import create_term_analyzer_from_chunks
+
+        term_analyzer = create_term_analyzer_from_chunks(metadata.get('chunks', []), min_term_length=2)
+        if term_analyzer is not None:
+            atsw_stats_bytes = term_analyzer.to_bytes()
+            if upload_file(atsw_stats_bytes, f"{r2_prefix}/{ATSW_STATS_FILENAME}", 'application/octet-stream'):
+                atsw_stats_r2_key = f"{r2_prefix}/{ATSW_STATS_FILENAME}"
+                logger.info(f"[ARTIFACT] Uploaded ATSW statistics ({len(atsw_stats_bytes) / 1024:.0f}KB)")
+            else:
+                logger.warning("[ARTIFACT] Failed to upload ATSW statistics, they will be computed at query time")
+    except Exception as e:
+        logger.warning(f"[ARTIFACT] Failed to build ATSW statistics: {e}")
+
+    # Structural index (page / article / heading lookups)
+    try:
+        from core.structural_index import build_structural_index
+
+        structure_bytes = build_structural_index(metadata.get('chunks', [])).to_bytes()
+        if upload_file(structure_bytes, f"{r2_prefix}/{STRUCTURE_FILENAME}", 'application/json'):
+            structure_r2_key = f"{r2_prefix}/{STRUCTURE_FILENAME}"
+            logger.info(f"[ARTIFACT] Uploaded structural index ({len(structure_bytes) / 1024:.0f}KB)")
+        else:
+            logger.warning("[ARTIFACT] Failed to upload structural index, it will be built at query time")
+    except Exception as e:
+        logger.warning(f"[ARTIFACT] Failed to build structural index: {e}")
+
+    # Positional full-text index ("find all occurrences" queries)
+    try:
+        from core.positional_index import build_positional_index
+
+        positional_index_bytes = build_positional_index(metadata.get('chunks', [])).to_bytes()
+        if upload_file(positional_index_bytes, f"{r2_prefix}/{POSITIONAL_INDEX_FILENAME}", 'application/octet-stream'):
+            positional_index_r2_key = f"{r2_prefix}/{POSITIONAL_INDEX_FILENAME}"
+            logger.info(f"[ARTIFACT] Uploaded positional index ({len(positional_index_bytes) / 1024:.0f}KB)")
+        else:
+            logger.warning("[ARTIFACT] Failed to upload positional index, it will be built at query time")
+    except Exception as e:
+        logger.warning(f"[ARTIFACT] Failed to build positional index: {e}")
+
+    manifest = build_manifest(
+        metadata, embeddings, embedding_model, ann_info,
+        has_keyword_index=keyword_index_r2_key is not None,
+        has_atsw_stats=atsw_stats_r2_key is not None,
+        has_structure=structure_r2_key is not None,
+        has_positional_index=positional_index_r2_key is not None
+    )
+    manifest_bytes = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+
+    if upload_file(manifest_bytes, f"{r2_prefix}/{MANIFEST_FILENAME}", 'application/json'):
+        manifest_r2_key = f"{r2_prefix}/{MANIFEST_FILENAME}"
+        metadata['artifact'] = {
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'manifest': MANIFEST_FILENAME
+        }
+    else:
+        logger.warning("[ARTIFACT] Failed to upload manifest, metadata will be read as legacy format")
+
+    # Compact JSON (no indentation): this file is downloaded on every cold query
+    metadata_bytes = json.dumps(metadata, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    if not upload_file(metadata_bytes, metadata_r2_key, 'application/json'):
+        logger.error(f"[ARTIFACT] Failed to upload metadata: {metadata_r2_key}")
+        return None
+
+    logger.info(f"[ARTIFACT] Uploaded v{ARTIFACT_FORMAT_VERSION} artifact to {r2_prefix} (metadata: {len(metadata_bytes) / 1024:.0f}KB)")
+
+    return {
+        'metadata_r2_key': metadata_r2_key,
+        'embeddings_r2_key': embeddings_r2_key,
+        'faiss_r2_key': faiss_r2_key,
+        'manifest_r2_key': manifest_r2_key,
+        'artifact_r2_keys': [
+            key for key in (
+                embeddings_r2_key, faiss_r2_key, keyword_index_r2_key, atsw_stats_r2_key,
+                structure_r2_key, positional_index_r2_key, manifest_r2_key
+            ) if key
+        ]
+    }
+
+
+class DocumentArtifact:
+    """
+    Loaded document: chunk metadata + embedding matrix + manifest
+
+    Attributes:
+        metadata: Parsed metadata.json (shared through the document cache - read-only)
+        chunks: metadata['chunks']
+        embeddings: float32 matrix (chunks x dim) or None if not precomputed
+        embeddings_normalized: True if embedding rows are L2-normalized
+        manifest: Parsed manifest.json or None (legacy format)
+        source_key: R2 key or local path of metadata.json
+        is_r2_key: True if source_key is an R2 key
+        version: Version identifier (ETag / mtime) used to key derived caches
+    """
+
+    def __init__(
+        self,
+        metadata: Dict[str, Any],
+        embeddings: Optional[np.ndarray] = None,
+        embeddings_normalized: bool = False,
+        manifest: Optional[Dict[str, Any]] = None,
+        source_key: Optional[str] = None,
+        version: Optional[str] = None,
+        is_r2_key: bool = False
+    ):
+        self.metadata = metadata
+        self.chunks: List[Dict[str, Any]] = metadata.get('chunks', [])
+        self.embeddings = embeddings
+        self.embeddings_normalized = embeddings_normalized
+        self.manifest = manifest
+        self.source_key = source_key
+        self.is_r2_key = is_r2_key
+        self.version = version
+
+    @property
+    def format_version(self) -> int:
+        """Artifact format version (0 = legacy metadata.json)"""
+        if self.manifest:
+            return self.manifest.get('format_version', 0)
+        return 0
+
+    @property
+    def cache_key(self) -> Optional[str]:
+        """
+        Stable key for per-document derived caches (source + version)
+
+        None when the version is unknown: derived caches must then be skipped,
+        otherwise they would outlive a re-upload of the document.
+        """
+        if self.version is None:
+            return None
+        return f"{self.source_key}@{self.version}"
+
+    @property
+    def embedding_model(self):
+        """EmbeddingModelInfo of the chunk embeddings (None if the document has none)"""
+        from core.embedding_models import resolve_embedding_model
+
+        if self.embeddings is None:
+            return None
+
+        dim = int(self.embeddings.shape[1])
+        recorded = ((self.manifest or {}).get('embedding') or {}).get('model')
+        if recorded:
+            return resolve_embedding_model(recorded, dim, 'manifest')
+        return resolve_embedding_model(self.metadata.get('embedding_model'), dim, 'metadata')
+
+
+def resolve_artifact_path(metadata_source: str, filename: str, is_r2_key: bool) -> str:
+    """
+    Resolve an artifact file relative to metadata.json (R2 key or local path)
+
+    Args:
+        metadata_source: R2 key or local path of metadata.json
+        filename: Artifact file name from the manifest
+        is_r2_key: True if metadata_source is an R2 key
+
+    Returns:
+        R2 key or local path of the artifact file
+    """
+    if is_r2_key:
+        return posixpath.join(posixpath.dirname(metadata_source), filename)
+    return os.path.join(os.path.dirname(metadata_source), filename)
+
+
+def load_document_artifact(
+    metadata: Dict[str, Any],
+    metadata_source: str,
+    is_r2_key: bool,
+    document_cache,
+    version: Optional[str] = None
+) -> DocumentArtifact:
+    """
+    Build DocumentArtifact from loaded metadata, reading the binary files if present
+
+    Args:
+        metadata: Parsed metadata.json (from the document cache)
+        metadata_source: R2 key or local path of metadata.json
+        is_r2_key: True if metadata_source is an R2 key
+        document_cache: DocumentCache used for manifest and embeddings
+        version: Version of metadata.json returned by the same load
+                 (None = unknown, per-version caches are skipped)
+
+    Returns:
+        DocumentArtifact (embeddings None if unavailable)
+    """
+    artifact_info = metadata.get('artifact')
+
+    # NEW FORMAT: manifest + binary embedding matrix
+    if artifact_info:
+        manifest_path = resolve_artifact_path(metadata_source, artifact_info.get('manifest', MANIFEST_FILENAME), is_r2_key)
+        try:
+            if is_r2_key:
+                manifest = document_cache.load_r2_json(manifest_path)
+            else:
+                manifest = document_cache.load_local_json(manifest_path)
+        except Exception as e:
+            logger.warning(f"[ARTIFACT] Failed to load manifest {manifest_path}: {e}")
+            manifest = None
+
+        if manifest and manifest.get('format_version', 0) > ARTIFACT_FORMAT_VERSION:
+            logger.warning(
+                f"[ARTIFACT] Manifest format v{manifest.get('format_version')} is newer than "
+                f"supported v{ARTIFACT_FORMAT_VERSION}, reading known fields only"
+            )
+
+        embeddings = None
+        embedding_info = (manifest or {}).get('embedding') or {}
+        embeddings_file = (manifest or {}).get('files', {}).get('embeddings')
+
+        if embeddings_file:
+            embeddings_path = resolve_artifact_path(metadata_source, embeddings_file, is_r2_key)
+            try:
+                if is_r2_key:
+                    embeddings = document_cache.load_r2_array(embeddings_path)
+                else:
+                    embeddings = document_cache.load_local_array(embeddings_path)
+            except Exception as e:
+                logger.warning(f"[ARTIFACT] Failed to load embeddings {embeddings_path}: {e}")
+                embeddings = None
+
+            if embeddings is not None and len(embeddings) != len(metadata.get('chunks', [])):
+                logger.warning(f"[ARTIFACT] Embeddings/chunks mismatch for {metadata_source}, ignoring embeddings")
+                embeddings = None
+
+        return DocumentArtifact(
+            metadata=metadata,
+            embeddings=embeddings,
+            embeddings_normalized=bool(embedding_info.get('normalized')),
+            manifest=manifest,
+            source_key=metadata_source,
+            version=version,
+            is_r2_key=is_r2_key
+        )
+
+    # LEGACY FORMAT: inline 'embedding' lists (converted once, then cached)
+    chunks = metadata.get('chunks', [])
+    embeddings = None
+    document = DocumentArtifact(
+        metadata=metadata,
+        embeddings_normalized=False,
+        manifest=None,
+        source_key=metadata_source,
+        version=version,
+        is_r2_key=is_r2_key
+    )
+    if chunks and all('embedding' in chunk for chunk in chunks):
+        document.embeddings = _build_per_version(
+            document,
+            document_cache,
+            'inline-embeddings',
+            builder=lambda: np.asarray([chunk['embedding'] for chunk in chunks], dtype=np.float32),
+            size_fn=lambda matrix: int(matrix.nbytes)
+        )
+    return document
+
+
+def _build_per_version(document: DocumentArtifact, document_cache, suffix: str, builder, size_fn):
+    """
+    Build a derived structure once per document version (through the document cache)
+
+    Without a known version the structure is built for this request only.
+
+    Args:
+        document: Loaded DocumentArtifact
+        document_cache: DocumentCache used to keep the structure
+        suffix: Name of the derived structure in the cache key
+        builder: Callable building the structure
+        size_fn: Callable (structure) -> approximate in-memory size
+
+    Returns:
+        Built (or cached) structure
+    """
+    if document.cache_key is None:
+        return builder()
+    return document_cache.get_or_build(f"{document.cache_key}#{suffix}", builder=builder, size_fn=size_fn)
+
+
+def load_ann_index(document: DocumentArtifact, document_cache, faiss_r2_key: Optional[str] = None):
+    """
+    Load the per-document ANN index for large documents (through the document cache)
+
+    The index is only worth using from ANN_QUERY_MIN_CHUNKS chunks on; below that
+    brute-force scoring over the memory-mapped matrix is just as fast. Flat indexes
+    uploaded by earlier versions are never loaded: their search is exhaustive and
+    they would duplicate the embeddings in memory.
+
+    Args:
+        document: Loaded DocumentArtifact (must have normalized embeddings)
+        document_cache: DocumentCache used to load and keep the index
+        faiss_r2_key: Explicit R2 key of the index (doc_metadata['faiss_r2_key']),
+                      otherwise resolved from the manifest
+
+    Returns:
+        FAISS index or None if unavailable / not needed
+    """
+    if document.embeddings is None or not document.embeddings_normalized:
+        return None
+    if len(document.chunks) < ANN_QUERY_MIN_CHUNKS:
+        return None
+    if ((document.manifest or {}).get('ann_index') or {}).get('type') == 'flat':
+        return None
+
+    index_file = ((document.manifest or {}).get('files') or {}).get('ann_index')
+
+    try:
+        if document.is_r2_key:
+            index_key = faiss_r2_key or (
+                resolve_artifact_path(document.source_key, index_file, True) if index_file else None
+            )
+            if not index_key:
+                return None
+            ann_index = document_cache.load_r2_faiss_index(index_key)
+        else:
+            if not index_file:
+                return None
+            ann_index = document_cache.load_local_faiss_index(
+                resolve_artifact_path(document.source_key, index_file, False)
+            )
+    except Exception as e:
+        logger.warning(f"[ARTIFACT] Failed to load ANN index for {document.source_key}: {e}")
+        return None
+
+    if ann_index is not None and ann_index.ntotal != len(document.chunks):
+        logger.warning(f"[ARTIFACT] ANN index/chunks mismatch for {document.source_key}, ignoring index")
+        return None
+
+    return ann_index
+
+
+def load_keyword_index(document: DocumentArtifact, document_cache):
+    """
+    Load the keyword inverted index of a document (through the document cache)
+
+    Documents processed before the index existed get it built from their chunks
+    on first use; the result is cached per document version.
+
+    Args:
+        document: Loaded DocumentArtifact
+        document_cache: DocumentCache used to load and keep the index
+
+    Returns:
+        KeywordIndex or None if unavailable
+    """
+    from core.keyword_index import build_keyword_index
+
+    index_file = ((document.manifest or {}).get('files') or {}).get('keyword_index')
+
+    if index_file:
+        index_path = resolve_artifact_path(document.source_key, index_file, document.is_r2_key)
+        try:
+            if document.is_r2_key:
+                keyword_index = document_cache.load_r2_keyword_index(index_path)
+            else:
+                keyword_index = document_cache.load_local_keyword_index(index_path)
+        except Exception as e:
+            logger.warning(f"[ARTIFACT] Failed to load keyword index {index_path}: {e}")
+            keyword_index = None
+
+        if keyword_index is not None and keyword_index.num_chunks == len(document.chunks):
+            return keyword_index
+        logger.warning(f"[ARTIFACT] Keyword index unavailable for {document.source_key}, building from chunks")
+
+    # LEGACY FORMAT (or missing file): build once per document version
+    try:
+        return _build_per_version(
+            document,
+            document_cache,
+            'keyword-index',
+            builder=lambda: build_keyword_index(document.chunks),
+            size_fn=lambda keyword_index: keyword_index.nbytes
+        )
+    except Exception as e:
+        logger.warning(f"[ARTIFACT] Failed to build keyword index for {document.source_key}: {e}")
+        return None
+
+
+def load_term_analyzer(document: DocumentArtifact, document_cache):
+    """
+    Load the precomputed ATSW term statistics of a document (through the document cache)
+
+    Args:
+        document: Loaded DocumentArtifact
+        document_cache: DocumentCache used to load and keep the statistics
+
+    Returns:
+        UniversalTermSpecificityAnalyzer, or None if the artifact has no statistics
+        (legacy documents, fewer than 10 chunks): the query engine then builds
+        the analyzer from the chunks on first use
+    """
+    stats_file = ((document.manifest or {}).get('files') or {}).get('atsw_stats')
+    if not stats_file:
+        return None
+
+    stats_path = resolve_artifact_path(document.source_key, stats_file, document.is_r2_key)
+    try:
+        if document.is_r2_key:
+            term_analyzer = document_cache.load_r2_term_analyzer(stats_path)
+        else:
+            term_analyzer = document_cache.load_local_term_analyzer(stats_path)
+    except Exception as e:
+        logger.warning(f"[ARTIFACT] Failed to load ATSW statistics {stats_path}: {e}")
+        return None
+
+    if term_analyzer is not None and term_analyzer.total_chunks != len(document.chunks):
+        logger.warning(f"[ARTIFACT] ATSW statistics/chunks mismatch for {document.source_key}, ignoring them")
+        return None
+
+    return term_analyzer
+
+
+def load_structural_index(document: DocumentArtifact, document_cache):
+    """
+    Load the structural index of a document (through the document cache)
+
+    Documents processed before the index existed get it built from their chunks
+    on first use; the result is cached per document version.
+
+    Args:
+        document: Loaded DocumentArtifact
+        document_cache: DocumentCache used to load and keep the index
+
+    Returns:
+        StructuralIndex or None if unavailable
+    """
+    from core.structural_index import build_structural_index
+
+    structure_file = ((document.manifest or {}).get('files') or {}).get('structure')
+
+    if structure_file:
+        structure_path = resolve_artifact_path(document.source_key, structure_file, document.is_r2_key)
+        try:
+            if document.is_r2_key:
+                structure = document_cache.load_r2_structural_index(structure_path)
+            else:
+                structure = document_cache.load_local_structural_index(structure_path)
+        except Exception as e:
+            logger.warning(f"[ARTIFACT] Failed to load structural index {structure_path}: {e}")
+            structure = None
+
+        if structure is not None and structure.num_chunks == len(document.chunks):
+            return structure
+        logger.warning(f"[ARTIFACT] Structural index unavailable for {document.source_key}, building from chunks")
+
+    # LEGACY FORMAT (or missing file): build once per document version
+    try:
+        return _build_per_version(
+            document,
+            document_cache,
+            'structure',
+            builder=lambda: build_structural_index(document.chunks),
+            size_fn=lambda structure: structure.nbytes
+        )
+    except Exception as e:
+        logger.warning(f"[ARTIFACT] Failed to build structural index for {document.source_key}: {e}")
+        return None
+
+
+def load_positional_index(document: DocumentArtifact, document_cache):
+    """
+    Load the positional full-text index of a document (through the document cache)
+
+    Documents processed before the index existed get it built from their chunks
+    on first use; the result is cached per document version.
+
+    Args:
+        document: Loaded DocumentArtifact
+        document_cache: DocumentCache used to load and keep the index
+
+    Returns:
+        PositionalIndex or None if unavailable
+    """
+    from core.positional_index import build_positional_index
+
+    index_file = ((document.manifest or {}).get('files') or {}).get('positional_index')
+
+    if index_file:
+        index_path = resolve_artifact_path(document.source_key, index_file, document.is_r2_key)
+        try:
+            if document.is_r2_key:
+                positional_index = document_cache.load_r2_positional_index(index_path)
+            else:
+                positional_index = document_cache.load_local_positional_index(index_path)
+        except Exception as e:
+            logger.warning(f"[ARTIFACT] Failed to load positional index {index_path}: {e}")
+            positional_index = None
+
+        if positional_index is not None and positional_index.num_chunks == len(document.chunks):
+            return positional_index
+        logger.warning(f"[ARTIFACT] Positional index unavailable for {document.source_key}, building from chunks")
+
+    # LEGACY FORMAT (or missing file): build once per document version
+    try:
+        return _build_per_version(
+            document,
+            document_cache,
+            'positions',
+            builder=lambda: build_positional_index(document.chunks),
+            size_fn=lambda positional_index: positional_index.nbytes
+        )
+    except Exception as e:
+        logger.warning(f"[ARTIFACT] Failed to build positional index for {document.source_key}: {e}")
+        return None
@@ -0,0 +1,874 @@
+"""
+Process-local Document Cache
+Keeps parsed document metadata in memory between queries (per gunicorn worker)
+
+Every chat turn used to download metadata.json from R2 and re-run json.loads
+over it. For large documents with inline embeddings that is tens of MB per
+request. This cache keeps the parsed dict in memory, bounded by a byte budget,
+and revalidates it against R2 with ETag / Last-Modified conditional requests.
+
+Embedding matrices are stored on local disk through a DiskCache (the R2 disk
+cache when R2_DISK_CACHE_DIR is set, otherwise one in DOCUMENT_MMAP_DIR with its
+own byte budget) and opened with np.load(mmap_mode='r'): both gunicorn workers
+map the same file, so the matrix lives once in the OS page cache instead of
+once per worker heap, and once on disk.
+
+IMPORTANT: Cached values are shared between requests - treat them as read-only
+(copy a chunk dict before adding scores to it).
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment
+DOCUMENT_CACHE_MAX_MB = int(os.getenv('DOCUMENT_CACHE_MAX_MB', '256'))
+DOCUMENT_CACHE_REVALIDATE_SECONDS = float(os.getenv('DOCUMENT_CACHE_REVALIDATE_SECONDS', '30'))
+
+DOCUMENT_MMAP_DIR = os.getenv(
+    'DOCUMENT_MMAP_DIR',
+    os.path.join(tempfile.gettempdir(), 'socrate-artifacts')
+)
+# Disk budget of DOCUMENT_MMAP_DIR (unused when R2_DISK_CACHE_DIR is set: arrays are mapped from there)
+DOCUMENT_MMAP_MAX_MB = int(os.getenv('DOCUMENT_MMAP_MAX_MB', '1024'))
+
+# Parsed JSON takes ~3x its serialized size in Python objects (dicts, str, float)
+PARSED_JSON_OVERHEAD = 3
+
+# Memory-mapped arrays live in the shared page cache, not in the worker heap.
+# They are accounted with a nominal size so the LRU still bounds open mappings.
+MMAP_ENTRY_BYTES = 64 * 1024
+
+
+class _CacheEntry:
+    """Single cache entry with validators for conditional requests"""
+
+    __slots__ = ('value', 'nbytes', 'etag', 'last_modified', 'checked_at')
+
+    def __init__(self, value: Any, nbytes: int, etag: Optional[str] = None, last_modified=None):
+        self.value = value
+        self.nbytes = nbytes
+        self.etag = etag
+        self.last_modified = last_modified
+        self.checked_at = time.time()
+
+    @property
+    def version(self) -> Optional[str]:
+        """Version identifier (ETag, else Last-Modified)"""
+        return self.etag or (str(self.last_modified) if self.last_modified else None)
+
+
+class SizedLRUCache:
+    """
+    Thread-safe LRU cache bounded by total size in bytes (not entry count)
+
+    Features:
+    - Least-recently-used eviction when the byte budget is exceeded
+    - Hit/miss/eviction counters exposed via get_stats()
+    - Entries larger than the whole budget are never stored
+    - Single-flight builds: concurrent misses on one key wait for the first build
+    """
+
+    def __init__(self, max_bytes: int, name: str = 'cache'):
+        """
+        Initialize cache
+
+        Args:
+            max_bytes: Total byte budget for all entries
+            name: Name used in log messages and stats
+        """
+        self.max_bytes = max_bytes
+        self.name = name
+        self._entries: 'OrderedDict[str, _CacheEntry]' = OrderedDict()
+        self._lock = threading.RLock()
+        self._inflight: Dict[str, Future] = {}
+        self.current_bytes = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0  # Misses served by another request's build
+
+    def _get_entry(self, key: str) -> Optional[_CacheEntry]:
+        """Get entry and mark it as most recently used (no counters)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Get cached value
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Cached value or None if cache miss
+        """
+        entry = self._get_entry(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry.value
+
+    def get_or_build(self, key: str, builder: Callable[[], Any], size_fn: Callable[[Any], int]) -> Any:
+        """
+        Get cached value, building and storing it on a miss
+
+        Args:
+            key: Cache key
+            builder: Zero-argument callable producing the value
+            size_fn: Callable returning the approximate size in bytes of the value
+
+        Returns:
+            Cached or freshly built value (None values are not cached)
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        def build():
+            entry = self._get_entry(key)  # Stored by a build that finished meanwhile
+            if entry is not None:
+                return entry.value
+            built = builder()
+            if built is not None:
+                self.put(key, built, size_fn(built))
+            return built
+
+        return self._single_flight(key, build)
+
+    def _single_flight(self, key: str, load: Callable[[], Any]) -> Any:
+        """
+        Run load() once per key at a time: concurrent callers wait for its result
+
+        PERFORMANCE: Without this, every request arriving for a cold document parses
+        or builds the same value before one put wins (peak memory x concurrency).
+        The result is shared even when it is too large to be cached.
+
+        Args:
+            key: Cache key
+            load: Zero-argument callable producing (and normally storing) the value
+
+        Returns:
+            Value produced by load() in this or a concurrent call
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            logger.info(f"[{self.name.upper()}] Waiting for concurrent build of {key}")
+            return future.result()
+
+        try:
+            value = load()
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def put(self, key: str, value: Any, nbytes: int, etag: Optional[str] = None, last_modified=None) -> bool:
+        """
+        Store value in cache, evicting least-recently-used entries if needed
+
+        Args:
+            key: Cache key
+            value: Value to store
+            nbytes: Approximate size of the value in bytes
+            etag: Optional ETag validator
+            last_modified: Optional Last-Modified validator
+
+        Returns:
+            True if stored, False if the value is larger than the whole budget
+        """
+        if nbytes > self.max_bytes:
+            logger.warning(
+                f"[{self.name.upper()}] Entry too large to cache: {key} "
+                f"({nbytes / 1024 / 1024:.1f}MB > {self.max_bytes / 1024 / 1024:.1f}MB budget)"
+            )
+            self.pop(key)
+            return False
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+
+            self._entries[key] = _CacheEntry(value, nbytes, etag=etag, last_modified=last_modified)
+            self.current_bytes += nbytes
+
+            # Evict least recently used entries until we fit the budget
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+                self.evictions += 1
+                logger.info(f"[{self.name.upper()}] Evicted {evicted_key} ({evicted.nbytes / 1024:.0f}KB)")
+
+        return True
+
+    def pop(self, key: str) -> Optional[Any]:
+        """Remove entry from cache (returns removed value or None)"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self.current_bytes -= entry.nbytes
+            return entry.value
+
+    def clear(self) -> int:
+        """Clear all entries (returns number of entries removed)"""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self.current_bytes = 0
+            return count
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Dict with entries, memory usage and hit/miss counters
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'coalesced': self.coalesced,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+class DocumentCache(SizedLRUCache):
+    """
+    Cache of parsed document metadata keyed by R2 key (or local path)
+
+    Revalidation strategy:
+    - Within DOCUMENT_CACHE_REVALIDATE_SECONDS of the last check: served from memory
+      (no R2 request at all - follow-up questions in the same chat)
+    - After that: conditional GET (If-None-Match / If-Modified-Since), a 304 costs
+      one round trip and no body download or JSON decoding
+    - If R2 is unreachable during revalidation, the stale copy is served
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        revalidate_seconds: float = DOCUMENT_CACHE_REVALIDATE_SECONDS,
+        mmap_dir: Optional[str] = DOCUMENT_MMAP_DIR
+    ):
+        super().__init__(max_bytes=max_bytes, name='doc-cache')
+        self.revalidate_seconds = revalidate_seconds
+        self.revalidations = 0  # 304 Not Modified responses
+        self.stale_hits = 0     # Served stale copy because R2 was unreachable
+
+        # Local disk store of memory-mapped arrays (None = load arrays in memory)
+        self.mmap_store = self._open_mmap_store(mmap_dir)
+        self.mmap_dir = self.mmap_store.cache_dir if self.mmap_store else None
+
+    @staticmethod
+    def _open_mmap_store(mmap_dir: Optional[str]):
+        """
+        DiskCache holding the files behind memory-mapped arrays
+
+        The R2 disk cache when configured (one copy on disk, one budget),
+        otherwise a dedicated DiskCache in mmap_dir.
+
+        Args:
+            mmap_dir: Directory for a dedicated store (None = no memory mapping)
+
+        Returns:
+            DiskCache or None
+        """
+        from core.disk_cache import DiskCache, get_disk_cache, R2_DISK_CACHE_POLICY
+
+        if not mmap_dir:
+            return None
+
+        disk_cache = get_disk_cache()
+        if disk_cache is not None:
+            return disk_cache
+
+        try:
+            os.makedirs(mmap_dir, exist_ok=True)
+            # Files of the former layout (<sha1>.npy + .etag sidecar) had no budget: drop them
+            for name in os.listdir(mmap_dir):
+                if name.endswith('.npy') or name.endswith('.npy.etag'):
+                    os.remove(os.path.join(mmap_dir, name))
+            return DiskCache(mmap_dir, max_bytes=DOCUMENT_MMAP_MAX_MB * 1024 * 1024, policy=R2_DISK_CACHE_POLICY)
+        except OSError as e:
+            logger.warning(f"[DOC-CACHE] Cannot use mmap dir {mmap_dir}: {e}, arrays stay in memory")
+            return None
+
+    def get_version(self, key: str) -> Optional[str]:
+        """
+        Get version identifier of a cached document (ETag or Last-Modified)
+
+        Args:
+            key: R2 key or local path
+
+        Returns:
+            Version string or None if not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.version if entry is not None else None
+
+    def _load_r2(self, r2_key: str, parse: Callable[[bytes], Any], size_fn: Callable[[bytes, Any], int]) -> Optional[Any]:
+        """Load and parse an R2 object through the cache (value only, see _load_r2_versioned)"""
+        return self._load_r2_versioned(r2_key, parse, size_fn)[0]
+
+    def _load_r2_versioned(
+        self,
+        r2_key: str,
+        parse: Callable[[bytes], Any],
+        size_fn: Callable[[bytes, Any], int]
+    ) -> Tuple[Optional[Any], Optional[str]]:
+        """
+        Load and parse an R2 object through the cache (with conditional revalidation)
+
+        Args:
+            r2_key: R2 key of the file
+            parse: Callable converting raw bytes to the cached value
+            size_fn: Callable (raw bytes, value) -> approximate in-memory size
+
+        Returns:
+            (parsed value (shared, read-only) or None if error, version of that value).
+            The version comes from the load itself, so it is known even when the value
+            was too large to cache or has been evicted since.
+        """
+        entry = self._get_entry(r2_key)
+
+        # Fresh enough: skip R2 entirely
+        if entry is not None and time.time() - entry.checked_at < self.revalidate_seconds:
+            with self._lock:
+                self.hits += 1
+            logger.info(f"[DOC-CACHE HIT] {r2_key}")
+            return entry.value, entry.version
+
+        return self._single_flight(r2_key, lambda: self._revalidate_r2(r2_key, parse, size_fn))
+
+    def _revalidate_r2(
+        self,
+        r2_key: str,
+        parse: Callable[[bytes], Any],
+        size_fn: Callable[[bytes, Any], int]
+    ) -> Tuple[Optional[Any], Optional[str]]:
+        """Conditional GET and (on change) parse of an R2 object, one caller per key at a time"""
+        from core.s3_storage import get_file_if_modified
+
+        entry = self._get_entry(r2_key)
+
+        # Revalidated by a concurrent request while this one waited
+        if entry is not None and time.time() - entry.checked_at < self.revalidate_seconds:
+            with self._lock:
+                self.hits += 1
+            return entry.value, entry.version
+
+        response = get_file_if_modified(
+            r2_key,
+            etag=entry.etag if entry else None,
+            last_modified=entry.last_modified if entry else None
+        )
+
+        if response is None:
+            if entry is not None:
+                # R2 unreachable: stale data is better than no answer
+                with self._lock:
+                    self.stale_hits += 1
+                logger.warning(f"[DOC-CACHE STALE] R2 revalidation failed, serving cached copy: {r2_key}")
+                return entry.value, entry.version
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        if response['not_modified'] and entry is not None:
+            with self._lock:
+                entry.checked_at = time.time()
+                self.hits += 1
+                self.revalidations += 1
+            logger.info(f"[DOC-CACHE HIT] {r2_key} (revalidated, 304 Not Modified)")
+            return entry.value, entry.version
+
+        # Miss (or changed on R2): parse and store
+        with self._lock:
+            self.misses += 1
+
+        data = response['data']
+        etag = response.get('etag')
+        last_modified = response.get('last_modified')
+        if not etag and not last_modified:
+            # No validators: version by content, so derived caches never outlive a re-upload
+            etag = f"sha1:{hashlib.sha1(data).hexdigest()}"
+
+        value = parse(data)
+        self.put(r2_key, value, nbytes=size_fn(data, value), etag=etag, last_modified=last_modified)
+        logger.info(f"[DOC-CACHE MISS] {r2_key} ({len(data) / 1024:.0f}KB parsed and cached)")
+        return value, etag or str(last_modified)
+
+    def load_r2_json(self, r2_key: str, with_version: bool = False):
+        """
+        Load and parse a JSON document from R2 through the cache
+
+        Args:
+            r2_key: R2 key of the JSON file
+            with_version: Also return the version (ETag / Last-Modified / content hash) of the value
+
+        Returns:
+            Parsed JSON (shared, read-only) or None if error,
+            as (value, version) if with_version
+        """
+        value, version = self._load_r2_versioned(
+            r2_key,
+            parse=lambda data: json.loads(data.decode('utf-8')),
+            size_fn=lambda data, value: len(data) * PARSED_JSON_OVERHEAD
+        )
+        return (value, version) if with_version else value
+
+    def load_r2_array(self, r2_key: str):
+        """
+        Load a .npy array from R2 through the cache
+
+        PERFORMANCE: With a mmap store, the array is stored on local disk (under
+        the store's byte budget) and memory-mapped read-only (shared between
+        workers via the page cache).
+
+        Args:
+            r2_key: R2 key of the .npy file
+
+        Returns:
+            numpy array / read-only memmap (shared) or None if error
+        """
+        if self.mmap_store:
+            return self._load_r2_mmap(r2_key)
+        return self._load_r2_in_memory_array(r2_key)
+
+    def _load_r2_in_memory_array(self, r2_key: str):
+        """Load a .npy array from R2 into the worker heap (through the cache)"""
+        from core.document_artifact import embeddings_from_bytes
+
+        return self._load_r2(
+            r2_key,
+            parse=embeddings_from_bytes,
+            size_fn=lambda data, value: int(value.nbytes)
+        )
+
+    def _load_r2_mmap(self, r2_key: str):
+        """
+        Memory-map a .npy array stored on local disk by the mmap store
+
+        DiskCache.fetch() downloads or revalidates the file (ETag in its .meta,
+        so a restarted worker - or the other worker - only needs a 304) and
+        keeps it under the store's byte budget. Evicting or replacing the file
+        never invalidates existing mappings.
+
+        Args:
+            r2_key: R2 key of the .npy file
+
+        Returns:
+            Read-only numpy memmap or None if error
+        """
+        entry = self._get_entry(r2_key)
+
+        # Fresh enough: skip R2 entirely
+        if entry is not None and time.time() - entry.checked_at < self.revalidate_seconds:
+            with self._lock:
+                self.hits += 1
+            logger.info(f"[DOC-CACHE HIT] {r2_key} (mmap)")
+            return entry.value
+
+        return self._single_flight(r2_key, lambda: self._map_r2_file(r2_key))
+
+    def _map_r2_file(self, r2_key: str):
+        """Fetch through the mmap store and map the file, one caller per key at a time"""
+        import numpy as np
+
+        entry = self._get_entry(r2_key)
+        if entry is not None and time.time() - entry.checked_at < self.revalidate_seconds:
+            with self._lock:
+                self.hits += 1
+            return entry.value
+
+        fetched = self.mmap_store.fetch(r2_key)
+
+        if fetched is None:
+            if entry is not None:
+                with self._lock:
+                    self.stale_hits += 1
+                logger.warning(f"[DOC-CACHE STALE] R2 revalidation failed, serving mapped copy: {r2_key}")
+                return entry.value
+            # Unavailable, or larger than the whole disk budget: load into memory instead
+            return self._revalidate_r2_array(r2_key)
+
+        local_path, etag = fetched
+
+        if entry is not None and etag and entry.etag == etag:
+            with self._lock:
+                entry.checked_at = time.time()
+                self.hits += 1
+            logger.info(f"[DOC-CACHE HIT] {r2_key} (mmap, unchanged)")
+            return entry.value
+
+        try:
+            matrix = np.load(local_path, mmap_mode='r', allow_pickle=False)
+        except OSError as e:
+            # Evicted by another process between fetch and map
+            logger.warning(f"[DOC-CACHE] Mapped file vanished, loading into memory: {r2_key} ({e})")
+            return self._revalidate_r2_array(r2_key)
+
+        with self._lock:
+            self.misses += 1
+        self.put(r2_key, matrix, nbytes=MMAP_ENTRY_BYTES, etag=etag)
+        logger.info(f"[DOC-CACHE MISS] {r2_key} ({matrix.nbytes / 1024:.0f}KB memory-mapped)")
+        return matrix
+
+    def _revalidate_r2_array(self, r2_key: str):
+        """In-memory fallback of the mmap tier (already inside the key's single flight)"""
+        from core.document_artifact import embeddings_from_bytes
+
+        return self._revalidate_r2(
+            r2_key,
+            parse=embeddings_from_bytes,
+            size_fn=lambda data, value: int(value.nbytes)
+        )[0]
+
+    def invalidate_local_file(self, r2_key: str) -> None:
+        """Remove the local copy of a changed / deleted R2 object from a dedicated mmap store"""
+        from core.disk_cache import get_disk_cache
+
+        if self.mmap_store is not None and self.mmap_store is not get_disk_cache():
+            self.mmap_store.invalidate(r2_key)
+
+    def load_r2_faiss_index(self, r2_key: str):
+        """
+        Load a serialized FAISS index from R2 through the cache
+
+        Args:
+            r2_key: R2 key of the .faiss file
+
+        Returns:
+            FAISS index (shared, search-only) or None if error
+        """
+        from core.embedding_generator import ann_index_from_bytes
+
+        return self._load_r2(
+            r2_key,
+            parse=ann_index_from_bytes,
+            size_fn=lambda data, value: len(data)
+        )
+
+    def load_r2_keyword_index(self, r2_key: str):
+        """
+        Load a keyword inverted index (.npz) from R2 through the cache
+
+        Args:
+            r2_key: R2 key of the .npz file
+
+        Returns:
+            KeywordIndex (shared, read-only) or None if error
+        """
+        from core.keyword_index import KeywordIndex
+
+        return self._load_r2(
+            r2_key,
+            parse=KeywordIndex.from_bytes,
+            size_fn=lambda data, value: value.nbytes
+        )
+
+    def load_r2_term_analyzer(self, r2_key: str):
+        """
+        Load precomputed ATSW term statistics (.npz) from R2 through the cache
+
+        Args:
+            r2_key: R2 key of the .npz file
+
+        Returns:
+            UniversalTermSpecificityAnalyzer (shared, query-only) or None if error
+        """
+        from core.term_specificity_analyzer import UniversalTermSpecificityAnalyzer
+
+        return self._load_r2(
+            r2_key,
+            parse=UniversalTermSpecificityAnalyzer.from_bytes,
+            size_fn=lambda data, value: value.estimate_memory_bytes()
+        )
+
+    def load_r2_structural_index(self, r2_key: str):
+        """
+        Load a structural index (structure.json) from R2 through the cache
+
+        Args:
+            r2_key: R2 key of the .json file
+
+        Returns:
+            StructuralIndex (shared, read-only) or None if error
+        """
+        from core.structural_index import StructuralIndex
+
+        return self._load_r2(
+            r2_key,
+            parse=StructuralIndex.from_bytes,
+            size_fn=lambda data, value: value.nbytes
+        )
+
+    def load_r2_positional_index(self, r2_key: str):
+        """
+        Load a positional full-text index (.npz) from R2 through the cache
+
+        Args:
+            r2_key: R2 key of the .npz file
+
+        Returns:
+            PositionalIndex (shared, read-only) or None if error
+        """
+        from core.positional_index import PositionalIndex
+
+        return self._load_r2(
+            r2_key,
+            parse=PositionalIndex.from_bytes,
+            size_fn=lambda data, value: value.nbytes
+        )
+
+    def _load_local(self, path: str, load: Callable[[str], Any], size_fn: Callable[[os.stat_result, Any], int]) -> Optional[Any]:
+        """Load a local file through the cache (value only, see _load_local_versioned)"""
+        return self._load_local_versioned(path, load, size_fn)[0]
+
+    def _load_local_versioned(
+        self,
+        path: str,
+        load: Callable[[str], Any],
+        size_fn: Callable[[os.stat_result, Any], int]
+    ) -> Tuple[Optional[Any], str]:
+        """
+        Load a local file through the cache (validated by mtime + size)
+
+        Args:
+            path: Local file path
+            load: Callable reading the file into the cached value
+            size_fn: Callable (stat result, value) -> approximate in-memory size
+
+        Returns:
+            (loaded value (shared, read-only), version "mtime_ns-size")
+        """
+        stat = os.stat(path)
+        version = f"{stat.st_mtime_ns}-{stat.st_size}"
+
+        entry = self._get_entry(path)
+        if entry is not None and entry.etag == version:
+            with self._lock:
+                self.hits += 1
+            return entry.value, version
+
+        with self._lock:
+            self.misses += 1
+
+        value = load(path)
+        if value is not None:
+            self.put(path, value, nbytes=size_fn(stat, value), etag=version)
+        return value, version
+
+    def load_local_json(self, path: str, with_version: bool = False):
+        """
+        Load and parse a local JSON file through the cache (validated by mtime + size)
+
+        Args:
+            path: Local file path
+            with_version: Also return the version (mtime + size) of the value
+
+        Returns:
+            Parsed JSON (shared, read-only) or None if error,
+            as (value, version) if with_version
+        """
+        def load(file_path):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        value, version = self._load_local_versioned(
+            path, load, size_fn=lambda stat, value: stat.st_size * PARSED_JSON_OVERHEAD
+        )
+        return (value, version) if with_version else value
+
+    def load_local_array(self, path: str):
+        """
+        Memory-map a local .npy array through the cache (validated by mtime + size)
+
+        Args:
+            path: Local .npy file path
+
+        Returns:
+            Read-only numpy memmap (shared) or None if error
+        """
+        import numpy as np
+
+        return self._load_local(
+            path,
+            lambda file_path: np.load(file_path, mmap_mode='r', allow_pickle=False),
+            size_fn=lambda stat, value: MMAP_ENTRY_BYTES
+        )
+
+    def load_local_faiss_index(self, path: str):
+        """
+        Load a local FAISS index through the cache (validated by mtime + size)
+
+        Args:
+            path: Local .faiss file path
+
+        Returns:
+            FAISS index (shared, search-only) or None if error
+        """
+        from core.embedding_generator import load_faiss_index
+
+        return self._load_local(path, load_faiss_index, size_fn=lambda stat, value: stat.st_size)
+
+    def load_local_keyword_index(self, path: str):
+        """
+        Load a local keyword inverted index (.npz) through the cache (validated by mtime + size)
+
+        Args:
+            path: Local .npz file path
+
+        Returns:
+            KeywordIndex (shared, read-only) or None if error
+        """
+        from core.keyword_index import KeywordIndex
+
+        def load(file_path):
+            with open(file_path, 'rb') as f:
+                return KeywordIndex.from_bytes(f.read())
+
+        return self._load_local(path, load, size_fn=lambda stat, value: value.nbytes)
+
+    def load_local_term_analyzer(self, path: str):
+        """
+        Load local precomputed ATSW term statistics (.npz) through the cache (validated by mtime + size)
+
+        Args:
+            path: Local .npz file path
+
+        Returns:
+            UniversalTermSpecificityAnalyzer (shared, query-only) or None if error
+        """
+        from core.term_specificity_analyzer import UniversalTermSpecificityAnalyzer
+
+        def load(file_path):
+            with open(file_path, 'rb') as f:
+                return UniversalTermSpecificityAnalyzer.from_bytes(f.read())
+
+        return self._load_local(path, load, size_fn=lambda stat, value: value.estimate_memory_bytes())
+
+    def load_local_structural_index(self, path: str):
+        """
+        Load a local structural index (structure.json) through the cache (validated by mtime + size)
+
+        Args:
+            path: Local .json file path
+
+        Returns:
+            StructuralIndex (shared, read-only) or None if error
+        """
+        from core.structural_index import StructuralIndex
+
+        def load(file_path):
+            with open(file_path, 'rb') as f:
+                return StructuralIndex.from_bytes(f.read())
+
+        return self._load_local(path, load, size_fn=lambda stat, value: value.nbytes)
+
+    def load_local_positional_index(self, path: str):
+        """
+        Load a local positional full-text index (.npz) through the cache (validated by mtime + size)
+
+        Args:
+            path: Local .npz file path
+
+        Returns:
+            PositionalIndex (shared, read-only) or None if error
+        """
+        from core.positional_index import PositionalIndex
+
+        def load(file_path):
+            with open(file_path, 'rb') as f:
+                return PositionalIndex.from_bytes(f.read())
+
+        return self._load_local(path, load, size_fn=lambda stat, value: value.nbytes)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics (including R2 revalidation counters)"""
+        stats = super().get_stats()
+        with self._lock:
+            stats['revalidations'] = self.revalidations
+            stats['stale_hits'] = self.stale_hits
+            stats['revalidate_seconds'] = self.revalidate_seconds
+            stats['mmap_dir'] = self.mmap_dir
+        if self.mmap_store is not None:
+            stats['mmap_store'] = {
+                key: value for key, value in self.mmap_store.get_stats().items()
+                if key in ('entries', 'bytes', 'max_bytes', 'evictions')
+            }
+        return stats
+
+
+# Singleton instance
+_document_cache_instance: Optional[DocumentCache] = None
+
+
+def get_document_cache() -> DocumentCache:
+    """
+    Get singleton document cache instance (one per worker process)
+
+    Returns:
+        DocumentCache instance
+    """
+    global _document_cache_instance
+
+    if _document_cache_instance is None:
+        _document_cache_instance = DocumentCache(max_bytes=DOCUMENT_CACHE_MAX_MB * 1024 * 1024)
+        logger.info(
+            f"[DOC-CACHE] Initialized (budget: {DOCUMENT_CACHE_MAX_MB}MB, "
+            f"revalidate every {DOCUMENT_CACHE_REVALIDATE_SECONDS:.0f}s)"
+        )
+
+    return _document_cache_instance
+
+
+def invalidate_local_file(r2_key: str) -> None:
+    """Drop the local disk copy of a changed / deleted R2 object (no-op before the cache is used)"""
+    if _document_cache_instance is not None:
+        _document_cache_instance.invalidate_local_file(r2_key)
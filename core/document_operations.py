@@ -216,6 +216,13 @@ def delete_document(document_id: str, user_id: str) -> bool:
                 r2_keys_to_delete.append(r2_key)
                 logger.info(f"Will delete embeddings file: {r2_key}")
 
+        # 5. Binary artifact files (manifest, indexes, ...)
+        if doc.doc_metadata and doc.doc_metadata.get('artifact_r2_keys'):
+            for r2_key in doc.doc_metadata['artifact_r2_keys']:
+                if r2_key and '/' in r2_key and r2_key not in r2_keys_to_delete:
+                    r2_keys_to_delete.append(r2_key)
+                    logger.info(f"Will delete artifact file: {r2_key}")
+
         # Get user to update storage
         user = db.query(User).filter_by(id=uuid.UUID(user_id)).first()
         if user and doc.file_size:
@@ -21,6 +21,20 @@ except ImportError as e:
     EMBEDDINGS_AVAILABLE = False
     logger.warning(f"Embeddings libraries not available: {e}")
 
+# FAISS alone is enough to build/search ANN indexes (query side)
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# ANN index configuration: HNSW from ANN_HNSW_THRESHOLD chunks on, no index below
+# (brute-force scoring over the embedding matrix is faster than an exhaustive flat index)
+ANN_HNSW_THRESHOLD = int(os.getenv('ANN_HNSW_THRESHOLD', '5000'))
+ANN_HNSW_M = 32
+ANN_HNSW_EF_CONSTRUCTION = 80
+ANN_HNSW_EF_SEARCH = int(os.getenv('ANN_HNSW_EF_SEARCH', '128'))
+
 
 def generate_and_save_embeddings(
     metadata_file: str,
@@ -165,7 +179,7 @@ def load_faiss_index(faiss_path: str):
     Returns:
         FAISS index or None if failed
     """
-    if not EMBEDDINGS_AVAILABLE:
+    if not FAISS_AVAILABLE:
         return None
 
     try:
@@ -180,7 +194,8 @@ def load_faiss_index(faiss_path: str):
 def search_similar_chunks(
     query_embedding: np.ndarray,
     faiss_index,
-    top_k: int = 5
+    top_k: int = 5,
+    ef_search: Optional[int] = None
 ) -> Tuple[List[int], List[float]]:
     """
     Search for most similar chunks using FAISS index
@@ -189,21 +204,27 @@ def search_similar_chunks(
         query_embedding: Query embedding vector (normalized)
         faiss_index: FAISS index
         top_k: Number of results to return
+        ef_search: HNSW search breadth (ignored for flat indexes, raised to top_k if lower)
 
     Returns:
         Tuple of (indices, scores) for top-k most similar chunks
     """
     try:
         # Normalize query embedding for cosine similarity
-        query_embedding = query_embedding.reshape(1, -1).astype('float32')
+        query_embedding = np.array(query_embedding, dtype='float32').reshape(1, -1)
         faiss.normalize_L2(query_embedding)
 
-        # Search
-        scores, indices = faiss_index.search(query_embedding, top_k)
+        # Search (per-call HNSW params: the index is shared between requests)
+        top_k = min(top_k, faiss_index.ntotal)
+        if ef_search and isinstance(faiss_index, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW(efSearch=max(ef_search, top_k))
+            scores, indices = faiss_index.search(query_embedding, top_k, params=params)
+        else:
+            scores, indices = faiss_index.search(query_embedding, top_k)
 
-        # Convert to lists
-        indices_list = indices[0].tolist()
-        scores_list = scores[0].tolist()
+        # Convert to lists (FAISS pads missing results with -1)
+        indices_list = [idx for idx in indices[0].tolist() if idx >= 0]
+        scores_list = scores[0].tolist()[:len(indices_list)]
 
         return indices_list, scores_list
 
@@ -212,6 +233,136 @@ def search_similar_chunks(
         return [], []
 
 
+def build_ann_index(embeddings: np.ndarray) -> Tuple[Optional[object], Optional[dict]]:
+    """
+    Build per-document ANN index over L2-normalized float32 embeddings
+
+    Documents with at least ANN_HNSW_THRESHOLD chunks get an IndexHNSWFlat
+    (inner product metric), which keeps semantic candidate retrieval in the
+    millisecond range near the 10,000-chunk ceiling. Smaller documents get no
+    index: a flat index would be a second copy of the embeddings in every
+    worker, searched exhaustively (slower than the brute-force matvec).
+
+    Args:
+        embeddings: float32 matrix (chunks x dim), rows already normalized
+
+    Returns:
+        Tuple of (faiss index, index info dict) or (None, None) if FAISS unavailable
+        or the document is below ANN_HNSW_THRESHOLD
+    """
+    if not FAISS_AVAILABLE:
+        logger.warning("FAISS not available, skipping ANN index")
+        return None, None
+
+    if len(embeddings) < ANN_HNSW_THRESHOLD:
+        logger.info(f"ANN index skipped: {len(embeddings)} vectors < {ANN_HNSW_THRESHOLD} (brute-force scoring)")
+        return None, None
+
+    try:
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        dimension = embeddings.shape[1]
+
+        index = faiss.IndexHNSWFlat(dimension, ANN_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ANN_HNSW_EF_CONSTRUCTION
+        index.add(embeddings)
+        info = {
+            'type': 'hnsw',
+            'metric': 'inner_product',
+            'm': ANN_HNSW_M,
+            'ef_construction': ANN_HNSW_EF_CONSTRUCTION
+        }
+
+        info['ntotal'] = int(index.ntotal)
+        logger.info(f"ANN index built: {info['type']} with {index.ntotal} vectors")
+        return index, info
+
+    except Exception as e:
+        logger.error(f"Error building ANN index: {e}", exc_info=True)
+        return None, None
+
+
+def ann_index_to_bytes(index) -> bytes:
+    """Serialize FAISS index to bytes (for R2 upload)"""
+    return faiss.serialize_index(index).tobytes()
+
+
+def ann_index_from_bytes(data: bytes):
+    """Deserialize FAISS index from bytes"""
+    return faiss.deserialize_index(np.frombuffer(data, dtype=np.uint8))
+
+
+def generate_embeddings_matrix(
+    texts: List[str],
+    model_name: str = 'sentence-transformers/paraphrase-multilingual-mpnet-base-v2',
+    batch_size: int = 8,
+    max_chunks_per_batch: int = 50
+) -> Optional[np.ndarray]:
+    """
+    Generate a float32 embedding matrix (len(texts) x dim) for chunk texts
+
+    Used by the binary artifact format (see core/document_artifact.py):
+    the matrix is saved as embeddings.npy instead of JSON float lists.
+
+    Args:
+        texts: Chunk texts
+        model_name: Sentence transformer model
+        batch_size: Batch size for encoding
+        max_chunks_per_batch: Process in small groups to avoid OOM
+
+    Returns:
+        float32 numpy array or None if failed
+    """
+    if not EMBEDDINGS_AVAILABLE:
+        logger.warning("Embeddings libraries not available, skipping")
+        return None
+
+    if not texts:
+        logger.warning("No texts to embed")
+        return None
+
+    try:
+        num_chunks = len(texts)
+
+        logger.info(f"Loading sentence transformer: {model_name}")
+        model = SentenceTransformer(model_name)
+
+        # Process in groups to avoid OOM
+        num_groups = (num_chunks + max_chunks_per_batch - 1) // max_chunks_per_batch
+        logger.info(f"Processing {num_chunks} chunks in {num_groups} groups")
+
+        # Preallocate once model dimension is known (avoids vstack copy)
+        matrix = None
+
+        for group_idx in range(num_groups):
+            start_idx = group_idx * max_chunks_per_batch
+            end_idx = min(start_idx + max_chunks_per_batch, num_chunks)
+
+            logger.info(f"Group {group_idx + 1}/{num_groups}: chunks {start_idx}-{end_idx}")
+
+            embeddings = model.encode(
+                texts[start_idx:end_idx],
+                batch_size=batch_size,
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+
+            if matrix is None:
+                matrix = np.zeros((num_chunks, embeddings.shape[1]), dtype=np.float32)
+            matrix[start_idx:end_idx] = embeddings
+
+            # Cleanup memory
+            import gc
+            embeddings = None
+            gc.collect()
+
+        logger.info(f"✅ Generated embedding matrix {matrix.shape}")
+        return matrix
+
+    except Exception as e:
+        logger.error(f"Error generating embedding matrix: {e}", exc_info=True)
+        return None
+
+
 def generate_and_save_embeddings_inline(
     metadata_file: str,
     model_name: str = 'sentence-transformers/paraphrase-multilingual-mpnet-base-v2',
@@ -221,6 +372,9 @@ def generate_and_save_embeddings_inline(
     """
     Generate embeddings and save them INLINE in metadata.json
 
+    LEGACY: New documents use generate_embeddings_matrix() + the binary artifact
+    format (core/document_artifact.py). Kept for local tools and old scripts.
+
     This solves the OOM problem by pre-calculating embeddings during processing,
     allowing queries to use cached embeddings instead of recalculating 1448+ embeddings
     on every query (which causes 2+ minute delays and worker crashes).
@@ -0,0 +1,225 @@
+"""
+Embedding Model Registry
+Per-document embedding model id + registry of loaded query encoders
+
+Documents are embedded by different models: the PDF pipeline uses multilingual
+MPNet (768-dim), OCR documents use MiniLM (384-dim), and older query engines
+silently fell back to MiniLM. A query must be embedded with the SAME model as
+the document it is compared to, otherwise cosine scores are meaningless (or
+the whole document gets re-embedded on demand).
+
+- Every artifact manifest records the embedding model id and dimension; for
+  legacy documents the model is inferred from the embedding dimension
+- EncoderRegistry keeps a few loaded encoders per worker (LRU, default model
+  pinned), so each query is embedded with the document's model
+- Query embedding cache keys include the model id
+
+Upgrading the default model is incremental: existing documents keep being
+queried with the model they were embedded with until they are re-processed.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_MODEL = 'sentence-transformers/paraphrase-multilingual-mpnet-base-v2'
+FALLBACK_EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+
+# Loaded encoders per worker (the default model is always kept)
+EMBEDDING_MAX_LOADED_MODELS = int(os.getenv('EMBEDDING_MAX_LOADED_MODELS', '2'))
+
+# Retry a model that failed to load after this many seconds
+EMBEDDING_LOAD_RETRY_SECONDS = 300
+
+# Output dimension of known models (identifies the model of legacy documents)
+KNOWN_MODEL_DIMS = {
+    DEFAULT_EMBEDDING_MODEL: 768,
+    FALLBACK_EMBEDDING_MODEL: 384
+}
+
+
+class EmbeddingModelInfo(NamedTuple):
+    """Model that produced a document's embeddings"""
+    model_id: str
+    dim: Optional[int]
+    source: str  # 'manifest', 'metadata', 'dimension' or 'default'
+
+
+def canonical_model_id(model_id: Optional[str]) -> Optional[str]:
+    """
+    Canonical HuggingFace id ('all-MiniLM-L6-v2' -> 'sentence-transformers/all-MiniLM-L6-v2')
+
+    Args:
+        model_id: Model name as passed to SentenceTransformer
+
+    Returns:
+        Canonical model id or None
+    """
+    if not model_id:
+        return None
+    model_id = model_id.strip()
+    return model_id if '/' in model_id else f"sentence-transformers/{model_id}"
+
+
+def resolve_embedding_model(
+    model_id: Optional[str],
+    dim: Optional[int],
+    source: str = 'manifest'
+) -> EmbeddingModelInfo:
+    """
+    Identify the model of a document's embeddings
+
+    Args:
+        model_id: Recorded model id (manifest / metadata) or None
+        dim: Embedding dimension of the document
+        source: Where model_id was recorded
+
+    Returns:
+        EmbeddingModelInfo (recorded model, else inferred from the dimension, else default)
+    """
+    model_id = canonical_model_id(model_id)
+    known_dim = KNOWN_MODEL_DIMS.get(model_id)
+
+    if model_id and (dim is None or known_dim is None or known_dim == dim):
+        return EmbeddingModelInfo(model_id, dim, source)
+
+    if model_id:
+        logger.warning(f"[EMBEDDING] Recorded model {model_id} ({known_dim}-dim) does not match {dim}-dim embeddings")
+
+    # Legacy document (or inconsistent record): the dimension identifies the model
+    matches = [known_id for known_id, known in KNOWN_MODEL_DIMS.items() if known == dim]
+    if len(matches) == 1:
+        return EmbeddingModelInfo(matches[0], dim, 'dimension')
+
+    return EmbeddingModelInfo(DEFAULT_EMBEDDING_MODEL, dim, 'default')
+
+
+def load_encoder(model_id: str):
+    """
+    Load a query encoder (backend from QUERY_EMBEDDING_BACKEND)
+
+    Args:
+        model_id: Canonical model id
+
+    Returns:
+        Encoder with a SentenceTransformer-compatible encode()
+    """
+    from core.query_engine import QUERY_EMBEDDING_BACKEND
+
+    if QUERY_EMBEDDING_BACKEND.startswith('onnx'):
+        try:
+            from core.query_encoder_onnx import ONNXQueryEncoder
+            return ONNXQueryEncoder(model_id, quantize=QUERY_EMBEDDING_BACKEND == 'onnx-int8')
+        except Exception as e:
+            logger.warning(f"[ONNX-ENCODER] Failed to load {model_id}: {e}, using PyTorch")
+
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_id)
+
+
+class EncoderRegistry:
+    """
+    Loaded query encoders of this worker, keyed by canonical model id
+
+    Least recently used encoders are dropped beyond max_models (the pinned
+    default model never is). Failed loads are not retried for a while.
+    """
+
+    def __init__(self, max_models: int = EMBEDDING_MAX_LOADED_MODELS, pinned: str = DEFAULT_EMBEDDING_MODEL):
+        """
+        Initialize registry
+
+        Args:
+            max_models: Maximum number of loaded encoders
+            pinned: Model id never evicted (the default query model)
+        """
+        self.max_models = max(max_models, 1)
+        self.pinned = canonical_model_id(pinned)
+        self._encoders: 'OrderedDict[str, Any]' = OrderedDict()
+        self._failed: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, model_id: str):
+        """
+        Get (loading if needed) the encoder for a model
+
+        Args:
+            model_id: Model id (canonicalized)
+
+        Returns:
+            Encoder, or None if the model cannot be loaded
+        """
+        model_id = canonical_model_id(model_id)
+
+        with self._lock:
+            if model_id in self._encoders:
+                self._encoders.move_to_end(model_id)
+                return self._encoders[model_id]
+
+            failed_at = self._failed.get(model_id)
+            if failed_at and time.time() - failed_at < EMBEDDING_LOAD_RETRY_SECONDS:
+                return None
+
+            start = time.time()
+            try:
+                logger.info(f"[EMBEDDING] Loading encoder: {model_id}...")
+                encoder = load_encoder(model_id)
+            except Exception as e:
+                logger.error(f"[EMBEDDING] Failed to load encoder {model_id}: {e}")
+                self._failed[model_id] = time.time()
+                return None
+
+            self._failed.pop(model_id, None)
+            self._encoders[model_id] = encoder
+            self.loads += 1
+            logger.info(f"[EMBEDDING] Encoder {model_id} loaded in {(time.time() - start) * 1000:.0f}ms")
+
+            while len(self._encoders) > self.max_models:
+                evict_id = next((key for key in self._encoders if key != self.pinned), None)
+                if evict_id is None or evict_id == model_id:
+                    break
+                del self._encoders[evict_id]
+                self.evictions += 1
+                logger.info(f"[EMBEDDING] Evicted encoder {evict_id}")
+
+            return encoder
+
+    def loaded_models(self) -> List[str]:
+        """Model ids of loaded encoders (least recently used first)"""
+        return list(self._encoders)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Registry statistics"""
+        return {
+            'loaded': self.loaded_models(),
+            'max_models': self.max_models,
+            'loads': self.loads,
+            'evictions': self.evictions,
+            'failed': sorted(self._failed)
+        }
+
+
+# Singleton instance (per worker)
+_registry_instance: Optional[EncoderRegistry] = None
+
+
+def get_encoder_registry() -> EncoderRegistry:
+    """
+    Get singleton encoder registry
+
+    Returns:
+        EncoderRegistry instance
+    """
+    global _registry_instance
+
+    if _registry_instance is None:
+        _registry_instance = EncoderRegistry()
+
+    return _registry_instance
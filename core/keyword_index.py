@@ -0,0 +1,288 @@
+"""
+Keyword Inverted Index
+Precomputed postings for the keyword half of hybrid search
+
+SimpleQueryEngine._calculate_keyword_scores used to lowercase every chunk,
+call text.count(term) and re-split every chunk into words for each query term
+(pure Python, O(chunks x terms x words) per query). This index is built once
+per document (at ingest, stored in the artifact as keyword_index.npz) and
+scores only the postings of the vocabulary entries that match a query term.
+
+Tokens are the whitespace-split words of the lowercased chunk text, exactly
+as the original scoring loop saw them, so the scores are identical:
+    score(term) = sum over words w: tf(w) * (w.count(term) + 0.5 * [term in w, w != term])
+
+Storage layout (CSR, all numpy arrays, no pickle):
+    vocab_blob / vocab_offsets - Vocabulary as one UTF-8 blob + word start offsets
+    indptr                     - Postings start per vocabulary entry (V + 1)
+    chunk_ids / tfs            - Postings: chunk row and term frequency
+    doc_lengths                - Words per chunk (for BM25 length normalization)
+"""
+
+import io
+import re
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KEYWORD_INDEX_FORMAT_VERSION = 1
+
+# BM25 parameters (standard defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Partial (substring) matches count half of an exact occurrence
+PARTIAL_MATCH_WEIGHT = 0.5
+
+
+class KeywordIndex:
+    """
+    Inverted index over whitespace tokens of lowercased chunk texts
+    """
+
+    def __init__(
+        self,
+        vocab: List[str],
+        indptr: np.ndarray,
+        chunk_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_lengths: np.ndarray
+    ):
+        """
+        Initialize index from CSR arrays (use build_keyword_index / from_bytes)
+
+        Args:
+            vocab: Vocabulary (position = term id)
+            indptr: Postings start per term id (len(vocab) + 1)
+            chunk_ids: Chunk row of each posting
+            tfs: Term frequency of each posting
+            doc_lengths: Number of words per chunk
+        """
+        self.vocab = vocab
+        self.indptr = indptr
+        self.chunk_ids = chunk_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.num_chunks = len(doc_lengths)
+        self.avg_doc_length = float(doc_lengths.mean()) if self.num_chunks else 0.0
+
+        # Substring search runs in C over one newline-separated string
+        self._term_ids = {term: term_id for term_id, term in enumerate(vocab)}
+        self._vocab_text = '\n'.join(vocab)
+        starts = np.zeros(len(vocab), dtype=np.int64)
+        if vocab:
+            lengths = np.fromiter((len(term) + 1 for term in vocab), dtype=np.int64, count=len(vocab))
+            starts[1:] = np.cumsum(lengths)[:-1]
+        self._vocab_starts = starts
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory footprint in bytes (for cache accounting)"""
+        arrays = self.indptr.nbytes + self.chunk_ids.nbytes + self.tfs.nbytes + self.doc_lengths.nbytes
+        # vocab list + joined text + id dict (~100 bytes per entry of Python overhead)
+        return int(arrays + self._vocab_starts.nbytes + len(self._vocab_text) * 2 + len(self.vocab) * 100)
+
+    def match_terms(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find vocabulary entries containing a query term
+
+        Args:
+            term: Lowercased query term (no whitespace)
+
+        Returns:
+            Tuple of (term ids, match weights): weight = occurrences of term in the
+            word, plus PARTIAL_MATCH_WEIGHT if the word is not the term itself
+        """
+        if not term or '\n' in term:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+        positions = [match.start() for match in re.finditer(re.escape(term), self._vocab_text)]
+        if not positions:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+        word_ids = np.searchsorted(self._vocab_starts, np.asarray(positions, dtype=np.int64), side='right') - 1
+        term_ids, occurrences = np.unique(word_ids, return_counts=True)
+
+        weights = occurrences.astype(np.float64) + PARTIAL_MATCH_WEIGHT
+        exact_id = self._term_ids.get(term)
+        if exact_id is not None:
+            weights[term_ids == exact_id] -= PARTIAL_MATCH_WEIGHT
+
+        return term_ids, weights
+
+    def _term_frequencies(self, term: str) -> np.ndarray:
+        """Weighted frequency of a query term in every chunk (dense, len = num_chunks)"""
+        term_ids, weights = self.match_terms(term)
+        if len(term_ids) == 0:
+            return np.zeros(self.num_chunks)
+
+        # Gather postings of all matching vocabulary entries at once
+        starts = self.indptr[term_ids]
+        ends = self.indptr[term_ids + 1]
+        counts = ends - starts
+        posting_positions = np.repeat(ends - counts.cumsum(), counts) + np.arange(counts.sum())
+        posting_weights = np.repeat(weights, counts) * self.tfs[posting_positions]
+
+        return np.bincount(
+            self.chunk_ids[posting_positions],
+            weights=posting_weights,
+            minlength=self.num_chunks
+        )
+
+    def _cached_term_frequencies(self, term: str, tf_cache: Optional[Dict[str, np.ndarray]]) -> np.ndarray:
+        """Term frequencies, reused from tf_cache when several queries share a term"""
+        if tf_cache is None:
+            return self._term_frequencies(term)
+        tf = tf_cache.get(term)
+        if tf is None:
+            tf = self._term_frequencies(term)
+            tf_cache[term] = tf
+        return tf
+
+    def score(self, term_boosts: Dict[str, float], tf_cache: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+        """
+        Boosted term-frequency scores (same results as the original per-chunk loop)
+
+        Args:
+            term_boosts: Query term -> boost factor (ATSW / proper noun / default)
+            tf_cache: Optional dict shared across queries (term -> frequencies)
+
+        Returns:
+            Array of keyword scores (one per chunk)
+        """
+        scores = np.zeros(self.num_chunks)
+        for term, boost in term_boosts.items():
+            scores += boost * self._cached_term_frequencies(term, tf_cache)
+        return scores
+
+    def score_bm25(
+        self,
+        term_boosts: Dict[str, float],
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+        tf_cache: Optional[Dict[str, np.ndarray]] = None
+    ) -> np.ndarray:
+        """
+        BM25 scores (term frequency saturation + length normalization), boosted per term
+
+        Args:
+            term_boosts: Query term -> boost factor
+            k1: Term frequency saturation
+            b: Length normalization strength
+            tf_cache: Optional dict shared across queries (term -> frequencies)
+
+        Returns:
+            Array of keyword scores (one per chunk)
+        """
+        scores = np.zeros(self.num_chunks)
+        if not self.num_chunks:
+            return scores
+
+        length_norm = k1 * (1.0 - b + b * self.doc_lengths / max(self.avg_doc_length, 1e-10))
+
+        for term, boost in term_boosts.items():
+            tf = self._cached_term_frequencies(term, tf_cache)
+            document_frequency = int(np.count_nonzero(tf))
+            if document_frequency == 0:
+                continue
+            idf = np.log(1.0 + (self.num_chunks - document_frequency + 0.5) / (document_frequency + 0.5))
+            scores += boost * idf * tf * (k1 + 1.0) / (tf + length_norm)
+
+        return scores
+
+    def score_many(self, term_boosts_list: List[Dict[str, float]], bm25: bool = False) -> List[np.ndarray]:
+        """
+        Score several queries, gathering the postings of each distinct term only once
+
+        Args:
+            term_boosts_list: One term -> boost dict per query
+            bm25: Use BM25 instead of boosted term frequencies
+
+        Returns:
+            List of keyword score arrays (one per query)
+        """
+        tf_cache: Dict[str, np.ndarray] = {}
+        if bm25:
+            return [self.score_bm25(term_boosts, tf_cache=tf_cache) for term_boosts in term_boosts_list]
+        return [self.score(term_boosts, tf_cache=tf_cache) for term_boosts in term_boosts_list]
+
+    def to_bytes(self) -> bytes:
+        """Serialize index to .npz bytes (no pickle)"""
+        vocab_blob = '\n'.join(self.vocab).encode('utf-8')
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            format_version=np.array([KEYWORD_INDEX_FORMAT_VERSION], dtype=np.int32),
+            vocab_blob=np.frombuffer(vocab_blob, dtype=np.uint8),
+            indptr=self.indptr,
+            chunk_ids=self.chunk_ids,
+            tfs=self.tfs,
+            doc_lengths=self.doc_lengths
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'KeywordIndex':
+        """Deserialize index from .npz bytes"""
+        with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+            vocab_blob = npz['vocab_blob'].tobytes().decode('utf-8')
+            return cls(
+                vocab=vocab_blob.split('\n') if vocab_blob else [],
+                indptr=npz['indptr'],
+                chunk_ids=npz['chunk_ids'],
+                tfs=npz['tfs'],
+                doc_lengths=npz['doc_lengths']
+            )
+
+
+def build_keyword_index(chunks: List[Dict[str, Any]]) -> KeywordIndex:
+    """
+    Build keyword index from chunks
+
+    Args:
+        chunks: List of chunk dicts ('text' key; chunks without text get no postings)
+
+    Returns:
+        KeywordIndex
+    """
+    term_ids: Dict[str, int] = {}
+    postings: List[List[Tuple[int, int]]] = []
+    doc_lengths = np.zeros(len(chunks), dtype=np.int32)
+
+    for chunk_id, chunk in enumerate(chunks):
+        words = chunk.get('text', '').lower().split() if isinstance(chunk, dict) else []
+        doc_lengths[chunk_id] = len(words)
+
+        for word, tf in Counter(words).items():
+            term_id = term_ids.get(word)
+            if term_id is None:
+                term_id = len(term_ids)
+                term_ids[word] = term_id
+                postings.append([])
+            postings[term_id].append((chunk_id, tf))
+
+    counts = np.fromiter((len(plist) for plist in postings), dtype=np.int64, count=len(postings))
+    indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+
+    total = int(indptr[-1])
+    chunk_ids = np.empty(total, dtype=np.int32)
+    tfs = np.empty(total, dtype=np.int32)
+    position = 0
+    for plist in postings:
+        for chunk_id, tf in plist:
+            chunk_ids[position] = chunk_id
+            tfs[position] = tf
+            position += 1
+
+    vocab = [''] * len(term_ids)
+    for word, term_id in term_ids.items():
+        vocab[term_id] = word
+
+    logger.info(f"[KEYWORD-INDEX] Built: {len(vocab)} terms, {total} postings, {len(chunks)} chunks")
+
+    return KeywordIndex(vocab, indptr, chunk_ids, tfs, doc_lengths)
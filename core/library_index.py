@@ -0,0 +1,470 @@
+"""
+Library Index
+Cross-document search over all of a user's ready documents
+
+Every retrieval used to be scoped to one document_id. The library index lets a
+user search all their documents at once ("where did I read about X").
+
+Structure (per gunicorn worker):
+- LibraryIndex (one per user): the list of ready documents, kept in sync
+  incrementally with the database (documents added, reprocessed or deleted
+  are diffed by id + version, nothing else is reloaded)
+- LibraryShard (one per document version): embedding matrix (memory-mapped)
+  + keyword inverted index, held in a byte-bounded LRU shared by all users
+
+Search scores each shard independently, keeps the best semantic and keyword
+candidates per shard, then fuses and selects the global top-k over the union
+of all shard candidates. Shards are loaded from the artifact files (manifest,
+embeddings.npy, keyword_index.npz): metadata.json is only read for the
+documents that actually have hits (for text / page / section attribution).
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from core.document_cache import SizedLRUCache, MMAP_ENTRY_BYTES, get_document_cache
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment
+LIBRARY_CACHE_MAX_MB = int(os.getenv('LIBRARY_CACHE_MAX_MB', '256'))
+LIBRARY_INDEX_MAX_USERS = int(os.getenv('LIBRARY_INDEX_MAX_USERS', '256'))
+
+# Candidates kept per shard (x top_k, for semantic and keyword separately)
+SHARD_CANDIDATE_MULTIPLIER = 2
+
+
+class LibraryEntry(NamedTuple):
+    """Ready document in a user's library (from the database)"""
+    document_id: str
+    filename: str
+    metadata_source: str
+    is_r2_key: bool
+    version: str
+
+
+class LibraryHit(NamedTuple):
+    """Search hit: document + chunk row + scores"""
+    document_id: str
+    row: int
+    score: float
+    semantic_score: float
+    keyword_score: float
+
+
+class LibraryShard:
+    """
+    Searchable data of one document version (no chunk text)
+
+    Attributes:
+        entry: LibraryEntry the shard was loaded for
+        embeddings: float32 matrix (chunks x dim, may be a memmap) or None
+        embeddings_normalized: True if embedding rows are L2-normalized
+        keyword_index: KeywordIndex or None
+        num_chunks: Number of chunks in the document
+        embedding_model: Model id of the embeddings (None if there are none)
+    """
+
+    def __init__(
+        self,
+        entry: LibraryEntry,
+        embeddings,
+        embeddings_normalized: bool,
+        keyword_index,
+        num_chunks: int,
+        embedding_model: Optional[str] = None
+    ):
+        self.entry = entry
+        self.embeddings = embeddings
+        self.embeddings_normalized = embeddings_normalized
+        self.keyword_index = keyword_index
+        self.num_chunks = num_chunks
+        self.embedding_model = embedding_model
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory footprint (memory-mapped matrices are not in the heap)"""
+        size = self.keyword_index.nbytes if self.keyword_index is not None else 0
+        if isinstance(self.embeddings, np.memmap):
+            size += MMAP_ENTRY_BYTES
+        elif self.embeddings is not None:
+            size += int(self.embeddings.nbytes)
+        return size
+
+    def semantic_scores(self, query_vector: np.ndarray) -> Optional[np.ndarray]:
+        """Cosine similarity of every chunk with the normalized query vector (None if unavailable)"""
+        if self.embeddings is None or self.embeddings.shape[1] != len(query_vector):
+            return None
+        scores = self.embeddings @ query_vector
+        if not self.embeddings_normalized:
+            scores = scores / (np.linalg.norm(self.embeddings, axis=1) + 1e-10)
+        return scores
+
+
+def load_library_shard(entry: LibraryEntry, document_cache) -> Optional[LibraryShard]:
+    """
+    Load the searchable files of a document (through the document cache)
+
+    Artifact-format documents are loaded from manifest + embeddings.npy +
+    keyword_index.npz without parsing metadata.json. Legacy documents (inline
+    embeddings) fall back to the full document load.
+
+    Args:
+        entry: Library entry of the document
+        document_cache: DocumentCache used to load the files
+
+    Returns:
+        LibraryShard or None if the document cannot be loaded
+    """
+    from core.document_artifact import (
+        MANIFEST_FILENAME, resolve_artifact_path, load_document_artifact, load_keyword_index
+    )
+    from core.embedding_models import resolve_embedding_model
+
+    source = entry.metadata_source
+    manifest_path = resolve_artifact_path(source, MANIFEST_FILENAME, entry.is_r2_key)
+
+    try:
+        if entry.is_r2_key:
+            manifest = document_cache.load_r2_json(manifest_path)
+        elif os.path.exists(manifest_path):
+            manifest = document_cache.load_local_json(manifest_path)
+        else:
+            manifest = None
+    except Exception as e:
+        logger.warning(f"[LIBRARY] Failed to load manifest {manifest_path}: {e}")
+        manifest = None
+
+    files = (manifest or {}).get('files') or {}
+
+    if manifest and files.get('keyword_index'):
+        # ARTIFACT FORMAT: binary files only, no metadata.json
+        embeddings = None
+        embeddings_normalized = bool(((manifest.get('embedding') or {}).get('normalized')))
+        try:
+            if files.get('embeddings'):
+                embeddings_path = resolve_artifact_path(source, files['embeddings'], entry.is_r2_key)
+                if entry.is_r2_key:
+                    embeddings = document_cache.load_r2_array(embeddings_path)
+                else:
+                    embeddings = document_cache.load_local_array(embeddings_path)
+
+            keyword_index_path = resolve_artifact_path(source, files['keyword_index'], entry.is_r2_key)
+            if entry.is_r2_key:
+                keyword_index = document_cache.load_r2_keyword_index(keyword_index_path)
+            else:
+                keyword_index = document_cache.load_local_keyword_index(keyword_index_path)
+        except Exception as e:
+            logger.warning(f"[LIBRARY] Failed to load artifact files for {entry.document_id}: {e}")
+            return None
+
+        num_chunks = manifest.get('chunks_count', keyword_index.num_chunks if keyword_index is not None else 0)
+        if embeddings is not None and len(embeddings) != num_chunks:
+            logger.warning(f"[LIBRARY] Embeddings/chunks mismatch for {entry.document_id}, keyword search only")
+            embeddings = None
+
+        embedding_model = None
+        if embeddings is not None:
+            embedding_model = resolve_embedding_model(
+                (manifest.get('embedding') or {}).get('model'), int(embeddings.shape[1])
+            ).model_id
+
+        return LibraryShard(entry, embeddings, embeddings_normalized, keyword_index, num_chunks, embedding_model)
+
+    # LEGACY FORMAT: full document load (metadata.json with inline embeddings)
+    try:
+        if entry.is_r2_key:
+            metadata, version = document_cache.load_r2_json(source, with_version=True)
+        else:
+            metadata, version = document_cache.load_local_json(source, with_version=True)
+        if not metadata:
+            return None
+        document = load_document_artifact(metadata, source, entry.is_r2_key, document_cache, version=version)
+    except Exception as e:
+        logger.warning(f"[LIBRARY] Failed to load document {entry.document_id}: {e}")
+        return None
+
+    return LibraryShard(
+        entry,
+        document.embeddings,
+        document.embeddings_normalized,
+        load_keyword_index(document, document_cache),
+        len(document.chunks),
+        document.embedding_model.model_id if document.embeddings is not None else None
+    )
+
+
+# Shards of all users, bounded by bytes (keyed by document id + version)
+_shard_cache = SizedLRUCache(max_bytes=LIBRARY_CACHE_MAX_MB * 1024 * 1024, name='library-shards')
+
+
+class LibraryIndex:
+    """
+    Per-user library: ready documents + search across their shards
+    """
+
+    def __init__(self, user_id: str, document_cache=None):
+        """
+        Initialize empty library (see sync)
+
+        Args:
+            user_id: User UUID
+            document_cache: DocumentCache used to load shards (default: singleton)
+        """
+        self.user_id = user_id
+        self.document_cache = document_cache or get_document_cache()
+        self._entries: Dict[str, LibraryEntry] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def documents(self) -> List[LibraryEntry]:
+        """Current library entries (snapshot)"""
+        with self._lock:
+            return list(self._entries.values())
+
+    def sync(self, entries: List[LibraryEntry]) -> None:
+        """
+        Bring the library in line with the database (incremental)
+
+        Only new or reprocessed documents (different version) are (re)loaded,
+        lazily on the next search; removed documents are dropped.
+
+        Args:
+            entries: Ready documents of the user
+        """
+        with self._lock:
+            current = {entry.document_id: entry for entry in entries}
+            removed = [doc_id for doc_id in self._entries if doc_id not in current]
+            changed = [
+                entry for entry in entries
+                if self._entries.get(entry.document_id) != entry
+            ]
+            for doc_id in removed:
+                self._entries.pop(doc_id)
+            for entry in changed:
+                self._entries[entry.document_id] = entry
+
+        if removed or changed:
+            logger.info(
+                f"[LIBRARY] User {self.user_id}: {len(changed)} added/updated, "
+                f"{len(removed)} removed, {len(current)} documents"
+            )
+
+    def remove_document(self, document_id: str) -> None:
+        """Drop a document from the library (e.g. right after deletion)"""
+        with self._lock:
+            self._entries.pop(document_id, None)
+
+    def _get_shard(self, entry: LibraryEntry) -> Optional[LibraryShard]:
+        return _shard_cache.get_or_build(
+            f"{entry.document_id}@{entry.version}",
+            builder=lambda: load_library_shard(entry, self.document_cache),
+            size_fn=lambda shard: shard.nbytes
+        )
+
+    def search(
+        self,
+        query_vector_for: Optional[Callable[[Optional[str]], Optional[np.ndarray]]],
+        term_boosts: Dict[str, float],
+        top_k: int,
+        fuse: Callable[[np.ndarray, np.ndarray], np.ndarray],
+        keyword_scoring: str = 'tf'
+    ) -> List[LibraryHit]:
+        """
+        Search all documents: per-shard candidates, global fusion and top-k
+
+        Args:
+            query_vector_for: Callable model id -> L2-normalized query embedding of that
+                              model, or None (None = keyword search only)
+            term_boosts: Query term -> boost factor (keyword scoring)
+            top_k: Number of hits to return
+            fuse: Callable (semantic scores, keyword scores) -> hybrid scores
+            keyword_scoring: 'tf' or 'bm25'
+
+        Returns:
+            List of LibraryHit, best first
+        """
+        from core.score_fusion import top_k_indices
+
+        per_shard = max(top_k * SHARD_CANDIDATE_MULTIPLIER, 1)
+        candidate_docs: List[str] = []
+        candidate_rows: List[np.ndarray] = []
+        semantic_parts: List[np.ndarray] = []
+        keyword_parts: List[np.ndarray] = []
+
+        for entry in self.documents:
+            shard = self._get_shard(entry)
+            if shard is None or shard.num_chunks == 0:
+                continue
+
+            query_vector = None
+            if query_vector_for is not None and shard.embeddings is not None:
+                query_vector = query_vector_for(shard.embedding_model)
+            semantic = shard.semantic_scores(query_vector) if query_vector is not None else None
+            if shard.keyword_index is not None and term_boosts:
+                if keyword_scoring == 'bm25':
+                    keyword = shard.keyword_index.score_bm25(term_boosts)
+                else:
+                    keyword = shard.keyword_index.score(term_boosts)
+            else:
+                keyword = np.zeros(shard.num_chunks)
+
+            # Shard candidates: best semantic UNION best keyword matches
+            rows = np.flatnonzero(keyword > 0)
+            if len(rows) > per_shard:
+                rows = rows[top_k_indices(keyword[rows], per_shard)]
+            if semantic is not None:
+                rows = np.union1d(rows, top_k_indices(semantic, per_shard))
+            if len(rows) == 0:
+                continue
+
+            rows = rows.astype(np.int64)
+            candidate_docs.extend([entry.document_id] * len(rows))
+            candidate_rows.append(rows)
+            semantic_parts.append(semantic[rows] if semantic is not None else np.zeros(len(rows)))
+            keyword_parts.append(keyword[rows])
+
+        if not candidate_rows:
+            return []
+
+        rows = np.concatenate(candidate_rows)
+        semantic_scores = np.concatenate(semantic_parts)
+        keyword_scores = np.concatenate(keyword_parts)
+        hybrid_scores = fuse(semantic_scores, keyword_scores)
+
+        return [
+            LibraryHit(
+                document_id=candidate_docs[idx],
+                row=int(rows[idx]),
+                score=float(hybrid_scores[idx]),
+                semantic_score=float(semantic_scores[idx]),
+                keyword_score=float(keyword_scores[idx])
+            )
+            for idx in top_k_indices(hybrid_scores, top_k)
+        ]
+
+    def attribute(self, hits: List[LibraryHit]) -> List[Dict[str, Any]]:
+        """
+        Add document / chunk attribution to hits (loads metadata.json of hit documents only)
+
+        Args:
+            hits: Search hits
+
+        Returns:
+            List of hit dicts (document_id, filename, chunk_index, page, section, text, scores)
+        """
+        entries = {entry.document_id: entry for entry in self.documents}
+        chunks_by_doc: Dict[str, List[Dict[str, Any]]] = {}
+        results = []
+
+        for hit in hits:
+            entry = entries.get(hit.document_id)
+            if entry is None:
+                continue
+
+            if hit.document_id not in chunks_by_doc:
+                try:
+                    if entry.is_r2_key:
+                        metadata = self.document_cache.load_r2_json(entry.metadata_source)
+                    else:
+                        metadata = self.document_cache.load_local_json(entry.metadata_source)
+                    chunks_by_doc[hit.document_id] = (metadata or {}).get('chunks', [])
+                except Exception as e:
+                    logger.warning(f"[LIBRARY] Failed to load metadata for {hit.document_id}: {e}")
+                    chunks_by_doc[hit.document_id] = []
+
+            chunks = chunks_by_doc[hit.document_id]
+            if hit.row >= len(chunks):
+                continue
+
+            chunk = chunks[hit.row]
+            chunk_metadata = chunk.get('metadata', {})
+            results.append({
+                'document_id': hit.document_id,
+                'filename': entry.filename,
+                'chunk_index': chunk_metadata.get('index', hit.row),
+                'page': chunk_metadata.get('page', '?'),
+                'section': chunk_metadata.get('section', '?'),
+                'text': chunk.get('text', ''),
+                'similarity_score': hit.score,
+                'semantic_score': hit.semantic_score,
+                'keyword_score': hit.keyword_score
+            })
+
+        return results
+
+
+def library_entries_from_documents(documents: List[Any]) -> List[LibraryEntry]:
+    """
+    Build library entries from Document rows (ready documents with a metadata source)
+
+    Args:
+        documents: Document ORM objects
+
+    Returns:
+        List of LibraryEntry
+    """
+    entries = []
+    for doc in documents:
+        doc_metadata = doc.doc_metadata or {}
+        metadata_r2_key = doc_metadata.get('metadata_r2_key')
+        metadata_file = doc_metadata.get('metadata_file')
+        if not metadata_r2_key and not metadata_file:
+            continue
+
+        version = doc.processing_completed_at or doc.updated_at
+        entries.append(LibraryEntry(
+            document_id=str(doc.id),
+            filename=doc.filename,
+            metadata_source=metadata_r2_key or metadata_file,
+            is_r2_key=bool(metadata_r2_key),
+            version=version.isoformat() if version else ''
+        ))
+    return entries
+
+
+# Per-user libraries (LRU by user, entries are small)
+_library_indexes: 'OrderedDict[str, LibraryIndex]' = OrderedDict()
+_library_lock = threading.Lock()
+
+
+def get_library_index(user_id: str) -> LibraryIndex:
+    """
+    Get the library index of a user (created empty, see LibraryIndex.sync)
+
+    Args:
+        user_id: User UUID
+
+    Returns:
+        LibraryIndex instance
+    """
+    with _library_lock:
+        library = _library_indexes.get(user_id)
+        if library is None:
+            library = LibraryIndex(user_id)
+            _library_indexes[user_id] = library
+            while len(_library_indexes) > LIBRARY_INDEX_MAX_USERS:
+                _library_indexes.popitem(last=False)
+        else:
+            _library_indexes.move_to_end(user_id)
+        return library
+
+
+def remove_from_library_index(user_id: str, document_id: str) -> None:
+    """Drop a deleted document from the user's library in this worker"""
+    with _library_lock:
+        library = _library_indexes.get(user_id)
+    if library is not None:
+        library.remove_document(document_id)
+
+
+def get_library_stats() -> Dict[str, Any]:
+    """Get library index statistics (per worker)"""
+    with _library_lock:
+        users = len(_library_indexes)
+    return {'users': users, 'shards': _shard_cache.get_stats()}
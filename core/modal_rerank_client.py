@@ -4,6 +4,11 @@ Modal Labs GPU Reranker Client
 HTTP client for calling Modal GPU reranking service from Railway.
 Provides robust error handling, timeouts, and fallback logic.
 
+Transport: one keep-alive requests.Session per process (no TLS handshake per
+query once warm), gzip request bodies, separate connect and read timeouts and
+retries with jittered backoff for connection errors and 502/503/504, all within
+the caller's timeout.
+
 Usage:
     from core.modal_rerank_client import rerank_with_modal
 
@@ -14,8 +19,13 @@ Usage:
 """
 
 import os
+import gzip
+import json
+import random
+import threading
 import requests
 import logging
+from requests.adapters import HTTPAdapter
 from typing import List, Dict, Any, Optional, Tuple
 import time
 
@@ -29,6 +39,17 @@ DEFAULT_TIMEOUT = 30.0  # 30 seconds timeout (allow cold starts for GPU model lo
 MAX_CHUNKS_PER_REQUEST = 100  # Modal service limit
 DEFAULT_TOP_K = 10
 
+# Transport: connect timeout (the read timeout is the caller's timeout), retries and pool size
+CONNECT_TIMEOUT = float(os.getenv("MODAL_CONNECT_TIMEOUT_SECONDS", "3.0"))
+MAX_RETRIES = int(os.getenv("MODAL_RERANK_RETRIES", "2"))
+RETRY_BACKOFF_SECONDS = float(os.getenv("MODAL_RERANK_BACKOFF_SECONDS", "0.25"))
+RETRY_STATUS_CODES = (502, 503, 504)
+POOL_CONNECTIONS = int(os.getenv("MODAL_POOL_CONNECTIONS", "8"))
+
+# Request bodies above this size are sent gzip-compressed
+GZIP_MIN_BYTES = 1024
+GZIP_ENABLED = os.getenv("MODAL_RERANK_GZIP", "true").lower() == "true"
+
 # Log timeout at module load for debugging deployments
 import logging
 _logger = logging.getLogger(__name__)
@@ -40,61 +61,171 @@ def is_modal_enabled() -> bool:
     return bool(MODAL_RERANK_URL)
 
 
-def rerank_with_modal(
+# ============================================
+# TRANSPORT
+# ============================================
+
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_session_lock = threading.Lock()
+
+# Cleared when the service rejects a gzip body (older deployment): plain JSON from then on
+_gzip_accepted = True
+
+
+def get_session() -> requests.Session:
+    """
+    Shared keep-alive session of this process
+
+    Created lazily and again after a fork, so gunicorn workers never share
+    the master's sockets.
+    """
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_CONNECTIONS, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session, _session_pid = session, pid
+                logger.info(f"[MODAL] HTTP session created for process {pid} (pool {POOL_CONNECTIONS})")
+
+    return _session
+
+
+def _encode_body(payload: Dict[str, Any], compress: bool) -> Tuple[bytes, Dict[str, str]]:
+    """JSON body and headers, gzip-compressed above GZIP_MIN_BYTES"""
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+
+    if compress and len(body) >= GZIP_MIN_BYTES:
+        # Level 1: most of the size reduction (~80% on chunk text) for ~0.5ms per 60KB
+        body = gzip.compress(body, compresslevel=1)
+        headers["Content-Encoding"] = "gzip"
+
+    return body, headers
+
+
+def _backoff_seconds(attempt: int) -> float:
+    """Full-jitter exponential backoff: uniform in [0, base * 2^attempt]"""
+    return random.uniform(0, RETRY_BACKOFF_SECONDS * (2 ** attempt))
+
+
+def post_json(url: str, payload: Dict[str, Any], timeout: float = DEFAULT_TIMEOUT) -> requests.Response:
+    """
+    POST a JSON payload over the shared session, retrying transient failures
+
+    Connection errors (including stale keep-alive connections) and 502/503/504
+    are retried up to MAX_RETRIES times with jittered backoff. Read timeouts are
+    not retried: the service may still be working (GPU cold start). Every attempt
+    and backoff fits in the overall timeout.
+
+    Args:
+        url: Endpoint URL
+        payload: JSON-serializable request body
+        timeout: Overall budget in seconds (read timeout of each attempt, capped by what is left)
+
+    Returns:
+        Successful response
+
+    Raises:
+        requests.exceptions.RequestException: Last failure once retries or time are exhausted
+    """
+    global _gzip_accepted
+
+    deadline = time.time() + timeout
+    attempt = 0
+
+    while True:
+        compress = GZIP_ENABLED and _gzip_accepted
+        body, headers = _encode_body(payload, compress)
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise requests.exceptions.Timeout(f"Timeout budget of {timeout}s spent after {attempt} attempts")
+
+        try:
+            response = get_session().post(
+                url,
+                data=body,
+                headers=headers,
+                timeout=(min(CONNECT_TIMEOUT, remaining), remaining)
+            )
+
+            if "Content-Encoding" in headers and response.status_code in (400, 415, 422):
+                logger.warning(f"[MODAL] Service rejected gzip body (HTTP {response.status_code}), sending plain JSON")
+                _gzip_accepted = False
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < MAX_RETRIES:
+                raise requests.exceptions.HTTPError(f"{response.status_code} from service", response=response)
+
+            response.raise_for_status()
+            return response
+
+        except (requests.exceptions.ConnectionError, requests.exceptions.HTTPError) as e:
+            retryable = (
+                isinstance(e, requests.exceptions.ConnectionError)
+                or (e.response is not None and e.response.status_code in RETRY_STATUS_CODES)
+            )
+            if not retryable or attempt >= MAX_RETRIES:
+                raise
+
+            backoff = min(_backoff_seconds(attempt), max(0.0, deadline - time.time()))
+            attempt += 1
+            logger.warning(f"[MODAL] {e.__class__.__name__}: {e}, retry {attempt}/{MAX_RETRIES} in {backoff * 1000:.0f}ms")
+            time.sleep(backoff)
+
+
+def warm_modal_connection(timeout: float = 10.0) -> bool:
+    """
+    Open the keep-alive connection to the rerank endpoint (TLS handshake) ahead of the first query
+
+    Sends an empty rerank request, which the service answers without using the GPU.
+
+    Returns:
+        True if the endpoint answered
+    """
+    if not MODAL_RERANK_URL:
+        return False
+
+    try:
+        post_json(MODAL_RERANK_URL, {"query": "", "chunks": []}, timeout=timeout)
+        return True
+    except Exception as e:
+        logger.warning(f"[MODAL] Connection warm-up failed: {e}")
+        return False
+
+
+def score_with_modal(
     query: str,
-    chunks: List[Dict[str, Any]],
-    top_k: int = DEFAULT_TOP_K,
+    texts: List[str],
     timeout: float = DEFAULT_TIMEOUT
-) -> Optional[List[Dict[str, Any]]]:
+) -> Optional[List[float]]:
     """
-    Rerank chunks using Modal GPU service.
+    Cross-encoder relevance scores from the Modal GPU service.
 
     Args:
         query: User query text
-        chunks: List of chunk dictionaries with 'text' field
-        top_k: Number of top chunks to return after reranking
-        timeout: Request timeout in seconds (default 2.0s)
+        texts: Chunk texts (at most MAX_CHUNKS_PER_REQUEST)
+        timeout: Request timeout in seconds
 
     Returns:
-        Reranked chunks (top_k) or None if failed
-
-    Example:
-        >>> chunks = [{"text": "chunk1", "chunk_id": 1}, ...]
-        >>> reranked = rerank_with_modal("query", chunks, top_k=10)
-        >>> if reranked is None:
-        ...     # Use fallback strategy
-        ...     reranked = chunks[:10]
+        One score per text, or None if the call failed
     """
     if not MODAL_RERANK_URL:
         logger.debug("[MODAL] No MODAL_RERANK_URL configured, skipping GPU reranking")
         return None
 
-    if not chunks:
-        logger.warning("[MODAL] No chunks provided, skipping reranking")
-        return []
-
-    if len(chunks) > MAX_CHUNKS_PER_REQUEST:
-        logger.warning(f"[MODAL] Too many chunks ({len(chunks)}), truncating to {MAX_CHUNKS_PER_REQUEST}")
-        chunks = chunks[:MAX_CHUNKS_PER_REQUEST]
-
     try:
         start_time = time.time()
 
-        # Extract chunk texts
-        chunk_texts = [chunk.get("text", "") for chunk in chunks]
-
-        logger.info(f"[MODAL] Calling Modal API with {len(chunk_texts)} chunks")
-
-        # Call Modal API
-        response = requests.post(
-            MODAL_RERANK_URL,
-            json={"query": query, "chunks": chunk_texts},
-            timeout=timeout,
-            headers={"Content-Type": "application/json"}
-        )
+        logger.info(f"[MODAL] Calling Modal API with {len(texts)} chunks")
 
-        # Check HTTP status
-        response.raise_for_status()
+        # Call Modal API (shared keep-alive session, retries within timeout)
+        response = post_json(MODAL_RERANK_URL, {"query": query, "chunks": texts}, timeout=timeout)
 
         # Parse response
         result = response.json()
@@ -105,17 +236,10 @@ def rerank_with_modal(
 
         scores = result.get("scores", [])
 
-        if len(scores) != len(chunks):
-            logger.error(f"[MODAL] Score count mismatch: {len(scores)} scores for {len(chunks)} chunks")
+        if len(scores) != len(texts):
+            logger.error(f"[MODAL] Score count mismatch: {len(scores)} scores for {len(texts)} chunks")
             return None
 
-        # Sort chunks by scores (descending)
-        scored_chunks = list(zip(chunks, scores))
-        scored_chunks.sort(key=lambda x: x[1], reverse=True)
-
-        # Return top-K
-        reranked = [chunk for chunk, score in scored_chunks[:top_k]]
-
         elapsed_ms = (time.time() - start_time) * 1000
         modal_latency = result.get("latency_ms", 0)
 
@@ -125,7 +249,7 @@ def rerank_with_modal(
         )
         logger.debug(f"[MODAL] Top-3 scores: {[scores[i] for i in range(min(3, len(scores)))]}")
 
-        return reranked
+        return scores
 
     except requests.exceptions.Timeout:
         logger.warning(f"[MODAL] Request timeout after {timeout}s, using fallback")
@@ -144,6 +268,54 @@ def rerank_with_modal(
         return None
 
 
+def rerank_with_modal(
+    query: str,
+    chunks: List[Dict[str, Any]],
+    top_k: int = DEFAULT_TOP_K,
+    timeout: float = DEFAULT_TIMEOUT
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Rerank chunks using Modal GPU service.
+
+    Args:
+        query: User query text
+        chunks: List of chunk dictionaries with 'text' field
+        top_k: Number of top chunks to return after reranking
+        timeout: Request timeout in seconds (default 2.0s)
+
+    Returns:
+        Reranked chunks (top_k) or None if failed
+
+    Example:
+        >>> chunks = [{"text": "chunk1", "chunk_id": 1}, ...]
+        >>> reranked = rerank_with_modal("query", chunks, top_k=10)
+        >>> if reranked is None:
+        ...     # Use fallback strategy
+        ...     reranked = chunks[:10]
+    """
+    if not MODAL_RERANK_URL:
+        logger.debug("[MODAL] No MODAL_RERANK_URL configured, skipping GPU reranking")
+        return None
+
+    if not chunks:
+        logger.warning("[MODAL] No chunks provided, skipping reranking")
+        return []
+
+    if len(chunks) > MAX_CHUNKS_PER_REQUEST:
+        logger.warning(f"[MODAL] Too many chunks ({len(chunks)}), truncating to {MAX_CHUNKS_PER_REQUEST}")
+        chunks = chunks[:MAX_CHUNKS_PER_REQUEST]
+
+    scores = score_with_modal(query, [chunk.get("text", "") for chunk in chunks], timeout=timeout)
+    if scores is None:
+        return None
+
+    # Sort chunks by scores (descending) and return top-K
+    scored_chunks = list(zip(chunks, scores))
+    scored_chunks.sort(key=lambda x: x[1], reverse=True)
+
+    return [chunk for chunk, score in scored_chunks[:top_k]]
+
+
 def rerank_with_modal_batch(
     query: str,
     chunks: List[Dict[str, Any]],
@@ -181,29 +353,15 @@ def rerank_with_modal_batch(
     for i in range(0, len(chunks), batch_size):
         batch = chunks[i:i + batch_size]
 
-        try:
-            chunk_texts = [c.get("text", "") for c in batch]
-
-            response = requests.post(
-                MODAL_RERANK_URL,
-                json={"query": query, "chunks": chunk_texts},
-                timeout=timeout,
-                headers={"Content-Type": "application/json"}
-            )
-            response.raise_for_status()
-
-            result = response.json()
-            scores = result.get("scores", [])
-
-            # Collect scored chunks
-            for chunk, score in zip(batch, scores):
-                all_scored.append((chunk, score))
-
-        except Exception as e:
-            logger.warning(f"[MODAL-BATCH] Batch {i//batch_size + 1} failed: {e}")
+        scores = score_with_modal(query, [c.get("text", "") for c in batch], timeout=timeout)
+        if scores is None:
+            logger.warning(f"[MODAL-BATCH] Batch {i//batch_size + 1} failed")
             # Continue with remaining batches
             continue
 
+        # Collect scored chunks
+        all_scored.extend(zip(batch, scores))
+
     if not all_scored:
         logger.error("[MODAL-BATCH] All batches failed")
         return None
@@ -241,7 +399,7 @@ def check_modal_health(timeout: float = 5.0) -> Tuple[bool, Optional[Dict[str, A
         # Derive health endpoint URL
         health_url = MODAL_RERANK_URL.replace("/rerank_api", "/health")
 
-        response = requests.get(health_url, timeout=timeout)
+        response = get_session().get(health_url, timeout=(min(CONNECT_TIMEOUT, timeout), timeout))
         response.raise_for_status()
 
         health_info = response.json()
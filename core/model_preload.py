@@ -0,0 +1,202 @@
+"""
+Model Preloading for gunicorn workers
+Load models once in the master before fork, warm them up, report readiness
+
+Each gunicorn worker used to load its own embedding model (and optionally the
+ONNX reranker) on its first query: the model weights were resident once per
+worker and the first user of every worker paid the cold start.
+
+With PRELOAD_MODELS=true (see gunicorn.conf.py):
+- Master, before fork (preload_models): PyTorch models are loaded and warmed
+  up single-threaded, so the weight pages are shared copy-on-write by all
+  workers and no OpenMP thread pool exists at fork time. ONNX exports are
+  built here too (never inside a worker with a request timeout).
+- Worker, after fork (init_worker_models): ONNX Runtime sessions are created
+  (their thread pools do not survive fork), every model runs a warm-up
+  inference, then the worker is marked ready.
+
+/api/health reports get_model_readiness() for information only: post_fork runs
+before the worker accepts connections, so a worker never serves while warming.
+A failed warm-up leaves ready=False (with the error) and models load lazily.
+"""
+
+import os
+import time
+import logging
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_MODELS = os.getenv('PRELOAD_MODELS', 'false').lower() == 'true'
+PRELOAD_ONNX_RERANKER = os.getenv('PRELOAD_ONNX_RERANKER', 'false').lower() == 'true'
+
+# Warm-up inputs (typical Italian queries of different lengths)
+WARMUP_QUERIES = [
+    "Di cosa parla il documento?",
+    "Quali sono gli ingredienti principali della ricetta e in che ordine vanno aggiunti?",
+    "Riassumi i punti chiave del terzo capitolo"
+]
+
+_state: Dict[str, Any] = {
+    'shared_loaded': False,
+    'worker_pid': None,
+    'models': {},
+    'error': None
+}
+
+
+def _record(name: str, **info) -> None:
+    """Store load/warm-up details of one model"""
+    _state['models'].setdefault(name, {}).update(info)
+
+
+def _warm_up_encoder(model, single_thread: bool = False) -> float:
+    """
+    Run warm-up inferences on the query encoder
+
+    Args:
+        model: SentenceTransformer or ONNXQueryEncoder
+        single_thread: Limit torch to one thread (master before fork: no OpenMP pool)
+
+    Returns:
+        Warm-up time in ms
+    """
+    start = time.time()
+    torch = None
+    previous_threads = None
+
+    if single_thread and not hasattr(model, 'session'):
+        import torch
+        previous_threads = torch.get_num_threads()
+        torch.set_num_threads(1)
+
+    try:
+        model.encode(WARMUP_QUERIES[0], convert_to_tensor=False)
+        model.encode(WARMUP_QUERIES, convert_to_tensor=False)
+    finally:
+        if torch is not None:
+            torch.set_num_threads(previous_threads)
+
+    return (time.time() - start) * 1000
+
+
+def preload_models() -> bool:
+    """
+    Load shareable models in the current process (gunicorn master before fork)
+
+    Returns:
+        True if all requested models were loaded
+    """
+    if not PRELOAD_MODELS:
+        return False
+
+    logger.info("[PRELOAD] Loading models before fork...")
+
+    try:
+        from core.query_engine import query_engine, QUERY_EMBEDDING_BACKEND
+
+        start = time.time()
+        if QUERY_EMBEDDING_BACKEND.startswith('onnx'):
+            # ONNX sessions are created per worker: only make sure the export exists
+            from core.query_encoder_onnx import export_onnx_encoder
+            export_onnx_encoder(query_engine.model_name, quantize=QUERY_EMBEDDING_BACKEND == 'onnx-int8')
+            _record('query_encoder', backend=QUERY_EMBEDDING_BACKEND, export_ms=round((time.time() - start) * 1000, 1))
+        else:
+            model = query_engine.model
+            if model is None:
+                raise RuntimeError("embedding model not available")
+            load_ms = (time.time() - start) * 1000
+            warmup_ms = _warm_up_encoder(model, single_thread=True)
+            _record(
+                'query_encoder',
+                backend=QUERY_EMBEDDING_BACKEND,
+                shared=True,
+                load_ms=round(load_ms, 1),
+                master_warmup_ms=round(warmup_ms, 1)
+            )
+
+        if PRELOAD_ONNX_RERANKER:
+            # ONNX sessions are created per worker: only export, quantize and verify here
+            from core.reranker_onnx import ONNX_RERANKER_VARIANT, export_onnx_reranker
+
+            start = time.time()
+            export_onnx_reranker(quantize=ONNX_RERANKER_VARIANT == 'int8')
+            _record('onnx_reranker', variant=ONNX_RERANKER_VARIANT, export_ms=round((time.time() - start) * 1000, 1))
+
+        _state['shared_loaded'] = True
+        logger.info(f"[PRELOAD] Models loaded before fork: {_state['models']}")
+        return True
+
+    except Exception as e:
+        _state['error'] = str(e)
+        logger.error(f"[PRELOAD] Model preload failed: {e}, workers will load models lazily", exc_info=True)
+        return False
+
+
+def init_worker_models() -> bool:
+    """
+    Create per-process model sessions, warm up and mark this worker ready
+    (gunicorn post_fork hook, or the process itself when not forked)
+
+    Returns:
+        True if the worker is ready
+    """
+    if not PRELOAD_MODELS:
+        return False
+
+    pid = os.getpid()
+    start = time.time()
+
+    try:
+        from core.query_engine import query_engine
+
+        model = query_engine.model
+        if model is None:
+            raise RuntimeError("embedding model not available")
+        _record('query_encoder', worker_warmup_ms=round(_warm_up_encoder(model), 1))
+
+        if PRELOAD_ONNX_RERANKER:
+            from core.reranker_onnx import get_onnx_reranker
+
+            reranker = get_onnx_reranker()
+            warmup_start = time.time()
+            reranker.rerank(WARMUP_QUERIES[0], [{'text': query} for query in WARMUP_QUERIES], top_k=1)
+            _record('onnx_reranker', worker_warmup_ms=round((time.time() - warmup_start) * 1000, 1))
+
+        from core.modal_rerank_client import is_modal_enabled, warm_modal_connection
+
+        if is_modal_enabled():
+            # Keep-alive connection per worker: the first query skips the TLS handshake
+            warmup_start = time.time()
+            _record('modal_connection', connected=warm_modal_connection(),
+                    worker_warmup_ms=round((time.time() - warmup_start) * 1000, 1))
+
+        _state['worker_pid'] = pid
+        _state['error'] = None
+        logger.info(f"[PRELOAD] Worker {pid} ready in {(time.time() - start) * 1000:.1f}ms")
+        return True
+
+    except Exception as e:
+        _state['error'] = str(e)
+        # Still serving (models load lazily), but not reported as warm
+        logger.error(f"[PRELOAD] Worker {pid} warm-up failed: {e}, models will load lazily", exc_info=True)
+        return False
+
+
+def get_model_readiness() -> Dict[str, Any]:
+    """
+    Readiness of this worker's models (reported by /api/health, informational)
+
+    Returns:
+        Dict with ready flag (models warmed up in this process, always True
+        without PRELOAD_MODELS), preload mode, per-model timings and last error
+    """
+    ready = not PRELOAD_MODELS or _state['worker_pid'] == os.getpid()
+    return {
+        'ready': ready,
+        'preload': PRELOAD_MODELS,
+        'shared': _state['shared_loaded'],
+        'pid': os.getpid(),
+        'models': _state['models'],
+        'error': _state['error']
+    }
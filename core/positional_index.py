@@ -0,0 +1,550 @@
+"""
+Positional Full-Text Index
+Exact occurrence counts, pages and offsets of a term or phrase in a document
+
+"Trova tutte le occorrenze di X" / "quante volte compare X" queries used to
+scan every chunk text (memvidBeta direct_metadata_search, capped at 30
+results), and the counts were inflated by the text repeated in overlapping
+chunks. This index is built once per document (at ingest, stored in the
+artifact as positions.npz):
+
+- Chunk overlaps are detected from the text (suffix of a chunk == prefix of
+  the next), so every token of the document is indexed exactly once
+- Tokens are the \\w+ words of the normalized text (lowercase, accents
+  removed, length-preserving, so offsets point into the original chunk text);
+  '## Pagina N' markers set the page and are not indexed
+- Phrases match consecutive token positions (also across chunk boundaries)
+
+Storage layout (CSR, all numpy arrays, no pickle):
+    vocab_blob / indptr - Sorted vocabulary + postings start per term (V + 1)
+    positions           - Postings: global token positions (ascending per term)
+    offsets             - Character offset of every token in its chunk
+    row_starts          - First token position of every chunk (chunks + 1)
+    page_starts / page_numbers - Token position where each page begins
+"""
+
+import io
+import os
+import re
+import logging
+import threading
+import unicodedata
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from core.structural_index import PAGE_MARKER_RE
+
+logger = logging.getLogger(__name__)
+
+POSITIONAL_INDEX_FORMAT_VERSION = 1
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Minimum shared text to treat two consecutive chunks as overlapping
+MIN_OVERLAP_CHARS = 16
+
+# Occurrences returned per page of results (API default / maximum)
+DEFAULT_OCCURRENCE_LIMIT = 50
+MAX_OCCURRENCE_LIMIT = 500
+
+# "Find all" queries (term in quotes, after 'parola'/'termine', or capitalized)
+OCCURRENCE_PHRASES = (
+    'trova tutte', 'trova tutti', 'tutte le occorrenze', 'tutti i riferimenti',
+    'cerca tutte', 'elenca tutte', 'mostra tutte', 'quante volte',
+    'cerca parola', 'cerca termine', 'cerca il termine', 'cerca la parola',
+    'dove appare', 'dove compare', 'in che pagine', 'in quali pagine',
+    'dammi tutte', 'ogni menzione', 'ogni riferimento', 'tutte le volte'
+)
+OCCURRENCE_STOPWORDS = frozenset({
+    'trova', 'tutte', 'tutti', 'occorrenze', 'riferimenti', 'cerca', 'elenca', 'mostra',
+    'quante', 'volte', 'dove', 'appare', 'compare', 'quali', 'pagine', 'dammi', 'ogni'
+})
+
+
+def _build_fold_table() -> Dict[int, str]:
+    """Latin characters -> lowercase without accents (one char -> one char)"""
+    table = {}
+    for code_point in range(0x250):
+        char = chr(code_point)
+        folded = ''.join(c for c in unicodedata.normalize('NFKD', char.lower()) if not unicodedata.combining(c))
+        if len(folded) == 1 and folded != char:
+            table[code_point] = folded
+    return table
+
+
+FOLD_TABLE = _build_fold_table()
+
+
+def fold_text(text: str) -> str:
+    """
+    Normalize text for indexing: lowercase, accents removed, SAME length
+
+    Args:
+        text: Original text
+
+    Returns:
+        Normalized text (character offsets are valid in the original text)
+    """
+    folded = text.translate(FOLD_TABLE)
+    lowered = folded.lower()
+    return lowered if len(lowered) == len(folded) else folded
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalized tokens of a term or phrase"""
+    return TOKEN_RE.findall(fold_text(text))
+
+
+def parse_occurrence_query(query: str) -> Optional[str]:
+    """
+    Extract the searched term of a "find all occurrences" query
+
+    Args:
+        query: User query
+
+    Returns:
+        Term or phrase, or None if the query is not an occurrence query
+    """
+    query_lower = query.lower()
+    if not any(phrase in query_lower for phrase in OCCURRENCE_PHRASES):
+        return None
+
+    # Term in quotes: 'trova tutte le occorrenze di "reddito agrario"'
+    match = re.search(r'["“«]([^"”»\n]+)["”»]', query) or re.search(r"'([^'\n]{2,})'", query)
+    if match:
+        return match.group(1).strip()
+
+    # Term after 'parola' / 'termine'
+    match = re.search(r'\b(?:parola|termine)\s+["\']?(\w+)', query_lower)
+    if match:
+        return match.group(1)
+
+    # Capitalized word (first word of the sentence excluded)
+    for word in query.split()[1:]:
+        word = word.strip('?!.,;:()')
+        if len(word) > 3 and word[0].isupper() and word.lower() not in OCCURRENCE_STOPWORDS:
+            return word.lower()
+
+    return None
+
+
+class Occurrence(NamedTuple):
+    """One occurrence: chunk row + character span (end in end_row for cross-chunk phrases)"""
+    row: int
+    start: int
+    end_row: int
+    end: int
+    page: Optional[int]
+
+
+class OccurrencePage(NamedTuple):
+    """One page of occurrences of a term, with exact totals"""
+    term: str
+    total: int
+    pages: List[Tuple[int, int]]  # (page, occurrences), page order
+    occurrences: List[Occurrence]
+    offset: int
+    limit: int
+
+    @property
+    def has_more(self) -> bool:
+        return self.offset + len(self.occurrences) < self.total
+
+
+class PositionalIndex:
+    """
+    Positional inverted index over the (de-overlapped) document text
+    """
+
+    def __init__(
+        self,
+        vocab: List[str],
+        indptr: np.ndarray,
+        positions: np.ndarray,
+        offsets: np.ndarray,
+        row_starts: np.ndarray,
+        page_starts: np.ndarray,
+        page_numbers: np.ndarray
+    ):
+        """
+        Initialize index from CSR arrays (use build_positional_index / from_bytes)
+
+        Args:
+            vocab: Sorted vocabulary (position = term id)
+            indptr: Postings start per term id (len(vocab) + 1)
+            positions: Global token positions of each posting
+            offsets: Character offset of each token in its chunk
+            row_starts: First token position of each chunk (chunks + 1)
+            page_starts: Token position where each page begins
+            page_numbers: Page number of each page start
+        """
+        self.vocab = vocab
+        self.indptr = indptr
+        self.positions = positions
+        self.offsets = offsets
+        self.row_starts = row_starts
+        self.page_starts = page_starts
+        self.page_numbers = page_numbers
+        self.num_chunks = len(row_starts) - 1
+        self.num_tokens = len(offsets)
+        self._term_ids = {term: term_id for term_id, term in enumerate(vocab)}
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate in-memory size (arrays + vocabulary)"""
+        arrays = (self.indptr, self.positions, self.offsets, self.row_starts, self.page_starts, self.page_numbers)
+        return sum(array.nbytes for array in arrays) + sum(60 + len(term) for term in self.vocab)
+
+    def _postings(self, token: str) -> np.ndarray:
+        """Sorted token positions of one normalized token"""
+        term_id = self._term_ids.get(token)
+        if term_id is None:
+            return self.positions[:0]
+        return self.positions[self.indptr[term_id]:self.indptr[term_id + 1]]
+
+    def match_positions(self, tokens: List[str]) -> np.ndarray:
+        """
+        Start positions of a token sequence (consecutive positions)
+
+        Args:
+            tokens: Normalized tokens (see tokenize)
+
+        Returns:
+            Sorted int array of the positions of the first token
+        """
+        if not tokens:
+            return self.positions[:0]
+
+        starts = self._postings(tokens[0])
+        for shift, token in enumerate(tokens[1:], start=1):
+            if len(starts) == 0:
+                break
+            postings = self._postings(token)
+            wanted = starts + shift
+            found = np.searchsorted(postings, wanted)
+            valid = found < len(postings)
+            valid[valid] = postings[found[valid]] == wanted[valid]
+            starts = starts[valid]
+        return starts
+
+    def rows_of(self, positions: np.ndarray) -> np.ndarray:
+        """Chunk row of each token position"""
+        return np.searchsorted(self.row_starts, positions, side='right') - 1
+
+    def pages_of(self, positions: np.ndarray) -> np.ndarray:
+        """Page number of each token position (0 if before the first page marker)"""
+        if len(self.page_starts) == 0:
+            return np.zeros(len(positions), dtype=np.int32)
+        page_idx = np.searchsorted(self.page_starts, positions, side='right') - 1
+        return np.where(page_idx >= 0, self.page_numbers[np.maximum(page_idx, 0)], 0)
+
+    def count(self, term: str) -> int:
+        """Exact number of occurrences of a term or phrase"""
+        return int(len(self.match_positions(tokenize(term))))
+
+    def find(self, term: str, offset: int = 0, limit: int = DEFAULT_OCCURRENCE_LIMIT) -> OccurrencePage:
+        """
+        Occurrences of a term or phrase (document order, paginated)
+
+        Args:
+            term: Term or phrase (normalized like the document text)
+            offset: Occurrences to skip
+            limit: Maximum occurrences returned
+
+        Returns:
+            OccurrencePage with the exact total and per-page counts of ALL occurrences
+        """
+        tokens = tokenize(term)
+        starts = self.match_positions(tokens)
+        total = int(len(starts))
+
+        page_counts = []
+        if total:
+            pages, counts = np.unique(self.pages_of(starts), return_counts=True)
+            page_counts = [(int(page), int(count)) for page, count in zip(pages, counts) if page > 0]
+
+        selected = starts[offset:offset + limit]
+        ends = selected + (len(tokens) - 1)
+        rows = self.rows_of(selected)
+        end_rows = self.rows_of(ends)
+        pages = self.pages_of(selected)
+        last_length = len(tokens[-1]) if tokens else 0
+
+        occurrences = [
+            Occurrence(
+                row=int(row),
+                start=int(self.offsets[start]),
+                end_row=int(end_row),
+                end=int(self.offsets[end]) + last_length,
+                page=int(page) or None
+            )
+            for start, end, row, end_row, page in zip(selected, ends, rows, end_rows, pages)
+        ]
+
+        return OccurrencePage(term, total, page_counts, occurrences, offset, limit)
+
+    def to_bytes(self) -> bytes:
+        """Serialize index to .npz bytes (no pickle)"""
+        vocab_blob = '\n'.join(self.vocab).encode('utf-8')
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            format_version=np.array([POSITIONAL_INDEX_FORMAT_VERSION], dtype=np.int32),
+            vocab_blob=np.frombuffer(vocab_blob, dtype=np.uint8),
+            indptr=self.indptr,
+            positions=self.positions,
+            offsets=self.offsets,
+            row_starts=self.row_starts,
+            page_starts=self.page_starts,
+            page_numbers=self.page_numbers
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'PositionalIndex':
+        """Deserialize index from .npz bytes"""
+        with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+            if int(npz['format_version'][0]) != POSITIONAL_INDEX_FORMAT_VERSION:
+                raise ValueError(f"Unsupported positional index format: {int(npz['format_version'][0])}")
+            vocab_blob = npz['vocab_blob'].tobytes().decode('utf-8')
+            return cls(
+                vocab=vocab_blob.split('\n') if vocab_blob else [],
+                indptr=npz['indptr'],
+                positions=npz['positions'],
+                offsets=npz['offsets'],
+                row_starts=npz['row_starts'],
+                page_starts=npz['page_starts'],
+                page_numbers=npz['page_numbers']
+            )
+
+
+def overlap_length(previous: str, text: str) -> int:
+    """
+    Length of the text shared by two consecutive chunks (suffix of previous == prefix of text)
+
+    Args:
+        previous: Text of the previous chunk
+        text: Text of the chunk
+
+    Returns:
+        Overlap in characters (0 if below MIN_OVERLAP_CHARS)
+    """
+    probe = text[:2 * MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+
+    best = 0
+    position = previous.rfind(probe)
+    while position != -1:
+        if text.startswith(previous[position:]):
+            best = len(previous) - position  # Earlier match = longer overlap
+        if position == 0:
+            break
+        position = previous.rfind(probe, 0, position + len(probe) - 1)
+    return best if best >= MIN_OVERLAP_CHARS else 0
+
+
+def build_positional_index(chunks: List[Dict[str, Any]]) -> PositionalIndex:
+    """
+    Build positional index from chunks
+
+    Each token belongs to exactly one chunk: tokens starting in the overlap
+    with the next chunk are indexed there, and a word cut at the start of a
+    chunk is indexed in the previous one.
+
+    Args:
+        chunks: Document chunks ('text' key, document order)
+
+    Returns:
+        PositionalIndex
+    """
+    texts = [(chunk.get('text') or '') if isinstance(chunk, dict) else '' for chunk in chunks]
+    overlaps = [0] + [overlap_length(texts[row - 1], texts[row]) for row in range(1, len(texts))] + [0]
+
+    term_ids: Dict[str, int] = {}
+    postings: List[List[int]] = []
+    offsets: List[int] = []
+    row_starts = np.zeros(len(texts) + 1, dtype=np.int64)
+    page_starts: List[int] = []
+    page_numbers: List[int] = []
+    position = 0
+
+    for row, text in enumerate(texts):
+        row_starts[row] = position
+        owned_end = len(text) - overlaps[row + 1]
+
+        # A word cut by the chunk start belongs to the previous chunk
+        previous_end = len(texts[row - 1]) - overlaps[row] if row else 0
+        skip_first = bool(overlaps[row]) and previous_end > 0 and texts[row - 1][previous_end - 1].isalnum()
+
+        folded = fold_text(text)
+        markers = [(m.start(), m.end(), int(m.group(1))) for m in PAGE_MARKER_RE.finditer(folded)]
+        for start, end, _ in markers:
+            folded = folded[:start] + ' ' * (end - start) + folded[end:]
+        markers = [(start, page) for start, _, page in markers if start < owned_end]
+        next_marker = 0
+
+        for match in TOKEN_RE.finditer(folded):
+            start = match.start()
+            if start >= owned_end:
+                break
+
+            while next_marker < len(markers) and markers[next_marker][0] <= start:
+                page = markers[next_marker][1]
+                if not page_numbers or page_numbers[-1] != page:
+                    page_starts.append(position)
+                    page_numbers.append(page)
+                next_marker += 1
+
+            if start == 0 and skip_first:
+                continue
+
+            token = match.group()
+            term_id = term_ids.get(token)
+            if term_id is None:
+                term_id = term_ids[token] = len(postings)
+                postings.append([])
+            postings[term_id].append(position)
+            offsets.append(start)
+            position += 1
+
+        for _, page in markers[next_marker:]:
+            if not page_numbers or page_numbers[-1] != page:
+                page_starts.append(position)
+                page_numbers.append(page)
+
+    row_starts[len(texts)] = position
+
+    # CSR over the sorted vocabulary
+    vocab = sorted(term_ids)
+    lengths = np.array([len(postings[term_ids[term]]) for term in vocab], dtype=np.int64)
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    flat_positions = np.fromiter(
+        (pos for term in vocab for pos in postings[term_ids[term]]),
+        dtype=np.int32,
+        count=int(indptr[-1])
+    )
+
+    index = PositionalIndex(
+        vocab=vocab,
+        indptr=indptr,
+        positions=flat_positions,
+        offsets=np.asarray(offsets, dtype=np.int32),
+        row_starts=row_starts,
+        page_starts=np.asarray(page_starts, dtype=np.int64),
+        page_numbers=np.asarray(page_numbers, dtype=np.int32)
+    )
+    logger.info(f"[POSITIONS] Indexed {index.num_tokens} tokens ({len(vocab)} terms, {len(page_numbers)} pages)")
+    return index
+
+
+def make_snippet(chunks: List[Dict[str, Any]], occurrence: Occurrence, context_chars: int = 80) -> str:
+    """
+    Text around an occurrence (single line)
+
+    Args:
+        chunks: Document chunks the index was built from
+        occurrence: Occurrence from PositionalIndex.find
+        context_chars: Characters kept before and after the match
+
+    Returns:
+        Snippet text
+    """
+    text = chunks[occurrence.row].get('text', '')
+    if occurrence.end_row != occurrence.row:
+        end = len(text)  # Phrase continues in the next chunk
+    else:
+        end = min(occurrence.end + context_chars, len(text))
+    start = max(occurrence.start - context_chars, 0)
+
+    snippet = ' '.join(PAGE_MARKER_RE.sub(' ', text[start:end]).split())
+    return f"{'...' if start > 0 else ''}{snippet}{'...' if end < len(text) else ''}"
+
+
+def positions_path_for(metadata_path: str) -> str:
+    """
+    Positional index file next to a local metadata file
+
+    Args:
+        metadata_path: '<name>_metadata.json' (memvidBeta layout)
+
+    Returns:
+        '<name>_positions.npz'
+    """
+    if metadata_path.endswith('_metadata.json'):
+        return metadata_path[:-len('_metadata.json')] + '_positions.npz'
+    return os.path.splitext(metadata_path)[0] + '_positions.npz'
+
+
+def write_positions_file(metadata_path: str, chunks: List[Dict[str, Any]]) -> Optional[PositionalIndex]:
+    """
+    Build the positional index of a local document and save it next to its metadata
+
+    Args:
+        metadata_path: Path of the document metadata JSON
+        chunks: Document chunks
+
+    Returns:
+        PositionalIndex, or None if it could not be built
+    """
+    try:
+        index = build_positional_index(chunks)
+    except Exception as e:
+        logger.warning(f"[POSITIONS] Failed to build positional index for {metadata_path}: {e}")
+        return None
+
+    try:
+        with open(positions_path_for(metadata_path), 'wb') as f:
+            f.write(index.to_bytes())
+    except OSError as e:
+        logger.warning(f"[POSITIONS] Failed to save positional index for {metadata_path}: {e}")
+    return index
+
+
+# Local documents (memvidBeta): metadata path -> (metadata mtime/size, index)
+_local_indexes: Dict[str, Tuple[str, Optional[PositionalIndex]]] = {}
+_local_lock = threading.Lock()
+
+
+def load_local_positional_index(metadata_path: str, chunks: List[Dict[str, Any]]) -> Optional[PositionalIndex]:
+    """
+    Positional index of a local document (cached per process)
+
+    Read from '<name>_positions.npz', or built from the chunks and saved
+    there for documents encoded before it existed.
+
+    Args:
+        metadata_path: Path of the document metadata JSON
+        chunks: Document chunks (from the same metadata file)
+
+    Returns:
+        PositionalIndex (shared, read-only) or None
+    """
+    stat = os.stat(metadata_path)
+    version = f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    with _local_lock:
+        cached = _local_indexes.get(metadata_path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    index = None
+    index_path = positions_path_for(metadata_path)
+    try:
+        if os.path.exists(index_path) and os.stat(index_path).st_mtime_ns >= stat.st_mtime_ns:
+            with open(index_path, 'rb') as f:
+                index = PositionalIndex.from_bytes(f.read())
+            if index.num_chunks != len(chunks):
+                index = None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"[POSITIONS] Ignoring positional index {index_path}: {e}")
+        index = None
+
+    if index is None:
+        index = write_positions_file(metadata_path, chunks)
+
+    with _local_lock:
+        _local_indexes[metadata_path] = (version, index)
+    return index
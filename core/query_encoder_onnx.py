@@ -0,0 +1,340 @@
+"""
+ONNX Runtime Query Encoder for the bi-encoder embedding model
+
+Query embeddings were computed with SentenceTransformer on PyTorch CPU inside
+each gunicorn worker: torch import at startup plus per-query PyTorch latency.
+This module runs the same model with ONNX Runtime:
+
+1. One-time export (cached under ~/.cache/huggingface/onnx, like ONNXReranker)
+2. Optional int8 dynamic quantisation of the exported graph
+3. Mean-pooling head in NumPy, verified at export time:
+   - Pooling config of the sentence-transformers model must be mean pooling
+   - ONNX embeddings are compared with the PyTorch model on reference
+     sentences (minimum cosine similarity per variant)
+
+Loading a verified export needs only onnxruntime + a tokenizer (no torch).
+The export itself needs optimum[onnxruntime] and sentence-transformers.
+
+Select with QUERY_EMBEDDING_BACKEND=onnx (fp32) or onnx-int8.
+"""
+
+from typing import List, Dict, Any, Optional, Union
+import json
+import logging
+import os
+import time
+import numpy as np
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Threads per ONNX session (0 = onnxruntime default, one per core)
+ONNX_ENCODER_THREADS = int(os.getenv('ONNX_ENCODER_THREADS', '0'))
+
+ENCODER_CONFIG_FILENAME = 'encoder_config.json'
+FP32_MODEL_FILENAME = 'model.onnx'
+INT8_MODEL_FILENAME = 'model_int8.onnx'
+
+# Minimum cosine similarity to the PyTorch model on the reference sentences
+MIN_COSINE = {'fp32': 0.9999, 'int8': 0.98}
+
+# Reference sentences for the export check (Italian first, like the documents)
+VERIFICATION_SENTENCES = [
+    "Qual è la ricetta tradizionale della carbonara romana?",
+    "Riassumi il capitolo sulla rivoluzione industriale in Inghilterra.",
+    "Chi ha firmato il contratto di locazione e quando scade?",
+    "Elenca i requisiti di sicurezza per l'installazione dell'impianto elettrico.",
+    "What are the main findings of the clinical study?",
+    "ossobuco alla milanese",
+    "Art. 1341 c.c. clausole vessatorie",
+    "Quali sono gli effetti collaterali più comuni del farmaco descritto nel foglietto illustrativo, "
+    "e in quali casi è necessario interrompere immediatamente il trattamento e consultare un medico?"
+]
+
+
+def _onnx_cache_path(model_name: str) -> Path:
+    """Export directory for a model (same cache root as the ONNX rerankers)"""
+    cache_dir = Path.home() / ".cache" / "huggingface" / "onnx"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir / model_name.replace("/", "_")
+
+
+def _read_pooling_config(model_name: str) -> Dict[str, Any]:
+    """
+    Read pooling, normalization and max length of a sentence-transformers model
+
+    Raises:
+        ValueError: If the model does not use plain mean pooling
+    """
+    from huggingface_hub import hf_hub_download
+
+    def load_json(filename: str) -> Dict[str, Any]:
+        try:
+            with open(hf_hub_download(model_name, filename), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    modules = load_json('modules.json') or []
+    module_types = [module.get('type', '') for module in modules]
+    pooling_path = next(
+        (module['path'] for module in modules if module.get('type', '').endswith('Pooling')),
+        '1_Pooling'
+    )
+    pooling = load_json(f"{pooling_path}/config.json")
+
+    if not pooling.get('pooling_mode_mean_tokens', False) or any(
+        pooling.get(mode, False) for mode in (
+            'pooling_mode_cls_token', 'pooling_mode_max_tokens', 'pooling_mode_mean_sqrt_len_tokens'
+        )
+    ):
+        raise ValueError(f"{model_name}: only mean pooling is supported (pooling config: {pooling})")
+
+    if any(module_type.endswith('Dense') for module_type in module_types):
+        raise ValueError(f"{model_name}: Dense layers after pooling are not supported")
+
+    return {
+        'max_seq_length': load_json('sentence_bert_config.json').get('max_seq_length', 512),
+        'normalize': any(module_type.endswith('Normalize') for module_type in module_types),
+        'dimension': pooling.get('word_embedding_dimension')
+    }
+
+
+def mean_pool(token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """
+    Mean pooling over non-padding tokens (sentence-transformers Pooling, mean mode)
+
+    Args:
+        token_embeddings: Last hidden state (batch, tokens, dim)
+        attention_mask: Attention mask (batch, tokens)
+
+    Returns:
+        Sentence embeddings (batch, dim), float32
+    """
+    mask = attention_mask.astype(np.float32)[:, :, None]
+    summed = (token_embeddings.astype(np.float32) * mask).sum(axis=1)
+    counts = np.clip(mask.sum(axis=1), 1e-9, None)
+    return summed / counts
+
+
+def cosine_agreement(expected: np.ndarray, actual: np.ndarray) -> np.ndarray:
+    """Row-wise cosine similarity between two embedding matrices"""
+    expected = np.asarray(expected, dtype=np.float32)
+    actual = np.asarray(actual, dtype=np.float32)
+    norms = np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1)
+    return (expected * actual).sum(axis=1) / np.clip(norms, 1e-12, None)
+
+
+def export_onnx_encoder(model_name: str, quantize: bool = False) -> Path:
+    """
+    Export a sentence-transformers model to ONNX, quantize and verify it (one time)
+
+    Args:
+        model_name: HuggingFace model ID
+        quantize: Also produce and verify the int8 dynamic-quantized graph
+
+    Returns:
+        Export directory (contains encoder_config.json with verification results)
+
+    Raises:
+        ValueError: If the pooling head is unsupported or verification fails
+    """
+    export_path = _onnx_cache_path(model_name)
+    config_file = export_path / ENCODER_CONFIG_FILENAME
+    config = {}
+    if config_file.exists():
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+    start = time.time()
+
+    if not (export_path / FP32_MODEL_FILENAME).exists():
+        logger.info("[ONNX-ENCODER] First-time setup: Converting PyTorch → ONNX (one time only)")
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+            from transformers import AutoTokenizer
+        except ImportError:
+            logger.error("optimum[onnxruntime] not installed. Install with: pip install optimum[onnxruntime]")
+            raise
+
+        model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+        model.save_pretrained(str(export_path))
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(str(export_path))
+        config = {}
+
+    if quantize and not (export_path / INT8_MODEL_FILENAME).exists():
+        logger.info("[ONNX-ENCODER] Quantizing weights to int8 (dynamic quantization)")
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantize_dynamic(
+            str(export_path / FP32_MODEL_FILENAME),
+            str(export_path / INT8_MODEL_FILENAME),
+            weight_type=QuantType.QInt8
+        )
+        config.get('verification', {}).pop('int8', None)
+
+    if not config.get('model_name'):
+        config = {'model_name': model_name, **_read_pooling_config(model_name), 'verification': {}}
+
+    # Numerical check of the pooling head against the PyTorch model
+    variants = ['fp32', 'int8'] if quantize else ['fp32']
+    pending = [variant for variant in variants if variant not in config['verification']]
+    if pending:
+        from sentence_transformers import SentenceTransformer
+
+        reference = SentenceTransformer(model_name).encode(VERIFICATION_SENTENCES, convert_to_tensor=False)
+
+        for variant in pending:
+            encoder = ONNXQueryEncoder._from_export(export_path, config, variant)
+            agreement = cosine_agreement(reference, encoder.encode(VERIFICATION_SENTENCES))
+            min_cosine = float(agreement.min())
+
+            logger.info(f"[ONNX-ENCODER] {variant} cosine vs PyTorch: min={min_cosine:.6f} mean={agreement.mean():.6f}")
+            if min_cosine < MIN_COSINE[variant]:
+                raise ValueError(
+                    f"{model_name} ({variant}): ONNX embeddings disagree with PyTorch "
+                    f"(min cosine {min_cosine:.6f} < {MIN_COSINE[variant]})"
+                )
+            config['verification'][variant] = {
+                'min_cosine': round(min_cosine, 6),
+                'mean_cosine': round(float(agreement.mean()), 6)
+            }
+
+    with open(config_file, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+
+    logger.info(f"[ONNX-ENCODER] Export ready in {(time.time()-start):.1f}s: {export_path}")
+    return export_path
+
+
+class ONNXQueryEncoder:
+    """
+    Bi-encoder on ONNX Runtime with a NumPy mean-pooling head
+
+    Drop-in for the SentenceTransformer.encode calls of the query engine:
+    encode(str) returns one vector, encode(list) returns a matrix.
+    """
+
+    def __init__(self, model_name: str, quantize: bool = False):
+        """
+        Load a verified export (exporting and verifying it first if needed)
+
+        Args:
+            model_name: HuggingFace model ID
+            quantize: Use the int8 dynamic-quantized graph
+        """
+        variant = 'int8' if quantize else 'fp32'
+        export_path = _onnx_cache_path(model_name)
+        config = self._load_verified_config(export_path, variant)
+
+        if config is None:
+            export_onnx_encoder(model_name, quantize=quantize)
+            config = self._load_verified_config(export_path, variant)
+
+        self._init_session(export_path, config, variant)
+
+    @classmethod
+    def _from_export(cls, export_path: Path, config: Dict[str, Any], variant: str) -> 'ONNXQueryEncoder':
+        """Encoder over an export that is not verified yet (used by the verification itself)"""
+        encoder = cls.__new__(cls)
+        encoder._init_session(export_path, config, variant)
+        return encoder
+
+    @staticmethod
+    def _load_verified_config(export_path: Path, variant: str) -> Optional[Dict[str, Any]]:
+        """Encoder config if the export of this variant exists and passed verification"""
+        config_file = export_path / ENCODER_CONFIG_FILENAME
+        model_file = export_path / (INT8_MODEL_FILENAME if variant == 'int8' else FP32_MODEL_FILENAME)
+        if not config_file.exists() or not model_file.exists():
+            return None
+
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        return config if variant in config.get('verification', {}) else None
+
+    def _init_session(self, export_path: Path, config: Dict[str, Any], variant: str) -> None:
+        """Create the ONNX Runtime session and tokenizer"""
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        start = time.time()
+        model_file = export_path / (INT8_MODEL_FILENAME if variant == 'int8' else FP32_MODEL_FILENAME)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_ENCODER_THREADS > 0:
+            options.intra_op_num_threads = ONNX_ENCODER_THREADS
+
+        self.model_name = config['model_name']
+        self.variant = variant
+        self.max_seq_length = config['max_seq_length']
+        self.normalize = config['normalize']
+        self.session = ort.InferenceSession(str(model_file), options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(str(export_path))
+
+        logger.info(
+            f"[ONNX-ENCODER] {self.model_name} ({variant}) loaded in {(time.time()-start)*1000:.1f}ms "
+            f"(max length {self.max_seq_length})"
+        )
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        convert_to_tensor: bool = False,
+        **kwargs
+    ) -> np.ndarray:
+        """
+        Encode sentences (SentenceTransformer.encode compatible subset)
+
+        Args:
+            sentences: One sentence or a list of sentences
+            batch_size: Inference batch size
+            convert_to_tensor: Ignored (always NumPy)
+
+        Returns:
+            Embedding vector for a string, embedding matrix for a list
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings = []
+
+        for i in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[i:i + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feed = {name: value.astype(np.int64) for name, value in inputs.items() if name in self.input_names}
+            token_embeddings = self.session.run(None, feed)[0]
+            embeddings.append(mean_pool(token_embeddings, inputs['attention_mask']))
+
+        result = np.vstack(embeddings) if embeddings else np.empty((0, 0), dtype=np.float32)
+        if self.normalize:
+            result /= np.clip(np.linalg.norm(result, axis=1, keepdims=True), 1e-12, None)
+
+        return result[0] if single else result
+
+
+# Singletons (per model and variant)
+_instances: Dict[str, ONNXQueryEncoder] = {}
+
+
+def get_onnx_query_encoder(model_name: str, quantize: bool = False) -> ONNXQueryEncoder:
+    """
+    Get singleton ONNX query encoder
+
+    Args:
+        model_name: HuggingFace model ID
+        quantize: Use the int8 dynamic-quantized graph
+
+    Returns:
+        ONNXQueryEncoder instance
+    """
+    key = f"{model_name}:{'int8' if quantize else 'fp32'}"
+    if key not in _instances:
+        _instances[key] = ONNXQueryEncoder(model_name, quantize=quantize)
+    return _instances[key]
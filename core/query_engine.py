@@ -5,18 +5,50 @@ Uses metadata JSON from memvid processing + sentence-transformers for retrieval
 
 import os
 import json
+import time
 import logging
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Keyword scoring over the inverted index: 'tf' (ATSW-boosted term frequency,
+# same ranking as the original loop) or 'bm25'
+KEYWORD_SCORING = os.getenv('KEYWORD_SCORING', 'tf').lower()
+
+# Per-document cache of ATSW term analyzers (per worker)
+ATSW_CACHE_MAX_MB = int(os.getenv('ATSW_CACHE_MAX_MB', '64'))
+
+# ANN candidate pool for large documents (exact rescoring happens on this pool)
+ANN_CANDIDATE_MULTIPLIER = 4
+ANN_MIN_CANDIDATES = 200
+
+# "Find all" queries: occurrences whose chunks can enter the context, pages listed in it
+MAX_OCCURRENCE_CONTEXT = 200
+MAX_OCCURRENCE_PAGES_LISTED = 100
+
+# Query embedding runtime: 'torch' (SentenceTransformer), 'onnx' (ONNX Runtime fp32)
+# or 'onnx-int8' (dynamic int8 quantization) - see core/query_encoder_onnx.py
+QUERY_EMBEDDING_BACKEND = os.getenv('QUERY_EMBEDDING_BACKEND', 'torch').lower()
+
 # Try to import sentence-transformers for embeddings
 try:
-    from sentence_transformers import SentenceTransformer
     import numpy as np
+    if QUERY_EMBEDDING_BACKEND.startswith('onnx'):
+        # PERFORMANCE: No torch import in the worker (SentenceTransformer only as fallback)
+        SentenceTransformer = None
+        try:
+            import onnxruntime  # noqa: F401
+        except ImportError:
+            # load_encoder falls back to SentenceTransformer: only fail if that is missing too
+            import importlib.util
+            if importlib.util.find_spec('sentence_transformers') is None:
+                raise
+            logger.warning("⚠️ onnxruntime not available - query encoders fall back to SentenceTransformer")
+    else:
+        from sentence_transformers import SentenceTransformer
     EMBEDDINGS_AVAILABLE = True
-    logger.info("✅ sentence-transformers available")
+    logger.info(f"✅ Query embeddings available (backend: {QUERY_EMBEDDING_BACKEND})")
 except ImportError:
     EMBEDDINGS_AVAILABLE = False
     logger.warning("⚠️ sentence-transformers not available - using simple keyword matching")
@@ -31,6 +63,26 @@ from core.content_generators import (
     generate_analysis_prompt
 )
 
+# Result cache key scope (query type + generation parameters)
+from core.cache_manager import make_result_scope
+
+# Structural lookups ("articolo 32", "pagina 12", "ultima pagina")
+from core.structural_index import parse_structural_query
+
+# Exact occurrences ("trova tutte le occorrenze di ...", "quante volte compare ...")
+from core.positional_index import DEFAULT_OCCURRENCE_LIMIT, make_snippet, parse_occurrence_query
+
+# Embedding model registry (per-document model id)
+from core.embedding_models import DEFAULT_EMBEDDING_MODEL, FALLBACK_EMBEDDING_MODEL, get_encoder_registry
+
+# Vectorised hybrid score fusion
+from core.candidates import CandidateChunk
+from core.candidate_budget import CandidateBudget, plan_candidate_budget, score_gap_cutoff
+from core.score_fusion import ChunkScore, fuse_scores, build_chunk_scores, format_timings
+
+# Rerank backend cascade (Modal GPU, local ONNX, lightweight)
+from core.rerank_cascade import RerankResult, get_rerank_cascade
+
 # Import Universal Term Specificity Analyzer (ATSW solution)
 try:
     from core.term_specificity_analyzer import create_term_analyzer_from_chunks
@@ -51,8 +103,10 @@ class SimpleQueryEngine:
         self._model = None  # Lazy loaded
         # IMPROVED: Using multilingual MPNet model (768 dims vs 384, better for Italian)
         # Falls back to MiniLM if multilingual not available
-        self.model_name = 'sentence-transformers/paraphrase-multilingual-mpnet-base-v2'
-        self.fallback_model_name = 'all-MiniLM-L6-v2'
+        self.model_name = DEFAULT_EMBEDDING_MODEL
+        self.fallback_model_name = FALLBACK_EMBEDDING_MODEL
+        # Model id of self.model (documents embedded by other models use the encoder registry)
+        self._model_id = self.model_name
 
         # COST-OPTIMIZED: Initialize cache manager
         try:
@@ -64,8 +118,14 @@ class SimpleQueryEngine:
             logger.warning(f"[CACHE] Failed to initialize cache: {e}")
             self.cache = None
 
-        # UNIVERSAL RAG: Term specificity analyzer (lazy loaded per document)
-        self._term_analyzer = None
+        # PERFORMANCE: Process-local cache of parsed document metadata (per worker)
+        from core.document_cache import get_document_cache
+        self.document_cache = get_document_cache()
+
+        # UNIVERSAL RAG: Term specificity analyzers, built lazily per document version
+        # (the engine is shared by all users, so one analyzer per engine would mix documents)
+        from core.document_cache import SizedLRUCache
+        self._term_analyzers = SizedLRUCache(max_bytes=ATSW_CACHE_MAX_MB * 1024 * 1024, name='atsw-cache')
 
     @property
     def model(self):
@@ -74,62 +134,122 @@ class SimpleQueryEngine:
             return None
 
         if self._model is None:
-            try:
-                logger.info(f"Loading embedding model: {self.model_name}...")
-                self._model = SentenceTransformer(self.model_name)
-                logger.info(f"Embedding model loaded successfully: {self.model_name}")
-            except Exception as e:
-                logger.warning(f"Failed to load {self.model_name}: {e}")
+            registry = get_encoder_registry()
+            self._model = registry.get(self.model_name)
+
+            if self._model is None:
+                # The fallback has its own model id: documents embedded with the default
+                # model are still queried with it when it becomes loadable (_get_encoder)
                 logger.info(f"Falling back to: {self.fallback_model_name}")
-                try:
-                    self._model = SentenceTransformer(self.fallback_model_name)
-                    logger.info(f"Fallback model loaded: {self.fallback_model_name}")
-                except Exception as fallback_error:
-                    logger.error(f"Failed to load fallback model: {fallback_error}")
+                self._model = registry.get(self.fallback_model_name)
+                if self._model is None:
+                    logger.error("Failed to load fallback model")
                     return None
+                self._model_id = self.fallback_model_name
 
         return self._model
 
-    def load_document_metadata(self, metadata_source: str, is_r2_key: bool = False) -> Optional[Dict[str, Any]]:
+    def _get_encoder(self, model_id: Optional[str] = None):
+        """
+        Encoder for a document's embedding model
+
+        Args:
+            model_id: Model id of the document embeddings (None = default query model)
+
+        Returns:
+            Tuple (encoder, model id it computes)
+        """
+        model = self.model
+        if model_id is None or model_id == self._model_id:
+            return model, self._model_id
+
+        encoder = get_encoder_registry().get(model_id)
+        if encoder is None:
+            logger.warning(f"[EMBEDDING] Encoder {model_id} unavailable, using {self._model_id}")
+            return model, self._model_id
+        return encoder, model_id
+
+    def load_document_metadata(self, metadata_source: str, is_r2_key: bool = False, with_version: bool = False):
         """
         Load document metadata from JSON file or R2
 
+        PERFORMANCE: Parsed metadata is kept in the process-local document cache
+        (revalidated with ETag), so follow-up questions skip R2 and JSON decoding.
+        The returned dict is shared between requests - do not mutate it.
+
         Args:
             metadata_source: Path to metadata JSON file or R2 key
             is_r2_key: True if metadata_source is an R2 key, False if local path
+            with_version: Also return the version (ETag / Last-Modified / mtime) of the metadata
 
         Returns:
-            Metadata dict or None if error
+            Metadata dict or None if error, as (metadata, version) if with_version
         """
         try:
             if is_r2_key:
-                # Download from R2
-                from core.s3_storage import download_file
-                logger.info(f"Downloading metadata from R2: {metadata_source}")
-
-                metadata_bytes = download_file(metadata_source)
-                if not metadata_bytes:
+                # Download from R2 (through document cache)
+                metadata, version = self.document_cache.load_r2_json(metadata_source, with_version=True)
+                if not metadata:
                     logger.error(f"Failed to download metadata from R2: {metadata_source}")
-                    return None
-
-                metadata = json.loads(metadata_bytes.decode('utf-8'))
+                    return (None, None) if with_version else None
             else:
-                # Load from local file
-                with open(metadata_source, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
+                # Load from local file (through document cache)
+                metadata, version = self.document_cache.load_local_json(metadata_source, with_version=True)
 
             logger.info(f"Loaded metadata: {metadata.get('chunks_count', 0)} chunks")
-            return metadata
+            return (metadata, version) if with_version else metadata
 
         except Exception as e:
             logger.error(f"Error loading metadata from {metadata_source}: {e}")
+            return (None, None) if with_version else None
+
+    def load_document(self, metadata_source: str, is_r2_key: bool = False):
+        """
+        Load document metadata plus its binary artifact (embedding matrix, manifest)
+
+        Supports both the artifact format (metadata.json + embeddings.npy + manifest.json)
+        and legacy metadata.json files with inline embeddings.
+
+        Args:
+            metadata_source: Path to metadata JSON file or R2 key
+            is_r2_key: True if metadata_source is an R2 key, False if local path
+
+        Returns:
+            DocumentArtifact or None if error
+        """
+        from core.document_artifact import load_document_artifact
+
+        metadata, version = self.load_document_metadata(metadata_source, is_r2_key=is_r2_key, with_version=True)
+        if not metadata:
             return None
 
+        try:
+            document = load_document_artifact(metadata, metadata_source, is_r2_key, self.document_cache, version=version)
+        except Exception as e:
+            logger.error(f"Error loading document artifact for {metadata_source}: {e}")
+            from core.document_artifact import DocumentArtifact
+            document = DocumentArtifact(metadata=metadata, source_key=metadata_source, is_r2_key=is_r2_key)
+
+        logger.info(
+            f"Loaded document (format v{document.format_version}, "
+            f"embeddings: {'yes' if document.embeddings is not None else 'no'})"
+        )
+        return document
+
     def find_relevant_chunks(
         self,
         query: str,
         chunks: List[Dict[str, Any]],
-        top_k: int = 3
+        top_k: int = 3,
+        embeddings: Optional['np.ndarray'] = None,
+        embeddings_normalized: bool = False,
+        ann_index=None,
+        keyword_index=None,
+        timings: Optional[Dict[str, float]] = None,
+        document_key: Optional[str] = None,
+        term_analyzer=None,
+        query_embedding: Optional['np.ndarray'] = None,
+        embedding_model: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
         Find most relevant chunks using HYBRID SEARCH (semantic + keyword matching)
@@ -139,6 +259,17 @@ class SimpleQueryEngine:
             query: User query
             chunks: List of chunk dictionaries (may contain precomputed embeddings)
             top_k: Number of chunks to return
+            embeddings: Precomputed embedding matrix aligned with chunks (artifact format,
+                        may be a read-only memmap - never copied here)
+            embeddings_normalized: True if embedding rows are already L2-normalized
+            ann_index: Per-document FAISS index (large documents): semantic scores are then
+                       computed only for ANN candidates plus keyword candidates
+            keyword_index: Precomputed KeywordIndex for this document (vectorised keyword scores)
+            timings: Optional dict filled with per-stage durations in ms
+            document_key: Document version key (DocumentArtifact.cache_key) for per-document caches
+            term_analyzer: Precomputed ATSW analyzer from the artifact (built from chunks if None)
+            query_embedding: Query embedding if already computed (encoded here if None)
+            embedding_model: Model id of the document embeddings (None = default query model)
 
         Returns:
             List of most relevant chunks with scores (hybrid ranking)
@@ -147,104 +278,484 @@ class SimpleQueryEngine:
         if not chunks:
             return []
 
-        # UNIVERSAL RAG: Initialize term analyzer if not already done
-        if ATSW_AVAILABLE and self._term_analyzer is None:
-            logger.info("[ATSW] Initializing term specificity analyzer for this document...")
-            self._term_analyzer = create_term_analyzer_from_chunks(chunks, min_term_length=2)
-            if self._term_analyzer:
-                stats = self._term_analyzer.get_statistics_summary()
-                logger.info(f"[ATSW] Ready: {stats['total_unique_terms']} unique terms analyzed")
-            else:
-                logger.warning("[ATSW] Analyzer initialization failed - using standard hybrid search")
+        # UNIVERSAL RAG: Term specificity analyzer for THIS document (precomputed at ingest,
+        # or built from chunks and cached per document version)
+        if term_analyzer is None:
+            term_analyzer = self._get_term_analyzer(chunks, document_key)
 
         # If embeddings not available, use pure keyword matching
         if not EMBEDDINGS_AVAILABLE or self.model is None:
             return self._keyword_matching(query, chunks, top_k)
 
         try:
-            # STEP 1: Semantic search (embeddings)
-            # COST-OPTIMIZED: Check embedding cache first
-            query_embedding = None
-            if self.cache and self.cache.enabled:
-                query_embedding = self.cache.get_embedding(query)
+            records = self.score_chunks(
+                query, chunks, top_k,
+                embeddings=embeddings,
+                embeddings_normalized=embeddings_normalized,
+                ann_index=ann_index,
+                keyword_index=keyword_index,
+                timings=timings,
+                term_analyzer=term_analyzer,
+                query_embedding=query_embedding,
+                embedding_model=embedding_model
+            )
 
-            if query_embedding is None:
-                # Cache miss: compute embedding
-                query_embedding = self.model.encode(query, convert_to_tensor=False)
+            return self._build_candidates(records, chunks)
 
-                # Cache for future use
-                if self.cache and self.cache.enabled:
-                    self.cache.set_embedding(query, query_embedding)
+        except Exception as e:
+            logger.error(f"Error in hybrid search: {e}")
+            # Fallback to keyword matching
+            return self._keyword_matching(query, chunks, top_k)
 
-            # Check if chunks have precomputed embeddings inline
-            has_inline_embeddings = all('embedding' in chunk for chunk in chunks)
+    def score_chunks(
+        self,
+        query: str,
+        chunks: List[Dict[str, Any]],
+        top_k: int,
+        embeddings: Optional['np.ndarray'] = None,
+        embeddings_normalized: bool = False,
+        ann_index=None,
+        keyword_index=None,
+        timings: Optional[Dict[str, float]] = None,
+        term_analyzer=None,
+        query_embedding: Optional['np.ndarray'] = None,
+        embedding_model: Optional[str] = None
+    ) -> List[ChunkScore]:
+        """
+        Hybrid retrieval core: semantic + keyword scoring, fusion and top-k selection
 
-            if has_inline_embeddings:
-                logger.info(f"Using precomputed inline embeddings for {len(chunks)} chunks")
-                chunk_embeddings = np.array([chunk['embedding'] for chunk in chunks])
-            else:
-                logger.warning(f"No inline embeddings found, computing on-demand for {len(chunks)} chunks")
-                chunk_texts = [chunk['text'] for chunk in chunks]
-                chunk_embeddings = self.model.encode(chunk_texts, convert_to_tensor=False, show_progress_bar=True)
+        Args:
+            query: User query
+            chunks: List of chunk dictionaries
+            top_k: Number of records to return
+            embeddings: Precomputed embedding matrix aligned with chunks (may be a memmap)
+            embeddings_normalized: True if embedding rows are already L2-normalized
+            ann_index: Per-document FAISS index (large documents)
+            keyword_index: Precomputed KeywordIndex for this document
+            timings: Optional dict filled with per-stage durations in ms
+            term_analyzer: ATSW analyzer built from this document (optional)
+            query_embedding: Query embedding if already computed (encoded here if None)
+            embedding_model: Model id of the document embeddings (None = default query model)
+
+        Returns:
+            List of ChunkScore records (row + scores), best first
+        """
+        if timings is None:
+            timings = {}
+
+        # STEP 1: Semantic search (embeddings)
+        stage_start = time.perf_counter()
+
+        # COST-OPTIMIZED: Embedding cache first (see _encode_queries)
+        # The query is embedded with the document's model (see core/embedding_models.py)
+        encoder, embedding_model = self._get_encoder(embedding_model)
+        if query_embedding is None:
+            query_embedding = self._encode_queries([query], embedding_model)[0]
+
+        timings['query_embedding'] = (time.perf_counter() - stage_start) * 1000
+        stage_start = time.perf_counter()
+
+        chunk_embeddings, embeddings_normalized = self._resolve_chunk_embeddings(
+            chunks, embeddings, embeddings_normalized, encoder, len(query_embedding)
+        )
 
-            # Calculate cosine similarity
+        # Candidate rows to score (None = every chunk)
+        candidate_rows = None
+        keyword_scores = None
+
+        # Calculate cosine similarity
+        if embeddings_normalized:
+            # PERFORMANCE: Rows are unit length - cosine is a single matrix-vector
+            # product on the mapped view (no row norms, no copy of the matrix)
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            query_vector = query_vector / (np.linalg.norm(query_vector) + 1e-10)
+
+            if ann_index is not None and chunk_embeddings is embeddings:
+                # LARGE DOCUMENT: ANN candidates + keyword candidates, exact scores on the union
+                keyword_start = time.perf_counter()
+                keyword_scores = self._calculate_keyword_scores(query, chunks, keyword_index, term_analyzer)
+                timings['keyword'] = (time.perf_counter() - keyword_start) * 1000
+
+                ann_start = time.perf_counter()
+                candidate_rows = self._select_ann_candidates(query_vector, ann_index, keyword_scores, top_k)
+                timings['ann'] = (time.perf_counter() - ann_start) * 1000
+
+                keyword_scores = keyword_scores[candidate_rows]
+                stage_start = time.perf_counter()
+                semantic_scores = chunk_embeddings[candidate_rows] @ query_vector
+            else:
+                semantic_scores = chunk_embeddings @ query_vector
+        else:
             semantic_scores = np.dot(chunk_embeddings, query_embedding) / (
                 np.linalg.norm(chunk_embeddings, axis=1) * np.linalg.norm(query_embedding)
             )
 
-            # STEP 2: Keyword matching (term frequency)
-            keyword_scores = self._calculate_keyword_scores(query, chunks)
-
-            # STEP 3: Hybrid combination (weighted average)
-            # Normalize scores to [0, 1] range
-            semantic_norm = (semantic_scores - semantic_scores.min()) / (semantic_scores.max() - semantic_scores.min() + 1e-10)
-            keyword_norm = (keyword_scores - keyword_scores.min()) / (keyword_scores.max() - keyword_scores.min() + 1e-10)
-
-            # IMPROVED: Detect proper nouns in query to adjust hybrid weighting
-            has_proper_nouns = any(len(term) > 2 and term[0].isupper() and not term.isupper()
-                                  for term in query.split())
-
-            # RECIPE FIX: Detect recipe queries for special hybrid weighting
-            is_recipe = self._is_recipe_query(query)
-
-            # Combine: 70% semantic, 30% keyword (prioritize semantic understanding)
-            # BUT if keyword score is high (>0.8), boost it to catch exact matches
-            # IMPROVED: Also boost keyword weight if query contains proper nouns
-            # RECIPE FIX: Boost keyword weight to 60% for recipe queries (overcome title-content separation)
-            hybrid_scores = np.zeros(len(chunks))
-            for i in range(len(chunks)):
-                if is_recipe:
-                    # RECIPE MODE: 40% semantic, 60% keyword (keywords crucial for recipe matching)
-                    hybrid_scores[i] = 0.4 * semantic_norm[i] + 0.6 * keyword_norm[i]
-                elif keyword_norm[i] > 0.8:
-                    # Strong keyword match → boost keyword weight to 50%
-                    hybrid_scores[i] = 0.5 * semantic_norm[i] + 0.5 * keyword_norm[i]
-                elif has_proper_nouns:
-                    # Query contains proper nouns (regions, names) → boost keyword to 50%
-                    hybrid_scores[i] = 0.5 * semantic_norm[i] + 0.5 * keyword_norm[i]
-                else:
-                    # Normal: 70% semantic, 30% keyword
-                    hybrid_scores[i] = 0.7 * semantic_norm[i] + 0.3 * keyword_norm[i]
-
-            # Get top-k indices
-            top_indices = np.argsort(hybrid_scores)[-top_k:][::-1]
-
-            # Build results
-            results = []
-            for idx in top_indices:
-                chunk = chunks[idx].copy()
-                chunk['similarity_score'] = float(hybrid_scores[idx])
-                chunk['semantic_score'] = float(semantic_scores[idx])
-                chunk['keyword_score'] = float(keyword_scores[idx])
-                results.append(chunk)
-
-            logger.info(f"Hybrid search: {len(results)} chunks (semantic avg: {semantic_scores[top_indices].mean():.3f}, keyword avg: {keyword_scores[top_indices].mean():.3f})")
-            return results
+        timings['semantic'] = (time.perf_counter() - stage_start) * 1000
+
+        # STEP 2: Keyword matching (term frequency)
+        if keyword_scores is None:
+            stage_start = time.perf_counter()
+            keyword_scores = self._calculate_keyword_scores(query, chunks, keyword_index, term_analyzer)
+            timings['keyword'] = (time.perf_counter() - stage_start) * 1000
+
+        # STEP 3: Hybrid combination (vectorised, see core/score_fusion.py)
+        stage_start = time.perf_counter()
+        hybrid_scores = self._fuse_query_scores(query, semantic_scores, keyword_scores)
+
+        # Top-k with argpartition (no full sort), lightweight records
+        records = build_chunk_scores(hybrid_scores, semantic_scores, keyword_scores, top_k, candidate_rows)
+        timings['fusion'] = (time.perf_counter() - stage_start) * 1000
+
+        if records:
+            logger.info(
+                f"Hybrid search: {len(records)} chunks "
+                f"(semantic avg: {np.mean([r.semantic_score for r in records]):.3f}, "
+                f"keyword avg: {np.mean([r.keyword_score for r in records]):.3f}) | {format_timings(timings)}"
+            )
+        return records
+
+    def find_relevant_chunks_batch(
+        self,
+        queries: List[str],
+        chunks: List[Dict[str, Any]],
+        top_k: int = 3,
+        embeddings: Optional['np.ndarray'] = None,
+        embeddings_normalized: bool = False,
+        keyword_index=None,
+        timings: Optional[Dict[str, float]] = None,
+        document_key: Optional[str] = None,
+        term_analyzer=None,
+        embedding_model: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Hybrid search for several queries against ONE document in a single pass
+
+        Same ranking as find_relevant_chunks for every query (ATSW, fusion rules),
+        but all queries are encoded with one model.encode call, semantic scores come
+        from one queries x chunks matrix product and keyword postings of shared
+        terms are gathered once.
+
+        Args:
+            queries: User queries
+            chunks: List of chunk dictionaries
+            top_k: Number of chunks to return per query
+            embeddings: Precomputed embedding matrix aligned with chunks (may be a memmap)
+            embeddings_normalized: True if embedding rows are already L2-normalized
+            keyword_index: Precomputed KeywordIndex for this document
+            timings: Optional dict filled with per-stage durations in ms (whole batch)
+            document_key: Document version key (DocumentArtifact.cache_key) for per-document caches
+            term_analyzer: Precomputed ATSW analyzer from the artifact (built from chunks if None)
+            embedding_model: Model id of the document embeddings (None = default query model)
+
+        Returns:
+            One list of relevant chunks (hybrid ranking) per query, in query order
+        """
+        if not queries:
+            return []
+        if not chunks:
+            return [[] for _ in queries]
+
+        if term_analyzer is None:
+            term_analyzer = self._get_term_analyzer(chunks, document_key)
+
+        if not EMBEDDINGS_AVAILABLE or self.model is None:
+            return [self._keyword_matching(query, chunks, top_k) for query in queries]
+
+        try:
+            records_per_query = self.score_chunks_batch(
+                queries, chunks, top_k,
+                embeddings=embeddings,
+                embeddings_normalized=embeddings_normalized,
+                keyword_index=keyword_index,
+                timings=timings,
+                term_analyzer=term_analyzer,
+                embedding_model=embedding_model
+            )
+            return [self._build_candidates(records, chunks) for records in records_per_query]
 
         except Exception as e:
-            logger.error(f"Error in hybrid search: {e}")
-            # Fallback to keyword matching
-            return self._keyword_matching(query, chunks, top_k)
+            logger.error(f"Error in batch hybrid search: {e}")
+            return [self._keyword_matching(query, chunks, top_k) for query in queries]
+
+    def score_chunks_batch(
+        self,
+        queries: List[str],
+        chunks: List[Dict[str, Any]],
+        top_k: int,
+        embeddings: Optional['np.ndarray'] = None,
+        embeddings_normalized: bool = False,
+        keyword_index=None,
+        timings: Optional[Dict[str, float]] = None,
+        term_analyzer=None,
+        embedding_model: Optional[str] = None
+    ) -> List[List[ChunkScore]]:
+        """
+        Batch retrieval core: score_chunks for several queries in one pass
+
+        The embedding matrix is read once for all queries (brute force, no ANN:
+        one matrix product is cheaper than one ANN search per query).
+
+        Args:
+            queries: User queries
+            chunks: List of chunk dictionaries
+            top_k: Number of records to return per query
+            embeddings: Precomputed embedding matrix aligned with chunks (may be a memmap)
+            embeddings_normalized: True if embedding rows are already L2-normalized
+            keyword_index: Precomputed KeywordIndex for this document
+            timings: Optional dict filled with per-stage durations in ms (whole batch)
+            term_analyzer: ATSW analyzer built from this document (optional)
+            embedding_model: Model id of the document embeddings (None = default query model)
+
+        Returns:
+            One list of ChunkScore records (best first) per query
+        """
+        if timings is None:
+            timings = {}
+
+        # STEP 1: One encode call for all (uncached) queries
+        stage_start = time.perf_counter()
+        encoder, embedding_model = self._get_encoder(embedding_model)
+        query_embeddings = np.asarray(self._encode_queries(queries, embedding_model), dtype=np.float32)
+        timings['query_embedding'] = (time.perf_counter() - stage_start) * 1000
+        stage_start = time.perf_counter()
+
+        chunk_embeddings, embeddings_normalized = self._resolve_chunk_embeddings(
+            chunks, embeddings, embeddings_normalized, encoder, query_embeddings.shape[1]
+        )
+
+        # Cosine similarity for every (query, chunk) pair: one matrix product
+        query_embeddings = query_embeddings / (np.linalg.norm(query_embeddings, axis=1, keepdims=True) + 1e-10)
+        semantic_matrix = (chunk_embeddings @ query_embeddings.T).T
+        if not embeddings_normalized:
+            semantic_matrix = semantic_matrix / np.linalg.norm(chunk_embeddings, axis=1)
+        timings['semantic'] = (time.perf_counter() - stage_start) * 1000
+
+        # STEP 2: Keyword scores, postings of terms shared by several queries gathered once
+        stage_start = time.perf_counter()
+        if keyword_index is not None and keyword_index.num_chunks == len(chunks):
+            term_boosts_list = [self._query_term_boosts(query, term_analyzer) for query in queries]
+            keyword_matrix = keyword_index.score_many(term_boosts_list, bm25=KEYWORD_SCORING == 'bm25')
+        else:
+            keyword_matrix = [self._calculate_keyword_scores(query, chunks, None, term_analyzer) for query in queries]
+        timings['keyword'] = (time.perf_counter() - stage_start) * 1000
+
+        # STEP 3: Fusion + top-k per query (query-dependent rules)
+        stage_start = time.perf_counter()
+        results = []
+        for query, semantic_scores, keyword_scores in zip(queries, semantic_matrix, keyword_matrix):
+            hybrid_scores = self._fuse_query_scores(query, semantic_scores, keyword_scores)
+            results.append(build_chunk_scores(hybrid_scores, semantic_scores, keyword_scores, top_k))
+        timings['fusion'] = (time.perf_counter() - stage_start) * 1000
+
+        logger.info(f"Batch hybrid search: {len(queries)} queries x {len(chunks)} chunks | {format_timings(timings)}")
+        return results
+
+    def _encode_queries(self, queries: List[str], model_id: Optional[str] = None) -> List['np.ndarray']:
+        """
+        Encode queries, using the embedding cache and ONE model.encode call for the misses
+
+        Args:
+            queries: Query strings
+            model_id: Embedding model id (None = default query model)
+
+        Returns:
+            List of query embeddings (query order)
+        """
+        encoder, model_id = self._get_encoder(model_id)
+        query_embeddings = [None] * len(queries)
+
+        # COST-OPTIMIZED: Check embedding cache first (keys include the model id)
+        if self.cache and self.cache.enabled:
+            for i, query in enumerate(queries):
+                query_embeddings[i] = self.cache.get_embedding(query, model_id)
+
+        missing = [i for i, embedding in enumerate(query_embeddings) if embedding is None]
+        if missing:
+            # Cache miss: compute embeddings
+            if len(queries) == 1:
+                encoded = [encoder.encode(queries[0], convert_to_tensor=False)]
+            else:
+                encoded = encoder.encode([queries[i] for i in missing], convert_to_tensor=False)
+
+            for i, embedding in zip(missing, encoded):
+                query_embeddings[i] = embedding
+                # Cache for future use
+                if self.cache and self.cache.enabled:
+                    self.cache.set_embedding(queries[i], embedding, model_id)
+
+        return query_embeddings
+
+    def _resolve_chunk_embeddings(
+        self,
+        chunks: List[Dict[str, Any]],
+        embeddings: Optional['np.ndarray'],
+        embeddings_normalized: bool,
+        encoder=None,
+        query_dim: Optional[int] = None
+    ):
+        """
+        Pick the chunk embedding matrix: artifact matrix, inline embeddings or on-demand encoding
+
+        Args:
+            chunks: List of chunk dictionaries
+            embeddings: Precomputed embedding matrix aligned with chunks (may be a memmap)
+            embeddings_normalized: True if embedding rows are already L2-normalized
+            encoder: Encoder of the query (on-demand encoding, default: self.model)
+            query_dim: Query embedding dimension (precomputed embeddings of another
+                       dimension come from a model that could not be loaded)
+
+        Returns:
+            Tuple (embedding matrix, rows are L2-normalized)
+        """
+        encoder = encoder or self.model
+
+        if embeddings is not None and len(embeddings) == len(chunks):
+            if query_dim is None or embeddings.shape[1] == query_dim:
+                # ARTIFACT FORMAT: float32 matrix (memory-mapped) shared by all requests
+                logger.info(f"Using precomputed embedding matrix {embeddings.shape}")
+                return embeddings, embeddings_normalized
+            logger.warning(
+                f"[EMBEDDING] Document embeddings are {embeddings.shape[1]}-dim, query is "
+                f"{query_dim}-dim (model unavailable): re-encoding chunks"
+            )
+        elif chunks and all('embedding' in chunk for chunk in chunks) and (
+            query_dim is None or len(chunks[0]['embedding']) == query_dim
+        ):
+            logger.info(f"Using precomputed inline embeddings for {len(chunks)} chunks")
+            return np.array([chunk['embedding'] for chunk in chunks]), False
+        else:
+            logger.warning(f"No inline embeddings found, computing on-demand for {len(chunks)} chunks")
+
+        chunk_texts = [chunk['text'] for chunk in chunks]
+        return encoder.encode(chunk_texts, convert_to_tensor=False, show_progress_bar=True), False
+
+    def _fuse_query_scores(self, query: str, semantic_scores: 'np.ndarray', keyword_scores: 'np.ndarray') -> 'np.ndarray':
+        """
+        Hybrid scores for one query (fusion rules depend on the query text)
+
+        Args:
+            query: User query
+            semantic_scores: Semantic scores (one per candidate)
+            keyword_scores: Keyword scores (one per candidate)
+
+        Returns:
+            Array of hybrid scores (one per candidate)
+        """
+        # IMPROVED: Detect proper nouns in query to adjust hybrid weighting
+        has_proper_nouns = any(len(term) > 2 and term[0].isupper() and not term.isupper()
+                              for term in query.split())
+
+        # RECIPE FIX: Detect recipe queries for special hybrid weighting
+        is_recipe = self._is_recipe_query(query)
+
+        # Combine: 70% semantic, 30% keyword (prioritize semantic understanding)
+        # BUT if keyword score is high (>0.8), boost it to catch exact matches
+        # IMPROVED: Also boost keyword weight if query contains proper nouns
+        # RECIPE FIX: Boost keyword weight to 60% for recipe queries (overcome title-content separation)
+        return fuse_scores(
+            semantic_scores,
+            keyword_scores,
+            is_recipe=is_recipe,
+            has_proper_nouns=has_proper_nouns
+        )
+
+    def _build_candidates(self, records: List[ChunkScore], chunks: List[Dict[str, Any]]) -> List[CandidateChunk]:
+        """
+        Build compact candidates: row + scores over the shared chunk list
+
+        PERFORMANCE: No per-candidate dict copies and no inline embeddings; text is
+        read from the shared chunk only where needed (see core/candidates.py).
+        'chunk_row' is the row in the document embedding matrix (diversity filter).
+        """
+        return [
+            CandidateChunk(
+                chunks,
+                record.row,
+                similarity_score=record.score,
+                semantic_score=record.semantic_score,
+                keyword_score=record.keyword_score
+            )
+            for record in records
+        ]
+
+    def _get_term_analyzer(self, chunks: List[Dict[str, Any]], document_key: Optional[str] = None):
+        """
+        Get the ATSW term analyzer for a document (lazy build, cached per document version)
+
+        Args:
+            chunks: Document chunks
+            document_key: Document version key; without it the analyzer is built
+                          for this call only (never shared with another document)
+
+        Returns:
+            UniversalTermSpecificityAnalyzer or None if ATSW is unavailable
+        """
+        if not ATSW_AVAILABLE:
+            return None
+
+        def build():
+            logger.info(f"[ATSW] Initializing term specificity analyzer for {document_key or 'uncached document'}...")
+            analyzer = create_term_analyzer_from_chunks(chunks, min_term_length=2)
+            if analyzer:
+                analyzer.release_build_data()
+                stats = analyzer.get_statistics_summary()
+                logger.info(f"[ATSW] Ready: {stats['total_unique_terms']} unique terms analyzed")
+            else:
+                logger.warning("[ATSW] Analyzer initialization failed - using standard hybrid search")
+            return analyzer
+
+        if document_key is None:
+            return build()
+
+        return self._term_analyzers.get_or_build(
+            document_key,
+            builder=build,
+            size_fn=lambda analyzer: analyzer.estimate_memory_bytes()
+        )
+
+    def _select_ann_candidates(
+        self,
+        query_vector: 'np.ndarray',
+        ann_index,
+        keyword_scores: 'np.ndarray',
+        top_k: int
+    ) -> 'np.ndarray':
+        """
+        Select candidate rows for large documents: ANN neighbours UNION keyword matches
+
+        Keyword candidates are kept so exact-term matches (proper nouns, recipe names)
+        are never lost because the ANN search missed them.
+
+        Args:
+            query_vector: Normalized query embedding
+            ann_index: Per-document FAISS index
+            keyword_scores: Keyword scores for every chunk
+            top_k: Number of chunks the caller will return
+
+        Returns:
+            Sorted int64 array of candidate rows
+        """
+        from core.embedding_generator import search_similar_chunks, ANN_HNSW_EF_SEARCH
+
+        num_candidates = min(len(keyword_scores), max(top_k * ANN_CANDIDATE_MULTIPLIER, ANN_MIN_CANDIDATES))
+
+        ann_rows, _ = search_similar_chunks(query_vector, ann_index, num_candidates, ef_search=ANN_HNSW_EF_SEARCH)
+
+        keyword_rows = np.flatnonzero(keyword_scores > 0)
+        if len(keyword_rows) > num_candidates:
+            best = np.argpartition(keyword_scores[keyword_rows], -num_candidates)[-num_candidates:]
+            keyword_rows = keyword_rows[best]
+
+        candidate_rows = np.union1d(np.asarray(ann_rows, dtype=np.int64), keyword_rows.astype(np.int64))
+        if len(candidate_rows) == 0:
+            # ANN returned nothing (should not happen): score everything
+            candidate_rows = np.arange(len(keyword_scores), dtype=np.int64)
+
+        logger.info(
+            f"[ANN] {len(candidate_rows)} candidates "
+            f"({len(ann_rows)} semantic + {len(keyword_rows)} keyword) of {len(keyword_scores)} chunks"
+        )
+        return candidate_rows
 
     def _is_recipe_query(self, query: str) -> bool:
         """
@@ -274,42 +785,32 @@ class SimpleQueryEngine:
     def _calculate_keyword_scores(
         self,
         query: str,
-        chunks: List[Dict[str, Any]]
+        chunks: List[Dict[str, Any]],
+        keyword_index=None,
+        term_analyzer=None
     ) -> np.ndarray:
         """
         Calculate keyword-based scores for all chunks (TF-IDF-like)
         IMPROVED: Detects and boosts proper nouns (capitalized terms like region names, recipe names)
         UNIVERSAL RAG: Enhanced with ATSW (Adaptive Term Specificity Weighting)
+        PERFORMANCE: With a KeywordIndex, scores come from the postings of the query terms only
 
         Args:
             query: User query
             chunks: List of chunks
+            keyword_index: Precomputed KeywordIndex aligned with chunks (optional)
+            term_analyzer: ATSW analyzer built from this document (optional)
 
         Returns:
             Array of keyword scores (one per chunk)
         """
-        query_lower = query.lower()
-        query_terms = [term for term in query_lower.split() if len(term) > 2]  # Filter stopwords
+        term_boosts = self._query_term_boosts(query, term_analyzer)
 
-        # IMPROVED: Detect proper nouns in original query (before lowercasing)
-        proper_nouns = set()
-        for term in query.split():
-            # Proper noun: capitalized word that's not at start of sentence
-            if len(term) > 2 and term[0].isupper() and not term.isupper():
-                proper_nouns.add(term.lower())
-
-        # UNIVERSAL RAG: Compute term specificity weights if ATSW available
-        # CRITICAL FIX: Query is now ALWAYS clean (conversation extraction happens at API level)
-        term_weights = {}
-        if self._term_analyzer is not None:
-            try:
-                # Query is already clean - no extraction needed
-                term_weights = self._term_analyzer.compute_query_term_weights(query)
-                key_terms = self._term_analyzer.identify_key_terms(query, top_k=2)
-                logger.info(f"[ATSW] Query: '{query}' | Key terms: {key_terms} | Weights: {term_weights}")
-            except Exception as e:
-                logger.warning(f"[ATSW] Failed to compute term weights: {e}")
-                term_weights = {}
+        if keyword_index is not None and keyword_index.num_chunks == len(chunks):
+            # PERFORMANCE: Vectorised scoring over the inverted index (exact + partial matches)
+            if KEYWORD_SCORING == 'bm25':
+                return keyword_index.score_bm25(term_boosts)
+            return keyword_index.score(term_boosts)
 
         scores = np.zeros(len(chunks))
 
@@ -318,32 +819,16 @@ class SimpleQueryEngine:
                 continue
 
             text_lower = chunk['text'].lower()
+            words = text_lower.split()
 
             # Count term frequency for each query term
             score = 0
-            for term in query_terms:
-                is_proper_noun = term in proper_nouns
-
-                # UNIVERSAL RAG: Apply ATSW weighting
-                # If ATSW available, use learned weights; otherwise use heuristic boosting
-                if term in term_weights:
-                    # Use ATSW weight (0-1 range, normalized by total specificity)
-                    # RECIPE FIX: Cap boost at 4x maximum (was 6x) to prevent over-amplification
-                    # Scale: 1x to 4x range for balanced keyword emphasis
-                    term_boost_factor = 1.0 + (term_weights[term] * 3.0)  # Cap at 4x (1 + 1*3 = 4)
-                elif is_proper_noun:
-                    # Fallback: Proper noun boost (also capped at 4x)
-                    term_boost_factor = 4.0
-                else:
-                    # Fallback: Standard weight
-                    term_boost_factor = 2.0
-
+            for term, term_boost_factor in term_boosts.items():
                 # Exact term matches
                 term_count = text_lower.count(term)
                 score += term_count * term_boost_factor
 
                 # Partial matches (term as substring)
-                words = text_lower.split()
                 for word in words:
                     if term in word and term != word:  # Substring but not exact
                         score += 0.5 * term_boost_factor
@@ -352,6 +837,63 @@ class SimpleQueryEngine:
 
         return scores
 
+    def _query_term_boosts(self, query: str, term_analyzer=None) -> Dict[str, float]:
+        """
+        Boost factor per query term (ATSW weight, proper noun or default boost)
+
+        Args:
+            query: User query
+            term_analyzer: ATSW analyzer built from this document (optional)
+
+        Returns:
+            Dict lowercased query term -> boost factor
+        """
+        query_lower = query.lower()
+        query_terms = [term for term in query_lower.split() if len(term) > 2]  # Filter stopwords
+
+        # IMPROVED: Detect proper nouns in original query (before lowercasing)
+        proper_nouns = set()
+        for term in query.split():
+            # Proper noun: capitalized word that's not at start of sentence
+            if len(term) > 2 and term[0].isupper() and not term.isupper():
+                proper_nouns.add(term.lower())
+
+        # UNIVERSAL RAG: Compute term specificity weights if ATSW available
+        # CRITICAL FIX: Query is now ALWAYS clean (conversation extraction happens at API level)
+        term_weights = {}
+        if term_analyzer is not None:
+            try:
+                # Query is already clean - no extraction needed
+                term_weights = term_analyzer.compute_query_term_weights(query)
+                key_terms = term_analyzer.identify_key_terms(query, top_k=2)
+                logger.info(f"[ATSW] Query: '{query}' | Key terms: {key_terms} | Weights: {term_weights}")
+            except Exception as e:
+                logger.warning(f"[ATSW] Failed to compute term weights: {e}")
+                term_weights = {}
+
+        # Boost factor per query term (repeated terms add up, like repeated loop passes)
+        term_boosts = {}
+        for term in query_terms:
+            is_proper_noun = term in proper_nouns
+
+            # UNIVERSAL RAG: Apply ATSW weighting
+            # If ATSW available, use learned weights; otherwise use heuristic boosting
+            if term in term_weights:
+                # Use ATSW weight (0-1 range, normalized by total specificity)
+                # RECIPE FIX: Cap boost at 4x maximum (was 6x) to prevent over-amplification
+                # Scale: 1x to 4x range for balanced keyword emphasis
+                term_boost_factor = 1.0 + (term_weights[term] * 3.0)  # Cap at 4x (1 + 1*3 = 4)
+            elif is_proper_noun:
+                # Fallback: Proper noun boost (also capped at 4x)
+                term_boost_factor = 4.0
+            else:
+                # Fallback: Standard weight
+                term_boost_factor = 2.0
+
+            term_boosts[term] = term_boosts.get(term, 0.0) + term_boost_factor
+
+        return term_boosts
+
     def _keyword_matching(
         self,
         query: str,
@@ -373,22 +915,17 @@ class SimpleQueryEngine:
         query_words = set(query_lower.split())
 
         # Score each chunk by keyword overlap
-        scored_chunks = []
+        overlaps = []
         for chunk in chunks:
             text_lower = chunk['text'].lower()
             chunk_words = set(text_lower.split())
 
             # Simple overlap score
-            overlap = len(query_words & chunk_words)
-
-            chunk_copy = chunk.copy()
-            chunk_copy['similarity_score'] = overlap
-            scored_chunks.append(chunk_copy)
-
-        # Sort by score and return top-k
-        scored_chunks.sort(key=lambda x: x['similarity_score'], reverse=True)
+            overlaps.append(len(query_words & chunk_words))
 
-        return scored_chunks[:top_k]
+        # Sort by score and return top-k (compact candidates, no chunk copies)
+        rows = sorted(range(len(chunks)), key=lambda row: overlaps[row], reverse=True)[:top_k]
+        return [CandidateChunk(chunks, row, similarity_score=overlaps[row]) for row in rows]
 
     def _calculate_dynamic_retrieval_top_k(self, total_chunks: int, user_tier: str, query_type: str, query: str = "") -> int:
         """
@@ -398,6 +935,9 @@ class SimpleQueryEngine:
         Then reranking filters to top chunks (high precision)
 
         RECIPE FIX: Higher coverage for recipe queries to overcome title-content separation
+
+        PERFORMANCE: Only an upper bound now - _plan_candidate_budget caps it by tier
+        latency target and reranker limits
         """
         # RECIPE FIX: Detect recipe queries and apply higher coverage
         is_recipe = self._is_recipe_query(query) if query else False
@@ -423,6 +963,29 @@ class SimpleQueryEngine:
             else:
                 return int(total_chunks * 0.20)  # Very large: 20% (was 15%)
 
+    def _plan_candidate_budget(
+        self,
+        total_chunks: int,
+        final_top_k: int,
+        user_tier: str,
+        query_type: str,
+        query: str = ""
+    ) -> CandidateBudget:
+        """
+        Candidate budget for the reranking stage (see core/candidate_budget.py)
+
+        The percentage-of-document retrieval size is only an upper bound; tier latency
+        targets and reranker limits keep rerank latency bounded as documents grow.
+        """
+        return plan_candidate_budget(
+            total_chunks=total_chunks,
+            coverage_top_k=self._calculate_dynamic_retrieval_top_k(total_chunks, user_tier, query_type, query),
+            final_top_k=final_top_k,
+            user_tier=user_tier,
+            query_type=query_type,
+            use_modal=get_rerank_cascade().primary_backend() == 'modal'
+        )
+
     def _calculate_final_top_k(self, query_type: str, user_tier: str, query: str = "") -> int:
         """
         Calculate final chunks for LLM after reranking (high precision)
@@ -454,6 +1017,252 @@ class SimpleQueryEngine:
 
         return base_top_k
 
+    def _rerank_candidates(
+        self,
+        query: str,
+        candidate_chunks: List[CandidateChunk],
+        final_top_k: int,
+        embeddings: Optional['np.ndarray'] = None,
+        document_key: Optional[str] = None
+    ) -> RerankResult:
+        """
+        STAGE 2: Rerank candidates through the backend cascade (see core/rerank_cascade.py)
+
+        Modal GPU cross-encoder, local ONNX cross-encoder, lightweight diversity
+        reranker: first available backend within its latency budget wins.
+
+        Args:
+            query: User query
+            candidate_chunks: Candidates from find_relevant_chunks
+            final_top_k: Number of chunks to keep
+            embeddings: Document embedding matrix (diversity filter)
+            document_key: Document version key (rerank score cache)
+
+        Returns:
+            RerankResult (chunks, at most final_top_k, and the backend used)
+        """
+        return get_rerank_cascade().rerank(
+            query, candidate_chunks, final_top_k, embeddings=embeddings, document_key=document_key
+        )
+
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        metadata_file: str = None,
+        metadata_r2_key: str = None,
+        top_k: int = None,
+        user_tier: str = 'free',
+        query_type: str = 'query'
+    ) -> Dict[str, Any]:
+        """
+        Retrieve candidate chunks for several queries against one document (no rerank, no LLM)
+
+        The document is loaded once and all queries are scored in a single pass
+        (see find_relevant_chunks_batch). Used by multi-query tools and evaluation jobs.
+
+        Args:
+            queries: User queries
+            metadata_file: Path to document metadata JSON (local)
+            metadata_r2_key: R2 key for metadata JSON (cloud)
+            top_k: Chunks per query (default: dynamic retrieval size for the document)
+            user_tier: User subscription tier (affects default retrieval size)
+            query_type: Type of query (affects default retrieval size)
+
+        Returns:
+            Dict with 'success', 'results' (one {'query', 'chunks'} per query) and 'metadata'
+        """
+        timings = {}
+        stage_start = time.perf_counter()
+
+        if metadata_r2_key:
+            document = self.load_document(metadata_r2_key, is_r2_key=True)
+        elif metadata_file:
+            document = self.load_document(metadata_file, is_r2_key=False)
+        else:
+            logger.error("No metadata source provided (neither R2 key nor local file)")
+            return {'success': False, 'results': [], 'metadata': {'error': 'no_metadata_source'}}
+
+        if not document:
+            return {'success': False, 'results': [], 'metadata': {'error': 'metadata_load_failed'}}
+        if not document.chunks:
+            return {'success': False, 'results': [], 'metadata': {'error': 'no_chunks'}}
+
+        if top_k is None:
+            # Same candidate budget as query_document (recipe queries get more coverage)
+            top_k = max(
+                self._plan_candidate_budget(
+                    len(document.chunks),
+                    self._calculate_final_top_k(query_type, user_tier, query),
+                    user_tier, query_type, query
+                ).max_candidates
+                for query in queries
+            ) if queries else 0
+
+        from core.document_artifact import load_keyword_index, load_term_analyzer
+        keyword_index = load_keyword_index(document, self.document_cache)
+        term_analyzer = load_term_analyzer(document, self.document_cache) if ATSW_AVAILABLE else None
+        timings['load'] = (time.perf_counter() - stage_start) * 1000
+
+        chunks_per_query = self.find_relevant_chunks_batch(
+            queries, document.chunks, top_k,
+            embeddings=document.embeddings,
+            embeddings_normalized=document.embeddings_normalized,
+            keyword_index=keyword_index,
+            timings=timings,
+            document_key=document.cache_key,
+            term_analyzer=term_analyzer,
+            embedding_model=document.embedding_model.model_id if document.embeddings is not None else None
+        )
+
+        logger.info(f"[BATCH] {len(queries)} queries, top_k {top_k} | [TIMING] {format_timings(timings)}")
+
+        return {
+            'success': True,
+            'results': [
+                {'query': query, 'chunks': query_chunks}
+                for query, query_chunks in zip(queries, chunks_per_query)
+            ],
+            'metadata': {
+                'queries': len(queries),
+                'top_k': top_k,
+                'chunks_total': len(document.chunks),
+                'timings_ms': {stage: round(ms, 1) for stage, ms in timings.items()}
+            }
+        }
+
+    def find_occurrences(
+        self,
+        term: str,
+        metadata_file: str = None,
+        metadata_r2_key: str = None,
+        offset: int = 0,
+        limit: int = DEFAULT_OCCURRENCE_LIMIT,
+        context_chars: int = 80
+    ) -> Dict[str, Any]:
+        """
+        All occurrences of a term or phrase in a document (exact total, paginated, no LLM)
+
+        Args:
+            term: Term or phrase (case and accents are ignored)
+            metadata_file: Path to document metadata JSON (local)
+            metadata_r2_key: R2 key for metadata JSON (cloud)
+            offset: Occurrences to skip
+            limit: Maximum occurrences returned
+            context_chars: Snippet characters before and after each occurrence
+
+        Returns:
+            Dict with 'success', 'total', 'pages' (page, count), 'occurrences' and 'metadata'
+        """
+        timings = {}
+        stage_start = time.perf_counter()
+
+        if metadata_r2_key:
+            document = self.load_document(metadata_r2_key, is_r2_key=True)
+        elif metadata_file:
+            document = self.load_document(metadata_file, is_r2_key=False)
+        else:
+            logger.error("No metadata source provided (neither R2 key nor local file)")
+            return {'success': False, 'total': 0, 'occurrences': [], 'metadata': {'error': 'no_metadata_source'}}
+
+        if not document:
+            return {'success': False, 'total': 0, 'occurrences': [], 'metadata': {'error': 'metadata_load_failed'}}
+
+        from core.document_artifact import load_positional_index
+        positional_index = load_positional_index(document, self.document_cache)
+        if positional_index is None:
+            return {'success': False, 'total': 0, 'occurrences': [], 'metadata': {'error': 'positional_index_unavailable'}}
+        timings['load'] = (time.perf_counter() - stage_start) * 1000
+
+        stage_start = time.perf_counter()
+        found = positional_index.find(term, offset=offset, limit=limit)
+        timings['search'] = (time.perf_counter() - stage_start) * 1000
+
+        logger.info(f"[POSITIONS] '{term}': {found.total} occurrences in {len(found.pages)} pages | [TIMING] {format_timings(timings)}")
+
+        return {
+            'success': True,
+            'term': term,
+            'total': found.total,
+            'pages': [{'page': page, 'count': count} for page, count in found.pages],
+            'occurrences': [
+                {
+                    'chunk_index': (document.chunks[occurrence.row].get('metadata') or {}).get('index', occurrence.row),
+                    'page': occurrence.page,
+                    'start': occurrence.start,
+                    'end': occurrence.end if occurrence.end_row == occurrence.row else None,
+                    'snippet': make_snippet(document.chunks, occurrence, context_chars)
+                }
+                for occurrence in found.occurrences
+            ],
+            'offset': offset,
+            'limit': limit,
+            'has_more': found.has_more,
+            'metadata': {
+                'chunks_total': len(document.chunks),
+                'timings_ms': {stage: round(ms, 1) for stage, ms in timings.items()}
+            }
+        }
+
+    def search_library(self, query: str, library_index, top_k: int = 10) -> Dict[str, Any]:
+        """
+        Search all documents of a user's library (no rerank, no LLM)
+
+        Args:
+            query: User query
+            library_index: LibraryIndex of the user (already synced with the database)
+            top_k: Number of hits to return
+
+        Returns:
+            Dict with 'success', 'results' (hits with document/page/section attribution) and 'metadata'
+        """
+        timings = {}
+
+        # Documents may be embedded by different models: one query vector per model,
+        # encoded on first use (see core/embedding_models.py)
+        query_vectors = {}
+
+        def query_vector_for(model_id: Optional[str]) -> Optional['np.ndarray']:
+            if model_id not in query_vectors:
+                query_vectors[model_id] = None
+                if EMBEDDINGS_AVAILABLE and self.model is not None:
+                    encoder_start = time.perf_counter()
+                    _, encoded_model = self._get_encoder(model_id)
+                    vector = np.asarray(self._encode_queries([query], encoded_model)[0], dtype=np.float32)
+                    query_vectors[model_id] = vector / (np.linalg.norm(vector) + 1e-10)
+                    timings['query_embedding'] = timings.get('query_embedding', 0.0) + (
+                        (time.perf_counter() - encoder_start) * 1000
+                    )
+            return query_vectors[model_id]
+
+        # Library-wide search: heuristic term boosts (ATSW statistics are per document)
+        stage_start = time.perf_counter()
+        hits = library_index.search(
+            query_vector_for,
+            self._query_term_boosts(query),
+            top_k,
+            fuse=lambda semantic, keyword: self._fuse_query_scores(query, semantic, keyword),
+            keyword_scoring=KEYWORD_SCORING
+        )
+        timings['search'] = (time.perf_counter() - stage_start) * 1000 - timings.get('query_embedding', 0.0)
+
+        stage_start = time.perf_counter()
+        results = library_index.attribute(hits)
+        timings['attribution'] = (time.perf_counter() - stage_start) * 1000
+
+        logger.info(
+            f"[LIBRARY] {len(results)} hits across {len({r['document_id'] for r in results})} documents "
+            f"| [TIMING] {format_timings(timings)}"
+        )
+
+        return {
+            'success': True,
+            'results': results,
+            'metadata': {
+                'documents_searched': len(library_index.documents),
+                'timings_ms': {stage: round(ms, 1) for stage, ms in timings.items()}
+            }
+        }
+
     def query_document(
         self,
         query: str,
@@ -475,6 +1284,8 @@ class SimpleQueryEngine:
             query: User's question or command
             metadata_file: Path to document metadata JSON (local)
             metadata_r2_key: R2 key for metadata JSON (cloud)
+            embeddings_r2_key: Unused (embeddings are resolved from the artifact manifest)
+            faiss_r2_key: R2 key for the per-document ANN index (used for large documents)
             top_k: Number of chunks to retrieve
             max_tokens: Max tokens in LLM response
             temperature: LLM temperature
@@ -511,19 +1322,52 @@ class SimpleQueryEngine:
         logger.info(f"Processing {query_type} (tier: {user_tier}, top_k: {top_k}): {query[:100]}")
 
         # COST-OPTIMIZED: Check result cache first
-        # Cache key includes doc_id to ensure correct document
+        # Cache key includes doc_id to ensure correct document, and the query type and
+        # generation parameters (a quiz and a summary of the same text are different results)
         doc_id = metadata_r2_key or metadata_file
-        if self.cache and self.cache.enabled and doc_id:
-            cached_result = self.cache.get_result(query, doc_id)
+        cache_enabled = bool(self.cache and self.cache.enabled and doc_id)
+        cache_scope = make_result_scope(query_type, {
+            'tier': user_tier,
+            'top_k': top_k,
+            'max_tokens': max_tokens,
+            'temperature': temperature,
+            'params': command_params
+        })
+        query_embedding = None
+        semantic_audit = None
+        occurrence_term = parse_occurrence_query(query) if query_type == 'query' else None
+        structural_query = parse_structural_query(query) if query_type == 'query' and not occurrence_term else None
+        if cache_enabled:
+            cached_result = self.cache.get_result(query, doc_id, cache_scope)
             if cached_result:
                 logger.info(f"[CACHE HIT] Returning cached result (zero cost, zero latency)")
                 return cached_result
 
-        # Load document metadata (prefer R2, fallback to local)
+            # Near-duplicate query (different phrasing) on the same document and scope
+            # Structural / occurrence queries are exact-match only: "articolo 32" and "articolo 33" embed almost identically
+            if EMBEDDINGS_AVAILABLE and self.model is not None and structural_query is None and not occurrence_term:
+                try:
+                    query_embedding = self._encode_queries([query])[0]
+                except Exception as e:
+                    logger.warning(f"[CACHE] Query embedding for semantic lookup failed: {e}")
+
+            if query_embedding is not None:
+                match = self.cache.get_similar_result(query, query_embedding, doc_id, cache_scope)
+                if match and not match.audit:
+                    logger.info(f"[CACHE HIT] Returning semantic match (similarity {match.similarity:.3f})")
+                    return match.result
+                # Sampled hit: answer normally and compare with the cached result
+                semantic_audit = match
+
+        # PERFORMANCE: Per-stage timings (ms), logged and returned in result metadata
+        timings = {}
+        stage_start = time.perf_counter()
+
+        # Load document metadata + artifact (prefer R2, fallback to local)
         if metadata_r2_key:
-            metadata = self.load_document_metadata(metadata_r2_key, is_r2_key=True)
+            document = self.load_document(metadata_r2_key, is_r2_key=True)
         elif metadata_file:
-            metadata = self.load_document_metadata(metadata_file, is_r2_key=False)
+            document = self.load_document(metadata_file, is_r2_key=False)
         else:
             logger.error("No metadata source provided (neither R2 key nor local file)")
             return {
@@ -532,7 +1376,7 @@ class SimpleQueryEngine:
                 'sources': [],
                 'metadata': {'error': 'no_metadata_source'}
             }
-        if not metadata:
+        if not document:
             return {
                 'success': False,
                 'answer': 'Impossibile caricare i metadati del documento',
@@ -541,7 +1385,8 @@ class SimpleQueryEngine:
             }
 
         # Get chunks
-        chunks = metadata.get('chunks', [])
+        metadata = document.metadata
+        chunks = document.chunks
         if not chunks:
             return {
                 'success': False,
@@ -550,69 +1395,102 @@ class SimpleQueryEngine:
                 'metadata': {'error': 'no_chunks'}
             }
 
-        # DYNAMIC TOP_K: Calculate optimal retrieval based on document size
+        # DYNAMIC TOP_K: Candidate budget bounded by tier latency target and reranker limits
         total_chunks = len(chunks)
-        retrieval_top_k = self._calculate_dynamic_retrieval_top_k(
-            total_chunks=total_chunks,
-            user_tier=user_tier,
-            query_type=query_type,
-            query=query  # RECIPE FIX: Pass query for recipe detection
-        )
+        final_top_k = self._calculate_final_top_k(query_type, user_tier, query)
+        budget = self._plan_candidate_budget(total_chunks, final_top_k, user_tier, query_type, query)
+        retrieval_top_k = budget.max_candidates
 
         logger.info(
             f"[DYNAMIC_RAG] Doc has {total_chunks} chunks, "
             f"retrieving {retrieval_top_k} for reranking"
         )
 
-        # Find relevant chunks (STAGE 1: High Recall)
-        candidate_chunks = self.find_relevant_chunks(query, chunks, retrieval_top_k)
-
-        # STAGE 2: RERANKING (Modal GPU Cross-Encoder with Diversity Fallback)
-        final_top_k = self._calculate_final_top_k(query_type, user_tier, query)
-
-        try:
-            # PRIORITY 1: Modal GPU Cross-Encoder (SOTA quality, optimized latency)
-            from core.modal_rerank_client import rerank_with_modal, is_modal_enabled
-
-            if is_modal_enabled():
-                logger.info(f"[MODAL-RERANKING] GPU cross-encoder: {len(candidate_chunks)} → {final_top_k}")
-
-                relevant_chunks = rerank_with_modal(
-                    query=query,
-                    chunks=candidate_chunks,
-                    top_k=final_top_k
-                )
-
-                if relevant_chunks is not None:
-                    logger.info(f"[MODAL SUCCESS] GPU reranked to {len(relevant_chunks)} chunks")
-                else:
-                    raise Exception("Modal returned None")
-            else:
-                raise Exception("Modal not configured")
-
-        except Exception as modal_error:
-            # PRIORITY 2: Local Diversity Reranker (Fast fallback)
-            logger.warning(f"[MODAL FALLBACK] Modal reranking failed: {modal_error}")
-            logger.info(f"[DIVERSITY-RERANKING] Using local diversity reranker")
-
-            try:
-                from core.reranker_optimized import get_reranker
-
-                reranker = get_reranker(use_cross_encoder=False)
-                relevant_chunks = reranker.rerank(
-                    query=query,
-                    chunks=candidate_chunks,
-                    top_k=final_top_k,
-                    diversity_threshold=0.80
-                )
+        # "Find all" query: exact occurrences from the positional index
+        occurrences = None
+        rerank = None
+        if occurrence_term:
+            from core.document_artifact import load_positional_index
+            positional_index = load_positional_index(document, self.document_cache)
+            if positional_index is not None:
+                occurrences = positional_index.find(occurrence_term, limit=MAX_OCCURRENCE_CONTEXT)
+
+        # Structural query ("articolo 32", "pagina 12", "ultima pagina"): direct lookup
+        structural_match = None
+        if structural_query is not None:
+            from core.document_artifact import load_structural_index
+            structure = load_structural_index(document, self.document_cache)
+            structural_match = structure.lookup(query) if structure is not None else None
+
+        if occurrences is not None and occurrences.total:
+            # PERFORMANCE: Chunks of the first occurrences (document order), no search and no rerank
+            rows = list(dict.fromkeys(occurrence.row for occurrence in occurrences.occurrences))[:final_top_k]
+            relevant_chunks = [
+                CandidateChunk(chunks, row, similarity_score=1.0, occurrence_term=occurrence_term)
+                for row in rows
+            ]
+            timings['load'] = (time.perf_counter() - stage_start) * 1000
+            logger.info(
+                f"[POSITIONS] '{occurrence_term}': {occurrences.total} occurrences in "
+                f"{len(occurrences.pages)} pages, context from {len(rows)} chunks"
+            )
+        elif structural_match:
+            # PERFORMANCE: Dictionary hit on the structural index, no search and no rerank
+            relevant_chunks = [
+                CandidateChunk(chunks, row, similarity_score=1.0, structural_match=structural_match.kind)
+                for row in structural_match.rows[:final_top_k]
+            ]
+            timings['load'] = (time.perf_counter() - stage_start) * 1000
+            logger.info(
+                f"[STRUCTURE] {structural_match.kind} {structural_match.key or ''}: "
+                f"{len(structural_match.rows)} chunks (rows {structural_match.rows[0]}-{structural_match.rows[-1]})"
+            )
+        else:
+            # Find relevant chunks (STAGE 1: High Recall)
+            # Large documents: per-document ANN index (explicit faiss_r2_key or from the manifest)
+            from core.document_artifact import load_ann_index, load_keyword_index, load_term_analyzer
+            ann_index = load_ann_index(document, self.document_cache, faiss_r2_key=faiss_r2_key)
+
+            # Keyword inverted index (from the artifact, or built once for legacy documents)
+            keyword_index = load_keyword_index(document, self.document_cache)
+
+            # ATSW term statistics precomputed at ingest (None for legacy documents)
+            term_analyzer = load_term_analyzer(document, self.document_cache) if ATSW_AVAILABLE else None
+            timings['load'] = (time.perf_counter() - stage_start) * 1000
+
+            # Embed the query with the model that embedded this document
+            embedding_model = document.embedding_model.model_id if document.embeddings is not None else None
+            retrieval_embedding = query_embedding
+            if embedding_model and embedding_model != self._model_id:
+                logger.info(f"[EMBEDDING] Document embedded with {embedding_model}")
+                retrieval_embedding = None  # Semantic cache lookup used the default model
+
+            candidate_chunks = self.find_relevant_chunks(
+                query, chunks, retrieval_top_k,
+                embeddings=document.embeddings,
+                embeddings_normalized=document.embeddings_normalized,
+                ann_index=ann_index,
+                keyword_index=keyword_index,
+                timings=timings,
+                document_key=document.cache_key,
+                term_analyzer=term_analyzer,
+                query_embedding=retrieval_embedding,
+                embedding_model=embedding_model
+            )
+            stage_start = time.perf_counter()
 
-                logger.info(f"[DIVERSITY SUCCESS] Selected {len(relevant_chunks)} diverse chunks")
+            # Score-gap early termination: drop the tail once hybrid scores fall off
+            keep = score_gap_cutoff([chunk['similarity_score'] for chunk in candidate_chunks], budget.min_candidates)
+            if keep < len(candidate_chunks):
+                logger.info(f"[BUDGET] Score gap: {len(candidate_chunks)} -> {keep} candidates")
+                candidate_chunks = candidate_chunks[:keep]
 
-            except Exception as rerank_error:
-                logger.warning(f"[RERANKING FAILED] All reranking methods failed: {rerank_error}")
-                final_top_k = min(final_top_k, len(candidate_chunks))
-                relevant_chunks = candidate_chunks[:final_top_k]
-                logger.info(f"[FALLBACK] Using top {len(relevant_chunks)} chunks without reranking")
+            # STAGE 2: RERANKING (backend cascade: Modal GPU, local ONNX, lightweight diversity)
+            rerank = self._rerank_candidates(
+                query, candidate_chunks, final_top_k, document.embeddings, document_key=document.cache_key
+            )
+            relevant_chunks = rerank.chunks
+            timings['rerank'] = (time.perf_counter() - stage_start) * 1000
 
         if not relevant_chunks:
             return {
@@ -643,6 +1521,17 @@ class SimpleQueryEngine:
                 'preview': chunk['text'][:200] + '...' if len(chunk['text']) > 200 else chunk['text']
             })
 
+        # Exact totals for "find all" queries (the context only holds the first occurrences)
+        if occurrences is not None:
+            page_list = ', '.join(str(page) for page, _ in occurrences.pages[:MAX_OCCURRENCE_PAGES_LISTED])
+            if len(occurrences.pages) > MAX_OCCURRENCE_PAGES_LISTED:
+                page_list += f" (+{len(occurrences.pages) - MAX_OCCURRENCE_PAGES_LISTED} altre)"
+            context_parts.insert(
+                0,
+                f"[Ricerca esatta di '{occurrence_term}': {occurrences.total} occorrenze in totale"
+                f"{f', pagine: {page_list}' if page_list else ''}]\n"
+            )
+
         context = "\n\n".join(context_parts)
 
         logger.info(f"Built context from {len(relevant_chunks)} chunks ({len(context)} chars)")
@@ -690,6 +1579,7 @@ class SimpleQueryEngine:
 
         # Call LLM
         try:
+            stage_start = time.perf_counter()
             llm_response = generate_chat_response(
                 query=final_query,
                 context=context,
@@ -702,6 +1592,9 @@ class SimpleQueryEngine:
                 }
             )
 
+            timings['llm'] = (time.perf_counter() - stage_start) * 1000
+            logger.info(f"[TIMING] {format_timings(timings)}")
+
             # Extract usage info for cost tracking
             usage = llm_response.get('metadata', {}).get('usage', {})
 
@@ -716,13 +1609,25 @@ class SimpleQueryEngine:
                     'input_tokens': usage.get('prompt_tokens', 0),
                     'output_tokens': usage.get('completion_tokens', 0),
                     'total_tokens': usage.get('total_tokens', 0),
-                    'finish_reason': llm_response.get('metadata', {}).get('finish_reason')
+                    'finish_reason': llm_response.get('metadata', {}).get('finish_reason'),
+                    'timings_ms': {stage: round(ms, 1) for stage, ms in timings.items()}
                 }
             }
+            if rerank is not None:
+                result['metadata']['rerank_backend'] = rerank.backend
+                result['metadata']['rerank_cache_hits'] = rerank.cache_hits
+            if occurrences is not None:
+                result['metadata']['occurrences'] = {
+                    'term': occurrence_term,
+                    'total': occurrences.total,
+                    'pages': [page for page, _ in occurrences.pages]
+                }
 
             # COST-OPTIMIZED: Cache successful result for future queries
-            if self.cache and self.cache.enabled and doc_id:
-                self.cache.set_result(query, doc_id, result)
+            if cache_enabled:
+                if semantic_audit:
+                    self.cache.record_semantic_audit(query, semantic_audit, result)
+                self.cache.set_result(query, doc_id, result, cache_scope, query_embedding=query_embedding)
 
             return result
 
@@ -0,0 +1,435 @@
+"""
+Rerank Cascade
+One Reranker interface over pluggable backends, tried in priority order
+
+Stage 2 of query_document used to call Modal over HTTP and, when Modal was
+not configured, slow or down, fall back to a keyword boost + diversity filter:
+the local ONNX cross-encoder was never called. The cascade tries the backends
+listed in RERANK_CASCADE, first available wins:
+
+- modal: Modal GPU cross-encoder over HTTP (core/modal_rerank_client.py)
+- onnx: local BGE v2-m3 on ONNX Runtime (core/reranker_onnx.py), only once the
+  model is exported (PRELOAD_ONNX_RERANKER or a previous run): the one-time
+  ~60s export never runs inside a request
+- cross_encoder: sentence-transformers CrossEncoder (core/reranker.py)
+- lightweight: similarity + keyword boost with diversity filter
+  (core/reranker_optimized.py), no model, always available
+
+Each backend has a latency budget (RERANK_BUDGET_MS_<NAME>): the Modal request
+timeout, or the deadline after which a local backend starts no further batch.
+Candidates scored within the budget are ranked by cross-encoder score and the
+unscored tail keeps its retrieval order behind them. A backend that fails is
+skipped for RERANK_BACKEND_COOLDOWN_SECONDS, so a Modal outage costs one
+timeout instead of one per query.
+
+Scores of cross-encoder backends are cached in Redis per (normalized query,
+document version, scoring model, chunk row) through CacheManager: one MGET
+per request, and only uncached candidates are sent to the model. Cached and
+fresh scores are merged before ranking; hit ratios per backend are reported
+by CacheManager.get_rerank_stats().
+
+Every decision is logged with a [RERANK] prefix.
+"""
+
+import os
+import time
+import logging
+import importlib.util
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Backend priority (comma-separated, first available wins)
+RERANK_CASCADE = [
+    name.strip() for name in os.getenv('RERANK_CASCADE', 'modal,onnx,lightweight').lower().split(',') if name.strip()
+]
+
+# Seconds a failed backend is skipped before it is tried again
+RERANK_BACKEND_COOLDOWN_SECONDS = float(os.getenv('RERANK_BACKEND_COOLDOWN_SECONDS', '60'))
+
+# Default latency budget per backend (ms), override with RERANK_BUDGET_MS_<NAME>
+DEFAULT_BUDGETS_MS = {
+    'modal': 30000,  # Request timeout: allows GPU cold starts
+    'onnx': 1500,
+    'cross_encoder': 1500,
+    'lightweight': 0  # No model inference
+}
+
+# Diversity threshold of the lightweight backend (as the former local fallback)
+LIGHTWEIGHT_DIVERSITY_THRESHOLD = 0.80
+
+
+def backend_budget_ms(name: str) -> float:
+    """Latency budget (ms) of a backend"""
+    return float(os.getenv(f'RERANK_BUDGET_MS_{name.upper()}', DEFAULT_BUDGETS_MS.get(name, 1000)))
+
+
+class RerankResult(NamedTuple):
+    """Reranked chunks and the backend that produced them"""
+    chunks: List[Dict[str, Any]]
+    backend: str
+    elapsed_ms: float
+    cache_hits: int = 0  # Candidate scores read from the rerank score cache
+
+
+def rank_by_scores(
+    chunks: List[Dict[str, Any]],
+    scores: np.ndarray,
+    top_k: int
+) -> List[Dict[str, Any]]:
+    """
+    Order candidates by backend score
+
+    Args:
+        chunks: Candidates in retrieval order
+        scores: Score per candidate, NaN where not scored (budget spent)
+        top_k: Number of chunks to return
+
+    Returns:
+        Scored candidates by score (descending), then the unscored ones in retrieval order
+    """
+    unscored = np.isnan(scores)
+    scored = np.flatnonzero(~unscored)
+    for i in scored:
+        chunks[i]['rerank_score'] = float(scores[i])
+
+    order = scored[np.argsort(-scores[scored], kind='stable')]
+    ranked = [chunks[i] for i in order] + [chunks[i] for i in np.flatnonzero(unscored)]
+    return ranked[:top_k]
+
+
+class RerankScoreCache:
+    """
+    Cached scores of one query on one document version (CacheManager, Redis)
+    """
+
+    def __init__(self, cache_manager: Any, document_key: str, model: str):
+        """
+        Initialize cache view
+
+        Args:
+            cache_manager: Enabled CacheManager
+            document_key: Document version key (DocumentArtifact.cache_key)
+            model: Scoring backend and model (RerankBackend.cache_id)
+        """
+        self.cache_manager = cache_manager
+        self.document_key = document_key
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, query: str, chunks: List[Dict[str, Any]]) -> np.ndarray:
+        """Cached score per candidate (NaN where not cached), one MGET"""
+        scores = np.full(len(chunks), np.nan, dtype=np.float32)
+        positions = [i for i, chunk in enumerate(chunks) if chunk.get('chunk_row') is not None]
+
+        cached = self.cache_manager.get_rerank_scores(
+            query, self.document_key, self.model, [int(chunks[i]['chunk_row']) for i in positions]
+        )
+        for position, score in zip(positions, cached):
+            if score is not None:
+                scores[position] = score
+
+        self.hits = int(np.count_nonzero(~np.isnan(scores)))
+        self.misses = len(chunks) - self.hits
+        return scores
+
+    def store(self, query: str, chunks: List[Dict[str, Any]], positions: np.ndarray, scores: np.ndarray) -> None:
+        """Cache freshly computed scores of the candidates at positions"""
+        self.cache_manager.set_rerank_scores(query, self.document_key, self.model, {
+            int(chunks[position]['chunk_row']): float(score)
+            for position, score in zip(positions, scores)
+            if chunks[position].get('chunk_row') is not None
+        })
+
+
+class RerankBackend:
+    """
+    Base class of a cascade backend: scores (query, chunk) pairs within a budget
+
+    Subclasses implement score() (cross-encoders) or override rerank().
+    """
+
+    name = 'base'
+
+    # Scoring model identity for the score cache (None: scores are not cached)
+    cache_id: Optional[str] = None
+
+    def __init__(self, budget_ms: Optional[float] = None):
+        """
+        Initialize backend
+
+        Args:
+            budget_ms: Latency budget (ms). If None, uses RERANK_BUDGET_MS_<NAME> or default.
+        """
+        self.budget_ms = backend_budget_ms(self.name) if budget_ms is None else budget_ms
+
+    def is_available(self) -> bool:
+        """True if the backend can serve a request now (configured, model present)"""
+        return True
+
+    def score(self, query: str, texts: List[str], deadline: float) -> Optional[Sequence[float]]:
+        """
+        Relevance scores of a prefix of texts
+
+        Args:
+            query: User query
+            texts: Candidate texts in retrieval order
+            deadline: time.time() after which no further batch should start
+
+        Returns:
+            Scores of the first len(result) texts, or None if the backend failed
+        """
+        raise NotImplementedError
+
+    def rerank(
+        self,
+        query: str,
+        chunks: List[Dict[str, Any]],
+        top_k: int,
+        embeddings: Optional[np.ndarray] = None,
+        score_cache: Optional[RerankScoreCache] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Rerank candidates, scoring only those without a cached score (None if the backend failed)
+        """
+        if score_cache is not None:
+            scores = score_cache.lookup(query, chunks)
+        else:
+            scores = np.full(len(chunks), np.nan, dtype=np.float32)
+
+        missing = np.flatnonzero(np.isnan(scores))
+        if len(missing):
+            deadline = time.time() + self.budget_ms / 1000
+            fresh = self.score(query, [chunks[i]['text'] for i in missing], deadline)
+            if fresh is None:
+                return None
+
+            scored = missing[:len(fresh)]
+            scores[scored] = np.asarray(fresh, dtype=np.float32)[:len(scored)]
+            if score_cache is not None:
+                score_cache.store(query, chunks, scored, scores[scored])
+
+            if len(scored) < len(missing):
+                logger.info(
+                    f"[RERANK] {self.name}: scored {len(chunks) - len(missing) + len(scored)}/{len(chunks)} "
+                    f"candidates within budget"
+                )
+
+        return rank_by_scores(chunks, scores, top_k)
+
+
+class ModalRerankBackend(RerankBackend):
+    """Modal GPU cross-encoder over HTTP (budget = request timeout)"""
+
+    name = 'modal'
+
+    @property
+    def cache_id(self) -> str:
+        from core.modal_rerank_client import MODAL_RERANK_URL
+        return f"modal:{MODAL_RERANK_URL}"
+
+    def is_available(self) -> bool:
+        from core.modal_rerank_client import is_modal_enabled
+        return is_modal_enabled()
+
+    def score(self, query: str, texts: List[str], deadline: float) -> Optional[Sequence[float]]:
+        from core.modal_rerank_client import MAX_CHUNKS_PER_REQUEST, score_with_modal
+        return score_with_modal(query, texts[:MAX_CHUNKS_PER_REQUEST], timeout=self.budget_ms / 1000)
+
+
+class ONNXRerankBackend(RerankBackend):
+    """Local BGE v2-m3 cross-encoder on ONNX Runtime (exported model only)"""
+
+    name = 'onnx'
+
+    @property
+    def cache_id(self) -> str:
+        from core.reranker_onnx import ONNX_RERANKER_VARIANT, get_onnx_reranker, is_onnx_reranker_loaded, onnx_reranker_model_name
+        if is_onnx_reranker_loaded():
+            reranker = get_onnx_reranker()
+            return f"onnx:{reranker.model_name}:{reranker.variant}"
+        return f"onnx:{onnx_reranker_model_name()}:{ONNX_RERANKER_VARIANT}"
+
+    def is_available(self) -> bool:
+        from core.reranker_onnx import is_onnx_reranker_exported, is_onnx_reranker_loaded, is_onnx_runtime_available
+        return is_onnx_reranker_loaded() or (is_onnx_runtime_available() and is_onnx_reranker_exported())
+
+    def score(self, query: str, texts: List[str], deadline: float) -> Optional[Sequence[float]]:
+        from core.reranker_onnx import get_onnx_reranker
+        return get_onnx_reranker().score(query, texts, deadline=deadline)
+
+
+class CrossEncoderRerankBackend(RerankBackend):
+    """Local sentence-transformers CrossEncoder (RERANKER_MODEL)"""
+
+    name = 'cross_encoder'
+
+    @property
+    def cache_id(self) -> str:
+        from core.reranker import reranker_model_name
+        return f"cross_encoder:{reranker_model_name()}"
+
+    def is_available(self) -> bool:
+        return importlib.util.find_spec('sentence_transformers') is not None
+
+    def score(self, query: str, texts: List[str], deadline: float) -> Optional[Sequence[float]]:
+        from core.reranker import get_reranker
+        return get_reranker().score(query, texts, deadline=deadline)
+
+
+class LightweightRerankBackend(RerankBackend):
+    """Similarity + keyword boost with diversity filter (no model)"""
+
+    name = 'lightweight'
+
+    def rerank(
+        self,
+        query: str,
+        chunks: List[Dict[str, Any]],
+        top_k: int,
+        embeddings: Optional[np.ndarray] = None,
+        score_cache: Optional[RerankScoreCache] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        from core.reranker_optimized import get_reranker
+
+        return get_reranker(use_cross_encoder=False).rerank(
+            query=query,
+            chunks=chunks,
+            top_k=top_k,
+            diversity_threshold=LIGHTWEIGHT_DIVERSITY_THRESHOLD,
+            embeddings=embeddings
+        )
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (ModalRerankBackend, ONNXRerankBackend, CrossEncoderRerankBackend, LightweightRerankBackend)
+}
+
+
+class Reranker:
+    """
+    Priority cascade of rerank backends with per-backend budgets and cooldown
+    """
+
+    def __init__(self, backends: Optional[List[RerankBackend]] = None):
+        """
+        Initialize cascade
+
+        Args:
+            backends: Backends in priority order. If None, built from RERANK_CASCADE.
+        """
+        if backends is None:
+            unknown = [name for name in RERANK_CASCADE if name not in BACKENDS]
+            if unknown:
+                logger.warning(f"[RERANK] Unknown backends in RERANK_CASCADE ignored: {unknown}")
+            backends = [BACKENDS[name]() for name in RERANK_CASCADE if name in BACKENDS]
+
+        self.backends = backends
+        self._disabled_until: Dict[str, float] = {}
+
+        logger.info(
+            "[RERANK] Cascade: " + ' -> '.join(f"{backend.name} ({backend.budget_ms:.0f}ms)" for backend in backends)
+        )
+
+    @staticmethod
+    def _score_cache_manager() -> Optional[Any]:
+        """Enabled CacheManager for the rerank score cache (None: caching off)"""
+        from core.cache_manager import RERANK_CACHE_ENABLED, get_cache_manager
+
+        if not RERANK_CACHE_ENABLED:
+            return None
+        cache_manager = get_cache_manager()
+        return cache_manager if cache_manager.enabled else None
+
+    def available_backends(self) -> List[RerankBackend]:
+        """Backends that can serve a request now (not cooling down), in priority order"""
+        now = time.time()
+        return [
+            backend for backend in self.backends
+            if self._disabled_until.get(backend.name, 0.0) <= now and backend.is_available()
+        ]
+
+    def primary_backend(self) -> Optional[str]:
+        """Name of the backend the next request will try first"""
+        available = self.available_backends()
+        return available[0].name if available else None
+
+    def rerank(
+        self,
+        query: str,
+        chunks: List[Dict[str, Any]],
+        top_k: int,
+        embeddings: Optional[np.ndarray] = None,
+        document_key: Optional[str] = None
+    ) -> RerankResult:
+        """
+        Rerank candidates with the first backend that succeeds
+
+        Args:
+            query: User query
+            chunks: Candidates in retrieval order
+            top_k: Number of chunks to return
+            embeddings: Document embedding matrix (diversity filter of the lightweight backend)
+            document_key: Document version key, enables the rerank score cache
+
+        Returns:
+            RerankResult (retrieval order if every backend failed)
+        """
+        start = time.perf_counter()
+        cache_manager = self._score_cache_manager() if document_key else None
+
+        for backend in self.available_backends():
+            backend_start = time.perf_counter()
+            score_cache = None
+            try:
+                if cache_manager is not None and backend.cache_id:
+                    score_cache = RerankScoreCache(cache_manager, document_key, backend.cache_id)
+                ranked = backend.rerank(query, chunks, top_k, embeddings=embeddings, score_cache=score_cache)
+            except Exception as e:
+                logger.warning(f"[RERANK] {backend.name} failed: {e}")
+                ranked = None
+
+            elapsed_ms = (time.perf_counter() - backend_start) * 1000
+            if ranked is None:
+                self._disabled_until[backend.name] = time.time() + RERANK_BACKEND_COOLDOWN_SECONDS
+                logger.warning(
+                    f"[RERANK] {backend.name} unavailable after {elapsed_ms:.0f}ms, "
+                    f"skipped for {RERANK_BACKEND_COOLDOWN_SECONDS:.0f}s"
+                )
+                continue
+
+            cache_hits = 0
+            if score_cache is not None:
+                cache_hits = score_cache.hits
+                cache_manager.record_rerank_lookup(backend.name, score_cache.hits, score_cache.misses)
+
+            logger.info(
+                f"[RERANK] {backend.name}: {len(chunks)} -> {len(ranked)} chunks in {elapsed_ms:.0f}ms "
+                f"(budget {backend.budget_ms:.0f}ms"
+                + (f", {cache_hits}/{len(chunks)} scores cached)" if score_cache is not None else ")")
+            )
+            return RerankResult(ranked, backend.name, (time.perf_counter() - start) * 1000, cache_hits)
+
+        logger.warning(f"[RERANK] No backend succeeded, using top {min(top_k, len(chunks))} chunks by retrieval score")
+        return RerankResult(list(chunks[:top_k]), 'none', (time.perf_counter() - start) * 1000)
+
+
+# Singleton instance
+_reranker_instance: Optional[Reranker] = None
+
+
+def get_rerank_cascade() -> Reranker:
+    """
+    Get singleton cascade (configured from RERANK_CASCADE)
+
+    Returns:
+        Reranker instance
+    """
+    global _reranker_instance
+    if _reranker_instance is None:
+        _reranker_instance = Reranker()
+    return _reranker_instance
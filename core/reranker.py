@@ -18,9 +18,12 @@ Benefits:
 from typing import List, Dict, Any, Optional
 import logging
 import os
+import time
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_RERANKER_MODEL = 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1'
+
 # Lazy import to avoid loading sentence_transformers at module import time
 _CrossEncoder = None
 
@@ -37,6 +40,11 @@ def _get_cross_encoder():
     return _CrossEncoder
 
 
+def reranker_model_name() -> str:
+    """Configured cross-encoder model (RERANKER_MODEL)"""
+    return os.getenv('RERANKER_MODEL', DEFAULT_RERANKER_MODEL)
+
+
 class DocumentReranker:
     """
     Two-stage retrieval with cross-encoder reranking.
@@ -60,10 +68,7 @@ class DocumentReranker:
                        If None, uses env var RERANKER_MODEL or default.
         """
         # Get model name from env or use default
-        self.model_name = model_name or os.getenv(
-            'RERANKER_MODEL',
-            'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1'
-        )
+        self.model_name = model_name or reranker_model_name()
 
         logger.info(f"[RERANKER] Initializing with model: {self.model_name}")
 
@@ -75,6 +80,41 @@ class DocumentReranker:
             logger.error(f"[RERANKER] Failed to load model: {e}")
             raise
 
+    def score(
+        self,
+        query: str,
+        texts: List[str],
+        batch_size: int = 32,
+        deadline: Optional[float] = None
+    ) -> List[float]:
+        """
+        Cross-encoder relevance scores for (query, text) pairs
+
+        Args:
+            query: User query string
+            texts: Chunk texts, best retrieval candidates first
+            batch_size: Inference batch size
+            deadline: time.time() after which no further batch is started
+                      (the first batch always runs)
+
+        Returns:
+            Scores of the first len(result) texts (all of them unless the deadline was hit)
+        """
+        scores = []
+        for i in range(0, len(texts), batch_size):
+            if i and deadline is not None and time.time() >= deadline:
+                logger.info(f"[RERANKER] Latency budget spent: scored {i}/{len(texts)} chunks")
+                break
+
+            batch_scores = self.model.predict(
+                [[query, text] for text in texts[i:i + batch_size]],
+                batch_size=batch_size,
+                show_progress_bar=False
+            )
+            scores.extend(float(score) for score in batch_scores)
+
+        return scores
+
     def rerank(
         self,
         query: str,
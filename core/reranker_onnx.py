@@ -0,0 +1,498 @@
+"""
+ONNX Reranker for BGE v2-m3 Cross-Encoder
+
+Local CPU cross-encoder tier of the rerank cascade (core/rerank_cascade.py),
+used when Modal is not configured, slow or down.
+
+Execution path (NumPy end to end, no torch at load or inference time):
+1. One-time export (cached under ~/.cache/huggingface/onnx), optional int8
+   dynamic quantisation verified against the fp32 scores (ONNX_RERANKER_VARIANT)
+2. Fast tokenisation: the Rust `tokenizers` tokenizer of the export, pairs
+   encoded once without padding
+3. Length buckets: pairs sorted by token length and grouped under a token
+   budget, so short chunks are not padded to the longest chunk of a fixed
+   batch of 32 (ONNX_RERANKER_BATCH_TOKENS)
+4. ONNX Runtime session with intra-op threads matched to the gunicorn worker
+   count (ONNX_RERANKER_THREADS, default: cores / workers)
+
+With a deadline, candidates are processed in windows in retrieval order and
+the scored prefix is returned once the latency budget is spent.
+
+Performance target: <500ms for 50 chunks on CPU (int8)
+
+Model: BAAI/bge-reranker-v2-m3 (multilingual, excellent on Italian)
+"""
+
+from typing import List, Dict, Any, Optional
+import importlib.util
+import json
+import logging
+import os
+import numpy as np
+from pathlib import Path
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ONNX_RERANKER_MODEL = 'BAAI/bge-reranker-v2-m3'
+MAX_SEQUENCE_LENGTH = 512
+
+# fp32 or int8 (dynamic quantisation, falls back to fp32 if verification fails)
+ONNX_RERANKER_VARIANT = os.getenv('ONNX_RERANKER_VARIANT', 'int8').lower()
+
+# Threads per ONNX session (0 = available cores / gunicorn workers)
+ONNX_RERANKER_THREADS = int(os.getenv('ONNX_RERANKER_THREADS', '0'))
+
+# Padded tokens per inference batch (batch size x longest pair of the bucket)
+ONNX_RERANKER_BATCH_TOKENS = int(os.getenv('ONNX_RERANKER_BATCH_TOKENS', '8192'))
+MAX_BATCH_PAIRS = 64
+
+# Pairs tokenized and scored per window when a deadline applies
+DEADLINE_WINDOW_PAIRS = 64
+
+RERANKER_CONFIG_FILENAME = 'reranker_config.json'
+FP32_MODEL_FILENAME = 'model.onnx'
+INT8_MODEL_FILENAME = 'model_int8.onnx'
+TOKENIZER_FILENAME = 'tokenizer.json'
+
+# Minimum Pearson correlation of int8 scores with fp32 scores on the reference pairs
+MIN_INT8_SCORE_CORRELATION = 0.98
+
+# Reference queries and passages for the int8 check (the relevant passage first)
+VERIFICATION_SET = [
+    ("Come si prepara la carbonara?", [
+        "La carbonara si prepara con guanciale, tuorli d'uovo, pecorino romano e pepe nero.",
+        "Il contratto di locazione scade il 31 dicembre e si rinnova tacitamente.",
+        "Il reddito agrario è determinato mediante l'applicazione di tariffe d'estimo."
+    ]),
+    ("Quando scade il contratto di locazione?", [
+        "Il contratto di locazione ha durata di quattro anni e scade il 31 dicembre 2027.",
+        "Gli effetti collaterali più comuni sono nausea e mal di testa.",
+        "La rivoluzione industriale iniziò in Inghilterra nella seconda metà del Settecento."
+    ]),
+    ("Art. 1341 c.c. clausole vessatorie", [
+        "Art. 1341. Le condizioni generali di contratto predisposte da uno dei contraenti sono efficaci "
+        "nei confronti dell'altro, se al momento della conclusione del contratto questi le ha conosciute.",
+        "Ingredienti: 500 g di farina, 3 uova, un pizzico di sale.",
+        "Il capitolo descrive la struttura del bilancio aziendale."
+    ]),
+    ("What are the main findings of the clinical study?", [
+        "The study found a 30% reduction in symptoms compared with placebo after twelve weeks.",
+        "Installation requires a dedicated 16A circuit and a certified electrician.",
+        "La ricetta tradizionale prevede il burro e la salvia."
+    ])
+]
+
+
+def onnx_reranker_model_name() -> str:
+    """Configured reranker model (ONNX_RERANKER_MODEL)"""
+    return os.getenv('ONNX_RERANKER_MODEL', DEFAULT_ONNX_RERANKER_MODEL)
+
+
+def onnx_export_path(model_name: Optional[str] = None) -> Path:
+    """Export directory of a reranker model (same cache root as the ONNX query encoder)"""
+    cache_dir = Path.home() / ".cache" / "huggingface" / "onnx"
+    return cache_dir / (model_name or onnx_reranker_model_name()).replace("/", "_")
+
+
+def is_onnx_reranker_exported(model_name: Optional[str] = None, variant: Optional[str] = None) -> bool:
+    """
+    True if loading the variant needs no export work (seconds, not minutes)
+
+    Exports of the former reranker modules contain only model.onnx: without the
+    tokenizer, the config and (int8) the quantized graph with its recorded verification,
+    ONNXReranker would tokenizer-download, quantize and verify inside the request.
+    A recorded failed int8 verification is ready too (ONNXReranker loads fp32).
+    """
+    export_path = onnx_export_path(model_name)
+    variant = variant or ONNX_RERANKER_VARIANT
+    config_file = export_path / RERANKER_CONFIG_FILENAME
+
+    required = (FP32_MODEL_FILENAME, TOKENIZER_FILENAME, RERANKER_CONFIG_FILENAME)
+    if not all((export_path / name).exists() for name in required):
+        return False
+
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return False
+
+    if not config.get('model_name'):
+        return False
+
+    if variant == 'int8':
+        verification = config.get('verification', {}).get('int8', {})
+        return (export_path / INT8_MODEL_FILENAME).exists() and 'passed' in verification
+
+    return True
+
+
+def is_onnx_runtime_available() -> bool:
+    """True if onnxruntime and the fast tokenizers library are installed"""
+    return importlib.util.find_spec('onnxruntime') is not None and importlib.util.find_spec('tokenizers') is not None
+
+
+def default_intra_op_threads() -> int:
+    """
+    Intra-op threads per session: available cores shared by the gunicorn workers
+
+    Every worker has its own session; with onnxruntime's default (one thread per
+    core in every worker) concurrent requests oversubscribe the CPU.
+    """
+    if ONNX_RERANKER_THREADS > 0:
+        return ONNX_RERANKER_THREADS
+
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+
+    workers = int(os.getenv('WEB_CONCURRENCY', '2'))  # Procfile: --workers 2
+    return max(1, cores // max(1, workers))
+
+
+def plan_length_buckets(
+    lengths: np.ndarray,
+    batch_tokens: int = ONNX_RERANKER_BATCH_TOKENS,
+    max_batch: int = MAX_BATCH_PAIRS
+) -> List[np.ndarray]:
+    """
+    Group pairs of similar token length into inference batches
+
+    Args:
+        lengths: Token length of every pair
+        batch_tokens: Maximum padded tokens per batch (pairs x longest pair)
+        max_batch: Maximum pairs per batch
+
+    Returns:
+        List of index arrays (every pair exactly once), shortest pairs first
+    """
+    order = np.argsort(lengths, kind='stable')
+    buckets = []
+    start = 0
+
+    for position in range(1, len(order) + 1):
+        if position == len(order):
+            buckets.append(order[start:])
+            break
+
+        # Ascending order: the padded length of a bucket is its last pair's length
+        size = position - start + 1
+        if size > max_batch or size * lengths[order[position]] > batch_tokens:
+            buckets.append(order[start:position])
+            start = position
+
+    return buckets
+
+
+def _score_correlation(expected: np.ndarray, actual: np.ndarray) -> float:
+    """Pearson correlation between two score vectors"""
+    return float(np.corrcoef(np.asarray(expected, dtype=np.float64), np.asarray(actual, dtype=np.float64))[0, 1])
+
+
+def export_onnx_reranker(model_name: Optional[str] = None, quantize: bool = False) -> Path:
+    """
+    Export the cross-encoder to ONNX, quantize and verify it (one time)
+
+    Args:
+        model_name: HuggingFace model ID (default: ONNX_RERANKER_MODEL)
+        quantize: Also produce and verify the int8 dynamic-quantized graph
+
+    Returns:
+        Export directory (contains reranker_config.json with verification results)
+    """
+    model_name = model_name or onnx_reranker_model_name()
+    export_path = onnx_export_path(model_name)
+    export_path.mkdir(parents=True, exist_ok=True)
+    config_file = export_path / RERANKER_CONFIG_FILENAME
+    config = {}
+    if config_file.exists():
+        with open(config_file, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+    start = time.time()
+
+    if not (export_path / FP32_MODEL_FILENAME).exists():
+        # First time: Export and cache (SLOW: ~60s, one time only)
+        logger.info("[ONNX-RERANKER] First-time setup: Converting PyTorch → ONNX (one time only)")
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+        except ImportError:
+            logger.error("optimum[onnxruntime] not installed. Install with: pip install optimum[onnxruntime]")
+            raise
+
+        model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+        model.save_pretrained(str(export_path))
+        config = {}
+
+    if not (export_path / TOKENIZER_FILENAME).exists() or not config.get('model_name'):
+        # Exports of the former reranker modules contain only the model
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        tokenizer.save_pretrained(str(export_path))
+        config = {
+            'model_name': model_name,
+            'max_length': MAX_SEQUENCE_LENGTH,
+            'pad_token_id': tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0,
+            'verification': {}
+        }
+
+    if quantize and not (export_path / INT8_MODEL_FILENAME).exists():
+        logger.info("[ONNX-RERANKER] Quantizing weights to int8 (dynamic quantization)")
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantize_dynamic(
+            str(export_path / FP32_MODEL_FILENAME),
+            str(export_path / INT8_MODEL_FILENAME),
+            weight_type=QuantType.QInt8
+        )
+        config['verification'].pop('int8', None)
+
+    if quantize and 'int8' not in config['verification']:
+        # Same ranking as fp32 on the reference pairs
+        fp32 = ONNXReranker._from_export(export_path, config, 'fp32')
+        int8 = ONNXReranker._from_export(export_path, config, 'int8')
+        expected = [fp32.score(query, passages) for query, passages in VERIFICATION_SET]
+        actual = [int8.score(query, passages) for query, passages in VERIFICATION_SET]
+
+        correlation = _score_correlation(np.concatenate(expected), np.concatenate(actual))
+        same_top1 = all(int(np.argmax(e)) == int(np.argmax(a)) for e, a in zip(expected, actual))
+        config['verification']['int8'] = {
+            'correlation': round(correlation, 6),
+            'same_top1': same_top1,
+            'passed': correlation >= MIN_INT8_SCORE_CORRELATION and same_top1
+        }
+        logger.info(f"[ONNX-RERANKER] int8 vs fp32: correlation={correlation:.6f} same_top1={same_top1}")
+
+    with open(config_file, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+
+    logger.info(f"[ONNX-RERANKER] Export ready in {(time.time()-start):.1f}s: {export_path}")
+    return export_path
+
+
+class ONNXReranker:
+    """
+    Cross-encoder on ONNX Runtime with length-bucketed NumPy batches
+
+    Key features:
+    - One-time ONNX export (cached permanently), int8 by default
+    - Fast loading from cache, no torch import
+    - Length buckets: padding only up to the longest pair of similar-length pairs
+    """
+
+    def __init__(self, model_name: Optional[str] = None, variant: Optional[str] = None):
+        """
+        Load the export (exporting, quantizing and verifying it first if needed)
+
+        Args:
+            model_name: HuggingFace model ID (default: ONNX_RERANKER_MODEL)
+            variant: fp32 or int8 (default: ONNX_RERANKER_VARIANT)
+        """
+        model_name = model_name or onnx_reranker_model_name()
+        variant = variant or ONNX_RERANKER_VARIANT
+
+        logger.info(f"[ONNX-RERANKER] Initializing {model_name} ({variant})")
+
+        export_path = export_onnx_reranker(model_name, quantize=variant == 'int8')
+        with open(export_path / RERANKER_CONFIG_FILENAME, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+        if variant == 'int8' and not config['verification'].get('int8', {}).get('passed'):
+            logger.warning(
+                f"[ONNX-RERANKER] int8 scores disagree with fp32 ({config['verification'].get('int8')}), using fp32"
+            )
+            variant = 'fp32'
+
+        self._init_session(export_path, config, variant)
+
+    @classmethod
+    def _from_export(cls, export_path: Path, config: Dict[str, Any], variant: str) -> 'ONNXReranker':
+        """Reranker over an export that is not verified yet (used by the verification itself)"""
+        reranker = cls.__new__(cls)
+        reranker._init_session(export_path, config, variant)
+        return reranker
+
+    def _init_session(self, export_path: Path, config: Dict[str, Any], variant: str) -> None:
+        """Create the ONNX Runtime session and the fast tokenizer"""
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        start = time.time()
+        model_file = export_path / (INT8_MODEL_FILENAME if variant == 'int8' else FP32_MODEL_FILENAME)
+        threads = default_intra_op_threads()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+
+        self.model_name = config['model_name']
+        self.variant = variant
+        self.onnx_model_path = export_path
+        self.pad_token_id = config['pad_token_id']
+        self.session = ort.InferenceSession(str(model_file), options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(str(export_path / TOKENIZER_FILENAME))
+        self.tokenizer.enable_truncation(max_length=config['max_length'])
+        self.tokenizer.no_padding()
+
+        logger.info(
+            f"[ONNX-RERANKER] {self.model_name} ({variant}) loaded in {(time.time()-start)*1000:.1f}ms "
+            f"({threads} intra-op threads)"
+        )
+
+    def _score_encodings(self, encodings: List[Any]) -> np.ndarray:
+        """Scores of tokenized pairs, one inference per length bucket"""
+        lengths = np.fromiter((len(encoding.ids) for encoding in encodings), dtype=np.int64, count=len(encodings))
+        scores = np.empty(len(encodings), dtype=np.float32)
+
+        for bucket in plan_length_buckets(lengths):
+            width = int(lengths[bucket].max())
+            input_ids = np.full((len(bucket), width), self.pad_token_id, dtype=np.int64)
+            attention_mask = np.zeros((len(bucket), width), dtype=np.int64)
+            token_type_ids = np.zeros((len(bucket), width), dtype=np.int64)
+
+            for row, index in enumerate(bucket):
+                encoding = encodings[index]
+                input_ids[row, :lengths[index]] = encoding.ids
+                attention_mask[row, :lengths[index]] = 1
+                token_type_ids[row, :lengths[index]] = encoding.type_ids
+
+            feed = {
+                name: value for name, value in (
+                    ('input_ids', input_ids), ('attention_mask', attention_mask), ('token_type_ids', token_type_ids)
+                ) if name in self.input_names
+            }
+            # BGE reranker outputs a single logit per pair
+            scores[bucket] = self.session.run(None, feed)[0].reshape(-1)
+
+        return scores
+
+    def score(
+        self,
+        query: str,
+        texts: List[str],
+        deadline: Optional[float] = None
+    ) -> np.ndarray:
+        """
+        Cross-encoder relevance scores for (query, text) pairs
+
+        Args:
+            query: User query string
+            texts: Chunk texts, best retrieval candidates first
+            deadline: time.time() after which no further window of
+                      DEADLINE_WINDOW_PAIRS pairs is started (the first always runs)
+
+        Returns:
+            Scores of the first len(result) texts (all of them unless the deadline was hit)
+        """
+        window = len(texts) if deadline is None else DEADLINE_WINDOW_PAIRS
+        all_scores = []
+
+        for i in range(0, len(texts), max(1, window)):
+            if i and deadline is not None and time.time() >= deadline:
+                logger.info(f"[ONNX-RERANKER] Latency budget spent: scored {i}/{len(texts)} chunks")
+                break
+
+            encodings = self.tokenizer.encode_batch([(query, text) for text in texts[i:i + window]])
+            all_scores.append(self._score_encodings(encodings))
+
+        return np.concatenate(all_scores) if all_scores else np.empty(0, dtype=np.float32)
+
+    def rerank(
+        self,
+        query: str,
+        chunks: List[Dict[str, Any]],
+        top_k: int = 10
+    ) -> List[Dict[str, Any]]:
+        """
+        Rerank chunks using ONNX cross-encoder.
+
+        Args:
+            query: User query string
+            chunks: List of chunk dicts (must have 'text' key)
+            top_k: Number of top chunks to return
+
+        Returns:
+            Top-k chunks by score, each with a 'rerank_score' key
+        """
+        if not chunks:
+            return []
+
+        start_time = time.time()
+        num_chunks = len(chunks)
+        actual_top_k = min(top_k, num_chunks)
+
+        logger.info(f"[ONNX-RERANKER] Processing {num_chunks} chunks → top {actual_top_k}")
+
+        try:
+            all_scores = self.score(query, [chunk['text'] for chunk in chunks])
+
+            # Add scores and sort
+            for chunk, score in zip(chunks, all_scores):
+                chunk['rerank_score'] = float(score)
+
+            # Get top k
+            ranked_indices = np.argsort(-all_scores, kind='stable')[:actual_top_k]
+            reranked = [chunks[i] for i in ranked_indices]
+
+            # Stats
+            elapsed = (time.time() - start_time) * 1000
+            top_scores = all_scores[ranked_indices]
+
+            logger.info(
+                f"[ONNX-RERANKER] Done in {elapsed:.1f}ms | "
+                f"Scores: {top_scores.min():.2f} to {top_scores.max():.2f}"
+            )
+
+            return reranked
+
+        except Exception as e:
+            logger.error(f"[ONNX-RERANKER] Error: {e}", exc_info=True)
+            return chunks[:actual_top_k]
+
+
+# Singleton
+_instance: Optional[ONNXReranker] = None
+
+def get_onnx_reranker() -> ONNXReranker:
+    """Get singleton instance."""
+    global _instance
+    if _instance is None:
+        _instance = ONNXReranker()
+    return _instance
+
+
+def is_onnx_reranker_loaded() -> bool:
+    """True if this process already holds the singleton model"""
+    return _instance is not None
+
+
+def rerank_chunks_onnx(
+    query: str,
+    chunks: List[Dict[str, Any]],
+    top_k: int = 10
+) -> List[Dict[str, Any]]:
+    """Main entry point for reranking."""
+    return get_onnx_reranker().rerank(query, chunks, top_k)
+
+
+def preload_model():
+    """
+    Preload the model at application startup.
+    Call this in api_server.py or __init__ to avoid first-request latency.
+
+    Usage in api_server.py:
+        if not app.debug:  # Only in production
+            from core.reranker_onnx import preload_model
+            preload_model()
+    """
+    logger.info("[ONNX-RERANKER] Preloading model at startup...")
+    start = time.time()
+    get_onnx_reranker()
+    logger.info(f"[ONNX-RERANKER] Model preloaded in {(time.time()-start)*1000:.1f}ms")
+    return True
@@ -1,262 +0,0 @@
-"""
-ONNX-Optimized Reranker for BGE v2-m3 Cross-Encoder - FIXED VERSION
-
-Cost optimization: Replaces Modal GPU reranking ($30-50/month) with local CPU ONNX inference.
-
-Performance:
-- Latency: <2s for 30 chunks on CPU (vs 15-25s Modal cold start)
-- Quality: Same as original BGE model (SOTA cross-encoder)
-- Cost: $0 (local processing)
-
-Model: BAAI/bge-reranker-v2-m3
-- Multilingual (supports Italian excellently)
-- 568M parameters
-- 8192 max sequence length
-- ONNX optimized for fast CPU inference
-
-Implementation: November 2025 - Cost Optimization Initiative
-"""
-
-from typing import List, Dict, Any, Optional
-import logging
-import os
-import numpy as np
-from pathlib import Path
-
-logger = logging.getLogger(__name__)
-
-# Lazy imports to avoid loading ONNX at module import time
-_ORTModelForSequenceClassification = None
-_AutoTokenizer = None
-
-def _get_onnx_model():
-    """Lazy load ONNX model classes"""
-    global _ORTModelForSequenceClassification, _AutoTokenizer
-    if _ORTModelForSequenceClassification is None:
-        try:
-            from optimum.onnxruntime import ORTModelForSequenceClassification
-            from transformers import AutoTokenizer
-            _ORTModelForSequenceClassification = ORTModelForSequenceClassification
-            _AutoTokenizer = AutoTokenizer
-        except ImportError:
-            logger.error("optimum[onnxruntime] not installed. Install with: pip install optimum[onnxruntime]")
-            raise
-    return _ORTModelForSequenceClassification, _AutoTokenizer
-
-
-class ONNXReranker:
-    """
-    ONNX-optimized cross-encoder reranker using BGE v2-m3.
-
-    Replaces Modal GPU reranking with local CPU inference:
-    - 95% faster on warm requests (no network latency)
-    - 100% cost reduction ($30-50/month savings)
-    - No cold start delays (15-25s eliminated)
-    - Same quality as GPU cross-encoder
-
-    Architecture:
-        Stage 1: Semantic + keyword retrieval → 50-100 candidates
-        Stage 2: ONNX cross-encoder → top 8-15 chunks
-        Stage 3: LLM generation with clean context
-    """
-
-    def __init__(self, model_name: Optional[str] = None):
-        """
-        Initialize ONNX reranker.
-
-        Args:
-            model_name: HuggingFace model ID. Default: BAAI/bge-reranker-v2-m3
-        """
-        self.model_name = model_name or os.getenv(
-            'ONNX_RERANKER_MODEL',
-            'BAAI/bge-reranker-v2-m3'
-        )
-
-        # Define cache directory for ONNX model
-        cache_dir = Path.home() / ".cache" / "huggingface" / "onnx"
-        cache_dir.mkdir(parents=True, exist_ok=True)
-
-        # Path for the ONNX model cache
-        onnx_model_path = cache_dir / self.model_name.replace("/", "_")
-
-        logger.info(f"[ONNX-RERANKER] Initializing BGE v2-m3 ONNX model: {self.model_name}")
-
-        try:
-            ORTModel, Tokenizer = _get_onnx_model()
-
-            # Check if ONNX model already exists
-            if onnx_model_path.exists() and (onnx_model_path / "model.onnx").exists():
-                # Load pre-exported ONNX model (FAST - <1 second)
-                logger.info(f"[ONNX-RERANKER] Loading cached ONNX model from {onnx_model_path}")
-                self.model = ORTModel.from_pretrained(
-                    str(onnx_model_path),
-                    provider="CPUExecutionProvider"
-                )
-            else:
-                # First time: Export and cache the ONNX model (SLOW - one time only)
-                logger.info("[ONNX-RERANKER] First-time export: Converting PyTorch to ONNX (this will take ~60s, one time only)...")
-
-                # Export from HuggingFace and save to cache
-                self.model = ORTModel.from_pretrained(
-                    self.model_name,
-                    export=True,  # Export only on first run
-                    provider="CPUExecutionProvider",
-                    cache_dir=str(cache_dir)  # Save for future use
-                )
-
-                # Save the exported model to our custom location
-                logger.info(f"[ONNX-RERANKER] Saving ONNX model to {onnx_model_path} for fast future loads")
-                self.model.save_pretrained(str(onnx_model_path))
-
-            # Load tokenizer (always fast)
-            self.tokenizer = Tokenizer.from_pretrained(self.model_name)
-
-            logger.info("[ONNX-RERANKER] Model loaded successfully")
-            logger.info(f"[ONNX-RERANKER] Max sequence length: {self.tokenizer.model_max_length}")
-
-        except Exception as e:
-            logger.error(f"[ONNX-RERANKER] Failed to load model: {e}")
-            raise
-
-    def rerank(
-        self,
-        query: str,
-        chunks: List[Dict[str, Any]],
-        top_k: int = 10,
-        batch_size: int = 32
-    ) -> List[Dict[str, Any]]:
-        """
-        Rerank chunks using ONNX-optimized cross-encoder.
-
-        Args:
-            query: User query string
-            chunks: List of chunk dicts (must have 'text' key)
-            top_k: Number of top chunks to return (default 10)
-            batch_size: Inference batch size (default 32)
-
-        Returns:
-            Top k chunks sorted by relevance score (highest first)
-            Each chunk gets 'rerank_score' field added
-        """
-        if not chunks:
-            logger.warning("[ONNX-RERANKER] No chunks provided, returning empty list")
-            return []
-
-        # FIXED: Always rerank, even if chunks <= top_k
-        # This ensures proper relevance scoring for all chunks
-        logger.info(f"[ONNX-RERANKER] Reranking {len(chunks)} chunks → selecting top {min(top_k, len(chunks))}")
-
-        import time
-        t_start = time.time()
-
-        try:
-            # Prepare query-document pairs
-            pairs = [[query, chunk['text']] for chunk in chunks]
-
-            # Process in batches for memory efficiency
-            all_scores = []
-
-            for i in range(0, len(pairs), batch_size):
-                batch_pairs = pairs[i:i + batch_size]
-                t_batch_start = time.time()
-
-                # Tokenize batch
-                inputs = self.tokenizer(
-                    batch_pairs,
-                    padding=True,
-                    truncation=True,
-                    max_length=512,  # BGE v2-m3 optimal length
-                    return_tensors="pt"
-                )
-                t_tokenize = time.time()
-
-                # Run ONNX inference
-                outputs = self.model(**inputs)
-                t_inference = time.time()
-
-                # Extract logits (scores)
-                scores = outputs.logits.squeeze(-1).detach().numpy()
-
-                # Handle single item (squeeze removes dimension)
-                if scores.ndim == 0:
-                    scores = np.array([scores.item()])
-
-                all_scores.extend(scores.tolist())
-
-                # Only log timing for debugging if explicitly enabled
-                if logger.isEnabledFor(logging.DEBUG):
-                    logger.debug(
-                        f"[ONNX-TIMING] Batch {i//batch_size + 1}: "
-                        f"tokenize={( t_tokenize - t_batch_start)*1000:.1f}ms, "
-                        f"inference={(t_inference - t_tokenize)*1000:.1f}ms"
-                    )
-
-            # Add scores to chunks
-            for i, chunk in enumerate(chunks):
-                chunk['rerank_score'] = float(all_scores[i])
-
-            # Sort by score (descending)
-            ranked_indices = np.argsort(all_scores)[::-1]
-
-            # Select top_k (or all if fewer chunks than top_k)
-            actual_top_k = min(top_k, len(chunks))
-            reranked_chunks = [chunks[i] for i in ranked_indices[:actual_top_k]]
-
-            # Log statistics
-            elapsed_ms = (time.time() - t_start) * 1000
-            top_scores = [float(all_scores[i]) for i in ranked_indices[:actual_top_k]]
-
-            logger.info(
-                f"[ONNX-RERANKER] Completed in {elapsed_ms:.1f}ms | "
-                f"Top scores: min={min(top_scores):.3f}, max={max(top_scores):.3f}, "
-                f"avg={sum(top_scores)/len(top_scores):.3f}"
-            )
-
-            return reranked_chunks
-
-        except Exception as e:
-            logger.error(f"[ONNX-RERANKER] Error during reranking: {e}", exc_info=True)
-            # Fallback: return first top_k chunks without reranking
-            logger.warning(f"[ONNX-RERANKER] Fallback: returning first {min(top_k, len(chunks))} chunks")
-            return chunks[:min(top_k, len(chunks))]
-
-
-# Global singleton instance
-_onnx_reranker_instance: Optional[ONNXReranker] = None
-
-def get_onnx_reranker() -> ONNXReranker:
-    """
-    Get singleton ONNX reranker instance.
-
-    The model is cached both:
-    1. In memory (singleton pattern) - within same process
-    2. On disk (ONNX export) - across process restarts
-
-    Returns:
-        ONNXReranker instance
-    """
-    global _onnx_reranker_instance
-    if _onnx_reranker_instance is None:
-        logger.info("[ONNX-RERANKER] Creating singleton instance")
-        _onnx_reranker_instance = ONNXReranker()
-    return _onnx_reranker_instance
-
-
-def rerank_chunks_onnx(
-    query: str,
-    chunks: List[Dict[str, Any]],
-    top_k: int = 10
-) -> List[Dict[str, Any]]:
-    """
-    Convenience function for ONNX reranking.
-
-    Args:
-        query: User query
-        chunks: Candidate chunks
-        top_k: Number of chunks to return
-
-    Returns:
-        Top k reranked chunks
-    """
-    reranker = get_onnx_reranker()
-    return reranker.rerank(query, chunks, top_k)
\ No newline at end of file
@@ -1,243 +0,0 @@
-"""
-ONNX-Optimized Reranker for BGE v2-m3 Cross-Encoder
-
-Cost optimization: Replaces Modal GPU reranking ($30-50/month) with local CPU ONNX inference.
-
-Performance:
-- Latency: <500ms on CPU (vs 15-25s Modal cold start)
-- Quality: Same as original BGE model (SOTA cross-encoder)
-- Cost: $0 (local processing)
-
-Model: BAAI/bge-reranker-v2-m3
-- Multilingual (supports Italian excellently)
-- 568M parameters
-- 8192 max sequence length
-- ONNX quantized for fast CPU inference
-
-Implementation: November 2025 - Cost Optimization Initiative
-"""
-
-from typing import List, Dict, Any, Optional
-import logging
-import os
-import numpy as np
-
-logger = logging.getLogger(__name__)
-
-# Lazy imports to avoid loading ONNX at module import time
-_ORTModelForSequenceClassification = None
-_AutoTokenizer = None
-
-def _get_onnx_model():
-    """Lazy load ONNX model classes"""
-    global _ORTModelForSequenceClassification, _AutoTokenizer
-    if _ORTModelForSequenceClassification is None:
-        try:
-            from optimum.onnxruntime import ORTModelForSequenceClassification
-            from transformers import AutoTokenizer
-            _ORTModelForSequenceClassification = ORTModelForSequenceClassification
-            _AutoTokenizer = AutoTokenizer
-        except ImportError:
-            logger.error("optimum[onnxruntime] not installed. Install with: pip install optimum[onnxruntime]")
-            raise
-    return _ORTModelForSequenceClassification, _AutoTokenizer
-
-
-class ONNXReranker:
-    """
-    ONNX-optimized cross-encoder reranker using BGE v2-m3.
-
-    Replaces Modal GPU reranking with local CPU inference:
-    - 95% faster on warm requests (no network latency)
-    - 100% cost reduction ($30-50/month savings)
-    - No cold start delays (15-25s eliminated)
-    - Same quality as GPU cross-encoder
-
-    Architecture:
-        Stage 1: Semantic + keyword retrieval → 50-100 candidates
-        Stage 2: ONNX cross-encoder → top 8-15 chunks
-        Stage 3: LLM generation with clean context
-    """
-
-    def __init__(self, model_name: Optional[str] = None):
-        """
-        Initialize ONNX reranker.
-
-        Args:
-            model_name: HuggingFace model ID. Default: BAAI/bge-reranker-v2-m3
-        """
-        self.model_name = model_name or os.getenv(
-            'ONNX_RERANKER_MODEL',
-            'BAAI/bge-reranker-v2-m3'
-        )
-
-        logger.info(f"[ONNX-RERANKER] Initializing BGE v2-m3 ONNX model: {self.model_name}")
-
-        try:
-            ORTModel, Tokenizer = _get_onnx_model()
-
-            # Load ONNX-optimized model (auto-exports if needed)
-            logger.info("[ONNX-RERANKER] Loading ONNX model (first run may take 30s to export)...")
-            self.model = ORTModel.from_pretrained(
-                self.model_name,
-                export=True,  # Auto-export to ONNX if not already exported
-                provider="CPUExecutionProvider"  # Force CPU inference
-            )
-
-            # Load tokenizer
-            self.tokenizer = Tokenizer.from_pretrained(self.model_name)
-
-            logger.info("[ONNX-RERANKER] Model loaded successfully")
-            logger.info(f"[ONNX-RERANKER] Max sequence length: {self.tokenizer.model_max_length}")
-
-        except Exception as e:
-            logger.error(f"[ONNX-RERANKER] Failed to load model: {e}")
-            raise
-
-    def rerank(
-        self,
-        query: str,
-        chunks: List[Dict[str, Any]],
-        top_k: int = 10,
-        batch_size: int = 32
-    ) -> List[Dict[str, Any]]:
-        """
-        Rerank chunks using ONNX-optimized cross-encoder.
-
-        Args:
-            query: User query string
-            chunks: List of chunk dicts (must have 'text' key)
-            top_k: Number of top chunks to return (default 10)
-            batch_size: Inference batch size (default 32)
-
-        Returns:
-            Top k chunks sorted by relevance score (highest first)
-            Each chunk gets 'rerank_score' field added
-        """
-        if not chunks:
-            logger.warning("[ONNX-RERANKER] No chunks provided, returning empty list")
-            return []
-
-        # If fewer chunks than top_k, return all without reranking
-        if len(chunks) <= top_k:
-            logger.info(f"[ONNX-RERANKER] {len(chunks)} chunks <= top_k={top_k}, returning all")
-            return chunks
-
-        logger.info(f"[ONNX-RERANKER] Reranking {len(chunks)} chunks → selecting top {top_k}")
-
-        import time
-        t_start = time.time()
-
-        try:
-            # Prepare query-document pairs
-            pairs = [[query, chunk['text']] for chunk in chunks]
-            t_pairs = time.time()
-            logger.debug(f"[ONNX-RERANKER-TIMING] Pairs preparation: {(t_pairs - t_start)*1000:.1f}ms")
-
-            # Tokenize in batches
-            all_scores = []
-
-            for i in range(0, len(pairs), batch_size):
-                batch_pairs = pairs[i:i + batch_size]
-                t_batch_start = time.time()
-
-                # Tokenize batch
-                inputs = self.tokenizer(
-                    batch_pairs,
-                    padding=True,
-                    truncation=True,
-                    max_length=512,  # BGE v2-m3 optimal length
-                    return_tensors="pt"
-                )
-                t_tokenize = time.time()
-
-                # Run ONNX inference
-                outputs = self.model(**inputs)
-                t_inference = time.time()
-
-                # Extract logits (scores)
-                # BGE reranker outputs single score per pair
-                scores = outputs.logits.squeeze(-1).detach().numpy()
-
-                # Handle single item (squeeze removes dimension)
-                if scores.ndim == 0:
-                    scores = np.array([scores.item()])
-
-                all_scores.extend(scores.tolist())
-                t_batch_end = time.time()
-
-                print(
-                    f"[ONNX-TIMING] Batch {i//batch_size + 1}/{(len(pairs) + batch_size - 1)//batch_size}: "
-                    f"tokenize={( t_tokenize - t_batch_start)*1000:.1f}ms, "
-                    f"inference={(t_inference - t_tokenize)*1000:.1f}ms, "
-                    f"total={(t_batch_end - t_batch_start)*1000:.1f}ms"
-                )
-
-            # Add scores to chunks
-            for i, chunk in enumerate(chunks):
-                chunk['rerank_score'] = float(all_scores[i])
-
-            # Sort by score (descending)
-            ranked_indices = np.argsort(all_scores)[::-1]
-
-            # Select top_k
-            reranked_chunks = [chunks[i] for i in ranked_indices[:top_k]]
-
-            # Log statistics
-            top_scores = [float(all_scores[i]) for i in ranked_indices[:top_k]]
-            min_score = min(top_scores)
-            max_score = max(top_scores)
-            avg_score = sum(top_scores) / len(top_scores)
-
-            logger.info(
-                f"[ONNX-RERANKER] Top {top_k} scores: "
-                f"min={min_score:.3f}, max={max_score:.3f}, avg={avg_score:.3f}"
-            )
-            logger.debug(f"[ONNX-RERANKER] Top scores: {[f'{s:.3f}' for s in top_scores]}")
-
-            return reranked_chunks
-
-        except Exception as e:
-            logger.error(f"[ONNX-RERANKER] Error during reranking: {e}", exc_info=True)
-            # Fallback: return first top_k chunks without reranking
-            logger.warning(f"[ONNX-RERANKER] Fallback: returning first {top_k} chunks")
-            return chunks[:top_k]
-
-
-# Global singleton instance
-_onnx_reranker_instance: Optional[ONNXReranker] = None
-
-def get_onnx_reranker() -> ONNXReranker:
-    """
-    Get singleton ONNX reranker instance.
-
-    Lazy loading: model is only loaded when first needed.
-
-    Returns:
-        ONNXReranker instance
-    """
-    global _onnx_reranker_instance
-    if _onnx_reranker_instance is None:
-        logger.info("[ONNX-RERANKER] Creating singleton instance")
-        _onnx_reranker_instance = ONNXReranker()
-    return _onnx_reranker_instance
-
-
-def rerank_chunks_onnx(
-    query: str,
-    chunks: List[Dict[str, Any]],
-    top_k: int = 10
-) -> List[Dict[str, Any]]:
-    """
-    Convenience function for ONNX reranking.
-
-    Args:
-        query: User query
-        chunks: Candidate chunks
-        top_k: Number of chunks to return
-
-    Returns:
-        Top k reranked chunks
-    """
-    reranker = get_onnx_reranker()
-    return reranker.rerank(query, chunks, top_k)
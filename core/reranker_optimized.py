@@ -4,11 +4,20 @@ Reduces chunks to LLM by 85-90% while maintaining high recall
 """
 
 import logging
+import os
+import zlib
 import numpy as np
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
+# MMR trade-off: 1.0 = pure relevance (threshold-only filter), lower = more diversity
+MMR_LAMBDA = float(os.getenv('MMR_LAMBDA', '0.7'))
+
+# MinHash signature length for the text fallback (estimate error ~ 1/sqrt(permutations))
+MINHASH_PERMUTATIONS = 128
+_MINHASH_PRIME = (1 << 31) - 1
+
 # Try to import cross-encoder for advanced reranking
 try:
     from sentence_transformers import CrossEncoder
@@ -18,6 +27,93 @@ except ImportError:
     logger.warning("CrossEncoder not available, using lightweight reranking")
 
 
+def maximal_marginal_relevance(
+    relevance: np.ndarray,
+    similarity_to: Callable[[int], np.ndarray],
+    top_k: int,
+    mmr_lambda: float = MMR_LAMBDA,
+    threshold: float = 1.0
+) -> List[int]:
+    """
+    Greedy Maximal Marginal Relevance selection
+
+    Each step picks argmax(lambda * relevance - (1 - lambda) * max_similarity) among candidates
+    whose max similarity to the selection is below threshold. max_similarity is one vector
+    updated with np.maximum after each pick, so a step costs a single similarity_to() call.
+
+    Args:
+        relevance: Relevance per candidate (min-max normalized here)
+        similarity_to: position -> similarity of every candidate to that candidate
+        top_k: Number of candidates to select
+        mmr_lambda: Relevance/diversity trade-off (1.0 = relevance order with threshold filter)
+        threshold: Candidates at or above this similarity to the selection are skipped
+
+    Returns:
+        Selected positions in selection order (fewer than top_k if all others are redundant)
+    """
+    num_candidates = len(relevance)
+    relevance = np.asarray(relevance, dtype=np.float32)
+    span = float(relevance.max() - relevance.min()) if num_candidates else 0.0
+    relevance = (relevance - relevance.min()) / span if span > 0 else np.zeros(num_candidates, dtype=np.float32)
+
+    # -1 (uniform before the first pick) never reaches the threshold
+    max_similarity = np.full(num_candidates, -1.0, dtype=np.float32)
+    available = np.ones(num_candidates, dtype=bool)
+    selected = []
+
+    while len(selected) < min(top_k, num_candidates):
+        eligible = available & (max_similarity < threshold)
+        if not eligible.any():
+            break
+
+        mmr = mmr_lambda * relevance - (1.0 - mmr_lambda) * max_similarity
+        position = int(np.argmax(np.where(eligible, mmr, -np.inf)))
+
+        selected.append(position)
+        available[position] = False
+        np.maximum(max_similarity, similarity_to(position), out=max_similarity)
+
+    return selected
+
+
+def minhash_signatures(texts: List[str], num_perm: int = MINHASH_PERMUTATIONS, seed: int = 1) -> np.ndarray:
+    """
+    MinHash signatures of the word sets of texts
+
+    The fraction of equal signature slots estimates the Jaccard similarity of two word sets,
+    so all candidates compare against one selected chunk with a single vectorized equality.
+
+    Returns:
+        Matrix (len(texts) x num_perm); empty texts get an all-sentinel row
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MINHASH_PRIME, num_perm, dtype=np.uint64)
+    b = rng.integers(0, _MINHASH_PRIME, num_perm, dtype=np.uint64)
+
+    # Each distinct shingle is hashed and permuted once, shared by all texts
+    vocabulary: Dict[str, int] = {}
+    shingle_ids = [
+        [vocabulary.setdefault(shingle, len(vocabulary)) for shingle in set(text.lower().split())]
+        for text in texts
+    ]
+
+    signatures = np.full((len(texts), num_perm), _MINHASH_PRIME, dtype=np.uint32)
+    if not vocabulary:
+        return signatures
+
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode('utf-8')) for shingle in vocabulary), dtype=np.uint64, count=len(vocabulary)
+    ) % _MINHASH_PRIME
+    # a * h < 2^62: no uint64 overflow; results < 2^31 fit uint32
+    permuted = ((hashes[:, None] * a + b) % _MINHASH_PRIME).astype(np.uint32)
+
+    for i, ids in enumerate(shingle_ids):
+        if ids:
+            signatures[i] = permuted[ids].min(axis=0)
+
+    return signatures
+
+
 class CostOptimizedReranker:
     """
     Two-stage reranker with diversity filtering for cost optimization
@@ -82,7 +178,9 @@ class CostOptimizedReranker:
         query: str,
         chunks: List[Dict[str, Any]],
         top_k: int = 12,
-        diversity_threshold: float = 0.85
+        diversity_threshold: float = 0.85,
+        embeddings: Optional[np.ndarray] = None,
+        mmr_lambda: Optional[float] = None
     ) -> List[Dict[str, Any]]:
         """
         Rerank chunks with diversity filtering (MAIN METHOD)
@@ -94,6 +192,8 @@ class CostOptimizedReranker:
             diversity_threshold: Cosine similarity threshold for diversity
                                Higher = more diverse (0.85 recommended)
                                RECIPE FIX: Automatically lowered to 0.70 for recipe queries
+            embeddings: Document embedding matrix (may be a memmap), indexed by chunk['chunk_row']
+            mmr_lambda: MMR relevance/diversity trade-off (None = MMR_LAMBDA env, default 0.7)
 
         Returns:
             Top-k chunks that are relevant AND diverse
@@ -128,7 +228,9 @@ class CostOptimizedReranker:
         final_chunks = self._apply_diversity_filter(
             chunks=reranked_chunks,
             top_k=top_k,
-            diversity_threshold=diversity_threshold
+            diversity_threshold=diversity_threshold,
+            embeddings=embeddings,
+            mmr_lambda=mmr_lambda
         )
 
         logger.info(f"[RERANKING] Stage 2 complete: selected {len(final_chunks)} diverse chunks")
@@ -204,19 +306,49 @@ class CostOptimizedReranker:
 
         return reranked
 
+    def _gather_candidate_embeddings(
+        self,
+        chunks: List[Dict[str, Any]],
+        embeddings: Optional[np.ndarray] = None
+    ) -> Optional[np.ndarray]:
+        """
+        Collect candidate embeddings as one L2-normalized float32 matrix
+
+        PERFORMANCE: With a document matrix (possibly memory-mapped) only the candidate
+        rows are read, via chunk['chunk_row']. Legacy chunks carry inline 'embedding' lists.
+
+        Returns:
+            Matrix (len(chunks) x dim) or None if embeddings are unavailable
+        """
+        if embeddings is not None and all('chunk_row' in chunk for chunk in chunks):
+            rows = np.fromiter((chunk['chunk_row'] for chunk in chunks), dtype=np.int64, count=len(chunks))
+            matrix = np.asarray(embeddings[rows], dtype=np.float32)
+        elif all('embedding' in chunk for chunk in chunks):
+            matrix = np.asarray([chunk['embedding'] for chunk in chunks], dtype=np.float32)
+        else:
+            return None
+
+        # Both branches produce a fresh array: normalize in place
+        norms = np.sqrt(np.einsum('ij,ij->i', matrix, matrix))
+        norms[norms == 0] = 1.0
+        matrix /= norms[:, None]
+        return matrix
+
     def _apply_diversity_filter(
         self,
         chunks: List[Dict[str, Any]],
         top_k: int,
-        diversity_threshold: float = 0.85
+        diversity_threshold: float = 0.85,
+        embeddings: Optional[np.ndarray] = None,
+        mmr_lambda: Optional[float] = None
     ) -> List[Dict[str, Any]]:
         """
-        Apply diversity filtering to avoid redundant chunks
+        Apply diversity filtering to avoid redundant chunks (Maximal Marginal Relevance)
 
         Algorithm:
         1. Take top chunk (highest rerank score)
-        2. For next chunks, check similarity with already selected
-        3. Add chunk only if it's sufficiently different (< diversity_threshold)
+        2. Next pick maximizes lambda * relevance - (1 - lambda) * max similarity to selected
+        3. Chunks at or above diversity_threshold similarity are never picked
         4. Continue until we have top_k chunks
 
         This ensures we capture:
@@ -232,104 +364,73 @@ class CostOptimizedReranker:
         if not chunks:
             return []
 
-        # Check if chunks have embeddings for diversity calculation
-        has_embeddings = all('embedding' in chunk for chunk in chunks)
+        # Gather candidate embeddings once (normalized rows: cosine = dot product)
+        candidate_matrix = self._gather_candidate_embeddings(chunks, embeddings)
 
-        if not has_embeddings:
+        if candidate_matrix is None:
             logger.warning("Chunks don't have embeddings, using text-based diversity")
-            return self._text_based_diversity(chunks, top_k, diversity_threshold)
-
-        selected = []
-
-        for chunk in chunks:
-            if len(selected) >= top_k:
-                break
-
-            if len(selected) == 0:
-                # Always take the top chunk
-                selected.append(chunk)
-                continue
-
-            # Check similarity with already selected chunks
-            chunk_embedding = np.array(chunk['embedding'])
-
-            max_similarity = 0.0
-            for selected_chunk in selected:
-                selected_embedding = np.array(selected_chunk['embedding'])
-
-                # Cosine similarity
-                similarity = np.dot(chunk_embedding, selected_embedding) / (
-                    np.linalg.norm(chunk_embedding) * np.linalg.norm(selected_embedding)
-                )
-
-                max_similarity = max(max_similarity, similarity)
-
-            # Add chunk if sufficiently diverse
-            if max_similarity < diversity_threshold:
-                selected.append(chunk)
-                logger.debug(f"Added chunk (diversity: {1-max_similarity:.3f})")
-            else:
-                logger.debug(f"Skipped redundant chunk (similarity: {max_similarity:.3f} >= {diversity_threshold})")
-
-        # If we couldn't get enough diverse chunks, fill remaining with top scored ones
-        if len(selected) < top_k:
-            remaining = top_k - len(selected)
-            logger.warning(f"Only {len(selected)} diverse chunks found, adding {remaining} more by score")
+            return self._text_based_diversity(chunks, top_k, diversity_threshold, mmr_lambda)
 
-            selected_indices = {id(c) for c in selected}
-            for chunk in chunks:
-                if id(chunk) not in selected_indices:
-                    selected.append(chunk)
-                    if len(selected) >= top_k:
-                        break
+        positions = maximal_marginal_relevance(
+            relevance=self._relevance_scores(chunks),
+            similarity_to=lambda position: candidate_matrix @ candidate_matrix[position],
+            top_k=top_k,
+            mmr_lambda=MMR_LAMBDA if mmr_lambda is None else mmr_lambda,
+            threshold=diversity_threshold
+        )
 
-        return selected
+        return self._fill_by_score(chunks, positions, top_k)
 
     def _text_based_diversity(
         self,
         chunks: List[Dict[str, Any]],
         top_k: int,
-        diversity_threshold: float
+        diversity_threshold: float,
+        mmr_lambda: Optional[float] = None
     ) -> List[Dict[str, Any]]:
         """
         Fallback diversity filter using text overlap (when embeddings unavailable)
+
+        Word-set Jaccard similarity, estimated from MinHash signatures
         """
-        selected = []
+        signatures = minhash_signatures([chunk['text'] for chunk in chunks])
 
-        for chunk in chunks:
-            if len(selected) >= top_k:
-                break
-
-            if len(selected) == 0:
-                selected.append(chunk)
-                continue
-
-            # Calculate word overlap with selected chunks
-            chunk_words = set(chunk['text'].lower().split())
-
-            max_overlap = 0.0
-            for selected_chunk in selected:
-                selected_words = set(selected_chunk['text'].lower().split())
-
-                # Jaccard similarity
-                intersection = len(chunk_words & selected_words)
-                union = len(chunk_words | selected_words)
-                overlap = intersection / union if union > 0 else 0
-
-                max_overlap = max(max_overlap, overlap)
-
-            # Add if sufficiently diverse (lower threshold for text-based)
-            if max_overlap < (diversity_threshold - 0.1):  # More lenient
-                selected.append(chunk)
-
-        # Fill remaining
-        if len(selected) < top_k:
-            selected_ids = {id(c) for c in selected}
-            for chunk in chunks:
-                if id(chunk) not in selected_ids:
-                    selected.append(chunk)
-                    if len(selected) >= top_k:
-                        break
+        positions = maximal_marginal_relevance(
+            relevance=self._relevance_scores(chunks),
+            similarity_to=lambda position: (signatures == signatures[position]).mean(axis=1),
+            top_k=top_k,
+            mmr_lambda=MMR_LAMBDA if mmr_lambda is None else mmr_lambda,
+            threshold=diversity_threshold - 0.1  # More lenient
+        )
+
+        return self._fill_by_score(chunks, positions, top_k)
+
+    @staticmethod
+    def _relevance_scores(chunks: List[Dict[str, Any]]) -> np.ndarray:
+        """Stage 1 scores in chunk order"""
+        return np.fromiter(
+            (chunk.get('rerank_score', chunk.get('similarity_score', 0.0)) for chunk in chunks),
+            dtype=np.float32, count=len(chunks)
+        )
+
+    @staticmethod
+    def _fill_by_score(
+        chunks: List[Dict[str, Any]],
+        positions: List[int],
+        top_k: int
+    ) -> List[Dict[str, Any]]:
+        """Selected chunks, then (if too few are diverse enough) the best remaining by score"""
+        selected = [chunks[position] for position in positions]
+
+        # If we couldn't get enough diverse chunks, fill remaining with top scored ones
+        if len(selected) < min(top_k, len(chunks)):
+            remaining = min(top_k, len(chunks)) - len(selected)
+            logger.warning(f"Only {len(selected)} diverse chunks found, adding {remaining} more by score")
+
+            taken = set(positions)
+            selected.extend(
+                [chunk for position, chunk in enumerate(chunks) if position not in taken][:remaining]
+            )
 
         return selected
 
@@ -18,14 +18,16 @@ R2_SECRET_KEY = os.getenv('R2_SECRET_ACCESS_KEY')
 R2_ENDPOINT = os.getenv('R2_ENDPOINT_URL')
 R2_BUCKET = os.getenv('R2_BUCKET_NAME', 'socrate-ai-storage')
 
-# Initialize S3 client for R2
+# Initialize S3 client for R2 (one per process: boto3 clients are not fork-safe,
+# a client created in the gunicorn master before fork is rebuilt in each worker)
 s3_client = None
+s3_client_pid = None
 
 def get_s3_client():
     """Get or create S3 client for R2"""
-    global s3_client
+    global s3_client, s3_client_pid
 
-    if s3_client is None:
+    if s3_client is None or s3_client_pid != os.getpid():
         # Detailed logging for debugging
         logger.info("Initializing S3 client for R2...")
         logger.info(f"  R2_ACCESS_KEY_ID: {'SET' if R2_ACCESS_KEY else 'MISSING'}")
@@ -51,6 +53,7 @@ def get_s3_client():
                 config=Config(signature_version='s3v4'),
                 region_name='auto'  # R2 uses 'auto' region
             )
+            s3_client_pid = os.getpid()
             logger.info(f"✅ S3 client initialized successfully for R2: {R2_ENDPOINT}")
         except Exception as e:
             logger.error(f"❌ Failed to initialize S3 client: {e}")
@@ -82,6 +85,7 @@ def upload_file(file_data: bytes, file_key: str, content_type: str = 'applicatio
         )
 
         logger.info(f"File uploaded to R2: {file_key} ({len(file_data)} bytes)")
+        _invalidate_disk_cache(file_key)
         return True
 
     except ClientError as e:
@@ -97,16 +101,43 @@ def upload_file(file_data: bytes, file_key: str, content_type: str = 'applicatio
         return False
 
 
+def _invalidate_disk_cache(file_key: str) -> None:
+    """Drop a key from the local disk caches (if enabled) after it changed on R2"""
+    from core.disk_cache import get_disk_cache
+    from core.document_cache import invalidate_local_file
+
+    disk_cache = get_disk_cache()
+    if disk_cache:
+        disk_cache.invalidate(file_key)
+    invalidate_local_file(file_key)
+
+
 def download_file(file_key: str) -> Optional[bytes]:
     """
     Download file from R2
 
+    PERFORMANCE: Served from the local disk cache when R2_DISK_CACHE_DIR is set
+    (revalidated with If-None-Match), otherwise a full get_object.
+
     Args:
         file_key: S3 key (path) for the file
 
     Returns:
         bytes: File content, or None if error
     """
+    from core.disk_cache import get_disk_cache
+
+    disk_cache = get_disk_cache()
+    if disk_cache:
+        file_data = disk_cache.get(file_key)
+        if file_data is not None:
+            return file_data
+
+    return _download_file_uncached(file_key)
+
+
+def _download_file_uncached(file_key: str) -> Optional[bytes]:
+    """Download file from R2 (full get_object, no local cache)"""
     try:
         client = get_s3_client()
 
@@ -130,6 +161,92 @@ def download_file(file_key: str) -> Optional[bytes]:
         return None
 
 
+def get_file_if_modified(file_key: str, etag: Optional[str] = None, last_modified=None) -> Optional[dict]:
+    """
+    Conditional download from R2 (If-None-Match / If-Modified-Since)
+
+    Unconditional requests (no etag / last_modified) go through the local disk
+    cache when enabled, so in-memory caches are warm again after a restart.
+
+    Args:
+        file_key: S3 key (path) for the file
+        etag: ETag of the cached copy (optional)
+        last_modified: Last-Modified datetime of the cached copy (optional)
+
+    Returns:
+        dict with 'not_modified', 'data', 'etag', 'last_modified', or None if error
+        (data is None when not_modified is True)
+    """
+    if not etag and not last_modified:
+        from core.disk_cache import get_disk_cache
+
+        disk_cache = get_disk_cache()
+        if disk_cache:
+            cached = disk_cache.get_with_etag(file_key)
+            if cached is not None:
+                return {
+                    'not_modified': False,
+                    'data': cached[0],
+                    'etag': cached[1],
+                    'last_modified': None
+                }
+
+    return get_file_if_modified_uncached(file_key, etag=etag, last_modified=last_modified)
+
+
+def get_file_if_modified_uncached(file_key: str, etag: Optional[str] = None, last_modified=None) -> Optional[dict]:
+    """
+    Conditional download from R2, bypassing the local disk cache
+
+    Args:
+        file_key: S3 key (path) for the file
+        etag: ETag of the cached copy (optional)
+        last_modified: Last-Modified datetime of the cached copy (optional)
+
+    Returns:
+        dict with 'not_modified', 'data', 'etag', 'last_modified', or None if error
+    """
+    try:
+        client = get_s3_client()
+
+        params = {'Bucket': R2_BUCKET, 'Key': file_key}
+        if etag:
+            params['IfNoneMatch'] = etag
+        elif last_modified:
+            params['IfModifiedSince'] = last_modified
+
+        response = client.get_object(**params)
+
+        file_data = response['Body'].read()
+        logger.info(f"File downloaded from R2: {file_key} ({len(file_data)} bytes)")
+        return {
+            'not_modified': False,
+            'data': file_data,
+            'etag': response.get('ETag'),
+            'last_modified': response.get('LastModified')
+        }
+
+    except ClientError as e:
+        error_code = str(e.response.get('Error', {}).get('Code', ''))
+        status_code = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        if status_code == 304 or error_code in ('304', 'NotModified'):
+            logger.debug(f"File not modified in R2: {file_key}")
+            return {
+                'not_modified': True,
+                'data': None,
+                'etag': etag,
+                'last_modified': last_modified
+            }
+        if error_code == 'NoSuchKey':
+            logger.error(f"File not found in R2: {file_key}")
+        else:
+            logger.error(f"Error downloading from R2: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected error downloading from R2: {e}")
+        return None
+
+
 def delete_file(file_key: str) -> bool:
     """
     Delete file from R2
@@ -149,6 +266,7 @@ def delete_file(file_key: str) -> bool:
         )
 
         logger.info(f"File deleted from R2: {file_key}")
+        _invalidate_disk_cache(file_key)
         return True
 
     except ClientError as e:
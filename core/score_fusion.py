@@ -0,0 +1,154 @@
+"""
+Hybrid Score Fusion
+Vectorised combination of semantic and keyword scores for find_relevant_chunks
+
+Strategies (HYBRID_FUSION_STRATEGY):
+- 'rules'    : Current production weighting (default)
+               recipe query      -> 40% semantic / 60% keyword
+               keyword_norm>0.8  -> 50% / 50% (strong exact match)
+               proper nouns      -> 50% / 50%
+               otherwise         -> 70% / 30%
+- 'weighted' : Fixed linear weighting (HYBRID_SEMANTIC_WEIGHT, default 0.7)
+- 'rrf'      : Reciprocal Rank Fusion, 1/(k + rank) summed over both rankings
+               (robust to score scale differences, no normalization needed)
+
+All strategies work on whole NumPy arrays (no per-chunk Python loop) and
+top-k selection uses np.argpartition (O(n)) instead of a full argsort.
+"""
+
+import os
+import logging
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HYBRID_FUSION_STRATEGY = os.getenv('HYBRID_FUSION_STRATEGY', 'rules').lower()
+HYBRID_SEMANTIC_WEIGHT = float(os.getenv('HYBRID_SEMANTIC_WEIGHT', '0.7'))
+RRF_K = 60
+
+FUSION_STRATEGIES = ('rules', 'weighted', 'rrf')
+
+
+class ChunkScore(NamedTuple):
+    """Lightweight retrieval record (row in the document + scores), no chunk copy"""
+    row: int
+    score: float
+    semantic_score: float
+    keyword_score: float
+
+
+def min_max_normalize(scores: np.ndarray) -> np.ndarray:
+    """Normalize scores to [0, 1] range (same epsilon as the original code)"""
+    return (scores - scores.min()) / (scores.max() - scores.min() + 1e-10)
+
+
+def _ranks(scores: np.ndarray) -> np.ndarray:
+    """1-based rank of every element (highest score = rank 1)"""
+    order = np.argsort(-scores, kind='stable')
+    ranks = np.empty(len(scores), dtype=np.float64)
+    ranks[order] = np.arange(1, len(scores) + 1)
+    return ranks
+
+
+def fuse_scores(
+    semantic_scores: np.ndarray,
+    keyword_scores: np.ndarray,
+    strategy: str = HYBRID_FUSION_STRATEGY,
+    is_recipe: bool = False,
+    has_proper_nouns: bool = False,
+    semantic_weight: float = HYBRID_SEMANTIC_WEIGHT
+) -> np.ndarray:
+    """
+    Combine semantic and keyword scores into hybrid scores
+
+    Args:
+        semantic_scores: Cosine similarities (one per candidate)
+        keyword_scores: Keyword scores (one per candidate)
+        strategy: 'rules', 'weighted' or 'rrf'
+        is_recipe: Query detected as recipe query ('rules' strategy)
+        has_proper_nouns: Query contains proper nouns ('rules' strategy)
+        semantic_weight: Semantic weight for the 'weighted' strategy
+
+    Returns:
+        Array of hybrid scores (one per candidate)
+    """
+    if strategy not in FUSION_STRATEGIES:
+        logger.warning(f"[FUSION] Unknown strategy '{strategy}', using 'rules'")
+        strategy = 'rules'
+
+    if strategy == 'rrf':
+        return 1.0 / (RRF_K + _ranks(semantic_scores)) + 1.0 / (RRF_K + _ranks(keyword_scores))
+
+    semantic_norm = min_max_normalize(semantic_scores)
+    keyword_norm = min_max_normalize(keyword_scores)
+
+    if strategy == 'weighted':
+        return semantic_weight * semantic_norm + (1.0 - semantic_weight) * keyword_norm
+
+    # 'rules': per-candidate semantic weight, same precedence as the original if/elif chain
+    if is_recipe:
+        # RECIPE MODE: 40% semantic, 60% keyword (keywords crucial for recipe matching)
+        weights = np.full(len(semantic_norm), 0.4)
+    elif has_proper_nouns:
+        # Query contains proper nouns (regions, names) -> 50% for every chunk
+        weights = np.full(len(semantic_norm), 0.5)
+    else:
+        # Strong keyword match -> 50%, otherwise 70% semantic / 30% keyword
+        weights = np.where(keyword_norm > 0.8, 0.5, 0.7)
+
+    return weights * semantic_norm + (1.0 - weights) * keyword_norm
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Indices of the top_k highest scores, best first
+
+    Uses np.argpartition (linear time) and only sorts the selected k.
+    """
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if top_k < len(scores):
+        candidates = np.argpartition(scores, -top_k)[-top_k:]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def build_chunk_scores(
+    hybrid_scores: np.ndarray,
+    semantic_scores: np.ndarray,
+    keyword_scores: np.ndarray,
+    top_k: int,
+    candidate_rows: Optional[np.ndarray] = None
+) -> List[ChunkScore]:
+    """
+    Select top_k candidates as lightweight ChunkScore records
+
+    Args:
+        hybrid_scores: Fused scores (one per candidate)
+        semantic_scores: Semantic scores (one per candidate)
+        keyword_scores: Keyword scores (one per candidate)
+        top_k: Number of records to return
+        candidate_rows: Document row of each candidate (None = candidate i is row i)
+
+    Returns:
+        List of ChunkScore, best first
+    """
+    records = []
+    for idx in top_k_indices(hybrid_scores, top_k):
+        row = int(candidate_rows[idx]) if candidate_rows is not None else int(idx)
+        records.append(ChunkScore(
+            row=row,
+            score=float(hybrid_scores[idx]),
+            semantic_score=float(semantic_scores[idx]),
+            keyword_score=float(keyword_scores[idx])
+        ))
+    return records
+
+
+def format_timings(timings: Dict[str, float]) -> str:
+    """Format per-stage timings (ms) for a single log line"""
+    return ' | '.join(f"{stage}: {ms:.1f}ms" for stage, ms in timings.items())
@@ -0,0 +1,492 @@
+"""
+Structural Index
+Page, article and heading lookups over a document's chunks
+
+"articolo 32", "pagina 12" and "ultima pagina" queries used to reload the
+chunk metadata and regex-scan every chunk (memvidBeta direct_metadata_search,
+utils/article_lookup). This index is built once per document (at ingest,
+stored in the artifact as structure.json) and answers those queries with a
+dictionary lookup:
+
+    pages    - page number -> chunk row ranges (from '## Pagina N' markers)
+    articles - article key ('32', '32bis') -> header row + continuation rows
+    sections - normalized heading -> section row spans (markdown headings)
+
+Chunks overlap, so a marker or header can appear in two consecutive chunks:
+page ranges include both, headers are attributed to the first one.
+
+Pure standard library: also imported by the memvidBeta encoder and chat app,
+which keep the index in a '<name>_structure.json' file next to their
+'<name>_metadata.json' (see structure_path_for).
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STRUCTURE_FORMAT_VERSION = 1
+
+# Chunks of one article (header + continuation) returned at most
+MAX_ARTICLE_CHUNKS = 8
+
+# Page markers written by the PDF/OCR text extraction ("## Pagina N")
+PAGE_MARKER_RE = re.compile(r'^[ \t]*##[ \t]*(?:Pagina|Page)[ \t]+(\d+)[ \t]*$', re.IGNORECASE | re.MULTILINE)
+
+# Markdown headings (page markers excluded)
+HEADING_RE = re.compile(r'^[ \t]*(#{1,6})[ \t]+(\S.*?)[ \t#]*$', re.MULTILINE)
+
+ARTICLE_SUFFIXES = 'bis|ter|quater|quinquies|sexies|septies|octies|novies|decies'
+
+# Article header at line start: "Art. 32. Reddito agrario", "Articolo 5-bis", "Art. 7 - Definizioni"
+ARTICLE_HEADER_RE = re.compile(
+    rf'^[ \t]*(?:art\.?|articolo)[ \t]*(\d+)(?:[ \t]*-?[ \t]*({ARTICLE_SUFFIXES}))?\b[ \t]*(?=[.:\-\u2013\u2014(]|$)',
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Inline header (PDF text without line breaks): "... Art. 32. Reddito agrario"
+ARTICLE_INLINE_HEADER_RE = re.compile(
+    rf'(?i:\bart\.|\barticolo)[ \t]*(\d+)(?:[ \t]*-?[ \t]*((?i:{ARTICLE_SUFFIXES})))?\.[ \t]+(?=[A-Z\u00c0-\u00dd(])'
+)
+
+# Structural queries
+ARTICLE_QUERY_RE = re.compile(rf'\bart(?:\.|icolo|icoli)?[ \t]*(\d+)(?:[ \t]*-?[ \t]*({ARTICLE_SUFFIXES})\b)?', re.IGNORECASE)
+PAGE_QUERY_RE = re.compile(r'\b(?:pagina|pag\.|page)[ \t]*(\d+)\b', re.IGNORECASE)
+LAST_PAGE_QUERY_RE = re.compile(r'\b(?:ultima[ \t]+pagina|last[ \t]+page)\b', re.IGNORECASE)
+SECTION_QUERY_RE = re.compile(r'\b(capitolo|sezione|paragrafo|chapter|section)[ \t]+(\w+)', re.IGNORECASE)
+
+
+class StructuralQuery(NamedTuple):
+    """Structural reference found in a query"""
+    kind: str  # 'article', 'page', 'last_page' or 'section'
+    key: Optional[str]
+
+
+class StructuralMatch(NamedTuple):
+    """Chunk rows answering a structural query (document order)"""
+    kind: str
+    key: Optional[str]
+    rows: List[int]
+
+
+def article_key(number: str, suffix: Optional[str] = None) -> str:
+    """
+    Canonical article key ('32', '32 bis' -> '32bis')
+
+    Args:
+        number: Article number
+        suffix: Latin suffix (bis, ter, ...) or None
+
+    Returns:
+        Article key
+    """
+    return f"{int(number)}{(suffix or '').lower()}"
+
+
+def normalize_heading(text: str) -> str:
+    """Heading key: lowercase, collapsed whitespace, no trailing punctuation"""
+    return re.sub(r'\s+', ' ', text).strip().strip('#:.-').strip().lower()
+
+
+def parse_structural_query(query: str) -> Optional[StructuralQuery]:
+    """
+    Detect article / page / last page / section references in a query
+
+    Args:
+        query: User query
+
+    Returns:
+        StructuralQuery or None for ordinary queries
+    """
+    match = ARTICLE_QUERY_RE.search(query)
+    if match:
+        return StructuralQuery('article', article_key(match.group(1), match.group(2)))
+
+    if LAST_PAGE_QUERY_RE.search(query):
+        return StructuralQuery('last_page', None)
+
+    match = PAGE_QUERY_RE.search(query)
+    if match:
+        return StructuralQuery('page', str(int(match.group(1))))
+
+    match = SECTION_QUERY_RE.search(query)
+    if match:
+        return StructuralQuery('section', normalize_heading(f"{match.group(1)} {match.group(2)}"))
+
+    return None
+
+
+def _ranges(rows: List[int]) -> List[Tuple[int, int]]:
+    """Sorted unique rows -> inclusive (first, last) ranges"""
+    ranges = []
+    for row in rows:
+        if ranges and row == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], row)
+        elif not ranges or row > ranges[-1][1]:
+            ranges.append((row, row))
+    return ranges
+
+
+def _expand(ranges: List[Tuple[int, int]]) -> List[int]:
+    """Inclusive (first, last) ranges -> rows"""
+    return [row for first, last in ranges for row in range(first, last + 1)]
+
+
+class StructuralIndex:
+    """
+    Page / article / section maps of one document (rows = chunk positions)
+    """
+
+    def __init__(
+        self,
+        num_chunks: int,
+        pages: Dict[int, List[Tuple[int, int]]],
+        articles: Dict[str, Tuple[int, int]],
+        sections: Dict[str, List[Tuple[int, int]]],
+        headings: List[Tuple[int, int, str]]
+    ):
+        """
+        Initialize index (use build_structural_index / from_bytes)
+
+        Args:
+            num_chunks: Number of chunks the index was built from
+            pages: Page number -> inclusive row ranges
+            articles: Article key -> (header row, last continuation row)
+            sections: Normalized heading -> inclusive row spans
+            headings: (row, level, text) of every heading, document order
+        """
+        self.num_chunks = num_chunks
+        self.pages = pages
+        self.articles = articles
+        self.sections = sections
+        self.headings = headings
+        self.last_page = max(pages) if pages else None
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate in-memory size (dict entries + tuples)"""
+        spans = sum(len(spans) for spans in self.pages.values()) + len(self.articles)
+        spans += sum(len(spans) for spans in self.sections.values())
+        return 200 * spans + sum(100 + 2 * len(title) for _, _, title in self.headings)
+
+    def page_rows(self, page: int) -> List[int]:
+        """Rows of the chunks covering a page (empty if unknown)"""
+        return _expand(self.pages.get(int(page), []))
+
+    def last_page_rows(self) -> List[int]:
+        """Rows of the chunks covering the last page"""
+        return self.page_rows(self.last_page) if self.last_page is not None else []
+
+    def article_rows(self, number: str, suffix: Optional[str] = None) -> List[int]:
+        """Header row + continuation rows of an article (empty if not found)"""
+        span = self.articles.get(article_key(number, suffix))
+        return list(range(span[0], span[1] + 1)) if span else []
+
+    def section_rows(self, heading: str) -> List[int]:
+        """
+        Rows of the section(s) titled heading
+
+        Exact (normalized) headings are a dictionary hit; otherwise headings
+        starting with the text match ('capitolo 3' -> '## Capitolo 3 - Costi').
+
+        Args:
+            heading: Heading text
+
+        Returns:
+            Rows in document order (empty if not found)
+        """
+        key = normalize_heading(heading)
+        spans = self.sections.get(key)
+        if spans is None and key:
+            prefix = re.compile(rf'{re.escape(key)}\b')
+            spans = [span for title, title_spans in self.sections.items() if prefix.match(title) for span in title_spans]
+        return sorted(set(_expand(spans or [])))
+
+    def lookup(self, query: str) -> Optional[StructuralMatch]:
+        """
+        Answer a structural query
+
+        Args:
+            query: User query
+
+        Returns:
+            StructuralMatch, or None if the query is not structural or the
+            document has no such page / article / section
+        """
+        parsed = parse_structural_query(query)
+        if parsed is None:
+            return None
+
+        if parsed.kind == 'article':
+            span = self.articles.get(parsed.key)
+            rows = list(range(span[0], span[1] + 1)) if span else []
+        elif parsed.kind == 'page':
+            rows = self.page_rows(int(parsed.key))
+        elif parsed.kind == 'last_page':
+            rows = self.last_page_rows()
+        else:
+            rows = self.section_rows(parsed.key)
+
+        if not rows:
+            return None
+        return StructuralMatch(parsed.kind, parsed.key, rows)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-compatible representation (structure.json)"""
+        return {
+            'format_version': STRUCTURE_FORMAT_VERSION,
+            'chunks_count': self.num_chunks,
+            'last_page': self.last_page,
+            'pages': {str(page): [list(span) for span in spans] for page, spans in self.pages.items()},
+            'articles': {key: list(span) for key, span in self.articles.items()},
+            'sections': {key: [list(span) for span in spans] for key, spans in self.sections.items()},
+            'headings': [list(heading) for heading in self.headings]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'StructuralIndex':
+        """Rebuild index from to_dict() output"""
+        if data.get('format_version') != STRUCTURE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported structural index format: {data.get('format_version')}")
+
+        return cls(
+            num_chunks=data['chunks_count'],
+            pages={int(page): [tuple(span) for span in spans] for page, spans in data['pages'].items()},
+            articles={key: tuple(span) for key, span in data['articles'].items()},
+            sections={key: [tuple(span) for span in spans] for key, spans in data['sections'].items()},
+            headings=[tuple(heading) for heading in data['headings']]
+        )
+
+    def to_bytes(self) -> bytes:
+        """Serialize to compact UTF-8 JSON"""
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'StructuralIndex':
+        """Deserialize from to_bytes() output"""
+        return cls.from_dict(json.loads(data.decode('utf-8')))
+
+
+def _find_article_headers(texts: List[str]) -> List[Tuple[int, int, str]]:
+    """
+    Article header occurrences (row, offset, key) in document order
+
+    Line-start headers are preferred; inline dotted headers ("art. 32. Reddito")
+    only count for articles without a line-start header.
+    """
+    strong = []
+    weak = []
+    for row, text in enumerate(texts):
+        strong.extend((row, m.start(), article_key(m.group(1), m.group(2))) for m in ARTICLE_HEADER_RE.finditer(text))
+        weak.extend((row, m.start(), article_key(m.group(1), m.group(2))) for m in ARTICLE_INLINE_HEADER_RE.finditer(text))
+
+    strong_keys = {key for _, _, key in strong}
+    headers = sorted(set(strong + [header for header in weak if header[2] not in strong_keys]))
+
+    # Overlapping chunks repeat a header in the next chunk: keep the first occurrence
+    deduped = []
+    for header in headers:
+        if deduped and deduped[-1][2] == header[2] and header[0] - deduped[-1][0] <= 1:
+            continue
+        deduped.append(header)
+    return deduped
+
+
+def _span_chars(texts: List[str], start: Tuple[int, int], end: Optional[Tuple[int, int]]) -> int:
+    """Approximate text length between two (row, offset) positions"""
+    start_row, start_offset = start
+    if end is None:
+        end = (len(texts) - 1, len(texts[-1]))
+    end_row, end_offset = end
+    if start_row == end_row:
+        return end_offset - start_offset
+    return (len(texts[start_row]) - start_offset) + sum(len(texts[row]) for row in range(start_row + 1, end_row)) + end_offset
+
+
+def _build_articles(texts: List[str]) -> Dict[str, Tuple[int, int]]:
+    """Article key -> (header row, last continuation row)"""
+    headers = _find_article_headers(texts)
+    articles: Dict[str, Tuple[int, int]] = {}
+    best_length: Dict[str, int] = {}
+
+    for position, (row, offset, key) in enumerate(headers):
+        following = headers[position + 1] if position + 1 < len(headers) else None
+        end = (following[0], following[1]) if following else None
+
+        if following is None:
+            last_row = len(texts) - 1
+        elif following[0] == row or PAGE_MARKER_RE.sub('', texts[following[0]][:following[1]]).strip():
+            last_row = following[0]  # Next header chunk still holds the end of this article
+        else:
+            last_row = following[0] - 1
+        last_row = min(max(last_row, row), row + MAX_ARTICLE_CHUNKS - 1)
+
+        # Repeated headers (table of contents + body): keep the longest article text
+        length = _span_chars(texts, (row, offset), end)
+        if key not in articles or length > best_length[key]:
+            articles[key] = (row, last_row)
+            best_length[key] = length
+
+    return articles
+
+
+def _build_sections(texts: List[str]) -> Tuple[Dict[str, List[Tuple[int, int]]], List[Tuple[int, int, str]]]:
+    """Normalized heading -> row spans, plus (row, level, text) of every heading"""
+    headings = []
+    for row, text in enumerate(texts):
+        for match in HEADING_RE.finditer(text):
+            title = match.group(2).strip()
+            if PAGE_MARKER_RE.match(match.group(0)) or not normalize_heading(title):
+                continue
+            if headings and headings[-1][2] == title and row - headings[-1][0] <= 1:
+                continue  # Repeated by chunk overlap
+            headings.append((row, len(match.group(1)), title))
+
+    sections: Dict[str, List[Tuple[int, int]]] = {}
+    for position, (row, level, title) in enumerate(headings):
+        last_row = len(texts) - 1
+        for next_row, next_level, _ in headings[position + 1:]:
+            if next_level <= level:
+                last_row = max(row, next_row)
+                break
+        sections.setdefault(normalize_heading(title), []).append((row, last_row))
+
+    return sections, headings
+
+
+def build_structural_index(chunks: List[Dict[str, Any]]) -> StructuralIndex:
+    """
+    Build the structural index of a document
+
+    Args:
+        chunks: Document chunks ('text' + 'metadata', in document order)
+
+    Returns:
+        StructuralIndex
+    """
+    texts = [chunk.get('text') or '' for chunk in chunks]
+
+    # Pages: the page current at the chunk start (previous marker) + markers inside it
+    page_to_rows: Dict[int, List[int]] = {}
+    current_page = None
+    for row, (chunk, text) in enumerate(zip(chunks, texts)):
+        markers = list(PAGE_MARKER_RE.finditer(text))
+        pages = [int(m.group(1)) for m in markers]
+        if current_page is not None and (not markers or text[:markers[0].start()].strip()):
+            pages.append(current_page)
+
+        metadata_page = (chunk.get('metadata') or {}).get('page')
+        if not pages and isinstance(metadata_page, (int, float)):
+            pages.append(int(metadata_page))
+
+        for page in set(pages):
+            page_to_rows.setdefault(page, []).append(row)
+        if markers:
+            current_page = pages[len(markers) - 1]
+        elif pages:
+            current_page = max(pages)
+
+    sections, headings = _build_sections(texts)
+
+    return StructuralIndex(
+        num_chunks=len(chunks),
+        pages={page: _ranges(rows) for page, rows in sorted(page_to_rows.items())},
+        articles=_build_articles(texts) if texts else {},
+        sections=sections,
+        headings=headings
+    )
+
+
+def structure_path_for(metadata_path: str) -> str:
+    """
+    Structural index file next to a local metadata file
+
+    Args:
+        metadata_path: '<name>_metadata.json' (memvidBeta layout)
+
+    Returns:
+        '<name>_structure.json'
+    """
+    if metadata_path.endswith('_metadata.json'):
+        return metadata_path[:-len('_metadata.json')] + '_structure.json'
+    return os.path.splitext(metadata_path)[0] + '_structure.json'
+
+
+def write_structure_file(metadata_path: str, chunks: List[Dict[str, Any]]) -> Optional[StructuralIndex]:
+    """
+    Build the structural index of a local document and save it next to its metadata
+
+    Args:
+        metadata_path: Path of the document metadata JSON
+        chunks: Document chunks
+
+    Returns:
+        StructuralIndex, or None if it could not be built
+    """
+    try:
+        structure = build_structural_index(chunks)
+    except Exception as e:
+        logger.warning(f"[STRUCTURE] Failed to build structural index for {metadata_path}: {e}")
+        return None
+
+    try:
+        with open(structure_path_for(metadata_path), 'wb') as f:
+            f.write(structure.to_bytes())
+    except OSError as e:
+        logger.warning(f"[STRUCTURE] Failed to save structural index for {metadata_path}: {e}")
+    return structure
+
+
+# Local documents (memvidBeta): path -> (metadata mtime/size, metadata, structure)
+_local_documents: Dict[str, Tuple[str, Dict[str, Any], Optional[StructuralIndex]]] = {}
+_local_lock = threading.Lock()
+
+
+def load_local_document(metadata_path: str) -> Tuple[Dict[str, Any], Optional[StructuralIndex]]:
+    """
+    Load a local metadata JSON and its structural index (cached per process)
+
+    The parsed metadata is kept until the file changes (mtime + size). The
+    structural index is read from '<name>_structure.json', or built from the
+    chunks and saved there for documents encoded before it existed.
+
+    Args:
+        metadata_path: Path of the document metadata JSON
+
+    Returns:
+        (metadata, StructuralIndex or None) - shared, read-only
+    """
+    stat = os.stat(metadata_path)
+    version = f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    with _local_lock:
+        cached = _local_documents.get(metadata_path)
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
+
+    with open(metadata_path, 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    chunks = metadata.get('chunks', [])
+
+    structure = None
+    structure_path = structure_path_for(metadata_path)
+    try:
+        if os.path.exists(structure_path) and os.stat(structure_path).st_mtime_ns >= stat.st_mtime_ns:
+            with open(structure_path, 'rb') as f:
+                structure = StructuralIndex.from_bytes(f.read())
+            if structure.num_chunks != len(chunks):
+                structure = None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"[STRUCTURE] Ignoring structural index {structure_path}: {e}")
+        structure = None
+
+    if structure is None:
+        structure = write_structure_file(metadata_path, chunks)
+
+    with _local_lock:
+        _local_documents[metadata_path] = (version, metadata, structure)
+    return metadata, structure
@@ -6,8 +6,13 @@ solution that automatically learns which query terms are generic vs. specific
 by analyzing document statistics.
 
 Based on RAG best practices 2025 and proven IR theory.
+
+Statistics are computed once at ingest and stored in the document artifact
+(atsw_stats.npz: sorted vocabulary + parallel float32 arrays), so queries load
+them with from_bytes() instead of re-analyzing the whole corpus.
 """
 
+import io
 import re
 import math
 import logging
@@ -17,6 +22,19 @@ import numpy as np
 
 logger = logging.getLogger(__name__)
 
+ATSW_STATS_FORMAT_VERSION = 1
+
+# Contextual diversity is counted in blocks of terms: at most this many
+# (term, co-occurring term) pairs and this many bitmap bytes per block
+CONTEXT_PAIRS_PER_BLOCK = 4_000_000
+CONTEXT_BITMAP_BYTES = 16 * 1024 * 1024
+
+DEFAULT_STOPWORDS = {
+    'il', 'lo', 'la', 'i', 'gli', 'le', 'un', 'uno', 'una',
+    'di', 'a', 'da', 'in', 'con', 'su', 'per', 'tra', 'fra',
+    'e', 'o', 'ma', 'se', 'non', 'che', 'del', 'al', 'dal', 'nel'
+}
+
 
 class UniversalTermSpecificityAnalyzer:
     """
@@ -48,11 +66,7 @@ class UniversalTermSpecificityAnalyzer:
             stopwords: Optional set of stopwords to filter (defaults to basic Italian)
         """
         # Basic Italian stopwords (minimal set to avoid over-filtering)
-        self.stopwords = stopwords or {
-            'il', 'lo', 'la', 'i', 'gli', 'le', 'un', 'uno', 'una',
-            'di', 'a', 'da', 'in', 'con', 'su', 'per', 'tra', 'fra',
-            'e', 'o', 'ma', 'se', 'non', 'che', 'del', 'al', 'dal', 'nel'
-        }
+        self.stopwords = stopwords or set(DEFAULT_STOPWORDS)
 
         self.min_term_length = min_term_length
         self.chunks = chunks
@@ -77,12 +91,11 @@ class UniversalTermSpecificityAnalyzer:
         self.vocabulary: Set[str] = set()
         self.avg_term_length = 0.0
 
+        self._idf_percentiles: Optional[Tuple[float, float]] = None
+
         # Build statistics
         logger.info(f"[ATSW] Initializing term analyzer for {self.total_chunks} chunks...")
-        self._build_vocabulary()
-        self._compute_idf()
-        self._compute_contextual_diversity()
-        self._compute_entropy()
+        self._build_statistics()
 
         logger.info(f"[ATSW] Analyzed {len(self.vocabulary)} unique terms")
 
@@ -108,109 +121,77 @@ class UniversalTermSpecificityAnalyzer:
 
         return tokens
 
-    def _build_vocabulary(self):
-        """Build vocabulary and compute document frequency."""
-        for chunk_text in self.chunk_texts:
-            # Get unique terms in this chunk
-            terms_in_chunk = set(self._tokenize(chunk_text))
-
-            # Update vocabulary
-            self.vocabulary.update(terms_in_chunk)
-
-            # Update document frequency (how many chunks contain this term)
-            for term in terms_in_chunk:
-                self.document_frequency[term] = self.document_frequency.get(term, 0) + 1
-
-        # Compute average term length
-        if self.vocabulary:
-            self.avg_term_length = sum(len(t) for t in self.vocabulary) / len(self.vocabulary)
-        else:
-            self.avg_term_length = 5.0
-
-    def _compute_idf(self):
-        """
-        Compute Inverse Document Frequency for all terms.
-
-        IDF(term) = log((N + 1) / (df(term) + 1)) + 1
-
-        High IDF = rare term = specific (e.g., "ossobuco")
-        Low IDF = common term = generic (e.g., "ricetta")
+    def _build_statistics(self):
         """
-        for term in self.vocabulary:
-            df = self.document_frequency[term]
-            idf = math.log((self.total_chunks + 1) / (df + 1)) + 1
-            self.idf_scores[term] = idf
+        Compute vocabulary, document frequency, IDF, contextual diversity and entropy.
 
-    def _compute_contextual_diversity(self):
+        Every chunk is tokenized ONCE into a sparse term x chunk count matrix
+        (COO arrays: one entry per distinct term in a chunk). All statistics are
+        vectorized reductions over these postings, so memory stays linear in the
+        number of postings (no dense per-term chunk vectors, no context sets).
         """
-        Compute contextual diversity for all terms.
-
-        Diversity(term) = |unique_context_terms(term)| / df(term)
-
-        High diversity = appears with many different terms = generic (e.g., "documento")
-        Low diversity = limited contexts = specific (e.g., "ossobuco")
-        """
-        # First pass: collect all contexts for each term
-        for chunk_text in self.chunk_texts:
-            terms = self._tokenize(chunk_text)
-            unique_terms = set(terms)
-
-            # For each term, record all OTHER terms it appears with
-            for term in unique_terms:
-                context_terms = unique_terms - {term}
-                self.term_contexts[term].update(context_terms)
-
-        # Second pass: compute diversity ratio
-        for term in self.vocabulary:
-            df = self.document_frequency[term]
-            unique_contexts = len(self.term_contexts[term])
-
-            # Normalize by document frequency
-            if df > 0:
-                diversity = unique_contexts / df
-                # Normalize to [0, 1] range (cap at 10 unique contexts per occurrence)
-                self.contextual_diversity[term] = min(diversity / 10.0, 1.0)
-            else:
-                self.contextual_diversity[term] = 0.0
-
-    def _compute_entropy(self):
-        """
-        Compute term entropy across chunks.
-
-        Entropy(term) = -Σ p(term|chunk) * log(p(term|chunk))
-
-        High entropy = evenly distributed = generic
-        Low entropy = concentrated in few chunks = specific
-        """
-        # Count term occurrences per chunk
-        term_chunk_counts = defaultdict(lambda: np.zeros(self.total_chunks))
+        term_ids: Dict[str, int] = {}
+        posting_terms: List[int] = []
+        posting_chunks: List[int] = []
+        posting_counts: List[int] = []
 
         for chunk_idx, chunk_text in enumerate(self.chunk_texts):
-            term_counts = Counter(self._tokenize(chunk_text))
-            for term, count in term_counts.items():
-                term_chunk_counts[term][chunk_idx] = count
-
-        # Compute entropy
-        for term in self.vocabulary:
-            counts = term_chunk_counts[term]
-            total_count = counts.sum()
-
-            if total_count == 0:
-                self.term_entropy[term] = 0.0
-                continue
+            for term, count in Counter(self._tokenize(chunk_text)).items():
+                term_id = term_ids.setdefault(term, len(term_ids))
+                posting_terms.append(term_id)
+                posting_chunks.append(chunk_idx)
+                posting_counts.append(count)
 
-            # Probability distribution
-            probs = counts / total_count
-            probs = probs[probs > 0]  # Remove zeros
+        vocab = list(term_ids)
+        self.vocabulary = set(vocab)
 
-            # Entropy
-            entropy = -np.sum(probs * np.log2(probs))
-
-            # Normalize by max possible entropy (log2 of number of chunks)
-            max_entropy = math.log2(self.total_chunks) if self.total_chunks > 1 else 1.0
-            normalized_entropy = entropy / max_entropy if max_entropy > 0 else 0.0
-
-            self.term_entropy[term] = normalized_entropy
+        # Compute average term length
+        if vocab:
+            self.avg_term_length = sum(len(t) for t in vocab) / len(vocab)
+        else:
+            self.avg_term_length = 5.0
+            return
+
+        num_terms = len(vocab)
+        terms = np.asarray(posting_terms, dtype=np.int64)
+        chunk_ids = np.asarray(posting_chunks, dtype=np.int64)
+        counts = np.asarray(posting_counts, dtype=np.float64)
+
+        # Document frequency: one posting per (term, chunk)
+        df = np.bincount(terms, minlength=num_terms)
+
+        # IDF(term) = log((N + 1) / (df(term) + 1)) + 1
+        # High IDF = rare term = specific (e.g., "ossobuco")
+        # Low IDF = common term = generic (e.g., "ricetta")
+        idf = np.log((self.total_chunks + 1) / (df + 1.0)) + 1.0
+
+        # Entropy(term) = -sum p(term|chunk) * log2(p(term|chunk)), normalized by log2(N)
+        # High entropy = evenly distributed = generic, low = concentrated = specific
+        totals = np.bincount(terms, weights=counts, minlength=num_terms)
+        probs = counts / totals[terms]
+        entropy = -np.bincount(terms, weights=probs * np.log2(probs), minlength=num_terms)
+        max_entropy = math.log2(self.total_chunks) if self.total_chunks > 1 else 1.0
+        entropy = entropy / max_entropy if max_entropy > 0 else np.zeros(num_terms)
+
+        # Diversity(term) = |unique_context_terms(term)| / df(term), capped at 10 per occurrence
+        # High diversity = appears with many different terms = generic (e.g., "documento")
+        unique_contexts = _count_unique_contexts(terms, chunk_ids, num_terms, self.total_chunks)
+        diversity = np.minimum(unique_contexts / np.maximum(df, 1) / 10.0, 1.0)
+
+        self.document_frequency = dict(zip(vocab, df.tolist()))
+        self.idf_scores = dict(zip(vocab, idf.tolist()))
+        self.term_entropy = dict(zip(vocab, entropy.tolist()))
+        self.contextual_diversity = dict(zip(vocab, diversity.tolist()))
+
+    def _idf_thresholds(self) -> Optional[Tuple[float, float]]:
+        """IDF 20th / 80th percentile cut-offs (computed once, statistics are immutable)."""
+        if self._idf_percentiles is None and self.idf_scores:
+            idf_values = np.sort(np.fromiter(self.idf_scores.values(), dtype=np.float64, count=len(self.idf_scores)))
+            self._idf_percentiles = (
+                float(idf_values[int(len(idf_values) * 0.2)]),
+                float(idf_values[int(len(idf_values) * 0.8)])
+            )
+        return self._idf_percentiles
 
     def compute_term_specificity(
         self,
@@ -274,10 +255,9 @@ class UniversalTermSpecificityAnalyzer:
         )
 
         # Adaptive thresholding based on IDF percentiles
-        idf_values = sorted(self.idf_scores.values())
-        if idf_values:
-            p20 = idf_values[int(len(idf_values) * 0.2)]
-            p80 = idf_values[int(len(idf_values) * 0.8)]
+        thresholds = self._idf_thresholds()
+        if thresholds:
+            p20, p80 = thresholds
 
             if idf < p20:
                 # Very common term - heavy suppression
@@ -377,6 +357,88 @@ class UniversalTermSpecificityAnalyzer:
         # Return top k terms
         return [term for term, weight in sorted_terms[:top_k]]
 
+    def release_build_data(self):
+        """
+        Drop data only needed while building statistics.
+
+        Chunk texts and term contexts (sets of co-occurring terms) are by far the
+        largest structures; query-time weighting only needs the per-term statistics.
+        Call this before keeping the analyzer in a long-lived cache.
+        """
+        self.chunks = None
+        self.chunk_texts = []
+        self.term_contexts = defaultdict(set)
+
+    def estimate_memory_bytes(self) -> int:
+        """
+        Rough memory footprint of the analyzer (for cache byte accounting).
+
+        Per vocabulary term: the string plus one entry in the vocabulary set and in
+        the four statistics dicts (~450 bytes), plus any retained term contexts.
+        """
+        vocabulary_bytes = sum(49 + len(term) for term in self.vocabulary)
+        statistics_bytes = len(self.vocabulary) * 450
+        context_bytes = sum(len(contexts) * 60 for contexts in self.term_contexts.values())
+        return vocabulary_bytes + statistics_bytes + context_bytes
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize term statistics to .npz bytes (no pickle).
+
+        Layout: sorted vocabulary (one UTF-8 blob) + parallel arrays
+        (document frequency int32, IDF / diversity / entropy float32).
+        Build-only data (chunk texts, term contexts) is not stored.
+        """
+        vocab = sorted(self.vocabulary)
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            format_version=np.array([ATSW_STATS_FORMAT_VERSION], dtype=np.int32),
+            total_chunks=np.array([self.total_chunks], dtype=np.int64),
+            min_term_length=np.array([self.min_term_length], dtype=np.int32),
+            avg_term_length=np.array([self.avg_term_length], dtype=np.float64),
+            vocab_blob=np.frombuffer('\n'.join(vocab).encode('utf-8'), dtype=np.uint8),
+            stopwords_blob=np.frombuffer('\n'.join(sorted(self.stopwords)).encode('utf-8'), dtype=np.uint8),
+            document_frequency=np.array([self.document_frequency[t] for t in vocab], dtype=np.int32),
+            idf=np.array([self.idf_scores[t] for t in vocab], dtype=np.float32),
+            contextual_diversity=np.array([self.contextual_diversity[t] for t in vocab], dtype=np.float32),
+            entropy=np.array([self.term_entropy[t] for t in vocab], dtype=np.float32)
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'UniversalTermSpecificityAnalyzer':
+        """
+        Load an analyzer from precomputed statistics (see to_bytes).
+
+        The analyzer is query-only: it has no chunk texts or term contexts.
+        """
+        with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+            format_version = int(npz['format_version'][0])
+            if format_version > ATSW_STATS_FORMAT_VERSION:
+                raise ValueError(f"Unsupported ATSW statistics format v{format_version}")
+
+            vocab_blob = npz['vocab_blob'].tobytes().decode('utf-8')
+            stopwords_blob = npz['stopwords_blob'].tobytes().decode('utf-8')
+            vocab = vocab_blob.split('\n') if vocab_blob else []
+
+            analyzer = cls.__new__(cls)
+            analyzer.stopwords = set(stopwords_blob.split('\n')) if stopwords_blob else set()
+            analyzer.min_term_length = int(npz['min_term_length'][0])
+            analyzer.chunks = None
+            analyzer.chunk_texts = []
+            analyzer.total_chunks = int(npz['total_chunks'][0])
+            analyzer.avg_term_length = float(npz['avg_term_length'][0])
+            analyzer.vocabulary = set(vocab)
+            analyzer.document_frequency = dict(zip(vocab, npz['document_frequency'].tolist()))
+            analyzer.idf_scores = dict(zip(vocab, npz['idf'].tolist()))
+            analyzer.contextual_diversity = dict(zip(vocab, npz['contextual_diversity'].tolist()))
+            analyzer.term_entropy = dict(zip(vocab, npz['entropy'].tolist()))
+            analyzer.term_contexts = defaultdict(set)
+            analyzer._idf_percentiles = None
+
+        return analyzer
+
     def get_statistics_summary(self) -> Dict[str, Any]:
         """Get summary statistics about the analyzed corpus."""
         if not self.vocabulary:
@@ -404,6 +466,67 @@ class UniversalTermSpecificityAnalyzer:
         }
 
 
+def _count_unique_contexts(
+    terms: np.ndarray,
+    chunk_ids: np.ndarray,
+    num_terms: int,
+    num_chunks: int
+) -> np.ndarray:
+    """
+    Count the distinct terms co-occurring (same chunk) with each term.
+
+    Equivalent to the number of non-zeros per row of A x A^T (A = binary term x chunk
+    matrix) minus the term itself, computed in blocks of terms with a boolean bitmap
+    so memory stays bounded whatever the vocabulary size.
+
+    Args:
+        terms: Term id of each posting (one posting per distinct term in a chunk)
+        chunk_ids: Chunk index of each posting
+        num_terms: Vocabulary size
+        num_chunks: Number of chunks
+
+    Returns:
+        Array of unique context counts (one per term id)
+    """
+    # Postings grouped by chunk (chunk -> its terms) and by term (term -> its chunks)
+    by_chunk = np.argsort(chunk_ids, kind='stable')
+    chunk_terms = terms[by_chunk]
+    chunk_sizes = np.bincount(chunk_ids, minlength=num_chunks)
+    chunk_starts = np.concatenate(([0], np.cumsum(chunk_sizes)[:-1]))
+
+    by_term = np.argsort(terms, kind='stable')
+    term_chunks = chunk_ids[by_term]
+    term_indptr = np.zeros(num_terms + 1, dtype=np.int64)
+    np.cumsum(np.bincount(terms, minlength=num_terms), out=term_indptr[1:])
+
+    # Pairs generated by each term = sum of the sizes of the chunks it appears in
+    pairs_per_term = np.bincount(terms, weights=chunk_sizes[chunk_ids], minlength=num_terms)
+    pairs_cumulative = np.cumsum(pairs_per_term)
+    max_block_terms = max(1, CONTEXT_BITMAP_BYTES // max(num_terms, 1))
+
+    unique_contexts = np.zeros(num_terms, dtype=np.int64)
+    start = 0
+    while start < num_terms:
+        # Largest block within the pair budget (always at least one term)
+        offset = pairs_cumulative[start - 1] if start else 0.0
+        end = int(np.searchsorted(pairs_cumulative, offset + CONTEXT_PAIRS_PER_BLOCK, side='right'))
+        end = min(max(end, start + 1), start + max_block_terms, num_terms)
+
+        # Expand every (term, chunk) posting of the block into the chunk's terms
+        block_chunks = term_chunks[term_indptr[start]:term_indptr[end]]
+        block_rows = np.repeat(np.arange(end - start), np.diff(term_indptr[start:end + 1]))
+        sizes = chunk_sizes[block_chunks]
+        positions = np.repeat(chunk_starts[block_chunks] - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+
+        seen = np.zeros((end - start, num_terms), dtype=bool)
+        seen[np.repeat(block_rows, sizes), chunk_terms[positions]] = True
+        unique_contexts[start:end] = seen.sum(axis=1) - 1  # Exclude the term itself
+
+        start = end
+
+    return unique_contexts
+
+
 def create_term_analyzer_from_chunks(
     chunks: List[Any],
     min_term_length: int = 2
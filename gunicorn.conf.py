@@ -0,0 +1,32 @@
+"""
+Gunicorn configuration (read automatically from the working directory)
+
+PRELOAD_MODELS=true: import the app in the master so models are loaded once
+before fork and shared copy-on-write by the workers (see core/model_preload.py).
+"""
+
+import gc
+import os
+
+preload_app = os.getenv('PRELOAD_MODELS', 'false').lower() == 'true'
+
+
+def when_ready(server):
+    """Master is up (app already imported when preloading)"""
+    if preload_app:
+        # PERFORMANCE: Move preloaded objects out of GC tracking, so collections in the
+        # workers do not write to (and un-share) their copy-on-write pages
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    """Worker forked: create per-process sessions and warm up before serving traffic"""
+    if preload_app:
+        # init_db() ran in the master: drop its pooled connections without closing them
+        # (the sockets are shared with the master), so this worker opens its own.
+        # The R2 client (core/s3_storage.py) is rebuilt per process on first use.
+        from core.database import engine
+        engine.dispose(close=False)
+
+        from core.model_preload import init_worker_models
+        init_worker_models()
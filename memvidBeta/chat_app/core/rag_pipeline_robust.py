@@ -26,6 +26,8 @@ logger = logging.getLogger(__name__)
 
 # Add the project root to the Python path
 sys.path.append(str(Path(__file__).parent.parent))
+# Repository root (shared structural index, core/structural_index.py)
+sys.path.append(str(Path(__file__).resolve().parents[3]))
 
 # Import necessary modules
 from core.memvid_retriever import RetrievalResult
@@ -39,6 +41,14 @@ from database.operations import (
 )
 from database.models import get_session
 from config.config import user_settings_manager, DEFAULT_TOP_K, TEMPERATURE, MAX_TOKENS
+from core.structural_index import load_local_document
+from core.positional_index import load_local_positional_index, make_snippet
+
+# Maximum chunks returned for a structural (article / page / section) query
+MAX_STRUCTURAL_RESULTS = 10
+
+# Maximum chunks returned for a "find all" query (the total count is always exact)
+MAX_OCCURRENCE_RESULTS = 30
 
 
 def normalize_text(text: str) -> str:
@@ -76,6 +86,44 @@ def normalize_text(text: str) -> str:
     return text
 
 
+def find_metadata_file(document_id: str) -> Optional[str]:
+    """
+    Find the metadata file of a document (next to its video).
+    
+    Args:
+        document_id: The document ID
+        
+    Returns:
+        Optional[str]: Path of the metadata file, None if not found
+    """
+    # Get document from database
+    document = get_document_by_id(document_id)
+    if not document:
+        logger.error(f"Document {document_id} not found")
+        return None
+    
+    # Get base name and directory
+    video_path = document.video_path
+    video_dir = os.path.dirname(video_path)
+    base_name = os.path.splitext(os.path.basename(video_path))[0]
+    
+    # Find metadata file
+    metadata_file = os.path.join(video_dir, f"{base_name}_metadata.json")
+    if not os.path.exists(metadata_file):
+        # Try alternative names
+        for alt_name in [f"{base_name}_sections_metadata.json", f"{base_name}_simple_metadata.json"]:
+            alt_file = os.path.join(video_dir, alt_name)
+            if os.path.exists(alt_file):
+                metadata_file = alt_file
+                break
+    
+    if not os.path.exists(metadata_file):
+        logger.error(f"Metadata file not found for document {document_id}")
+        return None
+    
+    return metadata_file
+
+
 def direct_metadata_search(document_id: str, query: str, metadata_only: bool = False) -> List[Dict[str, Any]]:
     """
     Perform a direct search in the metadata files, bypassing the Memvid retriever.
@@ -90,36 +138,14 @@ def direct_metadata_search(document_id: str, query: str, metadata_only: bool = F
         List[Dict[str, Any]]: The search results
     """
     try:
-        # Get document from database
-        document = get_document_by_id(document_id)
-        if not document:
-            logger.error(f"Document {document_id} not found")
-            return []
-        
-        # Get base name and directory
-        video_path = document.video_path
-        video_dir = os.path.dirname(video_path)
-        base_name = os.path.splitext(os.path.basename(video_path))[0]
-        
-        # Find metadata file
-        metadata_file = os.path.join(video_dir, f"{base_name}_metadata.json")
-        if not os.path.exists(metadata_file):
-            # Try alternative names
-            for alt_name in [f"{base_name}_sections_metadata.json", f"{base_name}_simple_metadata.json"]:
-                alt_file = os.path.join(video_dir, alt_name)
-                if os.path.exists(alt_file):
-                    metadata_file = alt_file
-                    break
-        
-        if not os.path.exists(metadata_file):
-            logger.error(f"Metadata file not found for document {document_id}")
+        metadata_file = find_metadata_file(document_id)
+        if not metadata_file:
             return []
         
         logger.info(f"Loading metadata from {metadata_file}")
         
-        # Load metadata
-        with open(metadata_file, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
+        # Load metadata + structural index (cached until the metadata file changes)
+        metadata, structure = load_local_document(metadata_file)
         
         # Extract chunks
         chunks = metadata.get('chunks', [])
@@ -139,8 +165,26 @@ def direct_metadata_search(document_id: str, query: str, metadata_only: bool = F
         
         results = []
         
-        # Handle article queries
-        if article_match:
+        # Article / page / last page / section lookup on the structural index
+        structural_match = structure.lookup(query) if structure else None
+        
+        if structural_match:
+            logger.info(
+                f"Structural index: {structural_match.kind} {structural_match.key or ''} "
+                f"-> chunks {structural_match.rows[:MAX_STRUCTURAL_RESULTS]}"
+            )
+            for i in structural_match.rows[:MAX_STRUCTURAL_RESULTS]:
+                chunk = chunks[i]
+                if metadata_only:
+                    results.append({'metadata': chunk.get('metadata', {})})
+                else:
+                    results.append({
+                        'text': normalize_text(chunk['text']),
+                        'metadata': chunk.get('metadata', {})
+                    })
+        
+        # Handle article queries (references without a header in the document)
+        elif article_match:
             article_num = article_match.group(1)
             article_pattern = fr"art(?:\.|icolo)?\s*{article_num}\b|articolo\s+{article_num}\b"
             
@@ -306,6 +350,61 @@ def direct_metadata_search(document_id: str, query: str, metadata_only: bool = F
         return []
 
 
+def occurrence_search(document_id: str, term: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Find all occurrences of a term or phrase with the positional index.
+    
+    Args:
+        document_id: The document ID
+        term: The term or phrase to find
+        
+    Returns:
+        Tuple[List[Dict[str, Any]], Dict[str, Any]]: The chunks of the first occurrences
+        (document order) and the exact totals ('total_occurrences', 'shown_occurrences',
+        'occurrence_pages')
+    """
+    try:
+        metadata_file = find_metadata_file(document_id)
+        if not metadata_file:
+            return [], {}
+        
+        metadata, _ = load_local_document(metadata_file)
+        chunks = metadata.get('chunks', [])
+        index = load_local_positional_index(metadata_file, chunks)
+        if index is None:
+            return [], {}
+        
+        found = index.find(term, limit=MAX_OCCURRENCE_RESULTS * 10)
+        
+        results = []
+        shown = 0
+        for occurrence in found.occurrences:
+            if results and results[-1]['metadata'].get('index') == occurrence.row:
+                shown += 1
+                continue
+            if len(results) >= MAX_OCCURRENCE_RESULTS:
+                break
+            shown += 1
+            chunk = chunks[occurrence.row]
+            results.append({
+                'text': normalize_text(chunk['text']),
+                'metadata': dict(chunk.get('metadata', {}), index=occurrence.row, page=occurrence.page),
+                'snippet': normalize_text(make_snippet(chunks, occurrence))
+            })
+        
+        totals = {
+            'total_occurrences': found.total,
+            'shown_occurrences': shown,
+            'occurrence_pages': [page for page, _ in found.pages]
+        }
+        logger.info(f"Positional index: '{term}' found {found.total} times in {len(found.pages)} pages")
+        return results, totals
+    
+    except Exception as e:
+        logger.error(f"Error in occurrence_search: {str(e)}", exc_info=True)
+        return [], {}
+
+
 def convert_to_retrieval_results(search_results: List[Dict[str, Any]]) -> List[RetrievalResult]:
     """
     Convert direct search results to RetrievalResult objects.
@@ -356,12 +455,15 @@ def format_context_for_llm_robust(results: List[RetrievalResult]) -> str:
         total = results[0].meta_info.get('total_occurrences', 0)
         shown = results[0].meta_info.get('shown_occurrences', 0)
         term = results[0].meta_info.get('search_term', '')
+        pages = results[0].meta_info.get('occurrence_pages', [])
         
         if total > 0 and term:
             if total > shown:
                 count_info = f"\n**NOTA IMPORTANTE**: Ho trovato {total} occorrenze totali del termine '{term}' nel documento. Per motivi di spazio, ne mostro le prime {shown} più rilevanti.\n"
             else:
                 count_info = f"\n**NOTA**: Ho trovato {total} occorrenze del termine '{term}' nel documento. Ecco tutte le occorrenze trovate:\n"
+            if pages:
+                count_info += f"Pagine in cui compare: {', '.join(str(page) for page in pages[:100])}{' ...' if len(pages) > 100 else ''}\n"
             context_parts.append(count_info)
     
     for i, result in enumerate(results):
@@ -484,15 +586,12 @@ def perform_hybrid_search_robust(document_id: str, query: str, top_k: int = DEFA
         
         if search_term:
             logger.info(f"Detected 'find all' query for term: {search_term}")
-            # Use direct search with expanded top_k
-            direct_results = direct_metadata_search(document_id, search_term)
-            if direct_results:
-                total_count = len(direct_results)
-                max_results = 30  # Increased from 20 to 30
-                logger.info(f"Found {total_count} results for find-all query, returning up to {max_results}")
+            # Exact occurrences from the positional index (chunks of the first occurrences)
+            results_to_return, totals = occurrence_search(document_id, search_term)
+            if results_to_return:
+                total_count = totals['total_occurrences']
+                logger.info(f"Found {total_count} occurrences for find-all query, returning {len(results_to_return)} chunks")
                 
-                # Create results with count info
-                results_to_return = direct_results[:min(max_results, total_count)]
                 retrieval_results = convert_to_retrieval_results(results_to_return)
                 
                 # Add count information to the first result's metadata
@@ -501,9 +600,10 @@ def perform_hybrid_search_robust(document_id: str, query: str, top_k: int = DEFA
                     if not hasattr(retrieval_results[0], 'meta_info'):
                         retrieval_results[0].meta_info = {}
                     retrieval_results[0].meta_info['total_occurrences'] = total_count
-                    retrieval_results[0].meta_info['shown_occurrences'] = len(results_to_return)
+                    retrieval_results[0].meta_info['shown_occurrences'] = totals['shown_occurrences']
+                    retrieval_results[0].meta_info['occurrence_pages'] = totals['occurrence_pages']
                     retrieval_results[0].meta_info['search_term'] = search_term
-                    logger.info(f"Added count metadata: {total_count} total, showing {len(results_to_return)}")
+                    logger.info(f"Added count metadata: {total_count} total, showing {len(results_to_return)} chunks")
                 
                 return retrieval_results
     
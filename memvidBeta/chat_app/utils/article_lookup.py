@@ -5,6 +5,7 @@ This module provides a direct lookup function for articles in the TUIR document.
 
 import re
 import os
+import sys
 from pathlib import Path
 import json
 from typing import Dict, List, Optional, Tuple, Any
@@ -15,11 +16,39 @@ BASE_DIR = os.path.dirname(SCRIPT_DIR)
 ENCODER_APP_DIR = os.path.join(BASE_DIR, "encoder_app")
 OUTPUTS_DIR = os.path.join(ENCODER_APP_DIR, "outputs")
 
+# Repository root (shared structural index, core/structural_index.py)
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from core.structural_index import load_local_document
+
+# TUIR metadata file, found once per process
+_tuir_metadata_file = None
+
+
+def find_tuir_metadata_file() -> Optional[str]:
+    """
+    Find the TUIR metadata file in the encoder outputs (cached once found).
+    
+    Returns:
+        Optional[str]: Path of the metadata file, None if not found
+    """
+    global _tuir_metadata_file
+    
+    if _tuir_metadata_file and os.path.exists(_tuir_metadata_file):
+        return _tuir_metadata_file
+    
+    for file in os.listdir(OUTPUTS_DIR):
+        if "TUIR" in file and file.endswith("_metadata.json"):
+            _tuir_metadata_file = os.path.join(OUTPUTS_DIR, file)
+            return _tuir_metadata_file
+    
+    return None
+
 
 def find_article_in_tuir(article_number: str) -> Optional[str]:
     """
     Find a specific article in the TUIR document.
-    Directly accesses the metadata files to find the article text.
+    Uses the structural index of the metadata file (header chunk + continuation
+    chunks), falling back to chunks that mention the article.
     
     Args:
         article_number: The article number to find (as a string)
@@ -28,11 +57,7 @@ def find_article_in_tuir(article_number: str) -> Optional[str]:
         Optional[str]: The article text if found, None otherwise
     """
     # Find the TUIR metadata file
-    metadata_file = None
-    for file in os.listdir(OUTPUTS_DIR):
-        if "TUIR" in file and file.endswith("_metadata.json"):
-            metadata_file = os.path.join(OUTPUTS_DIR, file)
-            break
+    metadata_file = find_tuir_metadata_file()
     
     if not metadata_file:
         print("Could not find TUIR metadata file!")
@@ -40,10 +65,9 @@ def find_article_in_tuir(article_number: str) -> Optional[str]:
     
     print(f"Looking for article {article_number} in {metadata_file}")
     
-    # Load the metadata
+    # Load the metadata + structural index (cached until the metadata file changes)
     try:
-        with open(metadata_file, 'r', encoding='utf-8') as f:
-            metadata = json.load(f)
+        metadata, structure = load_local_document(metadata_file)
         
         chunks = metadata.get('chunks', [])
         if not chunks:
@@ -52,11 +76,17 @@ def find_article_in_tuir(article_number: str) -> Optional[str]:
             
         print(f"Loaded {len(chunks)} chunks from metadata file")
         
-        # Find chunks that contain the article header
+        # Article header + continuation chunks from the structural index
+        article_rows = structure.article_rows(article_number) if structure else []
+        if article_rows:
+            article_text = "\n\n".join(chunks[i]['text'] for i in article_rows[:4])
+            print(f"Extracted article {article_number} text from chunks {article_rows[:4]} ({len(article_text)} characters)")
+            return article_text
+        
+        # No header found: collect the chunks that mention the article
         article_chunks = []
         pattern = fr"(?:art(?:\.|icolo)?\s*{article_number}\.?|articolo\s*{article_number}\.?)"
         
-        # First look for the exact article header
         for i, chunk in enumerate(chunks):
             if 'text' not in chunk:
                 continue
@@ -70,33 +100,7 @@ def find_article_in_tuir(article_number: str) -> Optional[str]:
             print(f"No references to article {article_number} found!")
             return None
         
-        # Find the most likely chunk that contains the article header
-        best_chunk = None
-        for i, chunk in article_chunks:
-            text = chunk['text'].lower()
-            # Look for patterns like "art. 32. reddito agrario"
-            if re.search(fr"art\.\s*{article_number}\.\s", text) or re.search(fr"articolo\s*{article_number}\.\s", text):
-                print(f"Found article {article_number} header in chunk {i}")
-                best_chunk = chunk
-                break
-        
-        if best_chunk:
-            # Extract all relevant chunks that continue the article
-            article_text = best_chunk['text']
-            
-            # Sort remaining chunks by position
-            remaining_chunks = [(i, c) for i, c in article_chunks if c != best_chunk]
-            if all('metadata' in c and 'start' in c['metadata'] for _, c in remaining_chunks):
-                remaining_chunks.sort(key=lambda x: x[1]['metadata']['start'])
-            
-            # Add up to 3 more chunks to get the full article
-            for i, chunk in remaining_chunks[:3]:
-                article_text += "\n\n" + chunk['text']
-            
-            print(f"Extracted article {article_number} text with {len(article_text)} characters")
-            return article_text
-        
-        # If we can't find the exact header, just return all chunks that mention the article
+        # Return all chunks that mention the article
         article_text = ""
         for i, chunk in article_chunks[:4]:  # Limit to 4 chunks
             if article_text:
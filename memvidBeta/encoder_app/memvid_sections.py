@@ -28,6 +28,21 @@ except ImportError:
     MEMVID_AVAILABLE = False
     print("⚠️ memvid non disponibile - solo output JSON sarà supportato")
 
+# Indice strutturale (pagine, articoli, titoli) e indice posizionale (occorrenze)
+# condivisi con il query engine
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+try:
+    from core.structural_index import write_structure_file
+    STRUCTURAL_INDEX_AVAILABLE = True
+except ImportError:
+    STRUCTURAL_INDEX_AVAILABLE = False
+
+try:
+    from core.positional_index import write_positions_file
+    POSITIONAL_INDEX_AVAILABLE = True
+except ImportError:
+    POSITIONAL_INDEX_AVAILABLE = False
+
 # Funzione per aggiornare l'attività corrente
 def update_activity(activity):
     global activity_timestamp, current_activity
@@ -560,6 +575,21 @@ def process_file_in_sections(file_path, chunk_size, overlap, output_format="mp4"
                 "chunks": all_chunks
             }, f, indent=2)
         
+        # Salva l'indice strutturale accanto ai metadati (<nome>_sections_structure.json)
+        if STRUCTURAL_INDEX_AVAILABLE:
+            update_activity("Creazione indice strutturale")
+            structure = write_structure_file(metadata_file, all_chunks)
+            if structure is not None:
+                print(f"Indice strutturale: {len(structure.pages)} pagine, {len(structure.articles)} articoli, "
+                      f"{len(structure.headings)} titoli")
+        
+        # Salva l'indice posizionale accanto ai metadati (<nome>_sections_positions.npz)
+        if POSITIONAL_INDEX_AVAILABLE:
+            update_activity("Creazione indice posizionale")
+            positions = write_positions_file(metadata_file, all_chunks)
+            if positions is not None:
+                print(f"Indice posizionale: {positions.num_tokens} parole, {len(positions.vocab)} termini")
+        
         # Libera memoria
         update_activity("Pulizia memoria prima della generazione video")
         all_chunks = None
@@ -12,6 +12,9 @@ Usage:
     # Returns: https://your-username--socrate-reranker-rerank-api.modal.run
 """
 
+import gzip
+import json
+
 import modal
 
 # Define Modal app
@@ -25,6 +28,9 @@ image = modal.Image.debian_slim().pip_install(
     "fastapi"  # Required for web endpoints
 )
 
+with image.imports():
+    from fastapi import Request
+
 
 # GPU function for reranking
 @app.function(
@@ -76,11 +82,11 @@ def rerank_batch(query: str, chunk_texts: list[str]) -> list[float]:
     timeout=60
 )
 @modal.fastapi_endpoint(method="POST")
-def rerank_api(data: dict):
+async def rerank_api(request: "Request"):
     """
     HTTP API endpoint for reranking.
 
-    Request:
+    Request (body may be gzip-compressed, with Content-Encoding: gzip):
         POST /
         {
             "query": "Come si prepara l'ossobuco?",
@@ -98,6 +104,18 @@ def rerank_api(data: dict):
 
     start_time = time.time()
 
+    body = await request.body()
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        body = gzip.decompress(body)
+
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return {
+            "error": "Request body is not valid JSON",
+            "status": "error"
+        }, 400
+
     # Validate input
     if "query" not in data or "chunks" not in data:
         return {
@@ -130,7 +148,7 @@ def rerank_api(data: dict):
 
     # Call GPU function
     try:
-        scores = rerank_batch.remote(query, chunks)
+        scores = await rerank_batch.remote.aio(query, chunks)
 
         latency_ms = (time.time() - start_time) * 1000
 
@@ -267,6 +267,7 @@ def process_document_task(self, document_id: str, user_id: str):
 
         except Exception as e:
             logger.warning(f"Error loading metadata: {e}")
+            metadata = {'chunks': []}
             total_chunks = 0
             total_tokens = 0
             language = 'unknown'
@@ -279,27 +280,31 @@ def process_document_task(self, document_id: str, user_id: str):
 
         # 6.5. Generate embeddings and FAISS index for fast retrieval
         embeddings_r2_key = None
+        manifest_r2_key = None
+        artifact_r2_keys = []
         faiss_r2_key = None
+        embeddings = None
+        embedding_model = 'sentence-transformers/paraphrase-multilingual-mpnet-base-v2'
 
-        # Generate embeddings INLINE in metadata.json
+        # Generate embeddings as a binary float32 matrix (artifact format v1)
         # This solves the OOM problem during queries by pre-calculating embeddings
         ENABLE_EMBEDDINGS = os.getenv('ENABLE_EMBEDDINGS', 'false').lower() == 'true'
 
         if ENABLE_EMBEDDINGS:
             try:
-                from core.embedding_generator import generate_and_save_embeddings_inline
+                from core.embedding_generator import generate_embeddings_matrix
                 import time
 
                 # Estimate processing time (~0.5 seconds per chunk)
                 estimated_time_minutes = max(1, int((total_chunks * 0.5) / 60))
 
-                logger.info(f"Generating INLINE embeddings for {total_chunks} chunks...")
+                logger.info(f"Generating embeddings for {total_chunks} chunks...")
                 logger.info(f"Estimated time: {estimated_time_minutes} minutes")
 
                 self.update_state(
                     state='PROCESSING',
                     meta={
-                        'status': f'Generating inline embeddings (~{estimated_time_minutes} min)',
+                        'status': f'Generating embeddings (~{estimated_time_minutes} min)',
                         'progress': 85,
                         'total_chunks': total_chunks,
                         'estimated_minutes': estimated_time_minutes
@@ -308,22 +313,20 @@ def process_document_task(self, document_id: str, user_id: str):
 
                 start_time = time.time()
 
-                # Generate embeddings and save INLINE to metadata.json
-                success = generate_and_save_embeddings_inline(
-                    metadata_file=metadata_file
+                embeddings = generate_embeddings_matrix(
+                    [chunk['text'] for chunk in metadata.get('chunks', [])],
+                    model_name=embedding_model
                 )
 
                 elapsed_time = int((time.time() - start_time) / 60)
 
-                if success:
-                    logger.info(f"✅ Inline embeddings generated in {elapsed_time} min (estimated: {estimated_time_minutes})")
-                    # Mark that embeddings are available (inline in metadata)
-                    embeddings_r2_key = "inline"
+                if embeddings is not None:
+                    logger.info(f"✅ Embeddings generated in {elapsed_time} min (estimated: {estimated_time_minutes})")
                 else:
-                    logger.warning("Failed to generate inline embeddings")
+                    logger.warning("Failed to generate embeddings")
 
             except Exception as e:
-                logger.warning(f"Error generating inline embeddings: {e}")
+                logger.warning(f"Error generating embeddings: {e}")
                 logger.warning("Continuing without pre-computed embeddings (queries will be slower)")
         else:
             logger.info("⚠️ Embedding generation DISABLED (set ENABLE_EMBEDDINGS=true to enable)")
@@ -335,20 +338,27 @@ def process_document_task(self, document_id: str, user_id: str):
             meta={'status': 'Uploading metadata to cloud', 'progress': 90}
         )
 
-        # 6.6. Upload metadata JSON to R2 for persistence
-        from core.s3_storage import upload_file
+        # 6.6. Upload document artifact (metadata.json + embeddings.npy + manifest.json) to R2
+        from core.document_artifact import upload_document_artifact, get_document_r2_prefix, ARTIFACT_FORMAT_VERSION
 
-        metadata_r2_key = f"users/{user_id}/documents/{document_id}/metadata.json"
+        metadata_r2_key = None
 
         try:
-            with open(metadata_file, 'rb') as f:
-                metadata_content = f.read()
-
-            upload_success = upload_file(metadata_content, metadata_r2_key, 'application/json')
+            artifact = upload_document_artifact(
+                metadata=metadata,
+                embeddings=embeddings,
+                r2_prefix=get_document_r2_prefix(user_id, document_id),
+                embedding_model=embedding_model if embeddings is not None else None
+            )
 
-            if not upload_success:
+            if artifact:
+                metadata_r2_key = artifact['metadata_r2_key']
+                embeddings_r2_key = artifact['embeddings_r2_key']
+                faiss_r2_key = artifact['faiss_r2_key']
+                manifest_r2_key = artifact['manifest_r2_key']
+                artifact_r2_keys = artifact['artifact_r2_keys']
+            else:
                 logger.warning("Failed to upload metadata to R2, but continuing...")
-                metadata_r2_key = None
         except Exception as e:
             logger.warning(f"Error uploading metadata to R2: {e}")
             metadata_r2_key = None
@@ -372,8 +382,11 @@ def process_document_task(self, document_id: str, user_id: str):
             language=language,
             doc_metadata={
                 'metadata_r2_key': metadata_r2_key,  # R2 key for metadata JSON
-                'embeddings_r2_key': embeddings_r2_key,  # R2 key for embeddings
-                'faiss_r2_key': faiss_r2_key,  # R2 key for FAISS index
+                'embeddings_r2_key': embeddings_r2_key,  # R2 key for embeddings.npy
+                'manifest_r2_key': manifest_r2_key,  # R2 key for artifact manifest
+                'artifact_r2_keys': artifact_r2_keys,  # All artifact files (for cleanup)
+                'artifact_version': ARTIFACT_FORMAT_VERSION if manifest_r2_key else 0,
+                'faiss_r2_key': faiss_r2_key,  # R2 key for per-document ANN index (index.faiss)
                 'metadata_file': metadata_file,  # Keep for backwards compatibility
                 'index_file': index_file if os.path.exists(index_file) else None,
                 'processed_at': datetime.utcnow().isoformat(),
@@ -577,24 +590,22 @@ def process_image_ocr_task(self, document_id: str, user_id: str):
             meta={'status': f'Generating embeddings for {total_chunks} chunks', 'progress': 60}
         )
 
-        # 5. Generate embeddings inline (if enabled)
+        # 5. Generate embeddings (if enabled) - stored as binary matrix, not inline JSON
         ENABLE_EMBEDDINGS = os.getenv('ENABLE_EMBEDDINGS', 'false').lower() == 'true'
         embeddings_generated = False
+        embeddings = None
+        embedding_model = 'all-MiniLM-L6-v2'
 
         if ENABLE_EMBEDDINGS:
             try:
-                logger.info(f"[OCR NEW] Generating inline embeddings for {total_chunks} chunks...")
+                logger.info(f"[OCR NEW] Generating embeddings for {total_chunks} chunks...")
 
                 from sentence_transformers import SentenceTransformer
-                model = SentenceTransformer('all-MiniLM-L6-v2')
+                model = SentenceTransformer(embedding_model)
 
                 # Generate embeddings for all chunks
                 chunk_texts = [chunk['text'] for chunk in chunks]
-                embeddings = model.encode(chunk_texts, show_progress_bar=False)
-
-                # Add embeddings to chunks
-                for i, chunk in enumerate(chunks):
-                    chunk['embedding'] = embeddings[i].tolist()
+                embeddings = model.encode(chunk_texts, show_progress_bar=False, convert_to_numpy=True)
 
                 embeddings_generated = True
                 logger.info(f"[OCR NEW] ✅ Generated embeddings for {total_chunks} chunks")
@@ -640,15 +651,20 @@ def process_image_ocr_task(self, document_id: str, user_id: str):
             meta={'status': 'Uploading metadata to R2', 'progress': 90}
         )
 
-        # 7. Save metadata JSON to R2
-        metadata_r2_key = f"users/{user_id}/documents/{document_id}/metadata.json"
+        # 7. Save document artifact (metadata.json + embeddings.npy + manifest.json) to R2
+        from core.document_artifact import upload_document_artifact, get_document_r2_prefix, ARTIFACT_FORMAT_VERSION
 
-        logger.info(f"[OCR NEW] Uploading metadata to R2: {metadata_r2_key}")
+        r2_prefix = get_document_r2_prefix(user_id, document_id)
+        logger.info(f"[OCR NEW] Uploading document artifact to R2: {r2_prefix}")
 
-        metadata_json = json.dumps(metadata, ensure_ascii=False, indent=2)
-        upload_success = upload_file(metadata_json.encode('utf-8'), metadata_r2_key, 'application/json')
+        artifact = upload_document_artifact(
+            metadata=metadata,
+            embeddings=embeddings,
+            r2_prefix=r2_prefix,
+            embedding_model=embedding_model if embeddings_generated else None
+        )
 
-        if not upload_success:
+        if not artifact:
             logger.error("[OCR NEW] Failed to upload metadata to R2")
             update_document_status(
                 document_id,
@@ -661,6 +677,9 @@ def process_image_ocr_task(self, document_id: str, user_id: str):
                 'error': 'Failed to upload metadata'
             }
 
+        metadata_r2_key = artifact['metadata_r2_key']
+        embeddings_generated = artifact['embeddings_r2_key'] is not None
+
         logger.info(f"[OCR NEW] ✅ Metadata uploaded successfully")
 
         # Update task state
@@ -680,7 +699,11 @@ def process_image_ocr_task(self, document_id: str, user_id: str):
             language=language,
             doc_metadata={
                 'metadata_r2_key': metadata_r2_key,
-                'embeddings_r2_key': 'inline' if embeddings_generated else None,
+                'embeddings_r2_key': artifact['embeddings_r2_key'],
+                'faiss_r2_key': artifact['faiss_r2_key'],
+                'manifest_r2_key': artifact['manifest_r2_key'],
+                'artifact_r2_keys': artifact['artifact_r2_keys'],
+                'artifact_version': ARTIFACT_FORMAT_VERSION if artifact['manifest_r2_key'] else 0,
                 'original_image_r2_key': doc.file_path,
                 'processed_at': datetime.utcnow().isoformat(),
                 'processing_method': 'ocr_direct_chunking',
@@ -0,0 +1,116 @@
+"""
+Test script for precomputed ATSW term statistics (core/term_specificity_analyzer.py)
+Checks that statistics stored in the artifact give the same query weights
+"""
+
+import sys
+import time
+import random
+import tracemalloc
+
+import numpy as np
+
+
+def make_chunks(num_chunks=300, seed=7):
+    """Generate Italian-like test chunks with a few rare terms"""
+    random.seed(seed)
+    words = [
+        'pasta', 'ricetta', 'carbonara', 'Roma', 'aglio', 'olio', 'uovo', 'guanciale',
+        'della', 'nel', 'cucina', "l'ossobuco", 'Milano,', 'tradizionale.'
+    ]
+    return [
+        {'text': ' '.join(random.choice(words) for _ in range(random.randint(5, 80))) + f' raro{i % 40}'}
+        for i in range(num_chunks)
+    ]
+
+
+def test_atsw_statistics_round_trip():
+    """Test that an analyzer loaded from atsw_stats.npz matches the built one"""
+
+    print("=" * 80)
+    print("TEST: ATSW Statistics Round Trip")
+    print("=" * 80)
+
+    from core.term_specificity_analyzer import (
+        create_term_analyzer_from_chunks,
+        UniversalTermSpecificityAnalyzer
+    )
+
+    chunks = make_chunks()
+    built = create_term_analyzer_from_chunks(chunks, min_term_length=2)
+    data = built.to_bytes()
+    loaded = UniversalTermSpecificityAnalyzer.from_bytes(data)
+
+    print(f"[TEST] Vocabulary: {len(built.vocabulary)} terms, statistics: {len(data) / 1024:.1f}KB")
+
+    if loaded.vocabulary != built.vocabulary or loaded.total_chunks != built.total_chunks:
+        print("\n[TEST] FAILED: Vocabulary or chunk count differs")
+        return False
+
+    for query in ['ricetta carbonara Roma raro7', "ossobuco Milano tradizionale", 'parola sconosciuta']:
+        expected = built.compute_query_term_weights(query)
+        actual = loaded.compute_query_term_weights(query)
+        if expected.keys() != actual.keys() or not np.allclose(
+            [expected[t] for t in expected], [actual[t] for t in expected], rtol=1e-5
+        ):
+            print(f"\n[TEST] FAILED: Weights differ for '{query}'")
+            return False
+        if built.identify_key_terms(query) != loaded.identify_key_terms(query):
+            print(f"\n[TEST] FAILED: Key terms differ for '{query}'")
+            return False
+
+    print("\n[TEST] TEST PASSED: Precomputed statistics give the same weights")
+    return True
+
+
+def make_large_corpus(num_chunks, vocab_size=50000, seed=11):
+    """Generate a corpus with a Zipf-like vocabulary (~120 words per chunk)"""
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(1.2, size=num_chunks * 120), vocab_size)
+    words = np.array([f"termine{i}" for i in range(vocab_size + 1)])
+    return [{'text': ' '.join(words[ranks[i * 120:(i + 1) * 120]])} for i in range(num_chunks)]
+
+
+def test_atsw_build_benchmark():
+    """Micro-benchmark: analyzer build time and peak memory on 1k and 10k chunks"""
+
+    print("\n" + "=" * 80)
+    print("TEST: ATSW Build Benchmark")
+    print("=" * 80)
+
+    from core.term_specificity_analyzer import UniversalTermSpecificityAnalyzer
+
+    for num_chunks in (1000, 10000):
+        chunks = make_large_corpus(num_chunks)
+
+        tracemalloc.start()
+        start = time.time()
+        analyzer = UniversalTermSpecificityAnalyzer(chunks, min_term_length=2)
+        build_ms = (time.time() - start) * 1000
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        terms = list(analyzer.vocabulary)[:1000]
+        start = time.time()
+        for term in terms:
+            analyzer.compute_term_specificity(term, 0, 1)
+        per_term_us = (time.time() - start) * 1e6 / len(terms)
+
+        print(
+            f"[TEST] {num_chunks} chunks, {len(analyzer.vocabulary)} terms: build {build_ms:.0f}ms, "
+            f"peak {peak_bytes / 1024 / 1024:.0f}MB, specificity {per_term_us:.1f}us/term"
+        )
+
+        # Dense per-term chunk vectors would need terms x chunks x 8 bytes
+        dense_bytes = len(analyzer.vocabulary) * num_chunks * 8
+        if num_chunks >= 10000 and peak_bytes > dense_bytes / 4:
+            print(f"\n[TEST] FAILED: Peak memory not linear in postings (dense would be {dense_bytes / 1024 / 1024:.0f}MB)")
+            return False
+
+    print("\n[TEST] TEST PASSED: Build benchmark completed")
+    return True
+
+
+if __name__ == "__main__":
+    results = [test_atsw_statistics_round_trip(), test_atsw_build_benchmark()]
+    sys.exit(0 if all(results) else 1)
@@ -23,7 +23,7 @@ def test_cached_loading():
 
     # Test loading speed
     t1 = time.time()
-    from core.reranker_onnx_fixed import rerank_chunks_onnx
+    from core.reranker_onnx import rerank_chunks_onnx
     t2 = time.time()
     print(f"1. Module import: {(t2-t1)*1000:.1f}ms")
 
@@ -0,0 +1,122 @@
+"""
+Test script for the candidate budget planner (core/candidate_budget.py)
+Checks the binding limit per tier and backend, the final top-k floor and
+score-gap early termination
+"""
+
+import sys
+
+
+def test_binding_limits():
+    """Test which limit binds for each tier / query type / backend"""
+
+    print("=" * 80)
+    print("TEST: Candidate Budget Limits")
+    print("=" * 80)
+
+    import core.candidate_budget as candidate_budget
+    from core.candidate_budget import plan_candidate_budget
+
+    # (description, kwargs, expected max_candidates, expected limited_by)
+    cases = [
+        ("small document, coverage below every cap",
+         dict(total_chunks=100, coverage_top_k=20, final_top_k=10), 20, 'coverage'),
+        ("free tier, local backend",
+         dict(total_chunks=5000, coverage_top_k=1000, final_top_k=10), 60, 'tier'),
+        ("pro tier, local backend",
+         dict(total_chunks=5000, coverage_top_k=1000, final_top_k=10, user_tier='pro'), 100, 'tier'),
+        ("free tier summary (x1.5), local backend",
+         dict(total_chunks=5000, coverage_top_k=1000, final_top_k=10, query_type='summary'), 90, 'tier'),
+        ("unknown tier falls back to free",
+         dict(total_chunks=5000, coverage_top_k=1000, final_top_k=10, user_tier='gold'), 60, 'tier'),
+        ("enterprise analyze on Modal: request limit",
+         dict(total_chunks=5000, coverage_top_k=1000, final_top_k=10, user_tier='enterprise',
+              query_type='analyze', use_modal=True), 100, 'backend'),
+    ]
+
+    for description, kwargs, expected_max, expected_limit in cases:
+        budget = plan_candidate_budget(**kwargs)
+        print(f"[TEST] {description}: {budget.max_candidates} (limited by {budget.limited_by})")
+
+        if (budget.max_candidates, budget.limited_by) != (expected_max, expected_limit):
+            print(f"\n[TEST] FAILED: Expected {expected_max} limited by {expected_limit}")
+            return False
+
+    # Slow Modal estimate: (400 ms - 150 ms overhead) / 8 ms per chunk = 31 candidates
+    previous = candidate_budget.MODAL_RERANK_MS_PER_CHUNK
+    candidate_budget.MODAL_RERANK_MS_PER_CHUNK = 8
+    try:
+        budget = plan_candidate_budget(5000, 1000, 10, use_modal=True)
+    finally:
+        candidate_budget.MODAL_RERANK_MS_PER_CHUNK = previous
+    print(f"[TEST] free tier on Modal at 8ms/chunk: {budget.max_candidates} (limited by {budget.limited_by})")
+
+    if (budget.max_candidates, budget.limited_by) != (31, 'latency'):
+        print("\n[TEST] FAILED: Expected 31 limited by latency")
+        return False
+
+    print("\n[TEST] TEST PASSED: Candidate budget limits")
+    return True
+
+
+def test_final_top_k_floor():
+    """Test that the budget never drops below the chunks the reranker must return"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Final Top-K Floor")
+    print("=" * 80)
+
+    from core.candidate_budget import plan_candidate_budget
+
+    budget = plan_candidate_budget(total_chunks=5000, coverage_top_k=5, final_top_k=12)
+    print(f"[TEST] coverage 5, final_top_k 12: {budget}")
+
+    if (budget.max_candidates, budget.min_candidates, budget.limited_by) != (12, 12, 'final_top_k'):
+        print("\n[TEST] FAILED: Expected the final top-k as floor")
+        return False
+
+    budget = plan_candidate_budget(total_chunks=8, coverage_top_k=2, final_top_k=12)
+    print(f"[TEST] 8-chunk document, final_top_k 12: {budget}")
+
+    if (budget.max_candidates, budget.min_candidates) != (8, 8):
+        print("\n[TEST] FAILED: Expected the whole (small) document")
+        return False
+
+    print("\n[TEST] TEST PASSED: Final top-k floor")
+    return True
+
+
+def test_score_gap_cutoff():
+    """Test score-gap early termination on flat, gradual and cliff-shaped score lists"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Score-Gap Cutoff")
+    print("=" * 80)
+
+    from core.candidate_budget import score_gap_cutoff
+
+    # (description, scores, min_keep, expected keep)
+    cases = [
+        ("flat scores", [0.5] * 10, 3, 10),
+        ("gradual decline", [1.0 - i * 0.1 for i in range(10)], 3, 10),
+        ("single cliff", [0.9, 0.88, 0.86, 0.85, 0.2, 0.18, 0.15], 2, 4),
+        ("cliff inside min_keep is not cut", [0.9, 0.1, 0.09, 0.08], 2, 4),
+        ("min_keep larger than the list", [0.9, 0.2, 0.1], 5, 3),
+        ("empty list", [], 3, 0),
+    ]
+
+    for description, scores, min_keep, expected in cases:
+        keep = score_gap_cutoff(scores, min_keep)
+        print(f"[TEST] {description}: keep {keep} of {len(scores)} (min_keep {min_keep})")
+
+        if keep != expected:
+            print(f"\n[TEST] FAILED: Expected to keep {expected}")
+            return False
+
+    print("\n[TEST] TEST PASSED: Score-gap cutoff")
+    return True
+
+
+if __name__ == "__main__":
+    results = [test_binding_limits(), test_final_top_k_floor(), test_score_gap_cutoff()]
+    sys.exit(0 if all(results) else 1)
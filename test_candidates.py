@@ -0,0 +1,136 @@
+"""
+Test script for compact retrieval candidates (core/candidates.py)
+Checks that candidates hide inline embeddings, never mutate the shared chunk,
+copy independently and serialize to JSON
+"""
+
+import sys
+import json
+
+
+def make_chunks():
+    """Legacy-style chunks with inline embeddings (shared document chunk list)"""
+    return [
+        {
+            'text': f"Articolo {i}: il reddito agrario dei terreni",
+            'metadata': {'page': i + 1},
+            'embedding': [0.1 * i] * 8
+        }
+        for i in range(5)
+    ]
+
+
+def test_hidden_embedding():
+    """Test that 'embedding' is invisible through get, iteration and to_dict"""
+
+    print("=" * 80)
+    print("TEST: Hidden Embedding")
+    print("=" * 80)
+
+    from core.candidates import CandidateChunk
+
+    chunks = make_chunks()
+    candidate = CandidateChunk(chunks, 2, similarity_score=0.8)
+
+    print(f"[TEST] keys={list(candidate)}")
+    print(f"[TEST] get('embedding')={candidate.get('embedding')}, 'embedding' in candidate={'embedding' in candidate}")
+
+    if candidate.get('embedding') is not None or 'embedding' in candidate:
+        print("\n[TEST] FAILED: 'embedding' should not be readable")
+        return False
+    if 'embedding' in list(candidate) or 'embedding' in candidate.to_dict():
+        print("\n[TEST] FAILED: 'embedding' should not be iterated or materialized")
+        return False
+    if candidate['text'] != chunks[2]['text'] or candidate['chunk_row'] != 2 or candidate['similarity_score'] != 0.8:
+        print("\n[TEST] FAILED: Chunk and candidate fields should resolve")
+        return False
+    if len(candidate) != len(candidate.to_dict()) or set(candidate.to_dict()) != {
+            'chunk_row', 'similarity_score', 'text', 'metadata'}:
+        print("\n[TEST] FAILED: len() and to_dict() should agree on the visible fields")
+        return False
+
+    print("\n[TEST] TEST PASSED: Hidden embedding")
+    return True
+
+
+def test_overlay_writes():
+    """Test that writes go to the candidate overlay and the shared chunk is never mutated"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Overlay Writes")
+    print("=" * 80)
+
+    from core.candidates import CandidateChunk
+
+    chunks = make_chunks()
+    original = json.dumps(chunks, sort_keys=True)
+    candidate = CandidateChunk(chunks, 1, similarity_score=0.5)
+
+    candidate['rerank_score'] = 0.9
+    candidate['text'] = "Testo evidenziato"  # Shadows the chunk field
+    candidate.update({'diversity_rank': 1})
+
+    print(f"[TEST] candidate text={candidate['text']!r}, rerank_score={candidate['rerank_score']}")
+    print(f"[TEST] shared chunk unchanged={json.dumps(chunks, sort_keys=True) == original}")
+
+    if json.dumps(chunks, sort_keys=True) != original:
+        print("\n[TEST] FAILED: Writes should not reach the shared chunk")
+        return False
+    if candidate['text'] != "Testo evidenziato" or candidate['diversity_rank'] != 1:
+        print("\n[TEST] FAILED: Writes should be visible through the candidate")
+        return False
+
+    # Deleting the overlay reveals the shared field again; chunk fields cannot be deleted
+    del candidate['text']
+    try:
+        del candidate['metadata']
+        deleted_chunk_field = True
+    except KeyError:
+        deleted_chunk_field = False
+    print(f"[TEST] after del: text={candidate['text']!r}, chunk field deletable={deleted_chunk_field}")
+
+    if candidate['text'] != chunks[1]['text'] or deleted_chunk_field or 'metadata' not in chunks[1]:
+        print("\n[TEST] FAILED: Only overlay fields should be deletable")
+        return False
+
+    print("\n[TEST] TEST PASSED: Overlay writes")
+    return True
+
+
+def test_copy_and_json():
+    """Test that copy() is independent and to_dict() is JSON-serializable"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Copy and JSON")
+    print("=" * 80)
+
+    from core.candidates import CandidateChunk
+
+    chunks = make_chunks()
+    candidate = CandidateChunk(chunks, 3, similarity_score=0.7)
+    clone = candidate.copy()
+    clone['rerank_score'] = 0.2
+    clone['similarity_score'] = 0.1
+
+    print(f"[TEST] original={candidate!r}")
+    print(f"[TEST] copy={clone!r}")
+
+    if 'rerank_score' in candidate or candidate['similarity_score'] != 0.7 or clone.row != candidate.row:
+        print("\n[TEST] FAILED: A copy should have its own score fields over the same row")
+        return False
+
+    serialized = json.dumps(candidate.to_dict())
+    print(f"[TEST] json.dumps(to_dict()) = {serialized}")
+
+    if json.loads(serialized) != {'chunk_row': 3, 'similarity_score': 0.7,
+                                  'text': chunks[3]['text'], 'metadata': chunks[3]['metadata']}:
+        print("\n[TEST] FAILED: Unexpected serialized candidate")
+        return False
+
+    print("\n[TEST] TEST PASSED: Copy and JSON")
+    return True
+
+
+if __name__ == "__main__":
+    results = [test_hidden_embedding(), test_overlay_writes(), test_copy_and_json()]
+    sys.exit(0 if all(results) else 1)
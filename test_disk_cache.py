@@ -0,0 +1,260 @@
+"""
+Test script for the local disk cache of R2 downloads (core/disk_cache.py)
+Checks LRU / LFU eviction under the byte budget, running totals, throttled
+.meta writes and ETag revalidation against a stand-in for R2, and the memory-mapped
+array tier of the document cache stored in it
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+
+
+class FakeR2:
+    """Stand-in for get_file_if_modified_uncached: objects with ETags, 304 on a matching If-None-Match"""
+
+    def __init__(self):
+        self.objects = {}
+        self.requests = []
+        self.unreachable = False
+
+    def put(self, key, data):
+        self.objects[key] = (data, f'"{key}-{len(self.requests)}-{len(data)}"')
+
+    def get_file_if_modified_uncached(self, file_key, etag=None, last_modified=None):
+        self.requests.append((file_key, etag))
+        if self.unreachable or file_key not in self.objects:
+            return None
+        data, current_etag = self.objects[file_key]
+        if etag == current_etag:
+            return {'not_modified': True, 'data': None, 'etag': etag, 'last_modified': None}
+        return {'not_modified': False, 'data': data, 'etag': current_etag, 'last_modified': None}
+
+
+def install_fake_r2():
+    """Route DiskCache downloads to a FakeR2 (None if core.s3_storage cannot be imported)"""
+    try:
+        import core.s3_storage as s3_storage
+    except ImportError:
+        return None
+
+    fake = FakeR2()
+    s3_storage.get_file_if_modified_uncached = fake.get_file_if_modified_uncached
+    return fake
+
+
+def test_eviction_policies():
+    """Test that LRU evicts the least recently used object and LFU the least frequently used"""
+
+    print("=" * 80)
+    print("TEST: Disk Cache Eviction (LRU / LFU)")
+    print("=" * 80)
+
+    fake = install_fake_r2()
+    if fake is None:
+        print("[TEST] SKIPPED: boto3 not installed")
+        return True
+
+    from core.disk_cache import DiskCache
+
+    for key in ('a', 'b', 'c', 'd'):
+        fake.put(key, key.encode('utf-8') * 100)
+
+    # a b c fill the budget, a few more accesses, then d overflows it
+    expected = {'lru': 'c', 'lfu': 'b'}
+
+    for policy in ('lru', 'lfu'):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = DiskCache(tmp, max_bytes=300, policy=policy, revalidate_seconds=60)
+            for key in ('a', 'b', 'c'):
+                cache.get(key)
+                time.sleep(0.01)
+
+            if policy == 'lru':
+                # b then a touched last: c is the least recently used
+                for key in ('b', 'a'):
+                    cache.get(key)
+                    time.sleep(0.01)
+            else:
+                # b touched last, but a and c are used more often
+                for key in ('a', 'a', 'c', 'c', 'b'):
+                    cache.get(key)
+                    time.sleep(0.01)
+
+            cache.get('d')
+            cached = sorted(key for key in 'abcd' if os.path.exists(cache._base_path(key) + '.bin'))
+            stats = cache.get_stats()
+            print(f"[TEST] {policy}: cached={cached}, entries={stats['entries']}, "
+                  f"bytes={stats['bytes']}, evictions={stats['evictions']}")
+
+            evicted = set('abcd') - set(cached)
+            if evicted != {expected[policy]} or stats['entries'] != 3 or stats['bytes'] != 300:
+                print(f"\n[TEST] FAILED: Expected '{expected[policy]}' evicted and 300 bytes in 3 entries")
+                return False
+
+            # Another process sharing the directory sees the same totals
+            other = DiskCache(tmp, max_bytes=300, policy=policy)
+            if (other.get_stats()['entries'], other.get_stats()['bytes']) != (3, 300):
+                print("\n[TEST] FAILED: A second cache on the directory should start from its contents")
+                return False
+
+    print("\n[TEST] TEST PASSED: Eviction policies")
+    return True
+
+
+def test_revalidation():
+    """Test ETag revalidation, re-download on change, stale copy when R2 is down and throttled .meta writes"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Disk Cache Revalidation")
+    print("=" * 80)
+
+    fake = install_fake_r2()
+    if fake is None:
+        print("[TEST] SKIPPED: boto3 not installed")
+        return True
+
+    from core.disk_cache import DiskCache
+
+    fake.put('doc/embeddings.npy', b'v1' * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Fresh window: hits skip R2 and do not rewrite .meta
+        cache = DiskCache(tmp, max_bytes=10_000, revalidate_seconds=60, touch_seconds=60)
+        cache.get('doc/embeddings.npy')
+        meta_path = cache._base_path('doc/embeddings.npy') + '.meta'
+        meta_before = open(meta_path).read()
+        requests_before = len(fake.requests)
+        for _ in range(20):
+            cache.get('doc/embeddings.npy')
+        print(f"[TEST] 20 fresh hits: {len(fake.requests) - requests_before} R2 requests, "
+              f".meta rewritten={open(meta_path).read() != meta_before}")
+
+        if len(fake.requests) != requests_before or open(meta_path).read() != meta_before:
+            print("\n[TEST] FAILED: Fresh hits should touch neither R2 nor .meta")
+            return False
+
+        # Revalidate every time: unchanged -> 304 with the stored ETag
+        cache.revalidate_seconds = 0
+        _, etag = cache.get_with_etag('doc/embeddings.npy')
+        print(f"[TEST] unchanged: If-None-Match={fake.requests[-1][1]}, revalidations={cache.revalidations}")
+
+        if fake.requests[-1][1] != etag or cache.revalidations != 1:
+            print("\n[TEST] FAILED: Expected a 304 revalidation with the stored ETag")
+            return False
+
+        # Changed on R2 -> new body and ETag
+        fake.put('doc/embeddings.npy', b'v2' * 80)
+        data, new_etag = cache.get_with_etag('doc/embeddings.npy')
+        print(f"[TEST] changed: {len(data)} bytes, new etag={new_etag != etag}, "
+              f"bytes={cache.get_stats()['bytes']}")
+
+        if data != b'v2' * 80 or new_etag == etag or cache.get_stats()['bytes'] != 160:
+            print("\n[TEST] FAILED: Expected the new version and updated totals")
+            return False
+
+        # R2 unreachable -> stale local copy
+        fake.unreachable = True
+        data = cache.get('doc/embeddings.npy')
+        print(f"[TEST] R2 down: served {len(data) if data else None} bytes, stale_hits={cache.stale_hits}")
+
+        if data != b'v2' * 80 or cache.stale_hits != 1:
+            print("\n[TEST] FAILED: Expected the stale copy while R2 is unreachable")
+            return False
+
+        # Invalidate (delete / overwrite on R2) -> gone from disk and totals
+        cache.invalidate('doc/embeddings.npy')
+        stats = cache.get_stats()
+        print(f"[TEST] invalidated: entries={stats['entries']}, bytes={stats['bytes']}")
+
+        if stats['entries'] != 0 or stats['bytes'] != 0 or cache.get('doc/embeddings.npy') is not None:
+            print("\n[TEST] FAILED: Invalidated object should be gone")
+            return False
+
+    print(f"[TEST] Stats: {cache.get_stats()}")
+    print("\n[TEST] TEST PASSED: Revalidation")
+    return True
+
+
+def test_mmap_store():
+    """Test that memory-mapped arrays are the DiskCache files themselves: one copy, budgeted, removed on delete"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Memory-Mapped Arrays in the Disk Cache")
+    print("=" * 80)
+
+    fake = install_fake_r2()
+    if fake is None:
+        print("[TEST] SKIPPED: boto3 not installed")
+        return True
+
+    from core.document_artifact import embeddings_to_bytes
+    from core.document_cache import DocumentCache
+    import core.document_cache as document_cache_module
+    import core.s3_storage as s3_storage
+
+    matrices = {}
+    for i in range(3):
+        key = f"users/u/documents/d{i}/embeddings.npy"
+        matrices[key] = np.random.default_rng(i).normal(size=(200, 64)).astype(np.float32)
+        fake.put(key, embeddings_to_bytes(matrices[key]))
+    size = len(fake.objects[key][0])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Leftovers of the former layout are dropped
+        open(os.path.join(tmp, 'abc.npy'), 'wb').close()
+        open(os.path.join(tmp, 'abc.npy.etag'), 'wb').close()
+
+        cache = DocumentCache(max_bytes=1024 * 1024, revalidate_seconds=0, mmap_dir=tmp)
+        cache.mmap_store.max_bytes = 2 * size + 1
+        cache.mmap_store.revalidate_seconds = 0
+
+        keys = list(matrices)
+        mapped = [cache.load_r2_array(key) for key in keys]
+        files = sorted(os.listdir(tmp))
+        stats = cache.get_stats()['mmap_store']
+        store_path = cache.mmap_store._base_path(keys[-1]) + '.bin'
+        print(f"[TEST] 3 arrays of {size / 1024:.0f}KB, budget for 2: files={len(files)}, store={stats}")
+        print(f"[TEST] mapped from the store file: {mapped[-1].filename == store_path}")
+
+        if any(name.endswith('.npy') or name.endswith('.etag') for name in files):
+            print("\n[TEST] FAILED: Former .npy/.etag files should be gone")
+            return False
+        if stats['entries'] != 2 or stats['evictions'] != 1 or mapped[-1].filename != store_path:
+            print("\n[TEST] FAILED: Expected arrays mapped from the budgeted store")
+            return False
+        if not all(np.array_equal(m, matrices[key]) for m, key in zip(mapped, keys)):
+            print("\n[TEST] FAILED: Mapped arrays differ from R2 (eviction must not break mappings)")
+            return False
+
+        # Unchanged on R2: same mapping, no re-download
+        requests_before = len(fake.requests)
+        again = cache.load_r2_array(keys[-1])
+        print(f"[TEST] revalidated: same mapping={again is mapped[-1]}, "
+              f"If-None-Match sent={fake.requests[requests_before][1] is not None}")
+
+        if again is not mapped[-1] or fake.requests[requests_before][1] is None:
+            print("\n[TEST] FAILED: Expected a 304 revalidation reusing the mapping")
+            return False
+
+        # Document deleted on R2: local copy removed
+        document_cache_module._document_cache_instance = cache
+        s3_storage._invalidate_disk_cache(keys[-1])
+        print(f"[TEST] after delete: file present={os.path.exists(store_path)}, "
+              f"entries={cache.get_stats()['mmap_store']['entries']}")
+        document_cache_module._document_cache_instance = None
+
+        if os.path.exists(store_path) or cache.get_stats()['mmap_store']['entries'] != 1:
+            print("\n[TEST] FAILED: Deleting the object should remove its local copy")
+            return False
+
+    print("\n[TEST] TEST PASSED: Memory-mapped arrays in the disk cache")
+    return True
+
+
+if __name__ == "__main__":
+    results = [test_eviction_policies(), test_revalidation(), test_mmap_store()]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,153 @@
+"""
+Test script for the process-local document cache (core/document_cache.py)
+Checks single-flight builds under concurrent misses and document versions
+for per-version derived caches
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+
+
+def test_single_flight_build():
+    """Test that concurrent misses on one key run the builder once and share its value"""
+
+    print("=" * 80)
+    print("TEST: Single-Flight Builds")
+    print("=" * 80)
+
+    from core.document_cache import SizedLRUCache
+
+    cache = SizedLRUCache(max_bytes=1024, name='test')
+    calls = []
+
+    def builder():
+        calls.append(threading.get_ident())
+        time.sleep(0.2)  # Slow parse of a cold document
+        return {'chunks': list(range(10))}
+
+    def oversized_builder():
+        calls.append(threading.get_ident())
+        time.sleep(0.2)
+        return 'x' * 4096
+
+    for name, key, build, size in (
+        ('cached', 'doc-a', builder, 100),
+        ('too large to cache', 'doc-b', oversized_builder, 4096)
+    ):
+        calls.clear()
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_build(key, build, lambda value: size)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        shared = all(result is results[0] for result in results)
+        print(f"[TEST] {name}: 8 concurrent misses -> {len(calls)} build(s), shared value={shared}")
+
+        if len(calls) != 1 or len(results) != 8 or not shared:
+            print("\n[TEST] FAILED: Expected one build shared by all callers")
+            return False
+
+    # Failed build: every waiter sees the error, the next call builds again
+    def failing_builder():
+        calls.append(threading.get_ident())
+        time.sleep(0.1)
+        raise ValueError("corrupt metadata")
+
+    calls.clear()
+    errors = []
+
+    def call_failing():
+        try:
+            cache.get_or_build('doc-c', failing_builder, lambda value: 100)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call_failing) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    value = cache.get_or_build('doc-c', lambda: 'rebuilt', lambda value: 10)
+    print(f"[TEST] failing build: {len(calls)} build(s), {len(errors)} errors, then {value!r}")
+
+    if len(calls) != 1 or len(errors) != 4 or value != 'rebuilt':
+        print("\n[TEST] FAILED: A failed build should reach all waiters and not be cached")
+        return False
+
+    print(f"[TEST] Stats: {cache.get_stats()}")
+    print("\n[TEST] TEST PASSED: Single-flight builds")
+    return True
+
+
+def test_document_versions():
+    """Test that loads return their version even when too large to cache, and that re-uploads change it"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Document Versions")
+    print("=" * 80)
+
+    from core.document_cache import DocumentCache
+    from core.document_artifact import load_document_artifact
+
+    chunks = [{'text': f"Chunk {i} sul reddito agrario", 'embedding': [float(i), 1.0]} for i in range(20)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'metadata.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'chunks': chunks}, f)
+
+        # Budget smaller than the parsed JSON: nothing is cached, the version is still known
+        cache = DocumentCache(max_bytes=64)
+        metadata, version = cache.load_local_json(path, with_version=True)
+        print(f"[TEST] too large to cache: version={version}, cached version={cache.get_version(path)}")
+
+        if not metadata or version is None or cache.get_version(path) is not None:
+            print("\n[TEST] FAILED: Expected a version from the load itself")
+            return False
+
+        document = load_document_artifact(metadata, path, False, cache, version=version)
+        print(f"[TEST] cache_key={document.cache_key}")
+
+        if document.cache_key != f"{path}@{version}" or document.embeddings is None:
+            print("\n[TEST] FAILED: Expected a versioned cache key and inline embeddings")
+            return False
+
+        # Re-upload: new version, new derived cache key
+        time.sleep(0.01)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'chunks': chunks[:10]}, f)
+        metadata, new_version = cache.load_local_json(path, with_version=True)
+        print(f"[TEST] after re-upload: version={new_version}, chunks={len(metadata['chunks'])}")
+
+        if new_version == version or len(metadata['chunks']) != 10:
+            print("\n[TEST] FAILED: A re-upload should change the version")
+            return False
+
+    # Unknown version: no cache key, derived structures built without caching
+    cache = DocumentCache(max_bytes=1024 * 1024)
+    document = load_document_artifact({'chunks': chunks}, 'docs/unknown/metadata.json', False, cache)
+    stats = cache.get_stats()
+    print(f"[TEST] unknown version: cache_key={document.cache_key}, "
+          f"embeddings={document.embeddings is not None}, cached entries={stats['entries']}")
+
+    if document.cache_key is not None or document.embeddings is None or stats['entries'] != 0:
+        print("\n[TEST] FAILED: Without a version derived caches should be skipped")
+        return False
+
+    print("\n[TEST] TEST PASSED: Document versions")
+    return True
+
+
+if __name__ == "__main__":
+    results = [test_single_flight_build(), test_document_versions()]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,82 @@
+"""
+Test script for the embedding model registry (core/embedding_models.py)
+Checks per-document model resolution and encoder registry eviction
+"""
+
+import sys
+
+
+def test_resolve_embedding_model():
+    """Test that documents resolve to the model that embedded them"""
+
+    print("=" * 80)
+    print("TEST: Document Embedding Model Resolution")
+    print("=" * 80)
+
+    from core.embedding_models import (
+        resolve_embedding_model,
+        DEFAULT_EMBEDDING_MODEL,
+        FALLBACK_EMBEDDING_MODEL
+    )
+
+    cases = [
+        # (recorded model, dim, expected model, expected source)
+        ('all-MiniLM-L6-v2', 384, FALLBACK_EMBEDDING_MODEL, 'manifest'),
+        (DEFAULT_EMBEDDING_MODEL, 768, DEFAULT_EMBEDDING_MODEL, 'manifest'),
+        (None, 384, FALLBACK_EMBEDDING_MODEL, 'dimension'),
+        (None, 768, DEFAULT_EMBEDDING_MODEL, 'dimension'),
+        ('all-MiniLM-L6-v2', 768, DEFAULT_EMBEDDING_MODEL, 'dimension'),
+        ('intfloat/multilingual-e5-small', 384, 'intfloat/multilingual-e5-small', 'manifest'),
+        (None, 1024, DEFAULT_EMBEDDING_MODEL, 'default')
+    ]
+
+    for recorded, dim, expected_model, expected_source in cases:
+        info = resolve_embedding_model(recorded, dim)
+        print(f"[TEST] {recorded} ({dim}-dim) -> {info.model_id} [{info.source}]")
+        if info.model_id != expected_model or info.source != expected_source:
+            print(f"\n[TEST] FAILED: Expected {expected_model} [{expected_source}]")
+            return False
+
+    print("\n[TEST] TEST PASSED: Models resolved from manifest or dimension")
+    return True
+
+
+def test_encoder_registry():
+    """Test LRU eviction of loaded encoders (default model pinned)"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Encoder Registry")
+    print("=" * 80)
+
+    import core.embedding_models as embedding_models
+
+    original_load_encoder = embedding_models.load_encoder
+    embedding_models.load_encoder = lambda model_id: f"encoder:{model_id}"
+
+    try:
+        registry = embedding_models.EncoderRegistry(max_models=2)
+        default = embedding_models.DEFAULT_EMBEDDING_MODEL
+
+        for model_id in (default, 'org/model-a', 'org/model-b', 'org/model-a'):
+            registry.get(model_id)
+
+        stats = registry.get_stats()
+        print(f"[TEST] Registry: {stats}")
+
+        if default not in stats['loaded'] or 'org/model-b' in stats['loaded'] or stats['loads'] != 4:
+            print("\n[TEST] FAILED: Default model evicted or LRU order not respected")
+            return False
+
+        if registry.get('all-MiniLM-L6-v2') != 'encoder:sentence-transformers/all-MiniLM-L6-v2':
+            print("\n[TEST] FAILED: Model ids not canonicalized")
+            return False
+    finally:
+        embedding_models.load_encoder = original_load_encoder
+
+    print("\n[TEST] TEST PASSED: Encoders kept per model, default pinned")
+    return True
+
+
+if __name__ == "__main__":
+    results = [test_resolve_embedding_model(), test_encoder_registry()]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,144 @@
+"""
+Test script for the keyword inverted index (core/keyword_index.py)
+Checks that indexed keyword scores match the original per-chunk loop
+"""
+
+import sys
+import time
+import random
+
+import numpy as np
+
+
+def legacy_keyword_scores(term_boosts, chunks):
+    """Original SimpleQueryEngine keyword loop (reference implementation)"""
+    scores = np.zeros(len(chunks))
+    for i, chunk in enumerate(chunks):
+        if 'text' not in chunk:
+            continue
+        text_lower = chunk['text'].lower()
+        score = 0
+        for term, boost in term_boosts.items():
+            score += text_lower.count(term) * boost
+            for word in text_lower.split():
+                if term in word and term != word:
+                    score += 0.5 * boost
+        scores[i] = score
+    return scores
+
+
+def make_chunks(num_chunks=3000, seed=42):
+    """Generate Italian-like test chunks (with punctuation and capitalization)"""
+    random.seed(seed)
+    words = [
+        'pasta', 'pastasciutta', 'Pasta,', 'ricetta', 'ricette', 'carbonara', 'aglio',
+        'olio', 'peperoncino', 'uovo', 'uova', 'guanciale', 'pecorino', 'Roma', 'romana',
+        'Lazio.', 'del', 'della', 'nel', 'cucina', 'tradizionale'
+    ]
+    chunks = [
+        {'text': ' '.join(random.choice(words) for _ in range(random.randint(0, 200)))}
+        for _ in range(num_chunks)
+    ]
+    chunks.append({'metadata': {'index': num_chunks}})  # Chunk without text
+    return chunks
+
+
+def test_keyword_index_parity():
+    """Test that KeywordIndex.score() equals the original loop"""
+
+    print("=" * 80)
+    print("TEST: Keyword Index Parity")
+    print("=" * 80)
+
+    from core.keyword_index import build_keyword_index, KeywordIndex
+
+    chunks = make_chunks()
+    term_boosts = {'pasta': 2.0, 'roma': 4.0, 'uov': 2.0, 'lazio.': 1.5, 'inesistente': 2.0}
+
+    start = time.time()
+    expected = legacy_keyword_scores(term_boosts, chunks)
+    legacy_ms = (time.time() - start) * 1000
+
+    keyword_index = build_keyword_index(chunks)
+
+    # Round trip through the artifact serialization
+    keyword_index = KeywordIndex.from_bytes(keyword_index.to_bytes())
+
+    start = time.time()
+    actual = keyword_index.score(term_boosts)
+    indexed_ms = (time.time() - start) * 1000
+
+    print(f"[TEST] Chunks: {len(chunks)}, vocabulary: {len(keyword_index.vocab)}")
+    print(f"[TEST] Legacy loop: {legacy_ms:.1f}ms | Inverted index: {indexed_ms:.1f}ms")
+
+    if not np.allclose(expected, actual):
+        diff = np.flatnonzero(~np.isclose(expected, actual))
+        print(f"\n[TEST] FAILED: {len(diff)} chunks differ (first: {diff[:5].tolist()})")
+        return False
+
+    print("\n[TEST] TEST PASSED: Indexed scores match the original loop")
+    return True
+
+
+def test_keyword_index_bm25():
+    """Test that BM25 scores are finite and rank matching chunks first"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Keyword Index BM25")
+    print("=" * 80)
+
+    from core.keyword_index import build_keyword_index
+
+    chunks = [
+        {'text': 'Ricetta della carbonara romana con guanciale e pecorino'},
+        {'text': 'Storia della cucina tradizionale del Lazio'},
+        {'text': 'Carbonara carbonara carbonara'},
+        {'text': ''}
+    ]
+    keyword_index = build_keyword_index(chunks)
+    scores = keyword_index.score_bm25({'carbonara': 2.0, 'guanciale': 2.0})
+
+    print(f"[TEST] BM25 scores: {np.round(scores, 3).tolist()}")
+
+    if not np.all(np.isfinite(scores)) or scores[1] != 0 or scores[3] != 0:
+        print("\n[TEST] FAILED: Unexpected BM25 scores")
+        return False
+
+    if scores[0] <= scores[2]:
+        print("\n[TEST] FAILED: Chunk matching both terms should rank first")
+        return False
+
+    print("\n[TEST] TEST PASSED: BM25 scoring works")
+    return True
+
+
+def test_keyword_index_score_many():
+    """Test that batch scoring (shared postings) equals scoring queries one by one"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Keyword Index Batch Scoring")
+    print("=" * 80)
+
+    from core.keyword_index import build_keyword_index
+
+    keyword_index = build_keyword_index(make_chunks(num_chunks=500))
+    queries = [
+        {'pasta': 2.0, 'roma': 4.0},
+        {'pasta': 1.5, 'carbonara': 2.0},
+        {'guanciale': 3.0, 'roma': 1.0}
+    ]
+
+    for bm25 in (False, True):
+        batch = keyword_index.score_many(queries, bm25=bm25)
+        single = [keyword_index.score_bm25(q) if bm25 else keyword_index.score(q) for q in queries]
+        if not all(np.allclose(b, s) for b, s in zip(batch, single)):
+            print(f"\n[TEST] FAILED: Batch scores differ (bm25={bm25})")
+            return False
+
+    print("\n[TEST] TEST PASSED: Batch scores match single-query scores")
+    return True
+
+
+if __name__ == "__main__":
+    results = [test_keyword_index_parity(), test_keyword_index_bm25(), test_keyword_index_score_many()]
+    sys.exit(0 if all(results) else 1)
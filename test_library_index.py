@@ -0,0 +1,230 @@
+"""
+Test script for the cross-document library index (core/library_index.py)
+Checks incremental sync by document id + version, global top-k merging across
+shards and dropping deleted documents, over local artifact and legacy documents
+"""
+
+import os
+import sys
+import json
+import uuid
+import tempfile
+
+import numpy as np
+
+EMBEDDING_DIM = 16
+
+
+def write_document(root, name, num_chunks, seed, legacy=False):
+    """
+    Write a processed document under root/name (artifact format, or legacy inline embeddings)
+
+    Returns:
+        (metadata.json path, normalized embedding matrix, chunks)
+    """
+    from core.keyword_index import build_keyword_index
+
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(num_chunks, EMBEDDING_DIM)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    chunks = [
+        {
+            'text': f"{name} parte {i}: " + ("reddito agrario dei terreni" if i % 7 == 0 else "canone di affitto"),
+            'metadata': {'index': i, 'page': i // 3 + 1}
+        }
+        for i in range(num_chunks)
+    ]
+
+    directory = os.path.join(root, name)
+    os.makedirs(directory)
+    metadata_path = os.path.join(directory, 'metadata.json')
+
+    if legacy:
+        for chunk, embedding in zip(chunks, embeddings):
+            chunk['embedding'] = embedding.tolist()
+        with open(metadata_path, 'w', encoding='utf-8') as f:
+            json.dump({'chunks': chunks}, f)
+        return metadata_path, embeddings, chunks
+
+    np.save(os.path.join(directory, 'embeddings.npy'), embeddings)
+    with open(os.path.join(directory, 'keyword_index.npz'), 'wb') as f:
+        f.write(build_keyword_index(chunks).to_bytes())
+    with open(os.path.join(directory, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'format_version': 1,
+            'chunks_count': num_chunks,
+            'files': {'chunks': 'metadata.json', 'embeddings': 'embeddings.npy', 'keyword_index': 'keyword_index.npz'},
+            'embedding': {'model': None, 'dim': EMBEDDING_DIM, 'dtype': 'float32', 'normalized': True}
+        }, f)
+    with open(metadata_path, 'w', encoding='utf-8') as f:
+        json.dump({'chunks': chunks, 'artifact': {'manifest': 'manifest.json'}}, f)
+    return metadata_path, embeddings, chunks
+
+
+def make_library(root):
+    """Three documents (two artifact, one legacy) with unique ids (shards are cached per worker)"""
+    from core.library_index import LibraryEntry
+
+    documents = {}
+    for name, num_chunks, seed, legacy in (('a', 40, 1, False), ('b', 60, 2, False), ('c', 30, 3, True)):
+        path, embeddings, chunks = write_document(root, name, num_chunks, seed, legacy)
+        entry = LibraryEntry(f"{name}-{uuid.uuid4().hex[:8]}", f"{name}.pdf", path, False, 'v1')
+        documents[name] = (entry, embeddings, chunks)
+    return documents
+
+
+def semantic_only(semantic, keyword):
+    return semantic
+
+
+def test_sync_diff():
+    """Test that sync only (re)loads added and reprocessed documents and drops removed ones"""
+
+    print("=" * 80)
+    print("TEST: Library Sync Diff")
+    print("=" * 80)
+
+    import core.library_index as library_index
+    from core.document_cache import DocumentCache
+
+    loads = []
+    original_loader = library_index.load_library_shard
+
+    def counting_loader(entry, document_cache):
+        loads.append((entry.document_id, entry.version))
+        return original_loader(entry, document_cache)
+
+    library_index.load_library_shard = counting_loader
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            documents = make_library(tmp)
+            a, b, c = (documents[name][0] for name in 'abc')
+            library = library_index.LibraryIndex('user-sync', DocumentCache(max_bytes=64 * 1024 * 1024))
+            query = lambda model: documents['a'][1][0]
+
+            library.sync([a, b])
+            library.search(query, {}, 5, semantic_only)
+            first = list(loads)
+
+            # b reprocessed (new version), c added, a unchanged
+            b2 = b._replace(version='v2')
+            library.sync([a, b2, c])
+            library.search(query, {}, 5, semantic_only)
+            second = loads[len(first):]
+
+            # b deleted
+            library.sync([a, c])
+            hits = library.search(query, {}, 200, semantic_only)
+            third = loads[len(first) + len(second):]
+    finally:
+        library_index.load_library_shard = original_loader
+
+    print(f"[TEST] initial sync loads: {[doc for doc, _ in first]}")
+    print(f"[TEST] after b v2 + c: {second}")
+    print(f"[TEST] after removing b: documents={[entry.document_id for entry in library.documents]}, loads={third}")
+
+    if sorted(first) != sorted([(a.document_id, 'v1'), (b.document_id, 'v1')]):
+        print("\n[TEST] FAILED: Expected a and b loaded once")
+        return False
+    if sorted(second) != sorted([(b.document_id, 'v2'), (c.document_id, 'v1')]):
+        print("\n[TEST] FAILED: Expected only the reprocessed and the new document loaded")
+        return False
+    if third or {hit.document_id for hit in hits} != {a.document_id, c.document_id}:
+        print("\n[TEST] FAILED: Removed documents should not be searched (and nothing reloaded)")
+        return False
+
+    print("\n[TEST] TEST PASSED: Sync diff")
+    return True
+
+
+def test_global_top_k():
+    """Test that merged shard candidates give the exact global top-k over all documents"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Library Global Top-K")
+    print("=" * 80)
+
+    from core.library_index import LibraryIndex
+    from core.document_cache import DocumentCache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        documents = make_library(tmp)
+        library = LibraryIndex('user-top-k', DocumentCache(max_bytes=64 * 1024 * 1024))
+        library.sync([entry for entry, _, _ in documents.values()])
+
+        query_vector = np.random.default_rng(9).normal(size=EMBEDDING_DIM).astype(np.float32)
+        query_vector /= np.linalg.norm(query_vector)
+
+        # Brute force over the concatenation of all documents
+        expected = sorted(
+            ((float(embeddings[row] @ query_vector), entry.document_id, row)
+             for entry, embeddings, _ in documents.values() for row in range(len(embeddings))),
+            reverse=True
+        )
+
+        for top_k in (1, 5, 25):
+            hits = library.search(lambda model: query_vector, {}, top_k, semantic_only)
+            got = [(hit.document_id, hit.row) for hit in hits]
+            want = [(doc, row) for _, doc, row in expected[:top_k]]
+            docs = sorted({doc[0] for doc, _ in got})
+            print(f"[TEST] top_k={top_k}: match={got == want}, documents={docs}, "
+                  f"best={hits[0].score:.4f}")
+
+            if got != want or not np.allclose([hit.score for hit in hits], [s for s, _, _ in expected[:top_k]],
+                                               atol=1e-5):
+                print("\n[TEST] FAILED: Expected the exact global top-k across shards")
+                return False
+
+        # Keyword-only search: hits only in chunks containing the term
+        hits = library.search(None, {'agrario': 1.0}, 10, lambda semantic, keyword: keyword)
+        results = library.attribute(hits)
+        print(f"[TEST] keyword only: {len(results)} hits, e.g. {results[0]['filename']} p.{results[0]['page']}: "
+              f"'{results[0]['text']}'")
+
+        if not results or any('agrario' not in result['text'] for result in results):
+            print("\n[TEST] FAILED: Keyword hits should contain the term")
+            return False
+
+    print("\n[TEST] TEST PASSED: Global top-k")
+    return True
+
+
+def test_remove_from_library():
+    """Test that a deleted document disappears from the user's search results"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Remove From Library")
+    print("=" * 80)
+
+    from core.library_index import get_library_index, remove_from_library_index
+
+    user_id = f"user-{uuid.uuid4().hex[:8]}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        documents = make_library(tmp)
+        library = get_library_index(user_id)
+        library.sync([entry for entry, _, _ in documents.values()])
+
+        query = lambda model: documents['b'][1][0]
+        before = library.search(query, {}, 10, semantic_only)
+        deleted = documents['b'][0].document_id
+
+        remove_from_library_index(user_id, deleted)
+        remove_from_library_index('unknown-user', deleted)  # No library in this worker: no-op
+        after = get_library_index(user_id).search(query, {}, 10, semantic_only)
+
+        print(f"[TEST] before: top hit {before[0].document_id} row {before[0].row}, "
+              f"{sum(hit.document_id == deleted for hit in before)} hits from the deleted document")
+        print(f"[TEST] after: {sum(hit.document_id == deleted for hit in after)} hits from it, {len(after)} hits")
+
+        if before[0].document_id != deleted or any(hit.document_id == deleted for hit in after) or len(after) != 10:
+            print("\n[TEST] FAILED: Deleted document should be dropped from the results")
+            return False
+
+    print("\n[TEST] TEST PASSED: Remove from library")
+    return True
+
+
+if __name__ == "__main__":
+    results = [test_sync_diff(), test_global_top_k(), test_remove_from_library()]
+    sys.exit(0 if all(results) else 1)
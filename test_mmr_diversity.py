@@ -0,0 +1,203 @@
+"""
+Test script for MMR diversity selection (core/reranker_optimized.py)
+Checks equivalence with the threshold filter at lambda=1, the MinHash text fallback,
+and benchmarks selection over 1,000 candidates against the former per-pair loop
+"""
+
+import sys
+import time
+
+import numpy as np
+
+NUM_CANDIDATES = 1000
+EMBEDDING_DIM = 768
+TOP_K = 12
+
+
+def make_chunks(num_chunks: int = NUM_CANDIDATES, num_clusters: int = 30, dim: int = EMBEDDING_DIM, seed: int = 3):
+    """Scored chunks in rerank order, in clusters of near-duplicates (inline embedding lists)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_clusters, dim))
+    embeddings = centers[rng.integers(0, len(centers), num_chunks)] + 0.3 * rng.normal(size=(num_chunks, dim))
+
+    return [
+        {
+            'text': f"Chunk {i} sul reddito agrario",
+            'rerank_score': 1.0 - i / num_chunks,
+            'embedding': embeddings[i].tolist()
+        }
+        for i in range(num_chunks)
+    ]
+
+
+def former_diversity_filter(chunks, top_k, diversity_threshold):
+    """Former selection: np.array per pair, norms recomputed against every selected chunk"""
+    selected = []
+    for chunk in chunks:
+        if len(selected) >= top_k:
+            break
+        if not selected:
+            selected.append(chunk)
+            continue
+
+        chunk_embedding = np.array(chunk['embedding'])
+        max_similarity = 0.0
+        for selected_chunk in selected:
+            selected_embedding = np.array(selected_chunk['embedding'])
+            similarity = np.dot(chunk_embedding, selected_embedding) / (
+                np.linalg.norm(chunk_embedding) * np.linalg.norm(selected_embedding)
+            )
+            max_similarity = max(max_similarity, similarity)
+
+        if max_similarity < diversity_threshold:
+            selected.append(chunk)
+
+    return selected
+
+
+def test_threshold_equivalence():
+    """Test that lambda=1 selects exactly what the former threshold filter selected"""
+
+    print("=" * 80)
+    print("TEST: MMR Threshold Equivalence (lambda=1)")
+    print("=" * 80)
+
+    from core.reranker_optimized import CostOptimizedReranker
+
+    reranker = CostOptimizedReranker(use_cross_encoder=False)
+    chunks = make_chunks(num_chunks=300)
+
+    for threshold in (0.70, 0.85):
+        expected = [chunk['text'] for chunk in former_diversity_filter(chunks, TOP_K, threshold)]
+        selected = [chunk['text'] for chunk in
+                    reranker._apply_diversity_filter(chunks, TOP_K, threshold, mmr_lambda=1.0)]
+        print(f"[TEST] threshold {threshold}: {len(selected)} selected, match={selected == expected}")
+
+        if selected != expected:
+            print("\n[TEST] FAILED: lambda=1 should reproduce the threshold filter")
+            return False
+
+    print("\n[TEST] TEST PASSED: Threshold equivalence")
+    return True
+
+
+def test_mmr_diversity():
+    """Test that a lower lambda trades relevance for spread across clusters"""
+
+    print("\n" + "=" * 80)
+    print("TEST: MMR Diversity")
+    print("=" * 80)
+
+    from core.reranker_optimized import CostOptimizedReranker
+
+    reranker = CostOptimizedReranker(use_cross_encoder=False)
+    chunks = make_chunks(num_chunks=300)
+    matrix = reranker._gather_candidate_embeddings(chunks)
+    row_of = {chunk['text']: i for i, chunk in enumerate(chunks)}
+
+    mean_similarities = {}
+    for mmr_lambda in (1.0, 0.5):
+        selected = reranker._apply_diversity_filter(chunks, TOP_K, 0.99, mmr_lambda=mmr_lambda)
+        rows = [row_of[chunk['text']] for chunk in selected]
+        similarities = matrix[rows] @ matrix[rows].T
+        mean_similarities[mmr_lambda] = float(similarities[np.triu_indices(len(rows), 1)].mean())
+        print(f"[TEST] lambda={mmr_lambda}: rows={rows} mean pairwise similarity "
+              f"{mean_similarities[mmr_lambda]:.3f}")
+
+    if mean_similarities[0.5] >= mean_similarities[1.0]:
+        print("\n[TEST] FAILED: Lower lambda should select less similar chunks")
+        return False
+
+    print("\n[TEST] TEST PASSED: MMR diversity")
+    return True
+
+
+def test_minhash_fallback():
+    """Test MinHash Jaccard estimates and the text-based selection without embeddings"""
+
+    print("\n" + "=" * 80)
+    print("TEST: MinHash Text Fallback")
+    print("=" * 80)
+
+    from core.reranker_optimized import CostOptimizedReranker, minhash_signatures
+
+    rng = np.random.default_rng(11)
+    vocabulary = [f"parola{i}" for i in range(400)]
+    texts = [' '.join(rng.choice(vocabulary, size=int(rng.integers(20, 120)))) for _ in range(60)]
+    texts += [text + " aggiunta" for text in texts[:20]]  # Near-duplicates
+
+    signatures = minhash_signatures(texts)
+    word_sets = [set(text.lower().split()) for text in texts]
+    errors = [
+        abs((signatures[i] == signatures[j]).mean() - len(word_sets[i] & word_sets[j]) / len(word_sets[i] | word_sets[j]))
+        for i in range(len(texts)) for j in range(i + 1, len(texts))
+    ]
+    print(f"[TEST] Jaccard estimate error: mean {np.mean(errors):.3f}, max {np.max(errors):.3f}")
+
+    if np.mean(errors) > 0.05:
+        print("\n[TEST] FAILED: MinHash estimates too far from exact Jaccard")
+        return False
+
+    # Duplicates ranked right after their originals: the fallback must skip them
+    chunks = []
+    for i in range(20):
+        chunks += [{'text': texts[i]}, {'text': texts[60 + i]}]
+    for i, chunk in enumerate(chunks):
+        chunk['rerank_score'] = 1.0 - i / len(chunks)
+
+    selected = CostOptimizedReranker(use_cross_encoder=False)._apply_diversity_filter(chunks, 10, 0.85, mmr_lambda=1.0)
+    duplicates = sum(chunk['text'].endswith(" aggiunta") for chunk in selected)
+    print(f"[TEST] {len(selected)} selected, {duplicates} near-duplicates")
+
+    if len(selected) != 10 or duplicates:
+        print("\n[TEST] FAILED: Near-duplicates should be skipped")
+        return False
+
+    print("\n[TEST] TEST PASSED: MinHash fallback")
+    return True
+
+
+def test_diversity_benchmark():
+    """Benchmark: 1,000 candidates x 768 dims, former per-pair loop vs MMR over the normalized matrix"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Diversity Selection Benchmark")
+    print("=" * 80)
+
+    from core.reranker_optimized import CostOptimizedReranker
+
+    reranker = CostOptimizedReranker(use_cross_encoder=False)
+    chunks = make_chunks(num_clusters=8)
+    embeddings = np.asarray([chunk['embedding'] for chunk in chunks], dtype=np.float32)
+    for row, chunk in enumerate(chunks):
+        chunk['chunk_row'] = row
+
+    def timed(select, runs=5):
+        select()  # Warm-up
+        start = time.time()
+        for _ in range(runs):
+            select()
+        return (time.time() - start) * 1000 / runs
+
+    # 8 topics for 12 slots: the former loop compares every candidate with every selected one
+    former_ms = timed(lambda: former_diversity_filter(chunks, TOP_K, 0.85), runs=1)
+    mmr_ms = timed(lambda: reranker._apply_diversity_filter(chunks, TOP_K, 0.85, embeddings=embeddings))
+
+    texts_only = [{'text': ' '.join(chunk['text'].split() * 10) + f" parte {i}", 'rerank_score': chunk['rerank_score']}
+                  for i, chunk in enumerate(chunks)]
+    text_ms = timed(lambda: reranker._apply_diversity_filter(texts_only, TOP_K, 0.85))
+
+    print(f"[TEST] {NUM_CANDIDATES} candidates: former {former_ms:.1f}ms | MMR {mmr_ms:.1f}ms "
+          f"({former_ms / mmr_ms:.0f}x) | MinHash text fallback {text_ms:.1f}ms")
+
+    if mmr_ms >= former_ms:
+        print("\n[TEST] FAILED: MMR selection should be faster than the former loop")
+        return False
+
+    print("\n[TEST] TEST PASSED: Diversity selection benchmark")
+    return True
+
+
+if __name__ == "__main__":
+    results = [test_threshold_equivalence(), test_mmr_diversity(), test_minhash_fallback(), test_diversity_benchmark()]
+    sys.exit(0 if all(results) else 1)
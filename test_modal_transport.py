@@ -0,0 +1,208 @@
+"""
+Test script for the Modal rerank client transport (core/modal_rerank_client.py)
+Runs a local FastAPI stand-in for the Modal endpoint and checks keep-alive reuse,
+gzip request bodies, retries on 503 and read timeouts, then compares per-request
+latency and bytes with the former bare requests.post
+"""
+
+import sys
+import time
+import random
+import gzip
+import json
+import socket
+import threading
+
+NUM_CHUNKS = 50
+QUERY = "Come si determina il reddito agrario dei terreni?"
+
+
+def make_texts(num_texts: int = NUM_CHUNKS, seed: int = 7):
+    """Chunk texts of realistic length (~150 words, varied word mix)"""
+    rng = random.Random(seed)
+    words = ("il reddito agrario dei terreni è determinato mediante tariffe d'estimo secondo le norme della legge "
+             "catasto coltura qualità classe imposta società contratto articolo comma decreto ministero allegato "
+             "proprietario fondo rustico canone affitto durata annata agraria superficie ettari rendita").split()
+    return [' '.join(rng.choice(words) for _ in range(150)) + f" (art. {i})" for i in range(num_texts)]
+
+
+def start_stand_in():
+    """
+    FastAPI stand-in for modal_reranker.rerank_api, served by uvicorn in a thread
+
+    Scores are the text length; it records client ports (one per TCP connection),
+    body sizes and encodings, and can fail or stall the next requests.
+
+    Returns:
+        (base_url, state, server) or None if fastapi/uvicorn are not installed
+    """
+    try:
+        from fastapi import FastAPI, Request
+        from fastapi.responses import JSONResponse
+        import uvicorn
+    except ImportError:
+        return None
+
+    state = {'ports': [], 'body_bytes': [], 'encodings': [], 'fail_next': 0, 'delay_next': 0.0}
+    app = FastAPI()
+
+    @app.post("/rerank_api")
+    async def rerank_api(request: Request):
+        body = await request.body()
+        state['ports'].append(request.client.port)
+        state['body_bytes'].append(len(body))
+        state['encodings'].append(request.headers.get("content-encoding", "identity"))
+
+        if state['fail_next'] > 0:
+            state['fail_next'] -= 1
+            return JSONResponse({"status": "error", "error": "warming up"}, status_code=503)
+
+        if state['delay_next'] > 0:
+            delay, state['delay_next'] = state['delay_next'], 0.0
+            time.sleep(delay)
+
+        if request.headers.get("content-encoding") == "gzip":
+            body = gzip.decompress(body)
+        data = json.loads(body)
+
+        return {"scores": [float(len(text)) for text in data["chunks"]], "num_chunks": len(data["chunks"]),
+                "latency_ms": 0.0, "status": "success"}
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    return f"http://127.0.0.1:{port}", state, server
+
+
+def test_modal_transport():
+    """Test keep-alive, gzip, retries and timeouts against the stand-in"""
+
+    print("=" * 80)
+    print("TEST: Modal Client Transport")
+    print("=" * 80)
+
+    stand_in = start_stand_in()
+    if stand_in is None:
+        print("[TEST] SKIPPED: fastapi/uvicorn not installed")
+        return True
+
+    import core.modal_rerank_client as client
+
+    base_url, state, server = stand_in
+    client.MODAL_RERANK_URL = f"{base_url}/rerank_api"
+    client.RETRY_BACKOFF_SECONDS = 0.01
+    texts = make_texts()
+
+    try:
+        # Keep-alive + gzip: ten calls, one connection, compressed bodies
+        for _ in range(10):
+            scores = client.score_with_modal(QUERY, texts, timeout=5.0)
+        raw_bytes = len(json.dumps({"query": QUERY, "chunks": texts}).encode('utf-8'))
+        print(f"[TEST] 10 calls over {len(set(state['ports']))} connection(s), "
+              f"body {state['body_bytes'][-1]} bytes ({state['encodings'][-1]}) vs {raw_bytes} raw JSON")
+
+        if scores != [float(len(text)) for text in texts]:
+            print("\n[TEST] FAILED: Scores not returned in order")
+            return False
+        if len(set(state['ports'])) != 1 or set(state['encodings']) != {'gzip'}:
+            print("\n[TEST] FAILED: Expected one reused connection and gzip bodies")
+            return False
+
+        # Retries: two 503s, then success
+        requests_before = len(state['ports'])
+        state['fail_next'] = 2
+        scores = client.score_with_modal(QUERY, texts, timeout=5.0)
+        attempts = len(state['ports']) - requests_before
+        print(f"[TEST] 503 x2: {attempts} attempts, scores={'ok' if scores else None}")
+
+        if scores is None or attempts != 3:
+            print("\n[TEST] FAILED: Expected success on the third attempt")
+            return False
+
+        # Retries exhausted: None (cascade falls back)
+        state['fail_next'] = client.MAX_RETRIES + 1
+        if client.score_with_modal(QUERY, texts, timeout=5.0) is not None:
+            print("\n[TEST] FAILED: Expected None once retries are exhausted")
+            return False
+
+        # Read timeout: not retried, returns within the budget
+        requests_before = len(state['ports'])
+        state['delay_next'] = 1.0
+        start = time.time()
+        scores = client.score_with_modal(QUERY, texts, timeout=0.3)
+        elapsed = time.time() - start
+        print(f"[TEST] Read timeout: {elapsed * 1000:.0f}ms, {len(state['ports']) - requests_before} attempt(s)")
+
+        if scores is not None or elapsed > 0.8 or len(state['ports']) - requests_before != 1:
+            print("\n[TEST] FAILED: Read timeout should fail fast without retries")
+            return False
+        time.sleep(1.0)  # Let the stalled request finish
+
+    finally:
+        server.should_exit = True
+
+    print("\n[TEST] TEST PASSED: Modal client transport")
+    return True
+
+
+def test_transport_benchmark():
+    """Benchmark: former bare requests.post (new connection, plain JSON) vs the shared session"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Modal Transport Benchmark")
+    print("=" * 80)
+
+    stand_in = start_stand_in()
+    if stand_in is None:
+        print("[TEST] SKIPPED: fastapi/uvicorn not installed")
+        return True
+
+    import requests
+    import core.modal_rerank_client as client
+
+    base_url, state, server = stand_in
+    client.MODAL_RERANK_URL = f"{base_url}/rerank_api"
+    texts = make_texts()
+    runs = 30
+
+    def timed(call):
+        call()  # Warm-up
+        start = time.time()
+        for _ in range(runs):
+            call()
+        return (time.time() - start) * 1000 / runs
+
+    try:
+        former_ms = timed(lambda: requests.post(client.MODAL_RERANK_URL, json={"query": QUERY, "chunks": texts},
+                                                timeout=5.0).json())
+        former_bytes = state['body_bytes'][-1]
+        former_connections = len(set(state['ports'][-runs:]))
+
+        pooled_ms = timed(lambda: client.score_with_modal(QUERY, texts, timeout=5.0))
+        pooled_bytes = state['body_bytes'][-1]
+        pooled_connections = len(set(state['ports'][-runs:]))
+    finally:
+        server.should_exit = True
+
+    print(f"[TEST] {NUM_CHUNKS} chunks, {runs} requests (local, no TLS):")
+    print(f"[TEST]   former: {former_ms:.1f}ms/request, {former_bytes} bytes, {former_connections} connections")
+    print(f"[TEST]   pooled: {pooled_ms:.1f}ms/request, {pooled_bytes} bytes, {pooled_connections} connection(s) "
+          f"({(1 - pooled_bytes / former_bytes) * 100:.0f}% fewer bytes)")
+
+    if pooled_connections != 1 or pooled_bytes >= former_bytes:
+        print("\n[TEST] FAILED: Expected one connection and smaller bodies")
+        return False
+
+    print("\n[TEST] TEST PASSED: Modal transport benchmark")
+    return True
+
+
+if __name__ == "__main__":
+    results = [test_modal_transport(), test_transport_benchmark()]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,96 @@
+"""
+Test script for the ONNX Runtime query encoder (core/query_encoder_onnx.py)
+Benchmarks latency and cosine agreement against the PyTorch SentenceTransformer
+"""
+
+import sys
+import time
+
+import numpy as np
+
+MODEL_NAME = 'sentence-transformers/paraphrase-multilingual-mpnet-base-v2'
+
+QUERIES = [
+    "Qual è la ricetta della carbonara?",
+    "Chi è l'autore del documento?",
+    "Riassumi le conclusioni principali",
+    "Quali sono le scadenze indicate nel contratto di fornitura?",
+    "Spiega la differenza tra costi fissi e costi variabili nel bilancio aziendale",
+    "elenco ingredienti tiramisù",
+    "What does section 4 say about data retention?",
+    "Quante persone hanno partecipato allo studio e con quali criteri di inclusione sono state selezionate?"
+]
+
+
+def test_mean_pooling_head():
+    """Test that the NumPy pooling head ignores padding tokens"""
+
+    print("=" * 80)
+    print("TEST: Mean Pooling Head")
+    print("=" * 80)
+
+    from core.query_encoder_onnx import mean_pool
+
+    rng = np.random.default_rng(3)
+    token_embeddings = rng.normal(size=(3, 6, 8)).astype(np.float32)
+    lengths = [6, 4, 1]
+    attention_mask = np.array([[1] * n + [0] * (6 - n) for n in lengths])
+
+    pooled = mean_pool(token_embeddings, attention_mask)
+    expected = np.vstack([token_embeddings[i, :n].mean(axis=0) for i, n in enumerate(lengths)])
+
+    if not np.allclose(pooled, expected, atol=1e-6):
+        print("\n[TEST] FAILED: Pooled embeddings differ from per-sentence token means")
+        return False
+
+    print("\n[TEST] TEST PASSED: Mean pooling matches per-sentence token means")
+    return True
+
+
+def test_onnx_encoder_benchmark():
+    """Benchmark: PyTorch vs ONNX fp32 vs ONNX int8 (latency per query, cosine agreement)"""
+
+    print("\n" + "=" * 80)
+    print("TEST: ONNX Query Encoder Benchmark")
+    print("=" * 80)
+
+    try:
+        from sentence_transformers import SentenceTransformer
+        import onnxruntime  # noqa: F401
+    except ImportError as e:
+        print(f"\n[TEST] SKIPPED: {e} (needs sentence-transformers and optimum[onnxruntime])")
+        return True
+
+    from core.query_encoder_onnx import ONNXQueryEncoder, cosine_agreement
+
+    def benchmark(model):
+        model.encode(QUERIES[0], convert_to_tensor=False)  # Warm-up
+        start = time.time()
+        embeddings = np.vstack([model.encode(query, convert_to_tensor=False) for query in QUERIES])
+        return embeddings, (time.time() - start) * 1000 / len(QUERIES)
+
+    reference, torch_ms = benchmark(SentenceTransformer(MODEL_NAME))
+    print(f"[TEST] PyTorch:   {torch_ms:.1f}ms/query")
+
+    passed = True
+    for quantize, min_cosine in ((False, 0.9999), (True, 0.98)):
+        encoder = ONNXQueryEncoder(MODEL_NAME, quantize=quantize)
+        embeddings, onnx_ms = benchmark(encoder)
+        agreement = cosine_agreement(reference, embeddings)
+
+        print(
+            f"[TEST] ONNX {encoder.variant}: {onnx_ms:.1f}ms/query ({torch_ms / onnx_ms:.1f}x), "
+            f"cosine min={agreement.min():.6f} mean={agreement.mean():.6f}"
+        )
+        if agreement.min() < min_cosine:
+            print(f"\n[TEST] FAILED: {encoder.variant} cosine agreement below {min_cosine}")
+            passed = False
+
+    if passed:
+        print("\n[TEST] TEST PASSED: ONNX embeddings agree with PyTorch")
+    return passed
+
+
+if __name__ == "__main__":
+    results = [test_mean_pooling_head(), test_onnx_encoder_benchmark()]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,193 @@
+"""
+Test script for the ONNX cross-encoder reranker (core/reranker_onnx.py)
+Checks length bucketing, export readiness and benchmarks the bucketed NumPy path (fp32, int8)
+against fixed batches of 32 padded to the longest pair (former path)
+"""
+
+import sys
+import time
+import random
+
+import numpy as np
+
+CANDIDATE_COUNTS = [30, 50, 100, 300]
+QUERY = "Come si determina il reddito agrario dei terreni?"
+
+
+def make_texts(num_texts: int, seed: int = 7):
+    """Chunk texts with the length mix of real documents (titles, short and full paragraphs)"""
+    rng = random.Random(seed)
+    words = ("il reddito agrario dei terreni è determinato mediante tariffe d'estimo secondo le norme "
+             "della legge catasto coltura qualità classe imposta società contratto").split()
+    lengths = [rng.choice([8, 30, 60, 120, 250, 400]) for _ in range(num_texts)]
+    return [' '.join(rng.choice(words) for _ in range(length)) for length in lengths]
+
+
+def test_length_buckets():
+    """Test that buckets cover every pair once within the token budget, and padding saved"""
+
+    print("=" * 80)
+    print("TEST: Length Buckets")
+    print("=" * 80)
+
+    from core.reranker_onnx import plan_length_buckets
+
+    rng = np.random.default_rng(5)
+    lengths = np.clip(rng.lognormal(mean=5.0, sigma=0.8, size=300).astype(np.int64), 12, 512)
+
+    buckets = plan_length_buckets(lengths, batch_tokens=8192, max_batch=64)
+    covered = np.sort(np.concatenate(buckets))
+    if not np.array_equal(covered, np.arange(len(lengths))):
+        print("\n[TEST] FAILED: Buckets do not cover every pair exactly once")
+        return False
+
+    oversized = [bucket for bucket in buckets if len(bucket) > 1 and len(bucket) * lengths[bucket].max() > 8192]
+    if oversized or max(len(bucket) for bucket in buckets) > 64:
+        print("\n[TEST] FAILED: Bucket over the token budget or pair limit")
+        return False
+
+    bucketed = sum(len(bucket) * int(lengths[bucket].max()) for bucket in buckets)
+    fixed = sum(len(lengths[i:i + 32]) * int(lengths[i:i + 32].max()) for i in range(0, len(lengths), 32))
+    print(f"[TEST] {len(buckets)} buckets, padded tokens {bucketed} vs {fixed} with fixed batches of 32 "
+          f"({(1 - bucketed / fixed) * 100:.0f}% less, real tokens {int(lengths.sum())})")
+
+    if bucketed >= fixed:
+        print("\n[TEST] FAILED: Bucketing should pad less than fixed batches")
+        return False
+
+    if plan_length_buckets(np.array([], dtype=np.int64)) != []:
+        print("\n[TEST] FAILED: No pairs should give no buckets")
+        return False
+
+    print("\n[TEST] TEST PASSED: Length buckets")
+    return True
+
+
+def test_export_readiness():
+    """Test that only a complete, verified export of the configured variant counts as ready"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Export Readiness")
+    print("=" * 80)
+
+    import os
+    import json
+    import tempfile
+    from core import reranker_onnx
+
+    home = os.environ.get('HOME')
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['HOME'] = tmp
+        try:
+            export_path = reranker_onnx.onnx_export_path('test/model')
+            export_path.mkdir(parents=True)
+
+            def ready():
+                return {variant: reranker_onnx.is_onnx_reranker_exported('test/model', variant)
+                        for variant in ('fp32', 'int8')}
+
+            # Former reranker_onnx_optimized export: model.onnx only
+            (export_path / 'model.onnx').write_bytes(b'')
+            legacy = ready()
+
+            (export_path / 'tokenizer.json').write_text('{}')
+            config = {'model_name': 'test/model', 'max_length': 512, 'pad_token_id': 0, 'verification': {}}
+            (export_path / 'reranker_config.json').write_text(json.dumps(config))
+            fp32_only = ready()
+
+            (export_path / 'model_int8.onnx').write_bytes(b'')
+            unverified = ready()
+
+            config['verification']['int8'] = {'correlation': 0.995, 'same_top1': True, 'passed': True}
+            (export_path / 'reranker_config.json').write_text(json.dumps(config))
+            verified = ready()
+        finally:
+            if home is None:
+                os.environ.pop('HOME', None)
+            else:
+                os.environ['HOME'] = home
+
+    print(f"[TEST] legacy={legacy} fp32 export={fp32_only} int8 unverified={unverified} verified={verified}")
+
+    expected = [
+        {'fp32': False, 'int8': False},
+        {'fp32': True, 'int8': False},
+        {'fp32': True, 'int8': False},
+        {'fp32': True, 'int8': True}
+    ]
+    if [legacy, fp32_only, unverified, verified] != expected:
+        print("\n[TEST] FAILED: Export readiness does not match the files present")
+        return False
+
+    print("\n[TEST] TEST PASSED: Export readiness")
+    return True
+
+
+def test_onnx_reranker_benchmark():
+    """Benchmark: former path (fixed batches, torch tensors) vs bucketed NumPy fp32 / int8"""
+
+    print("\n" + "=" * 80)
+    print("TEST: ONNX Reranker Benchmark")
+    print("=" * 80)
+
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        from transformers import AutoTokenizer
+        import onnxruntime  # noqa: F401
+        import tokenizers  # noqa: F401
+    except ImportError as e:
+        print(f"\n[TEST] SKIPPED: {e} (needs optimum[onnxruntime] and torch)")
+        return True
+
+    from core.reranker_onnx import ONNXReranker, export_onnx_reranker, _score_correlation
+
+    export_path = export_onnx_reranker(quantize=True)
+
+    # Former path: fixed batches of 32, padding to the longest pair, torch tensors
+    model = ORTModelForSequenceClassification.from_pretrained(str(export_path), provider="CPUExecutionProvider")
+    tokenizer = AutoTokenizer.from_pretrained(str(export_path))
+
+    def former_score(texts):
+        scores = []
+        for i in range(0, len(texts), 32):
+            inputs = tokenizer([[QUERY, text] for text in texts[i:i + 32]], padding=True, truncation=True,
+                               max_length=512, return_tensors="pt")
+            scores.append(model(**inputs).logits.squeeze(-1).detach().numpy().reshape(-1))
+        return np.concatenate(scores)
+
+    rerankers = {variant: ONNXReranker(variant=variant) for variant in ('fp32', 'int8')}
+
+    def timed(score_fn, texts):
+        score_fn(texts[:4])  # Warm-up
+        start = time.time()
+        scores = score_fn(texts)
+        return scores, (time.time() - start) * 1000
+
+    passed = True
+    for count in CANDIDATE_COUNTS:
+        texts = make_texts(count)
+        reference, former_ms = timed(former_score, texts)
+        line = f"[TEST] {count:>3} chunks: former {former_ms:7.1f}ms"
+
+        for variant, reranker in rerankers.items():
+            scores, ms = timed(lambda batch: reranker.score(QUERY, batch), texts)
+            correlation = _score_correlation(reference, scores)
+            line += f" | {reranker.variant} {ms:7.1f}ms ({former_ms / ms:.1f}x, r={correlation:.4f})"
+
+            if variant == 'fp32' and not np.allclose(scores, reference, atol=1e-3):
+                print(f"\n[TEST] FAILED: Bucketed fp32 scores differ from the former path ({count} chunks)")
+                passed = False
+            if count == 50 and variant == 'int8':
+                target = "within" if ms < 500 else "ABOVE"
+                line += f" [{target} 500ms target]"
+
+        print(line)
+
+    if passed:
+        print("\n[TEST] TEST PASSED: Bucketed scores match the former path")
+    return passed
+
+
+if __name__ == "__main__":
+    results = [test_length_buckets(), test_export_readiness(), test_onnx_reranker_benchmark()]
+    sys.exit(0 if all(results) else 1)
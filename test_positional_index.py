@@ -0,0 +1,140 @@
+"""
+Test script for the positional full-text index (core/positional_index.py)
+Checks exact counts and pages on overlapping chunks, phrases and pagination
+"""
+
+import re
+import sys
+import time
+import random
+
+
+def make_document(num_pages: int = 300, seed: int = 1):
+    """Synthetic document: page texts + overlapping chunks like memvid_sections"""
+    rng = random.Random(seed)
+    words = "il reddito agrario è determinato secondo la legge città perché imposta società".split()
+
+    pages = [' '.join(rng.choice(words) for _ in range(400)) for _ in range(num_pages)]
+    text = ''.join(f"\n## Pagina {page}\n\n{body}\n\n" for page, body in enumerate(pages, start=1))
+
+    # chunk_size 1200, overlap 200, forward overlap 100
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + 1200, len(text))
+        chunks.append({'text': text[start:min(end + 100, len(text))], 'metadata': {'index': len(chunks)}})
+        if end == len(text):
+            break
+        start = end - 200
+
+    return pages, chunks
+
+
+def test_exact_counts():
+    """Test that overlapping chunks are counted once (totals and per-page counts)"""
+
+    print("=" * 80)
+    print("TEST: Positional Index Exact Counts")
+    print("=" * 80)
+
+    from core.positional_index import build_positional_index, fold_text
+
+    pages, chunks = make_document()
+    start = time.time()
+    index = build_positional_index(chunks)
+    print(f"[TEST] Indexed {len(chunks)} chunks in {(time.time() - start) * 1000:.0f}ms")
+
+    for term in ('reddito', 'Città', 'perche'):
+        pattern = re.compile(r'(?<!\w)' + re.escape(fold_text(term)) + r'(?!\w)')
+        expected_pages = [(page, len(pattern.findall(fold_text(body)))) for page, body in enumerate(pages, start=1)]
+        expected_pages = [(page, count) for page, count in expected_pages if count]
+        expected_total = sum(count for _, count in expected_pages)
+
+        start = time.time()
+        found = index.find(term, limit=10)
+        print(f"[TEST] '{term}': {found.total} occurrences (expected {expected_total}), {(time.time() - start) * 1000:.2f}ms")
+
+        if found.total != expected_total or found.pages != expected_pages:
+            print(f"\n[TEST] FAILED: Counts differ for '{term}'")
+            return False
+
+    # Phrases also match across page breaks
+    full_text = fold_text(' '.join(pages))
+    expected_total = len(re.findall(r'(?<!\w)reddito\s+agrario(?!\w)', full_text))
+    found = index.find('reddito agrario')
+    print(f"[TEST] 'reddito agrario': {found.total} occurrences (expected {expected_total})")
+    if found.total != expected_total:
+        print("\n[TEST] FAILED: Phrase count differs")
+        return False
+
+    print("\n[TEST] TEST PASSED: Exact totals and pages")
+    return True
+
+
+def test_pagination_and_snippets():
+    """Test paginating through all occurrences"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Positional Index Pagination")
+    print("=" * 80)
+
+    from core.positional_index import PositionalIndex, build_positional_index, make_snippet
+
+    _, chunks = make_document(num_pages=40)
+    index = PositionalIndex.from_bytes(build_positional_index(chunks).to_bytes())
+
+    total = index.count('reddito agrario')
+    seen = []
+    offset = 0
+    while True:
+        found = index.find('reddito agrario', offset=offset, limit=25)
+        seen.extend((occurrence.row, occurrence.start) for occurrence in found.occurrences)
+        if not found.has_more:
+            break
+        offset += 25
+
+    if len(seen) != total or len(set(seen)) != total:
+        print(f"\n[TEST] FAILED: Paginated {len(seen)} occurrences ({len(set(seen))} unique) of {total}")
+        return False
+
+    snippet = make_snippet(chunks, index.find('reddito agrario', limit=1).occurrences[0], context_chars=20)
+    print(f"[TEST] {total} occurrences paginated, first snippet: {snippet}")
+    if 'reddito agrario' not in snippet:
+        print("\n[TEST] FAILED: Snippet does not contain the phrase")
+        return False
+
+    print("\n[TEST] TEST PASSED: Pagination covers every occurrence once")
+    return True
+
+
+def test_occurrence_query_parsing():
+    """Test extraction of the searched term from "find all" queries"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Occurrence Query Parsing")
+    print("=" * 80)
+
+    from core.positional_index import parse_occurrence_query
+
+    cases = [
+        ('Trova tutte le occorrenze di "reddito agrario"', 'reddito agrario'),
+        ('Quante volte compare Milano?', 'milano'),
+        ('cerca la parola imposta', 'imposta'),
+        ("In quali pagine compare 'IRPEF'?", 'IRPEF'),
+        ('Di cosa parla il documento?', None)
+    ]
+
+    for query, expected in cases:
+        term = parse_occurrence_query(query)
+        print(f"[TEST] {query!r} -> {term!r}")
+        if term != expected:
+            print(f"\n[TEST] FAILED: Expected {expected!r}")
+            return False
+
+    print("\n[TEST] TEST PASSED: Search terms extracted")
+    return True
+
+
+if __name__ == "__main__":
+    results = [test_exact_counts(), test_pagination_and_snippets(), test_occurrence_query_parsing()]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,270 @@
+"""
+Test script for the rerank backend cascade (core/rerank_cascade.py)
+Checks fallback order, cooldown, latency budget, score cache and the local ONNX backend
+"""
+
+import sys
+import numpy as np
+
+
+def make_candidates(num_chunks: int = 40):
+    """Candidates over a shared chunk list, in retrieval order"""
+    from core.candidates import CandidateChunk
+
+    chunks = [{'text': f"Chunk {i} sul reddito agrario", 'metadata': {'index': i}} for i in range(num_chunks)]
+    candidates = [
+        CandidateChunk(chunks, row, similarity_score=1.0 - row / num_chunks)
+        for row in range(num_chunks)
+    ]
+    return chunks, candidates
+
+
+def make_backends():
+    """Test backends: one that always fails, one scoring by row (higher row = more relevant)"""
+    from core.rerank_cascade import RerankBackend
+
+    class FailingBackend(RerankBackend):
+        name = 'failing'
+        calls = 0
+
+        def score(self, query, texts, deadline):
+            FailingBackend.calls += 1
+            raise TimeoutError("read timeout")
+
+    class RowBackend(RerankBackend):
+        name = 'rows'
+
+        def __init__(self, max_scored=None):
+            super().__init__(budget_ms=100)
+            self.max_scored = max_scored
+
+        def score(self, query, texts, deadline):
+            scored = texts[:self.max_scored] if self.max_scored else texts
+            return [float(text.split()[1]) for text in scored]
+
+    return FailingBackend, RowBackend
+
+
+def test_cascade_fallback():
+    """Test that a failing backend falls through to the next one and cools down"""
+
+    print("=" * 80)
+    print("TEST: Rerank Cascade Fallback")
+    print("=" * 80)
+
+    from core.rerank_cascade import Reranker
+
+    FailingBackend, RowBackend = make_backends()
+    reranker = Reranker([FailingBackend(budget_ms=100), RowBackend()])
+
+    _, candidates = make_candidates()
+    result = reranker.rerank("reddito agrario", candidates, top_k=5)
+    rows = [chunk.row for chunk in result.chunks]
+    print(f"[TEST] backend={result.backend} rows={rows}")
+
+    if result.backend != 'rows' or rows != [39, 38, 37, 36, 35]:
+        print("\n[TEST] FAILED: Expected the second backend's ranking")
+        return False
+
+    if reranker.primary_backend() != 'rows':
+        print("\n[TEST] FAILED: Failed backend should be cooling down")
+        return False
+
+    reranker.rerank("reddito agrario", candidates, top_k=5)
+    if FailingBackend.calls != 1:
+        print(f"\n[TEST] FAILED: Failed backend called {FailingBackend.calls} times during cooldown")
+        return False
+
+    print("\n[TEST] TEST PASSED: Fallback and cooldown")
+    return True
+
+
+def test_budget_partial_scores():
+    """Test that candidates not scored within the budget keep retrieval order after the scored ones"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Rerank Latency Budget")
+    print("=" * 80)
+
+    from core.rerank_cascade import Reranker
+
+    _, RowBackend = make_backends()
+    reranker = Reranker([RowBackend(max_scored=4)])
+
+    _, candidates = make_candidates()
+    result = reranker.rerank("reddito agrario", candidates, top_k=7)
+    rows = [chunk.row for chunk in result.chunks]
+    print(f"[TEST] rows={rows}")
+
+    if rows != [3, 2, 1, 0, 4, 5, 6]:
+        print("\n[TEST] FAILED: Expected scored prefix by score, then retrieval order")
+        return False
+
+    if 'rerank_score' in candidates[10] or candidates[3]['rerank_score'] != 3.0:
+        print("\n[TEST] FAILED: rerank_score should be set on scored candidates only")
+        return False
+
+    print("\n[TEST] TEST PASSED: Partial scoring within budget")
+    return True
+
+
+class MemoryRedis:
+    """Dict-backed stand-in for the redis client calls used by the rerank score cache"""
+
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    def incrby(self, key, amount):
+        self.data[key] = str(int(self.data.get(key, 0)) + amount).encode('utf-8')
+
+    def keys(self, pattern):
+        return [key.encode('utf-8') for key in self.data if key.startswith(pattern.rstrip('*'))]
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *args: self.calls.append((name, args))
+
+            def execute(self):
+                return [getattr(redis, name)(*args) for name, args in self.calls]
+
+        return Pipeline()
+
+
+def test_score_cache():
+    """Test that only uncached candidates are scored and partial hits merge with fresh scores"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Rerank Score Cache")
+    print("=" * 80)
+
+    from core.cache_manager import CacheManager
+    from core.rerank_cascade import Reranker
+
+    _, RowBackend = make_backends()
+    scored_texts = []
+
+    class CountingBackend(RowBackend):
+        cache_id = 'rows:v1'
+
+        def score(self, query, texts, deadline):
+            scored_texts.extend(texts)
+            return super().score(query, texts, deadline)
+
+    cache_manager = CacheManager.__new__(CacheManager)
+    cache_manager.enabled = True
+    cache_manager.redis_client = MemoryRedis()
+
+    reranker = Reranker([CountingBackend()])
+    reranker._score_cache_manager = lambda: cache_manager
+
+    _, candidates = make_candidates()
+    first = reranker.rerank("Reddito agrario?", candidates[:20], top_k=5, document_key='doc@v1')
+
+    # Rephrased (normalized equal) query, 20 cached + 20 new candidates
+    scored_texts.clear()
+    _, candidates = make_candidates()
+    second = reranker.rerank("  reddito   AGRARIO ", candidates, top_k=5, document_key='doc@v1')
+    rows = [chunk.row for chunk in second.chunks]
+    print(f"[TEST] first: {first.cache_hits} hits | second: {second.cache_hits} hits, "
+          f"{len(scored_texts)} scored, rows={rows}")
+
+    if first.cache_hits != 0 or second.cache_hits != 20 or len(scored_texts) != 20:
+        print("\n[TEST] FAILED: Expected 20 cached scores and 20 scored candidates")
+        return False
+
+    if rows != [39, 38, 37, 36, 35] or candidates[5]['rerank_score'] != 5.0:
+        print("\n[TEST] FAILED: Cached and fresh scores not merged")
+        return False
+
+    # New document version: nothing cached
+    third = reranker.rerank("reddito agrario", candidates, top_k=5, document_key='doc@v2')
+    stats = cache_manager.get_rerank_stats()['backends']['rows']
+    print(f"[TEST] new version: {third.cache_hits} hits, stats={stats}")
+
+    if third.cache_hits != 0 or stats['hits'] != 20 or stats['misses'] != 80:
+        print("\n[TEST] FAILED: Unexpected hit counters")
+        return False
+
+    print("\n[TEST] TEST PASSED: Score cache")
+    return True
+
+
+def test_lightweight_backend():
+    """Test the model-free backend (last resort, always available)"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Lightweight Backend")
+    print("=" * 80)
+
+    from core.rerank_cascade import Reranker, LightweightRerankBackend
+
+    _, candidates = make_candidates()
+    embeddings = np.random.default_rng(0).normal(size=(len(candidates), 16)).astype(np.float32)
+
+    result = Reranker([LightweightRerankBackend()]).rerank("reddito agrario", candidates, top_k=10, embeddings=embeddings)
+    print(f"[TEST] backend={result.backend} chunks={len(result.chunks)} in {result.elapsed_ms:.1f}ms")
+
+    if result.backend != 'lightweight' or len(result.chunks) != 10:
+        print("\n[TEST] FAILED: Expected 10 chunks from the lightweight backend")
+        return False
+
+    print("\n[TEST] TEST PASSED: Lightweight backend")
+    return True
+
+
+def test_onnx_backend():
+    """Test the local ONNX cross-encoder (needs optimum[onnxruntime] and the exported model)"""
+
+    print("\n" + "=" * 80)
+    print("TEST: ONNX Cross-Encoder Backend")
+    print("=" * 80)
+
+    from core.rerank_cascade import ONNXRerankBackend
+    from core.reranker_onnx import is_onnx_runtime_available
+
+    if not is_onnx_runtime_available():
+        print("[TEST] SKIPPED: optimum[onnxruntime] not installed")
+        return True
+
+    from core.reranker_onnx import get_onnx_reranker
+
+    get_onnx_reranker()  # Exports once if needed
+    backend = ONNXRerankBackend()
+    if not backend.is_available():
+        print("\n[TEST] FAILED: Backend unavailable after export")
+        return False
+
+    chunks = [
+        {'text': "La carbonara si prepara con guanciale, uova, pecorino e pepe nero."},
+        {'text': "Il contratto di locazione scade il 31 dicembre."},
+        {'text': "Il reddito agrario è determinato secondo la legge."}
+    ]
+    ranked = backend.rerank("Come si prepara la carbonara?", chunks, top_k=3)
+    print(f"[TEST] Scores: {[round(chunk['rerank_score'], 2) for chunk in ranked]}")
+
+    if ranked[0] is not chunks[0]:
+        print("\n[TEST] FAILED: Relevant chunk not ranked first")
+        return False
+
+    print("\n[TEST] TEST PASSED: ONNX cross-encoder ranking")
+    return True
+
+
+if __name__ == "__main__":
+    results = [
+        test_cascade_fallback(), test_budget_partial_scores(), test_score_cache(),
+        test_lightweight_backend(), test_onnx_backend()
+    ]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,240 @@
+"""
+Test script for the semantic result cache (core/cache_manager.py)
+Checks scope isolation, the similarity threshold, skipping expired results,
+entries of other embedding dimensions and false-hit accounting.
+
+Uses fakeredis when installed, otherwise a minimal in-memory stand-in for
+the Redis commands the cache manager issues.
+"""
+
+import sys
+import fnmatch
+
+import numpy as np
+
+DIM = 768
+
+
+class InMemoryRedis:
+    """In-memory stand-in for the redis-py client (bytes values, no TTL expiry)"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode('utf-8')
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, b'0')) + 1).encode('utf-8')
+
+    def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+
+    def keys(self, pattern):
+        return [key.encode('utf-8') for key in self.data if fnmatch.fnmatch(key, pattern)]
+
+    def lpush(self, key, value):
+        self.data.setdefault(key, []).insert(0, value)
+
+    def ltrim(self, key, start, end):
+        self.data[key] = self.data.get(key, [])[start:end + 1]
+
+    def lrange(self, key, start, end):
+        values = self.data.get(key, [])
+        return values[start:] if end == -1 else values[start:end + 1]
+
+    def expire(self, key, ttl):
+        pass
+
+    def pipeline(self):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    """Queued commands, run by execute()"""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((getattr(self.client, name), args))
+
+    def execute(self):
+        return [command(*args) for command, args in self.commands]
+
+
+def make_cache_manager():
+    """CacheManager over fakeredis (if installed) or the in-memory stand-in"""
+    from core.cache_manager import CacheManager
+
+    try:
+        import fakeredis
+        client = fakeredis.FakeRedis()
+    except ImportError:
+        client = InMemoryRedis()
+
+    manager = CacheManager(redis_url=None)
+    manager.redis_client = client
+    manager.enabled = True
+    return manager
+
+
+def unit(*components, dim=DIM):
+    """Vector with the given leading components (basis directions are exact in float16)"""
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[:len(components)] = components
+    return vector
+
+
+def at_similarity(similarity, dim=DIM):
+    """Unit vector with the given cosine similarity to unit(1.0)"""
+    return unit(similarity, np.sqrt(1.0 - similarity ** 2), dim=dim)
+
+
+def result_for(*chunk_indexes):
+    return {'answer': f"Risposta {chunk_indexes}", 'sources': [{'chunk_index': i} for i in chunk_indexes]}
+
+
+def test_scope_isolation():
+    """Test that hits stay within the same document and result scope"""
+
+    print("=" * 80)
+    print("TEST: Semantic Cache Scope Isolation")
+    print("=" * 80)
+
+    from core.cache_manager import make_result_scope
+
+    free_scope = make_result_scope('query', {'tier': 'free', 'temperature': 0.3})
+    print(f"[TEST] scope={free_scope}")
+
+    if make_result_scope('query', {'temperature': 0.3, 'tier': 'free'}) != free_scope:
+        print("\n[TEST] FAILED: Scope should not depend on parameter order")
+        return False
+    if len({free_scope, make_result_scope('query', {'tier': 'pro', 'temperature': 0.3}),
+            make_result_scope('quiz', {'tier': 'free', 'temperature': 0.3})}) != 3:
+        print("\n[TEST] FAILED: Query type and parameters should change the scope")
+        return False
+
+    manager = make_cache_manager()
+    manager.set_result("Chi è l'autore?", 'doc-1', result_for(1, 2), scope=free_scope, query_embedding=unit(1.0))
+
+    same = manager.get_similar_result("Chi ha scritto il documento?", at_similarity(0.99), 'doc-1', free_scope)
+    other_scope = manager.get_similar_result(
+        "Chi ha scritto il documento?", at_similarity(0.99), 'doc-1', make_result_scope('quiz', {'tier': 'free'})
+    )
+    other_doc = manager.get_similar_result("Chi ha scritto il documento?", at_similarity(0.99), 'doc-2', free_scope)
+    print(f"[TEST] same scope: {same.cached_query if same else None} | other scope: {other_scope} | "
+          f"other document: {other_doc}")
+
+    if same is None or same.result != result_for(1, 2) or other_scope is not None or other_doc is not None:
+        print("\n[TEST] FAILED: Expected a hit only within the same document and scope")
+        return False
+
+    print("\n[TEST] TEST PASSED: Scope isolation")
+    return True
+
+
+def test_threshold_and_probes():
+    """Test the similarity threshold, expired results and entries of another dimension"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Semantic Cache Threshold and Probes")
+    print("=" * 80)
+
+    from core.cache_manager import SEMANTIC_CACHE_THRESHOLD
+
+    manager = make_cache_manager()
+    manager.set_result("reddito agrario", 'doc-1', result_for(1), query_embedding=unit(1.0))
+
+    above = manager.get_similar_result("reddito agrario?", at_similarity(SEMANTIC_CACHE_THRESHOLD + 0.001), 'doc-1')
+    below = manager.get_similar_result("reddito dominicale", at_similarity(SEMANTIC_CACHE_THRESHOLD - 0.001), 'doc-1')
+    print(f"[TEST] threshold {SEMANTIC_CACHE_THRESHOLD}: +0.001 -> "
+          f"{'hit %.4f' % above.similarity if above else 'miss'}, -0.001 -> {'hit' if below else 'miss'}")
+
+    if above is None or below is not None:
+        print("\n[TEST] FAILED: Expected a hit just above the threshold and a miss just below")
+        return False
+
+    # Best match expired (result key gone, vector set entry still there): next best is used
+    manager.set_result("reddito agrario dei terreni", 'doc-1', result_for(2), query_embedding=at_similarity(0.99))
+    manager.redis_client.delete(manager._make_cache_key('result', "reddito agrario", 'doc-1'))
+    match = manager.get_similar_result("reddito agrario", unit(1.0), 'doc-1')
+    print(f"[TEST] best match expired: served '{match.cached_query if match else None}'")
+
+    if match is None or match.cached_query != "reddito agrario dei terreni" or match.result != result_for(2):
+        print("\n[TEST] FAILED: Expired results should be skipped for the next best match")
+        return False
+
+    # Entry from a 384-dim model in the same vector set: ignored by 768-dim queries and vice versa
+    manager.set_result("query di un altro modello", 'doc-1', result_for(3), query_embedding=unit(1.0, dim=384))
+    match_768 = manager.get_similar_result("reddito agrario", unit(1.0), 'doc-1')
+    match_384 = manager.get_similar_result("query di un altro modello", unit(1.0, dim=384), 'doc-1')
+    print(f"[TEST] mixed dimensions: 768 -> '{match_768.cached_query if match_768 else None}', "
+          f"384 -> '{match_384.cached_query if match_384 else None}'")
+
+    if match_768 is None or match_768.result != result_for(2) or match_384 is None or match_384.result != result_for(3):
+        print("\n[TEST] FAILED: Entries of another dimension should be skipped, not break lookups")
+        return False
+
+    print("\n[TEST] TEST PASSED: Threshold and probes")
+    return True
+
+
+def test_false_hit_accounting():
+    """Test audit sampling and false-hit counters / samples"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Semantic Cache False-Hit Accounting")
+    print("=" * 80)
+
+    import core.cache_manager as cache_manager
+
+    manager = make_cache_manager()
+    manager.set_result("reddito agrario", 'doc-1', result_for(1, 2, 3), query_embedding=unit(1.0))
+
+    previous_rate = cache_manager.SEMANTIC_CACHE_AUDIT_RATE
+    cache_manager.SEMANTIC_CACHE_AUDIT_RATE = 1.0  # Audit every hit
+    try:
+        match = manager.get_similar_result("reddito agrario?", at_similarity(0.99), 'doc-1')
+    finally:
+        cache_manager.SEMANTIC_CACHE_AUDIT_RATE = previous_rate
+    manager.get_similar_result("qualcos'altro", unit(0.0, 1.0), 'doc-1')  # Miss
+
+    if match is None or not match.audit:
+        print("\n[TEST] FAILED: Expected an audited hit")
+        return False
+
+    same_sources = manager.record_semantic_audit("reddito agrario?", match, result_for(1, 2, 3))
+    overlapping = manager.record_semantic_audit("reddito agrario?", match, result_for(1, 2, 4))
+    disjoint = manager.record_semantic_audit("reddito agrario?", match, result_for(7, 8, 9))
+    stats = manager._semantic_stats()
+    print(f"[TEST] audits: same={same_sources}, 2 of 4 shared={overlapping}, disjoint={disjoint}")
+    print(f"[TEST] stats: hits={stats['hits']} misses={stats['misses']} audits={stats['audits']} "
+          f"false_hits={stats['false_hits']} false_hit_rate={stats['false_hit_rate']:.2f}")
+    print(f"[TEST] samples: {stats['false_hit_samples']}")
+
+    if (same_sources, overlapping, disjoint) != (False, False, True):
+        print("\n[TEST] FAILED: Only the disjoint recomputation is a false hit")
+        return False
+    if (stats['hits'], stats['misses'], stats['audits'], stats['false_hits']) != (1, 1, 3, 1):
+        print("\n[TEST] FAILED: Unexpected semantic cache counters")
+        return False
+    if len(stats['false_hit_samples']) != 1 or stats['false_hit_samples'][0]['source_overlap'] != 0.0:
+        print("\n[TEST] FAILED: Expected one false-hit sample with no source overlap")
+        return False
+
+    print("\n[TEST] TEST PASSED: False-hit accounting")
+    return True
+
+
+if __name__ == "__main__":
+    results = [test_scope_isolation(), test_threshold_and_probes(), test_false_hit_accounting()]
+    sys.exit(0 if all(results) else 1)
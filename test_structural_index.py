@@ -0,0 +1,79 @@
+"""
+Test script for the structural index (core/structural_index.py)
+Checks page / article / section lookups on overlapping chunks
+"""
+
+import sys
+
+CHUNKS = [
+    {'text': "\n## Pagina 1\n\nIndice\nArt. 1. Definizioni\nArt. 2. Oggetto\n", 'metadata': {'page': 1}},
+    {'text': "\n## Pagina 2\n\n# Capitolo 1 - Norme generali\nArt. 1. Definizioni\nAi fini del presente testo "
+             "si intende per reddito quanto indicato dall'art. 2 del decreto.", 'metadata': {'page': 2}},
+    {'text': "continuazione della definizione di reddito, con gli esempi e le eccezioni previste", 'metadata': {}},
+    {'text': "fine dell'articolo.\nArt. 2. Oggetto\nIl presente testo disciplina...\n## Pagina 3\n\n"
+             "## Sezione 2\nArt. 2-bis. Disposizioni transitorie\ntesto", 'metadata': {'page': 3}},
+    {'text': "ultime disposizioni dell'art. 2-bis", 'metadata': {}}
+]
+
+
+def test_structural_lookups():
+    """Test article, page, last page and section lookups"""
+
+    print("=" * 80)
+    print("TEST: Structural Index Lookups")
+    print("=" * 80)
+
+    from core.structural_index import build_structural_index
+
+    structure = build_structural_index(CHUNKS)
+
+    cases = [
+        # (query, expected kind, expected rows)
+        ("Cosa dice l'articolo 1?", 'article', [1, 2, 3]),  # Body header, not the table of contents
+        ("art. 2 bis", 'article', [3, 4]),
+        ("Riassumi la pagina 2", 'page', [1, 2, 3]),
+        ("Cosa c'è nell'ultima pagina?", 'last_page', [3, 4]),
+        ("capitolo 1", 'section', [1, 2, 3, 4]),
+        ("sezione 2", 'section', [3, 4])
+    ]
+
+    for query, expected_kind, expected_rows in cases:
+        match = structure.lookup(query)
+        print(f"[TEST] {query!r} -> {match}")
+        if match is None or match.kind != expected_kind or match.rows != expected_rows:
+            print(f"\n[TEST] FAILED: Expected {expected_kind} {expected_rows}")
+            return False
+
+    for query in ("Chi è l'autore?", "articolo 99", "pagina 40"):
+        if structure.lookup(query) is not None:
+            print(f"\n[TEST] FAILED: {query!r} should fall back to search")
+            return False
+
+    print("\n[TEST] TEST PASSED: Structural queries resolved to the expected chunks")
+    return True
+
+
+def test_structural_index_roundtrip():
+    """Test that structure.json restores an identical index"""
+
+    print("\n" + "=" * 80)
+    print("TEST: Structural Index Serialization")
+    print("=" * 80)
+
+    from core.structural_index import StructuralIndex, build_structural_index
+
+    structure = build_structural_index(CHUNKS)
+    restored = StructuralIndex.from_bytes(structure.to_bytes())
+
+    if restored.to_dict() != structure.to_dict() or restored.last_page != 3:
+        print("\n[TEST] FAILED: Restored index differs")
+        return False
+
+    print(f"[TEST] {len(structure.to_bytes())} bytes, {len(restored.articles)} articles, {len(restored.pages)} pages")
+    print("\n[TEST] TEST PASSED: Serialization roundtrip")
+    return True
+
+
+if __name__ == "__main__":
+    results = [test_structural_lookups(), test_structural_index_roundtrip()]
+    sys.exit(0 if all(results) else 1)